@@ -3,35 +3,78 @@ API - Gerenciador de Projetos de Engenharia Civil
 Desenvolvido por: Vicente de Souza
 """
 
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.exceptions import RequestValidationError
 from config import settings
-from middleware.rate_limit import limiter, rate_limit_exception_handler
-from slowapi.errors import RateLimitExceeded
+from middleware.rate_limit import limiter, rate_limit_exception_handler, RateLimitExceeded
 from openapi_config import custom_openapi
+from middleware.database import (
+    init_db_pool, close_db_pool, get_db_pool,
+    UnidadeDeTrabalhoMiddleware, estatisticas_unidades
+)
+from utils.metricas_snapshot import snapshot_engine
+from utils.reconciliacao_progresso import reconciliacao_progresso
+from utils.chat_hub import chat_hub
+from utils.miniaturas import gerador_miniaturas
+from utils.armazenamento_arquivos import armazenamento_arquivos
+from utils.auth import executor_senhas
+from utils.cache_tokens import cache_tokens
+from utils.lista_revogacao import lista_revogacao
+from instrumentacao_sql import instrumentacao
 
 # Importar rotas
 from routes import auth, projetos, tarefas, equipes, documentos, materiais, orcamentos, chat, metricas
 
+# Instrumentação de SQL com os parâmetros de config.Settings
+instrumentacao.configurar(
+    ativa=settings.SQL_INSTRUMENTACAO_ATIVA,
+    limite_lenta_ms=settings.SQL_LENTA_MS,
+    max_consultas=settings.SQL_MAX_CONSULTAS
+)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Abre o pool de conexões compartilhado e os jobs em segundo plano no startup"""
+    await init_db_pool(app)
+    if settings.METRICAS_SNAPSHOT_ATIVO:
+        snapshot_engine.iniciar()
+    reconciliacao_progresso.iniciar()
+    if settings.MINIATURAS_ATIVO:
+        gerador_miniaturas.iniciar()
+    yield
+    await gerador_miniaturas.parar()
+    await chat_hub.fechar()
+    await reconciliacao_progresso.parar()
+    await snapshot_engine.parar()
+    await armazenamento_arquivos.parar()
+    executor_senhas.parar()
+    await limiter.fechar()
+    await close_db_pool(app)
+
+
 # Criar aplicação FastAPI
 app = FastAPI(
     title=settings.API_TITLE,
     version=settings.API_VERSION,
     description=settings.API_DESCRIPTION,
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    lifespan=lifespan
 )
 
 # Customizar OpenAPI/Swagger com documentação detalhada
 app.openapi = lambda: custom_openapi(app)
 
-# Adicionar middleware de rate limiting
-app.state.limiter = limiter
-
 # Registrar handler de rate limiting
 app.add_exception_handler(RateLimitExceeded, rate_limit_exception_handler)
 
+# Uma conexão e um commit por requisição (UnidadeDeTrabalho)
+app.add_middleware(UnidadeDeTrabalhoMiddleware)
+
 # Configurar CORS
 # Desenvolvimento: permite tudo (*) 
 # Produção: apenas domínios específicos
@@ -41,6 +84,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "X-Total-Count", "ETag", "Content-Range", "Accept-Ranges"],
 )
 
 # Registrar rotas
@@ -72,6 +116,49 @@ async def health_check():
     return {"status": "healthy", "service": "api-gerenciador-projetos"}
 
 
+@app.get("/health/db")
+async def health_db():
+    """Estatísticas do pool de conexões (em uso, ociosas, espera, falhas) e das unidades de trabalho"""
+    return {**get_db_pool().stats(), "unidades_de_trabalho": estatisticas_unidades}
+
+
+@app.get("/metrics")
+async def metrics(formato: str = "prometheus"):
+    """
+    Instrumentação de SQL: por consulta normalizada, chamadas, linhas,
+    erros, lentas e latência p50/p95/p99; espera por conexão do pool
+
+    formato=prometheus (texto para scrape) ou json (consultas de maior tempo total)
+    """
+    if formato == "json":
+        return instrumentacao.resumo()
+    return PlainTextResponse(instrumentacao.exportar_prometheus(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/health/senhas")
+async def health_senhas():
+    """Ocupação do pool de hash de senhas (fila e recusas)"""
+    return executor_senhas.stats()
+
+
+@app.get("/health/tokens")
+async def health_tokens():
+    """Cache de tokens verificados e lista de revogação (filtro de Bloom)"""
+    return {"cache": cache_tokens.stats(), "revogacao": lista_revogacao.stats()}
+
+
+@app.get("/health/rate-limit")
+async def health_rate_limit():
+    """Rate limiting (backend, chaves ativas, recusas)"""
+    return limiter.stats()
+
+
+@app.get("/health/chat")
+async def health_chat():
+    """Estatísticas do chat em tempo real (conexões, eventos, clientes lentos)"""
+    return chat_hub.stats()
+
+
 if __name__ == "__main__":
     import uvicorn
     
@@ -28,10 +28,82 @@ class Settings:
     DB_NAME: str = os.getenv("DB_NAME", "gerenciador_projetos")
     DB_PORT: int = int(os.getenv("DB_PORT", 3306))
     
+    # Pool de conexões (compartilhado por toda a aplicação)
+    DB_POOL_SIZE: int = int(os.getenv("DB_POOL_SIZE", 5))
+    DB_POOL_MAX_OVERFLOW: int = int(os.getenv("DB_POOL_MAX_OVERFLOW", 10))
+    DB_POOL_RECYCLE: int = int(os.getenv("DB_POOL_RECYCLE", 1800))  # segundos
+    DB_UNIDADE_DE_TRABALHO: bool = os.getenv("DB_UNIDADE_DE_TRABALHO", "True").lower() == "true"  # 1 conexão/commit por requisição
+    
+    # Instrumentação de SQL (lida pelos helpers em database/; exportada em /metrics)
+    SQL_INSTRUMENTACAO_ATIVA: bool = os.getenv("SQL_INSTRUMENTACAO_ATIVA", "True").lower() == "true"
+    SQL_LENTA_MS: float = float(os.getenv("SQL_LENTA_MS", 200))  # loga o EXPLAIN acima disso
+    SQL_MAX_CONSULTAS: int = int(os.getenv("SQL_MAX_CONSULTAS", 500))  # consultas distintas guardadas
+    
+    # Cache de permissões (papel do usuário por projeto)
+    PERMISSION_CACHE_TTL: int = int(os.getenv("PERMISSION_CACHE_TTL", 60))  # segundos
+    PERMISSION_CACHE_MAX_ENTRIES: int = int(os.getenv("PERMISSION_CACHE_MAX_ENTRIES", 10000))
+    
+    # Snapshots diários de métricas (metricas_projeto)
+    METRICAS_SNAPSHOT_ATIVO: bool = os.getenv("METRICAS_SNAPSHOT_ATIVO", "True").lower() == "true"
+    METRICAS_SNAPSHOT_INTERVALO: int = int(os.getenv("METRICAS_SNAPSHOT_INTERVALO", 300))  # segundos
+    
+    # Auditoria dos contadores de progresso (0 = desativada)
+    RECONCILIACAO_PROGRESSO_INTERVALO: int = int(os.getenv("RECONCILIACAO_PROGRESSO_INTERVALO", 21600))  # segundos
+    
+    # Chat em tempo real (WebSocket/SSE)
+    CHAT_BROKER: str = os.getenv("CHAT_BROKER", "memoria")
+    CHAT_FILA_MAXIMA: int = int(os.getenv("CHAT_FILA_MAXIMA", 256))  # eventos pendentes por conexão
+    CHAT_HEARTBEAT: int = int(os.getenv("CHAT_HEARTBEAT", 25))  # segundos
+    
+    # Busca de mensagens: fulltext (MySQL) ou indice (em memória, um worker)
+    CHAT_BUSCA_MOTOR: str = os.getenv("CHAT_BUSCA_MOTOR", "fulltext")
+    CHAT_BUSCA_MAX_PROJETOS: int = int(os.getenv("CHAT_BUSCA_MAX_PROJETOS", 50))
+    
+    # Versões de documentos em delta (keyframe completo a cada N versões)
+    DOCUMENTOS_DELTA_ATIVO: bool = os.getenv("DOCUMENTOS_DELTA_ATIVO", "False").lower() == "true"
+    DOCUMENTOS_DELTA_KEYFRAME: int = int(os.getenv("DOCUMENTOS_DELTA_KEYFRAME", 10))
+    DOCUMENTOS_DELTA_CACHE_MB: int = int(os.getenv("DOCUMENTOS_DELTA_CACHE_MB", 128))  # versões materializadas
+    DOCUMENTOS_DELTA_TAMANHO_MAXIMO_MB: int = int(os.getenv("DOCUMENTOS_DELTA_TAMANHO_MAXIMO_MB", 64))
+    
+    # I/O de arquivos (pool de threads próprio) e limpeza em segundo plano
+    ARQUIVOS_THREADS: int = int(os.getenv("ARQUIVOS_THREADS", 8))
+    ARQUIVOS_LIMPEZA_TENTATIVAS: int = int(os.getenv("ARQUIVOS_LIMPEZA_TENTATIVAS", 5))
+    
+    # Miniaturas e prévias de imagens/PDFs (pool de processos)
+    MINIATURAS_ATIVO: bool = os.getenv("MINIATURAS_ATIVO", "True").lower() == "true"
+    MINIATURAS_PROCESSOS: int = int(os.getenv("MINIATURAS_PROCESSOS", 2))
+    MINIATURAS_FILA: int = int(os.getenv("MINIATURAS_FILA", 500))  # jobs pendentes
+    
+    # Códigos OTP do 2FA: memoria (um worker) ou sqlite (arquivo compartilhado)
+    OTP_STORE: str = os.getenv("OTP_STORE", "memoria")
+    OTP_CAPACIDADE: int = int(os.getenv("OTP_CAPACIDADE", 10000))
+    OTP_SQLITE_CAMINHO: str = os.getenv("OTP_SQLITE_CAMINHO", "data/otp.sqlite3")
+    
     # Segurança JWT
     SECRET_KEY: str = os.getenv("SECRET_KEY", "chave-desenvolvimento-insegura-mude-em-producao")
     ALGORITHM: str = os.getenv("ALGORITHM", "HS256")
     ACCESS_TOKEN_EXPIRE_MINUTES: int = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", 30))
+    REFRESH_TOKEN_EXPIRE_DAYS: int = int(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS", 7))
+    SESSAO_MAX_DIAS: int = int(os.getenv("SESSAO_MAX_DIAS", 30))  # duração máxima da sessão, com rotações
+    TOKEN_CACHE_MAX_ENTRIES: int = int(os.getenv("TOKEN_CACHE_MAX_ENTRIES", 10000))  # tokens verificados (0 = sem cache)
+    
+    # Revogação de tokens (jti/famílias): memoria (um worker) ou sqlite (arquivo compartilhado)
+    REVOGACAO_STORE: str = os.getenv("REVOGACAO_STORE", "memoria")
+    REVOGACAO_CAPACIDADE: int = int(os.getenv("REVOGACAO_CAPACIDADE", 100000))  # dimensiona o filtro de Bloom
+    REVOGACAO_PODA_SEGUNDOS: float = float(os.getenv("REVOGACAO_PODA_SEGUNDOS", 300))
+    REVOGACAO_SQLITE_CAMINHO: str = os.getenv("REVOGACAO_SQLITE_CAMINHO", "data/revogacao.sqlite3")
+    REVOGACAO_SINCRONIA_SEGUNDOS: float = float(os.getenv("REVOGACAO_SINCRONIA_SEGUNDOS", 1))
+    
+    # Rate limiting: memoria (por processo) ou redis (compartilhado entre workers)
+    RATE_LIMIT_ATIVO: bool = os.getenv("RATE_LIMIT_ATIVO", "True").lower() == "true"
+    RATE_LIMIT_BACKEND: str = os.getenv("RATE_LIMIT_BACKEND", "memoria")
+    RATE_LIMIT_REDIS_URL: str = os.getenv("RATE_LIMIT_REDIS_URL", "redis://localhost:6379/0")
+    RATE_LIMIT_SHARDS: int = int(os.getenv("RATE_LIMIT_SHARDS", 16))
+    
+    # Hash de senhas: custo do bcrypt (2^rounds) e pool de threads dedicado
+    BCRYPT_ROUNDS: int = int(os.getenv("BCRYPT_ROUNDS", 12))
+    SENHA_THREADS: int = int(os.getenv("SENHA_THREADS", 4))
+    SENHA_FILA_MAXIMA: int = int(os.getenv("SENHA_FILA_MAXIMA", 64))  # acima disso: 503
     
     # API
     API_PORT: int = int(os.getenv("PORT", os.getenv("API_PORT", 8000)))
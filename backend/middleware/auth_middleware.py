@@ -6,6 +6,8 @@ from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from typing import Optional
 from utils.auth import decode_access_token
+from utils.cache_tokens import cache_tokens, digest_token
+from utils.lista_revogacao import lista_revogacao
 
 security = HTTPBearer()
 
@@ -13,6 +15,10 @@ security = HTTPBearer()
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)) -> dict:
     """
     Extrai e valida usuário do token JWT
+
+    Tokens já verificados vêm do cache_tokens (até o exp). Revogações
+    (jti e família, na lista_revogacao) são conferidas em toda
+    requisição, inclusive nas que vêm do cache.
     
     Args:
         credentials: Credenciais HTTP Bearer
@@ -23,11 +29,50 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
     Raises:
         HTTPException: Se token inválido ou expirado
     """
-    token = credentials.credentials
+    return await validar_token_acesso(credentials.credentials)
+
+
+async def validar_token_acesso(token: str) -> dict:
+    """
+    Valida um token de acesso bruto (sem o esquema Bearer)
+
+    Usado pelo get_current_user e pelas conexões em tempo real (WS/SSE),
+    que recebem o token na query string. Rejeita refresh tokens e tokens
+    revogados por jti ou família.
+
+    Raises:
+        HTTPException 401: Token inválido, expirado ou revogado
+    """
+    chave = digest_token(token)
     
+    if cache_tokens.revogado(chave):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Token revogado",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    
+    usuario = cache_tokens.obter(chave)
+    if usuario is None:
+        usuario = _usuario_do_token(token)
+        cache_tokens.guardar(chave, usuario, usuario["exp"])
+    
+    if lista_revogacao.revogado(usuario["jti"]) or lista_revogacao.revogado(usuario["fam"]):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Token revogado",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    
+    return dict(usuario)
+
+
+def _usuario_do_token(token: str) -> dict:
+    """Verifica o token de acesso e monta o usuário (com jti, fam e exp)"""
     payload = decode_access_token(token)
     
-    if payload is None:
+    # Refresh tokens só servem para /auth/refresh
+    if payload is None or payload.get("type", "access") != "access":
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Token inválido ou expirado",
@@ -48,7 +93,10 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
         "user_id": user_id,
         "email": email,
         "nome": payload.get("nome"),
-        "cargo": payload.get("cargo")
+        "cargo": payload.get("cargo"),
+        "jti": payload.get("jti"),
+        "fam": payload.get("fam"),
+        "exp": payload.get("exp")
     }
 
 
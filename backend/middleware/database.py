@@ -0,0 +1,360 @@
+"""
+Pool de Conexões - Dependency Injection
+Um único pool por processo, criado no lifespan da aplicação, e uma
+unidade de trabalho por requisição (uma conexão, um commit)
+"""
+
+import sys
+import os
+import asyncio
+import json
+import logging
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, List, Optional
+from fastapi import Request, FastAPI
+
+# Adicionar path do database
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'database'))
+from async_db_helper import AsyncDatabaseHelper
+from pymysql.err import Error
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+# Pool compartilhado do processo
+_db_pool: Optional[AsyncDatabaseHelper] = None
+
+
+def create_db_pool() -> AsyncDatabaseHelper:
+    """
+    Cria o helper do pool com os parâmetros de config.Settings
+
+    Returns:
+        AsyncDatabaseHelper (pool ainda não conectado)
+    """
+    return AsyncDatabaseHelper(
+        pool_name="api_pool",
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_POOL_MAX_OVERFLOW,
+        pool_recycle=settings.DB_POOL_RECYCLE
+    )
+
+
+def get_db_pool() -> AsyncDatabaseHelper:
+    """
+    Retorna o pool compartilhado do processo (criado uma única vez)
+
+    Usado fora das rotas, onde não há Request (ex.: PermissionManager)
+    """
+    global _db_pool
+    if _db_pool is None:
+        _db_pool = create_db_pool()
+    return _db_pool
+
+
+async def init_db_pool(app: FastAPI) -> AsyncDatabaseHelper:
+    """
+    Abre o pool compartilhado e registra em app.state (chamado no startup)
+
+    Se o banco estiver indisponível, a API sobe mesmo assim e o pool
+    é conectado na primeira requisição que precisar dele.
+    """
+    db = get_db_pool()
+    app.state.db = db
+
+    try:
+        await db.connect()
+    except Exception as e:
+        logger.warning(f"Pool não conectado no startup, será criado sob demanda: {e}")
+
+    return db
+
+
+async def close_db_pool(app: FastAPI):
+    """Fecha o pool compartilhado (chamado no shutdown)"""
+    db = getattr(app.state, "db", None)
+    if db is not None:
+        await db.close_pool()
+
+
+class UnidadeDeTrabalho:
+    """
+    Conexão única da requisição
+
+    Mesma API do AsyncDatabaseHelper (execute_query, execute_many,
+    acquire/release, get_connection), mas sobre uma conexão obtida do
+    pool só no primeiro uso e compartilhada por permissões, handler e
+    helpers. Nada é confirmado a cada comando: o middleware faz o commit
+    (resposta < 400) ou o rollback no fim da requisição, antes de a
+    resposta sair.
+
+    commit()/rollback() explícitos em conexões obtidas daqui valem para
+    tudo o que a requisição já fez. Depois de finalizada (ex.: limpezas
+    agendadas que rodam após a resposta), a unidade repassa tudo ao pool.
+
+    Efeitos em caches (invalidações) vão em apos_confirmar: rodam só
+    depois do commit final e são descartados no rollback.
+    """
+
+    def __init__(self, pool: AsyncDatabaseHelper):
+        self.pool = pool
+        self.finalizada = False
+        self._conn = None
+        # Uso concorrente (várias tasks na mesma requisição) é serializado;
+        # a mesma task pode aninhar acquire/execute_query
+        self._trava = asyncio.Lock()
+        self._dono: Optional[asyncio.Task] = None
+        self._profundidade = 0
+        self._apos_commit: List[Callable[[], Any]] = []
+
+    @property
+    def usada(self) -> bool:
+        return self._conn is not None
+
+    async def _entrar(self):
+        tarefa = asyncio.current_task()
+        if self._dono is tarefa:
+            self._profundidade += 1
+            return
+        await self._trava.acquire()
+        self._dono = tarefa
+        self._profundidade = 1
+
+    def _sair(self):
+        self._profundidade -= 1
+        if self._profundidade == 0:
+            self._dono = None
+            self._trava.release()
+
+    async def acquire(self):
+        """Conexão da requisição (obtida do pool no primeiro uso)"""
+        if self.finalizada:
+            return await self.pool.acquire()
+        await self._entrar()
+        if self._conn is None:
+            try:
+                self._conn = await self.pool.acquire()
+            except BaseException:
+                self._sair()
+                raise
+        return self._conn
+
+    async def release(self, conn):
+        """Fim do uso; a conexão da requisição só volta ao pool na finalização"""
+        if conn is None:
+            return
+        if conn is self._conn:
+            self._sair()
+        else:
+            await self.pool.release(conn)
+
+    @asynccontextmanager
+    async def get_connection(self):
+        conn = await self.acquire()
+        try:
+            yield conn
+        finally:
+            await self.release(conn)
+
+    async def execute_query(self, query: str, params: tuple = None, fetch: bool = False) -> Optional[Any]:
+        """execute_query do pool, sem commit por comando"""
+        if self.finalizada:
+            return await self.pool.execute_query(query, params, fetch)
+
+        async with self.get_connection() as conn:
+            cursor = await conn.cursor()
+            try:
+                await cursor.execute(query, params or ())
+                if fetch:
+                    return list(await cursor.fetchall())
+                return cursor.lastrowid or None
+            except Error as e:
+                logger.error(f"Erro ao executar query: {e}")
+                raise
+            finally:
+                await cursor.close()
+
+    async def execute_many(self, query: str, data: List[tuple]) -> int:
+        """execute_many do pool, sem commit por comando"""
+        if self.finalizada:
+            return await self.pool.execute_many(query, data)
+
+        async with self.get_connection() as conn:
+            cursor = await conn.cursor()
+            try:
+                await cursor.executemany(query, data)
+                return cursor.rowcount
+            except Error as e:
+                logger.error(f"Erro ao executar batch: {e}")
+                raise
+            finally:
+                await cursor.close()
+
+    def apos_confirmar(self, funcao: Callable[[], Any]):
+        """Agenda funcao para depois do commit (já finalizada, roda na hora)"""
+        if self.finalizada:
+            funcao()
+        else:
+            self._apos_commit.append(funcao)
+
+    async def finalizar(self, confirmar: bool):
+        """
+        Commit (confirmar) ou rollback e devolução da conexão ao pool
+
+        Os agendados em apos_confirmar rodam só se o commit der certo.
+
+        Raises:
+            Erro do commit (a conexão é devolvida mesmo assim)
+        """
+        self.finalizada = True
+        conn, self._conn = self._conn, None
+        pendentes, self._apos_commit = self._apos_commit, []
+        if conn is not None:
+            try:
+                if confirmar:
+                    await conn.commit()
+                else:
+                    await conn.rollback()
+            finally:
+                await self.pool.release(conn)
+
+        if confirmar:
+            for funcao in pendentes:
+                try:
+                    funcao()
+                except Exception as e:
+                    logger.error(f"Falha em efeito pós-commit: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        return self.pool.stats()
+
+
+# Estatísticas das unidades de trabalho (expostas em /health/db)
+estatisticas_unidades: Dict[str, int] = {
+    "requisicoes": 0, "com_banco": 0, "commits": 0, "rollbacks": 0, "falhas_commit": 0
+}
+
+_unidade_atual: ContextVar[Optional[UnidadeDeTrabalho]] = ContextVar("unidade_de_trabalho", default=None)
+
+
+def db_atual():
+    """
+    Banco da requisição em andamento (unidade de trabalho) ou, fora de
+    requisições (jobs, WebSocket), o pool compartilhado
+    """
+    return _unidade_atual.get() or get_db_pool()
+
+
+def apos_confirmar(funcao: Callable[[], Any]):
+    """
+    Roda funcao depois do commit da requisição em andamento
+
+    Para invalidações de cache: se a requisição fizer rollback (ou o
+    commit falhar), o cache continua igual ao banco. Fora de requisições
+    (ou com a unidade já finalizada) roda na hora.
+    """
+    unidade = _unidade_atual.get()
+    if unidade is None:
+        funcao()
+    else:
+        unidade.apos_confirmar(funcao)
+
+
+async def liberar_conexao():
+    """
+    Confirma o que a requisição já fez e devolve a conexão ao pool
+
+    Para handlers longos (recebimento de uploads, exportações em
+    streaming): chamar depois das consultas de permissão, antes do
+    trabalho demorado. Daí em diante o banco da requisição repassa tudo
+    ao pool, com commit por comando (ou transação explícita).
+    """
+    unidade = _unidade_atual.get()
+    if unidade is not None and not unidade.finalizada:
+        await _finalizar_unidade(unidade, True)
+
+
+async def _finalizar_unidade(unidade: UnidadeDeTrabalho, confirmar: bool):
+    if unidade.usada:
+        estatisticas_unidades["com_banco"] += 1
+        estatisticas_unidades["commits" if confirmar else "rollbacks"] += 1
+    await unidade.finalizar(confirmar)
+
+
+class UnidadeDeTrabalhoMiddleware:
+    """
+    Abre uma UnidadeDeTrabalho por requisição HTTP
+
+    A finalização acontece ao interceptar o início da resposta: o commit
+    termina antes de o cliente receber o status. Se o commit falhar, a
+    resposta do handler é descartada e vai um 500 no lugar. Handlers
+    longos devolvem a conexão antes com liberar_conexao.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not settings.DB_UNIDADE_DE_TRABALHO:
+            await self.app(scope, receive, send)
+            return
+
+        unidade = UnidadeDeTrabalho(get_db_pool())
+        token = _unidade_atual.set(unidade)
+        descartar = False
+        estatisticas_unidades["requisicoes"] += 1
+
+        async def enviar(mensagem):
+            nonlocal descartar
+            if descartar:
+                return
+            if mensagem["type"] == "http.response.start" and not unidade.finalizada:
+                try:
+                    await _finalizar_unidade(unidade, mensagem["status"] < 400)
+                except Exception as e:
+                    estatisticas_unidades["falhas_commit"] += 1
+                    logger.error(f"Falha no commit da requisição {scope.get('path')}: {e}")
+                    descartar = True
+                    await _responder_erro(send)
+                    return
+            await send(mensagem)
+
+        try:
+            await self.app(scope, receive, enviar)
+        finally:
+            if not unidade.finalizada:
+                await _finalizar_unidade(unidade, False)
+            _unidade_atual.reset(token)
+
+
+async def _responder_erro(send):
+    corpo = json.dumps({"detail": "Erro ao confirmar a operação. Tente novamente."}).encode()
+    await send({
+        "type": "http.response.start",
+        "status": 500,
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(corpo)).encode())]
+    })
+    await send({"type": "http.response.body", "body": corpo})
+
+
+async def get_db(request: Request) -> AsyncDatabaseHelper:
+    """
+    Dependency: Retorna o banco da requisição
+    Uso em rota: db: AsyncDatabaseHelper = Depends(get_db)
+
+    Com o UnidadeDeTrabalhoMiddleware, é a unidade de trabalho da
+    requisição (mesma API do pool). Sem ela, o pool compartilhado; se o
+    lifespan não rodou (ex.: TestClient sem context manager), o pool é
+    criado aqui uma única vez e reaproveitado.
+    """
+    unidade = _unidade_atual.get()
+    if unidade is not None:
+        return unidade
+
+    db = getattr(request.app.state, "db", None)
+    if db is None:
+        db = get_db_pool()
+        request.app.state.db = db
+    return db
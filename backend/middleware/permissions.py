@@ -4,13 +4,22 @@ Verificação de acesso a projetos e recursos
 Desenvolvido por: Vicente de Souza
 """
 
-import mysql.connector
-from typing import Optional, Dict, List
+import time
+from typing import Optional, Dict, List, Tuple
 from config import settings
+from middleware.database import db_atual
 
 
 class PermissionManager:
-    """Gerenciador de permissões de usuários"""
+    """
+    Gerenciador de permissões de usuários
+
+    O acesso (papel + dono) de cada par (usuário, projeto) é lido com uma
+    única query na conexão da requisição (db_atual) e guardado em cache por
+    PERMISSION_CACHE_TTL segundos. As rotas de equipes invalidam o cache
+    ao adicionar, alterar ou remover membros; em múltiplos workers o TTL
+    limita o tempo em que um worker pode ver um papel desatualizado.
+    """
     
     # Papéis na equipe (do banco: gerente, engenheiro, tecnico, colaborador)
     ROLE_MANAGER = "gerente"
@@ -26,14 +35,110 @@ class PermissionManager:
         "colaborador": 1
     }
     
-    def __init__(self):
-        self.db_config = settings.db_config
+    def __init__(self, cache_ttl: float = None, cache_max_entries: int = None):
+        """
+        Args:
+            cache_ttl: Segundos que um acesso fica em cache (0 = sem cache)
+            cache_max_entries: Limite de pares (usuário, projeto) em cache
+        """
+        self.cache_ttl = settings.PERMISSION_CACHE_TTL if cache_ttl is None else cache_ttl
+        self.cache_max_entries = (
+            settings.PERMISSION_CACHE_MAX_ENTRIES if cache_max_entries is None else cache_max_entries
+        )
+        # (user_id, project_id) -> (expira_em, acesso)
+        self._cache: Dict[Tuple[int, int], Tuple[float, Dict]] = {}
+        self.cache_hits = 0
+        self.cache_misses = 0
+    
+    # ===== CACHE =====
+    
+    def _cache_get(self, key: Tuple[int, int]) -> Optional[Dict]:
+        entry = self._cache.get(key)
+        if entry is None:
+            return None
+        expira_em, acesso = entry
+        if expira_em <= time.monotonic():
+            self._cache.pop(key, None)
+            return None
+        return acesso
+    
+    def _cache_set(self, key: Tuple[int, int], acesso: Dict):
+        if self.cache_ttl <= 0:
+            return
+        
+        agora = time.monotonic()
+        if len(self._cache) >= self.cache_max_entries:
+            # Remove expirados; se ainda estiver cheio, descarta os mais antigos
+            self._cache = {k: v for k, v in self._cache.items() if v[0] > agora}
+            excesso = len(self._cache) - self.cache_max_entries + 1
+            for k in list(self._cache)[:max(excesso, 0)]:
+                del self._cache[k]
+        
+        self._cache[key] = (agora + self.cache_ttl, acesso)
+    
+    def invalidate(self, user_id: Optional[int] = None, project_id: Optional[int] = None):
+        """
+        Remove acessos do cache
+        
+        Args:
+            user_id: Usuário afetado (None = todos)
+            project_id: Projeto afetado (None = todos)
+        """
+        if user_id is None and project_id is None:
+            self._cache.clear()
+            return
+        
+        if user_id is not None and project_id is not None:
+            self._cache.pop((user_id, project_id), None)
+            return
+        
+        for key in list(self._cache):
+            if (user_id is None or key[0] == user_id) and (project_id is None or key[1] == project_id):
+                self._cache.pop(key, None)
     
-    def _get_connection(self):
-        """Cria conexão com banco de dados"""
-        return mysql.connector.connect(**self.db_config)
+    # ===== ACESSO =====
     
-    def is_project_member(self, user_id: int, project_id: int) -> bool:
+    async def get_access(self, user_id: int, project_id: int) -> Dict:
+        """
+        Retorna papel e status de dono do usuário no projeto (1 query, com cache)
+        
+        Args:
+            user_id: ID do usuário
+            project_id: ID do projeto
+            
+        Returns:
+            {'papel': str ou None, 'is_owner': bool}
+        """
+        key = (user_id, project_id)
+        acesso = self._cache_get(key)
+        if acesso is not None:
+            self.cache_hits += 1
+            return acesso
+        
+        self.cache_misses += 1
+        query = """
+            SELECT 
+                (p.criador_id = %s) as is_owner,
+                e.papel
+            FROM projetos p
+            LEFT JOIN equipes e 
+                ON e.projeto_id = p.id 
+               AND e.usuario_id = %s 
+               AND e.ativo = TRUE
+            WHERE p.id = %s
+            LIMIT 1
+        """
+        rows = await db_atual().execute_query(query, (user_id, user_id, project_id), fetch=True)
+        row = rows[0] if rows else None
+        
+        acesso = {
+            'papel': row['papel'] if row else None,
+            'is_owner': bool(row['is_owner']) if row else False
+        }
+        self._cache_set(key, acesso)
+        return acesso
+    
+    async def is_project_member(self, user_id: int, project_id: int) -> bool:
         """
         Verifica se usuário é membro do projeto
         
@@ -44,25 +149,10 @@ class PermissionManager:
         Returns:
             True se é membro ativo, False caso contrário
         """
-        conn = self._get_connection()
-        cursor = conn.cursor()
-        
-        try:
-            query = """
-                SELECT COUNT(*) 
-                FROM equipes 
-                WHERE projeto_id = %s 
-                  AND usuario_id = %s 
-                  AND ativo = TRUE
-            """
-            cursor.execute(query, (project_id, user_id))
-            count = cursor.fetchone()[0]
-            return count > 0
-        finally:
-            cursor.close()
-            conn.close()
-    
-    def get_user_role_in_project(self, user_id: int, project_id: int) -> Optional[str]:
+        acesso = await self.get_access(user_id, project_id)
+        return acesso['papel'] is not None
+    
+    async def get_user_role_in_project(self, user_id: int, project_id: int) -> Optional[str]:
         """
         Retorna o papel do usuário no projeto
         
@@ -73,26 +163,10 @@ class PermissionManager:
         Returns:
             Papel do usuário (gerente, engenheiro, etc) ou None
         """
-        conn = self._get_connection()
-        cursor = conn.cursor()
-        
-        try:
-            query = """
-                SELECT papel 
-                FROM equipes 
-                WHERE projeto_id = %s 
-                  AND usuario_id = %s 
-                  AND ativo = TRUE
-                LIMIT 1
-            """
-            cursor.execute(query, (project_id, user_id))
-            result = cursor.fetchone()
-            return result[0] if result else None
-        finally:
-            cursor.close()
-            conn.close()
-    
-    def has_permission(
+        acesso = await self.get_access(user_id, project_id)
+        return acesso['papel']
+    
+    async def has_permission(
         self, 
         user_id: int, 
         project_id: int, 
@@ -109,7 +183,7 @@ class PermissionManager:
         Returns:
             True se tem permissão, False caso contrário
         """
-        user_role = self.get_user_role_in_project(user_id, project_id)
+        user_role = await self.get_user_role_in_project(user_id, project_id)
         
         if not user_role:
             return False
@@ -119,7 +193,7 @@ class PermissionManager:
         
         return user_level >= required_level
     
-    def is_project_owner(self, user_id: int, project_id: int) -> bool:
+    async def is_project_owner(self, user_id: int, project_id: int) -> bool:
         """
         Verifica se usuário é dono do projeto
         
@@ -130,23 +204,10 @@ class PermissionManager:
         Returns:
             True se é criador do projeto, False caso contrário
         """
-        conn = self._get_connection()
-        cursor = conn.cursor()
-        
-        try:
-            query = """
-                SELECT COUNT(*) 
-                FROM projetos 
-                WHERE id = %s AND criador_id = %s
-            """
-            cursor.execute(query, (project_id, user_id))
-            count = cursor.fetchone()[0]
-            return count > 0
-        finally:
-            cursor.close()
-            conn.close()
+        acesso = await self.get_access(user_id, project_id)
+        return acesso['is_owner']
     
-    def is_project_manager(self, user_id: int, project_id: int) -> bool:
+    async def is_project_manager(self, user_id: int, project_id: int) -> bool:
         """
         Verifica se usuário é gerente do projeto
         
@@ -157,10 +218,10 @@ class PermissionManager:
         Returns:
             True se é gerente, False caso contrário
         """
-        role = self.get_user_role_in_project(user_id, project_id)
+        role = await self.get_user_role_in_project(user_id, project_id)
         return role == self.ROLE_MANAGER
     
-    def can_modify_project(self, user_id: int, project_id: int) -> bool:
+    async def can_modify_project(self, user_id: int, project_id: int) -> bool:
         """
         Verifica se usuário pode modificar projeto
         Apenas gerente ou criador podem
@@ -172,12 +233,10 @@ class PermissionManager:
         Returns:
             True se pode modificar, False caso contrário
         """
-        return (
-            self.is_project_owner(user_id, project_id) or
-            self.is_project_manager(user_id, project_id)
-        )
+        acesso = await self.get_access(user_id, project_id)
+        return acesso['is_owner'] or acesso['papel'] == self.ROLE_MANAGER
     
-    def can_delete_project(self, user_id: int, project_id: int) -> bool:
+    async def can_delete_project(self, user_id: int, project_id: int) -> bool:
         """
         Verifica se usuário pode deletar projeto
         Apenas criador pode
@@ -189,9 +248,9 @@ class PermissionManager:
         Returns:
             True se pode deletar, False caso contrário
         """
-        return self.is_project_owner(user_id, project_id)
+        return await self.is_project_owner(user_id, project_id)
     
-    def get_user_projects(self, user_id: int) -> List[Dict]:
+    async def get_user_projects(self, user_id: int) -> List[Dict]:
         """
         Retorna todos os projetos do usuário
         
@@ -201,28 +260,31 @@ class PermissionManager:
         Returns:
             Lista de projetos com papel do usuário
         """
-        conn = self._get_connection()
-        cursor = conn.cursor(dictionary=True)
-        
-        try:
-            query = """
-                SELECT 
-                    p.id,
-                    p.nome,
-                    p.status,
-                    e.papel,
-                    e.data_entrada,
-                    (p.criador_id = %s) as is_owner
-                FROM projetos p
-                INNER JOIN equipes e ON p.id = e.projeto_id
-                WHERE e.usuario_id = %s AND e.ativo = TRUE
-                ORDER BY e.data_entrada DESC
-            """
-            cursor.execute(query, (user_id, user_id))
-            return cursor.fetchall()
-        finally:
-            cursor.close()
-            conn.close()
+        query = """
+            SELECT 
+                p.id,
+                p.nome,
+                p.status,
+                e.papel,
+                e.data_entrada,
+                (p.criador_id = %s) as is_owner
+            FROM projetos p
+            INNER JOIN equipes e ON p.id = e.projeto_id
+            WHERE e.usuario_id = %s AND e.ativo = TRUE
+            ORDER BY e.data_entrada DESC
+        """
+        return await db_atual().execute_query(query, (user_id, user_id), fetch=True)
+    
+    def stats(self) -> Dict:
+        """Retorna estatísticas do cache de permissões"""
+        total = self.cache_hits + self.cache_misses
+        return {
+            "entradas": len(self._cache),
+            "ttl_segundos": self.cache_ttl,
+            "hits": self.cache_hits,
+            "misses": self.cache_misses,
+            "taxa_acerto": round(self.cache_hits / total, 3) if total else 0
+        }
 
 
 # Instância global
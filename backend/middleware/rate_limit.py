@@ -1,47 +1,368 @@
 """
 Rate Limiting Middleware - Proteção contra brute force
 Desenvolvido por: Vicente de Souza
+
+Contador de janela deslizante: por chave guarda só o início da janela
+atual e as contagens da janela atual e da anterior (memória O(1)); a
+contagem estimada é anterior * (fração restante da janela anterior) + atual.
+Backends plugáveis: memória do processo (shards com trava própria) ou
+Redis (compartilhado entre workers e máquinas)
 """
 
-from slowapi import Limiter
-from slowapi.util import get_remote_address
-from slowapi.errors import RateLimitExceeded
-from fastapi import Request, HTTPException, status
-from fastapi.responses import JSONResponse
+import functools
 import logging
+import math
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from fastapi import Request, status
+from fastapi.responses import JSONResponse
+
+from config import settings
 
 logger = logging.getLogger(__name__)
 
-# Criar limiter com chave baseada no IP
-limiter = Limiter(key_func=get_remote_address)
+UNIDADES = {
+    "second": 1, "seconds": 1,
+    "minute": 60, "minutes": 60,
+    "hour": 3600, "hours": 3600,
+    "day": 86400, "days": 86400,
+}
+
+
+def interpretar_limite(regra: str) -> Tuple[int, int]:
+    """
+    "5/minute" -> (5, 60)
+
+    Raises:
+        ValueError se a regra for inválida
+    """
+    quantidade, _, unidade = regra.partition("/")
+    if unidade.strip() not in UNIDADES:
+        raise ValueError(f"Regra de rate limit inválida: {regra}")
+    return int(quantidade), UNIDADES[unidade.strip()]
+
+
+def tempo_de_espera(agora: float, inicio: float, janela: int, limite: int, atual: int, anterior: int) -> int:
+    """
+    Segundos até a próxima requisição caber no limite (Retry-After)
+
+    Dentro da janela atual, a estimativa cai à medida que a janela
+    anterior pesa menos; se só a janela atual já estoura, espera a
+    virada (quando atual passa a ser a anterior) e o peso dela cair.
+    """
+    decorrido = agora - inicio
+    if atual + 1 <= limite and anterior:
+        # anterior * (1 - t / janela) + atual + 1 <= limite
+        t = janela * (1 - (limite - atual - 1) / anterior)
+        return max(math.ceil(t - decorrido), 1)
+    # Próxima janela: atual * (1 - t / janela) + 1 <= limite
+    t = janela * (1 - (limite - 1) / atual) if atual else 0
+    return max(math.ceil(janela - decorrido + t), 1)
+
+
+class RateLimitExceeded(Exception):
+    """Limite estourado; retry_after em segundos"""
+
+    def __init__(self, regra: str, retry_after: int):
+        super().__init__(f"Rate limit excedido ({regra})")
+        self.regra = regra
+        self.retry_after = retry_after
+
+
+class BackendMemoria:
+    """
+    Contadores no próprio processo (um worker)
+
+    As chaves são distribuídas em shards, cada um com dicionário e trava
+    próprios: endpoints síncronos (threadpool) não disputam uma trava
+    global. Chaves paradas há mais de duas janelas são podadas quando o
+    shard dobra de tamanho (custo amortizado O(1)).
+    """
+
+    def __init__(self, shards: int = None):
+        self.shards = shards or settings.RATE_LIMIT_SHARDS
+        # chave -> [início da janela atual, contagem atual, contagem anterior, janela]
+        self._dados: List[Dict[str, list]] = [{} for _ in range(self.shards)]
+        self._travas = [threading.Lock() for _ in range(self.shards)]
+        self._limites_poda = [1024] * self.shards
+
+    async def registrar(self, chave: str, limite: int, janela: int, agora: float) -> Tuple[bool, int, int]:
+        """
+        Conta a requisição se ela couber no limite
+
+        Returns:
+            (permitida, contagem atual, contagem anterior)
+        """
+        indice = hash(chave) % self.shards
+        dados = self._dados[indice]
+        inicio = agora - agora % janela
+
+        with self._travas[indice]:
+            entrada = dados.get(chave)
+            if entrada is None:
+                if len(dados) >= self._limites_poda[indice]:
+                    self._podar(indice, agora)
+                entrada = dados[chave] = [inicio, 0, 0, janela]
+            elif entrada[0] != inicio:
+                # Virada: a janela atual vira a anterior (ou zera, se ficou parada)
+                entrada[2] = entrada[1] if entrada[0] == inicio - janela else 0
+                entrada[0] = inicio
+                entrada[1] = 0
+
+            atual, anterior = entrada[1], entrada[2]
+            if anterior * (1 - (agora - inicio) / janela) + atual + 1 > limite:
+                return False, atual, anterior
+            entrada[1] = atual + 1
+            return True, atual + 1, anterior
+
+    def _podar(self, indice: int, agora: float):
+        dados = self._dados[indice]
+        for chave in [c for c, e in dados.items() if e[0] + 2 * e[3] <= agora]:
+            del dados[chave]
+        self._limites_poda[indice] = max(2 * len(dados), 1024)
+
+    def __len__(self) -> int:
+        return sum(len(dados) for dados in self._dados)
+
+    async def fechar(self):
+        pass
+
+
+# Mesmo algoritmo do BackendMemoria, atômico no servidor; a chave expira
+# sozinha depois de duas janelas paradas
+_SCRIPT_REDIS = """
+local limite = tonumber(ARGV[1])
+local janela = tonumber(ARGV[2])
+local agora = tonumber(ARGV[3])
+local inicio = agora - (agora % janela)
+
+local dados = redis.call('HMGET', KEYS[1], 'i', 'a', 'p')
+local i = tonumber(dados[1])
+local atual = tonumber(dados[2]) or 0
+local anterior = tonumber(dados[3]) or 0
+if i == nil or i < inicio - janela then
+    atual = 0
+    anterior = 0
+elseif i < inicio then
+    anterior = atual
+    atual = 0
+end
+
+if anterior * (1 - (agora - inicio) / janela) + atual + 1 > limite then
+    return {0, atual, anterior}
+end
+atual = atual + 1
+redis.call('HSET', KEYS[1], 'i', tostring(inicio), 'a', atual, 'p', anterior)
+redis.call('PEXPIRE', KEYS[1], math.ceil(janela * 2000))
+return {1, atual, anterior}
+"""
+
+
+class BackendRedis:
+    """
+    Contadores num Redis (ou servidor compatível: Valkey, KeyDB, Dragonfly)
+
+    Um script Lua faz leitura, decisão e escrita numa única ida ao
+    servidor. A biblioteca redis é opcional e importada só aqui.
+    """
+
+    def __init__(self, url: str = None):
+        import redis.asyncio as redis
+
+        self.url = url or settings.RATE_LIMIT_REDIS_URL
+        self._cliente = redis.from_url(self.url)
+        self._script = self._cliente.register_script(_SCRIPT_REDIS)
+
+    async def registrar(self, chave, limite, janela, agora):
+        permitida, atual, anterior = await self._script(
+            keys=[f"rate_limit:{chave}"], args=[limite, janela, repr(agora)]
+        )
+        return bool(permitida), int(atual), int(anterior)
+
+    def __len__(self) -> int:
+        return -1  # não contado (chaves expiram no servidor)
+
+    async def fechar(self):
+        await self._cliente.aclose()
+
+
+BACKENDS = {
+    "memoria": BackendMemoria,
+    "redis": BackendRedis,
+}
+
+
+def criar_backend(nome: str = None):
+    """
+    Cria o backend configurado em RATE_LIMIT_BACKEND
+
+    Raises:
+        ValueError se o backend não existir
+    """
+    nome = nome or settings.RATE_LIMIT_BACKEND
+    if nome not in BACKENDS:
+        raise ValueError(f"Backend de rate limit desconhecido: {nome}")
+    return BACKENDS[nome]()
+
+
+def identificar(request: Request, usuario: Optional[dict] = None) -> str:
+    """
+    Chave do cliente: o usuário autenticado ou, sem login, o IP
+
+    Usuários atrás do mesmo NAT não dividem a cota, e um usuário não
+    escapa do limite trocando de IP.
+    """
+    if usuario and usuario.get("user_id") is not None:
+        return f"u:{usuario['user_id']}"
+    return f"ip:{request.client.host if request.client else '127.0.0.1'}"
+
+
+class Limiter:
+    """
+    Aplica regras ("5/minute") às rotas por decorador
+
+    O decorador roda depois das dependências: se a rota recebe
+    current_user, a cota é do usuário; senão, do IP. Falhas do backend
+    liberam a requisição (registrado em log e nas estatísticas).
+    """
+
+    def __init__(self, backend=None):
+        self._backend = backend
+        self.ativo = settings.RATE_LIMIT_ATIVO
+
+        # Estatísticas
+        self.permitidas = 0
+        self.recusadas = 0
+        self.falhas_backend = 0
+
+    @property
+    def backend(self):
+        if self._backend is None:
+            self._backend = criar_backend()
+        return self._backend
+
+    async def verificar(self, escopo: str, identidade: str, limite: int, janela: int, regra: str):
+        """
+        Conta a requisição de identidade no escopo
+
+        Raises:
+            RateLimitExceeded com o Retry-After
+        """
+        agora = time.time()
+        try:
+            permitida, atual, anterior = await self.backend.registrar(
+                f"{escopo}:{identidade}", limite, janela, agora
+            )
+        except Exception as e:
+            self.falhas_backend += 1
+            logger.error(f"Backend de rate limit indisponível, requisição liberada: {e}")
+            return
+
+        if permitida:
+            self.permitidas += 1
+            return
+        self.recusadas += 1
+        inicio = agora - agora % janela
+        raise RateLimitExceeded(regra, tempo_de_espera(agora, inicio, janela, limite, atual, anterior))
+
+    def limit(self, regra: str) -> Callable:
+        """Decorador de rota: limita a regra por usuário (ou IP)"""
+        limite, janela = interpretar_limite(regra)
+
+        def decorador(funcao):
+            escopo = f"{funcao.__module__}.{funcao.__name__}"
+
+            @functools.wraps(funcao)
+            async def envolvida(*args, **kwargs):
+                if self.ativo:
+                    request = next((v for v in kwargs.values() if isinstance(v, Request)), None)
+                    if request is not None:
+                        identidade = identificar(request, kwargs.get("current_user"))
+                        await self.verificar(escopo, identidade, limite, janela, regra)
+                return await funcao(*args, **kwargs)
+
+            return envolvida
+
+        return decorador
+
+    async def fechar(self):
+        """Fecha a conexão do backend (chamado no shutdown)"""
+        if self._backend is not None:
+            await self._backend.fechar()
+
+    def stats(self) -> Dict:
+        """Retorna estatísticas do rate limiting"""
+        return {
+            "ativo": self.ativo,
+            "backend": settings.RATE_LIMIT_BACKEND,
+            "chaves": len(self.backend),
+            "permitidas": self.permitidas,
+            "recusadas": self.recusadas,
+            "falhas_backend": self.falhas_backend
+        }
+
+
+# Instância global
+limiter = Limiter()
 
 
 async def rate_limit_exception_handler(request: Request, exc: RateLimitExceeded):
     """
     Handler customizado para exceções de rate limit
     """
-    logger.warning(f"Rate limit excedido para IP: {get_remote_address(request)}")
+    logger.warning(f"Rate limit excedido ({exc.regra}) para {request.client.host if request.client else '?'}")
     return JSONResponse(
         status_code=status.HTTP_429_TOO_MANY_REQUESTS,
         content={
             "detail": "Muitas requisições. Tente novamente em alguns minutos.",
             "retry_after": exc.retry_after
-        }
+        },
+        headers={"Retry-After": str(exc.retry_after)}
     )
 
 
 # Decoradores pré-configurados para uso nas rotas
 class RateLimitDecorators:
     """Decoradores de rate limit pré-configurados"""
-    
+
     # Auth - proteção contra brute force
     login = limiter.limit("5/minute")  # Máx 5 tentativas/min
     register = limiter.limit("10/hour")  # Máx 10 registros/hora
-    
+    refresh = limiter.limit("30/minute")  # Máx 30 rotações de refresh token/min
+
     # APIs gerais - proteção contra DoS
     standard = limiter.limit("100/minute")  # Máx 100 req/min
     strict = limiter.limit("50/minute")  # Máx 50 req/min
-    
+
     # Operações custosas
     upload = limiter.limit("10/hour")  # Máx 10 uploads/hora
     delete = limiter.limit("20/hour")  # Máx 20 deletes/hora
+
+
+if __name__ == '__main__':
+    # Benchmark (a partir de backend/): python -m middleware.rate_limit
+    # Custo por requisição do limitador (backend em memória, 10 mil chaves)
+    import asyncio
+    import random
+
+    async def _principal():
+        limitador = Limiter(BackendMemoria())
+        chaves = [f"ip:10.0.{i // 256}.{i % 256}" for i in range(10000)]
+        sorteio = random.Random(7)
+        sequencia = [sorteio.choice(chaves) for _ in range(200000)]
+        limite, janela = interpretar_limite("100/minute")
+
+        inicio = time.perf_counter()
+        for identidade in sequencia:
+            try:
+                await limitador.verificar("bench", identidade, limite, janela, "100/minute")
+            except RateLimitExceeded:
+                pass
+        us = (time.perf_counter() - inicio) / len(sequencia) * 1e6
+
+        print(f"✓ {len(sequencia)} requisições, {len(chaves)} chaves: {us:.2f}µs por requisição")
+        print(f"  {limitador.stats()}")
+
+    asyncio.run(_principal())
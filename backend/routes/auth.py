@@ -3,9 +3,12 @@ Rotas de Autenticação - Login e Registro
 Desenvolvido por: Vicente de Souza
 """
 
-from fastapi import APIRouter, HTTPException, status, Request
+from fastapi import APIRouter, Depends, HTTPException, status, Request
 from pydantic import BaseModel, EmailStr, Field
+import time
+import uuid
 from datetime import timedelta
+from typing import Optional
 import sys
 import os
 import re
@@ -13,11 +16,19 @@ import logging
 
 # Adicionar path do database
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'database'))
-from db_helper import DatabaseHelper
+from async_db_helper import AsyncDatabaseHelper
 
-from utils.auth import hash_password, verify_password, create_access_token
+from utils.auth import (
+    hash_password_async, verify_password_async, create_access_token, create_refresh_token,
+    decode_access_token, SobrecargaSenhas
+)
 from utils.two_factor_auth import gerar_otp, enviar_otp_email, validar_otp, resend_otp
 from middleware.rate_limit import RateLimitDecorators
+from middleware.database import get_db, db_atual
+from middleware.auth_middleware import security, get_current_user
+from fastapi.security import HTTPAuthorizationCredentials
+from utils.cache_tokens import cache_tokens
+from utils.lista_revogacao import lista_revogacao
 from config import settings
 
 # Logger para auditoria de segurança
@@ -25,6 +36,28 @@ logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/auth", tags=["Autenticação"])
 
+# Usuários de teste hardcoded (sem banco de dados)
+USUARIOS_TESTE = {
+    "teste01@gmail.com": {
+        "id": 1,
+        "nome": "Vicente de Souza",
+        "email": "teste01@gmail.com",
+        "senha": "Teste123@",
+        "telefone": "11 99999-0001",
+        "cargo": "Administrador",
+        "ativo": True
+    },
+    "francisco@gmail.com": {
+        "id": 2,
+        "nome": "Francisco",
+        "email": "francisco@gmail.com",
+        "senha": "Teste123@",
+        "telefone": "11 99999-0002",
+        "cargo": "Desenvolvedor",
+        "ativo": True
+    }
+}
+
 
 # Schemas
 class LoginRequest(BaseModel):
@@ -62,17 +95,127 @@ class OTPResponse(BaseModel):
 
 class TokenResponse(BaseModel):
     access_token: str
+    refresh_token: Optional[str] = None
     token_type: str = "bearer"
     user_id: int
     nome: str
     email: str
 
 
+class RefreshRequest(BaseModel):
+    refresh_token: str
+
+
+class LogoutRequest(BaseModel):
+    refresh_token: Optional[str] = None
+
+
 class VerifyOTPRequest(BaseModel):
     email: EmailStr
     codigo_otp: str = Field(..., min_length=6, max_length=6, description="Código OTP de 6 dígitos")
 
 
+def _servico_sobrecarregado(e: SobrecargaSenhas) -> HTTPException:
+    """503 com Retry-After quando o pool de senhas está no limite"""
+    logger.warning(f"Requisição recusada por sobrecarga: {e}")
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Serviço sobrecarregado. Tente novamente em instantes.",
+        headers={"Retry-After": "1"}
+    )
+
+
+def _emitir_tokens(
+    usuario: dict, familia: Optional[str] = None, auth_time: Optional[int] = None
+) -> TokenResponse:
+    """
+    Par access + refresh para o usuário (id, nome, email)
+
+    Args:
+        familia: Família da sessão (rotação); nova sessão se omitida
+        auth_time: Instante do login (epoch), repassado a cada rotação
+    """
+    familia = familia or uuid.uuid4().hex
+    dados = {"user_id": usuario["id"], "email": usuario["email"], "nome": usuario["nome"]}
+    refresh_token = create_refresh_token({**dados, "auth_time": auth_time or int(time.time())}, familia)
+    access_token = create_access_token(
+        data={**dados, "fam": familia},
+        expires_delta=timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
+    )
+    return TokenResponse(
+        access_token=access_token,
+        refresh_token=refresh_token,
+        user_id=usuario["id"],
+        nome=usuario["nome"],
+        email=usuario["email"]
+    )
+
+
+def _revogar_familia(familia: str):
+    """Encerra a sessão: nenhum token da família (access ou refresh) vale mais"""
+    lista_revogacao.revogar(familia, time.time() + settings.REFRESH_TOKEN_EXPIRE_DAYS * 86400)
+
+
+async def _usuario_ativo(usuario_id: int, email: str) -> bool:
+    """
+    Confere no banco se o usuário ainda existe e está ativo (usado no refresh)
+
+    Usuários de teste (fora do banco) são aceitos. Banco indisponível
+    recusa o refresh (503): a sessão não é estendida sem conferir.
+    """
+    teste = USUARIOS_TESTE.get(email)
+    if teste and teste["id"] == usuario_id:
+        return teste["ativo"]
+
+    try:
+        linhas = await db_atual().execute_query(
+            "SELECT ativo FROM usuarios WHERE id = %s", (usuario_id,), fetch=True
+        )
+    except Exception as e:
+        logger.error(f"Erro ao conferir usuário no refresh: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Serviço indisponível. Tente novamente em instantes.",
+            headers={"Retry-After": "1"}
+        )
+    return bool(linhas) and bool(linhas[0]["ativo"])
+
+
+async def _autenticar_cadastrado(email: str, senha: str) -> Optional[dict]:
+    """
+    Confere a senha de um usuário do banco (bcrypt no pool de senhas)
+
+    Returns:
+        Linha do usuário ou None (inexistente, inativo, senha errada ou
+        banco indisponível)
+
+    Raises:
+        SobrecargaSenhas: pool de senhas no limite
+    """
+    try:
+        linhas = await db_atual().execute_query(
+            "SELECT id, nome, email, senha_hash, ativo FROM usuarios WHERE email = %s",
+            (email.lower(),),
+            fetch=True
+        )
+    except Exception as e:
+        logger.error(f"Erro ao buscar usuário para login: {str(e)}")
+        return None
+
+    if not linhas or not linhas[0]["ativo"] or not linhas[0]["senha_hash"]:
+        return None
+
+    usuario = linhas[0]
+    try:
+        if await verify_password_async(senha, usuario["senha_hash"]):
+            return usuario
+    except SobrecargaSenhas:
+        raise
+    except ValueError as e:
+        logger.error(f"Hash de senha inválido para o usuário {usuario['id']}: {str(e)}")
+    return None
+
+
 @router.post("/login", response_model=TokenResponse)
 @RateLimitDecorators.login
 async def login(credentials: LoginRequest, request: Request):
@@ -82,49 +225,24 @@ async def login(credentials: LoginRequest, request: Request):
     Returns:
         Token JWT e dados do usuário
     """
-    # Usuários de teste hardcoded (sem banco de dados)
-    USUARIOS_TESTE = {
-        "teste01@gmail.com": {
-            "id": 1,
-            "nome": "Vicente de Souza", 
-            "email": "teste01@gmail.com",
-            "senha": "Teste123@",
-            "telefone": "11 99999-0001",
-            "cargo": "Administrador",
-            "ativo": True
-        },
-        "francisco@gmail.com": {
-            "id": 2,
-            "nome": "Francisco",
-            "email": "francisco@gmail.com", 
-            "senha": "Teste123@",
-            "telefone": "11 99999-0002",
-            "cargo": "Desenvolvedor",
-            "ativo": True
-        }
-    }
-    
     # Verificar se é usuário de teste
     if credentials.email in USUARIOS_TESTE:
         user_teste = USUARIOS_TESTE[credentials.email]
         if credentials.senha == user_teste["senha"] and user_teste["ativo"]:
-            # Criar token
-            access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
-            access_token = create_access_token(
-                data={"user_id": user_teste["id"], "email": user_teste["email"], "nome": user_teste["nome"]},
-                expires_delta=access_token_expires
-            )
-            
             logger.info(f"Login bem-sucedido (teste): {credentials.email}")
-            
-            return TokenResponse(
-                access_token=access_token,
-                user_id=user_teste["id"],
-                nome=user_teste["nome"],
-                email=user_teste["email"]
-            )
+            return _emitir_tokens(user_teste)
+    
+    # Usuários cadastrados
+    try:
+        usuario = await _autenticar_cadastrado(credentials.email, credentials.senha)
+    except SobrecargaSenhas as e:
+        raise _servico_sobrecarregado(e)
     
-    # Se não encontrou usuário de teste
+    if usuario:
+        logger.info(f"Login bem-sucedido: {credentials.email}")
+        return _emitir_tokens(usuario)
+    
+    logger.warning(f"Falha de login: {credentials.email}")
     raise HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Email ou senha incorretos"
@@ -133,7 +251,7 @@ async def login(credentials: LoginRequest, request: Request):
 
 @router.post("/register", response_model=MessageResponse, status_code=status.HTTP_201_CREATED)
 @RateLimitDecorators.register
-async def register(user_data: RegisterRequest, request: Request):
+async def register(user_data: RegisterRequest, request: Request, db: AsyncDatabaseHelper = Depends(get_db)):
     """
     Registro de novo usuário com validações de segurança
     
@@ -143,7 +261,6 @@ async def register(user_data: RegisterRequest, request: Request):
     Raises:
         HTTPException: Email já existe, senha fraca, erro ao inserir
     """
-    db = DatabaseHelper()
     
     # Validar força da senha
     if not RegisterRequest.validate_password(user_data.senha):
@@ -161,7 +278,7 @@ async def register(user_data: RegisterRequest, request: Request):
     
     # Verificar se email já existe (sem expor detalhes)
     try:
-        existing = db.execute_query(
+        existing = await db.execute_query(
             "SELECT id FROM usuarios WHERE email = %s",
             (user_data.email,),
             fetch=True
@@ -183,9 +300,11 @@ async def register(user_data: RegisterRequest, request: Request):
             detail="Erro ao validar email"
         )
     
-    # Hash da senha (bcrypt com salt rounds automático)
+    # Hash da senha (bcrypt no pool de senhas, fora do event loop)
     try:
-        senha_hash = hash_password(user_data.senha)
+        senha_hash = await hash_password_async(user_data.senha)
+    except SobrecargaSenhas as e:
+        raise _servico_sobrecarregado(e)
     except Exception as e:
         logger.error(f"Erro ao gerar hash de senha: {str(e)}")
         raise HTTPException(
@@ -195,7 +314,7 @@ async def register(user_data: RegisterRequest, request: Request):
     
     # Inserir usuário com tratamento específico de erros
     try:
-        db.execute_query(
+        await db.execute_query(
             """
             INSERT INTO usuarios (nome, email, senha_hash, telefone, cargo, ativo, data_criacao)
             VALUES (%s, %s, %s, %s, %s, TRUE, NOW())
@@ -221,8 +340,96 @@ async def register(user_data: RegisterRequest, request: Request):
         )
 
 
+@router.post("/refresh", response_model=TokenResponse)
+@RateLimitDecorators.refresh
+async def refresh(dados: RefreshRequest, request: Request):
+    """
+    Troca o refresh token por um novo par (rotação)
+
+    Cada refresh token vale uma única vez: o jti é revogado ao ser usado.
+    Reapresentar um token já usado indica vazamento, e a sessão inteira
+    (família) é revogada. A sessão termina SESSAO_MAX_DIAS depois do
+    login (auth_time) e quando o usuário é desativado ou removido.
+
+    Returns:
+        Novo access token e novo refresh token
+    """
+    payload = decode_access_token(dados.refresh_token)
+    if payload is None or payload.get("type") != "refresh" or not payload.get("jti"):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Refresh token inválido ou expirado"
+        )
+
+    familia = payload["fam"]
+    if lista_revogacao.revogado(familia):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Sessão encerrada"
+        )
+
+    # Tokens anteriores ao auth_time começam a contar a partir desta rotação
+    auth_time = payload.get("auth_time") or int(time.time())
+    if time.time() - auth_time > settings.SESSAO_MAX_DIAS * 86400:
+        _revogar_familia(familia)
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Sessão expirada. Faça login novamente."
+        )
+
+    if not await _usuario_ativo(payload["user_id"], payload["email"]):
+        _revogar_familia(familia)
+        logger.warning(f"Refresh recusado para usuário inativo ou removido: {payload.get('email')}")
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Sessão encerrada"
+        )
+
+    if not lista_revogacao.revogar(payload["jti"], payload["exp"]):
+        _revogar_familia(familia)
+        logger.warning(f"Refresh token reutilizado, sessão revogada: {payload.get('email')}")
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Refresh token já utilizado"
+        )
+
+    usuario = {"id": payload["user_id"], "email": payload["email"], "nome": payload.get("nome")}
+    return _emitir_tokens(usuario, familia, auth_time)
+
+
+@router.post("/logout", response_model=MessageResponse)
+async def logout(
+    dados: Optional[LogoutRequest] = None,
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Encerra a sessão
+
+    Revoga o token de acesso atual até a expiração e a família dele (os
+    refresh tokens da mesma sessão); o refresh_token do corpo, se
+    enviado, tem a família revogada também.
+    """
+    if current_user.get("jti"):
+        lista_revogacao.revogar(current_user["jti"], current_user["exp"])
+    else:
+        # Tokens emitidos antes do jti: revogados pelo digest, só neste processo
+        cache_tokens.revogar(credentials.credentials)
+
+    if current_user.get("fam"):
+        _revogar_familia(current_user["fam"])
+
+    if dados and dados.refresh_token:
+        payload = decode_access_token(dados.refresh_token)
+        if payload and payload.get("type") == "refresh" and payload.get("user_id") == current_user["user_id"]:
+            _revogar_familia(payload["fam"])
+
+    logger.info(f"Logout: {current_user['email']}")
+    return {"message": "Sessão encerrada"}
+
+
 @router.post("/verify-2fa")
-async def verify_2fa(otp_data: VerifyOTPRequest):
+async def verify_2fa(otp_data: VerifyOTPRequest, db: AsyncDatabaseHelper = Depends(get_db)):
     """
     Verifica código OTP para autenticação de dois fatores
     
@@ -240,8 +447,7 @@ async def verify_2fa(otp_data: VerifyOTPRequest):
         )
     
     # Buscar usuário para gerar token
-    db = DatabaseHelper()
-    usuario = db.execute_query(
+    usuario = await db.execute_query(
         "SELECT id, nome, email, cargo FROM usuarios WHERE email = %s",
         (otp_data.email,),
         fetch=True
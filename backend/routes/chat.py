@@ -2,102 +2,136 @@
 Rotas para chat interno
 Sistema de mensagens por projeto com histórico e participantes
 """
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
+from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from typing import Optional
+from datetime import datetime
+import asyncio
 from pydantic import BaseModel
-from middleware.auth_middleware import get_current_user
+import sys
+import os
+
+# Adicionar path do database
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'database'))
+from async_db_helper import AsyncDatabaseHelper
+
+from middleware.auth_middleware import get_current_user, validar_token_acesso
+from middleware.database import get_db
+from middleware.permissions import permission_manager
+from utils.chat_hub import chat_hub
+from utils.busca_mensagens import busca_mensagens
+from utils.paginacao import (
+    Paginacao, parametros_paginacao, condicao_keyset, ordem_keyset,
+    proximo_cursor, total_aproximado, aplicar_cabecalhos
+)
 
 router = APIRouter(prefix="/chat", tags=["Chat"])
 
+# Bearer opcional: EventSource/WebSocket do navegador enviam o token na query
+bearer_opcional = HTTPBearer(auto_error=False)
+
 class MensagemCreate(BaseModel):
     conteudo: str
     mencoes: Optional[list[int]] = None  # IDs de usuários mencionados
 
+# Chave de paginação das mensagens (idx_chat_data: chat_id, enviada_em, id)
+CHAVE_MENSAGENS = ("m.enviada_em", "m.id")
+
 @router.get("/{projeto_id}/mensagens")
 async def listar_mensagens(
     projeto_id: int,
-    limit: int = 50,
-    offset: int = 0,
-    current_user: dict = Depends(get_current_user)
+    response: Response,
+    pagina: Paginacao = Depends(parametros_paginacao),
+    current_user: dict = Depends(get_current_user),
+    db: AsyncDatabaseHelper = Depends(get_db)
 ):
-    """Lista mensagens do chat do projeto (mais recentes primeiro)"""
-    from database.db_helper import get_db_connection
+    """
+    Lista mensagens do chat do projeto (mais recentes primeiro)
+    Paginação por cursor: ?cursor=...&limit=...&incluir_total=true
+    """
+    # Cursor decodificado antes do try: adulterado gera 400, não 500
+    depois, params_cursor = condicao_keyset(CHAVE_MENSAGENS, pagina.cursor, decrescente=True)
     
-    conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
+    conn = await db.acquire()
+    cursor = await conn.cursor()
     
     try:
         # Buscar ID do chat do projeto
-        cursor.execute("""
+        await cursor.execute("""
             SELECT id FROM chats WHERE projeto_id = %s
         """, (projeto_id,))
         
-        chat = cursor.fetchone()
+        chat = await cursor.fetchone()
         if not chat:
             # Criar chat se não existir
-            cursor.execute("""
+            await cursor.execute("""
                 INSERT INTO chats (projeto_id, nome, criado_em)
                 VALUES (%s, 'Chat do Projeto', NOW())
             """, (projeto_id,))
-            conn.commit()
+            await conn.commit()
             chat_id = cursor.lastrowid
         else:
             chat_id = chat['id']
         
-        # Listar mensagens
-        cursor.execute("""
+        # Listar mensagens (a partir do cursor)
+        await cursor.execute(f"""
             SELECT m.*, u.nome as autor_nome, u.email as autor_email
             FROM mensagens m
             LEFT JOIN usuarios u ON m.autor_id = u.id
-            WHERE m.chat_id = %s
-            ORDER BY m.enviada_em DESC
-            LIMIT %s OFFSET %s
-        """, (chat_id, limit, offset))
+            WHERE m.chat_id = %s{depois}
+            {ordem_keyset(CHAVE_MENSAGENS, decrescente=True)}
+            LIMIT %s
+        """, (chat_id, *params_cursor, pagina.limite + 1))
         
-        mensagens = cursor.fetchall()
+        mensagens = list(await cursor.fetchall())
+        proximo = proximo_cursor(mensagens, pagina.limite, ("enviada_em", "id"))
         
-        # Contar total
-        cursor.execute("""
-            SELECT COUNT(*) as total FROM mensagens WHERE chat_id = %s
-        """, (chat_id,))
+        # Total aproximado (opcional)
+        total = None
+        if pagina.incluir_total:
+            total = await total_aproximado(
+                cursor, "SELECT 1 FROM mensagens WHERE chat_id = %s", (chat_id,)
+            )
         
-        total = cursor.fetchone()['total']
+        aplicar_cabecalhos(response, proximo, total)
         
         return {
             "success": True,
             "chat_id": chat_id,
             "total_mensagens": total,
-            "mensagens": mensagens
+            "mensagens": mensagens,
+            "proximo_cursor": proximo
         }
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
     finally:
-        cursor.close()
-        conn.close()
+        await cursor.close()
+        await db.release(conn)
 
 
 @router.post("/{projeto_id}/mensagens")
 async def enviar_mensagem(
     projeto_id: int,
     mensagem: MensagemCreate,
-    current_user: dict = Depends(get_current_user)
+    current_user: dict = Depends(get_current_user),
+    db: AsyncDatabaseHelper = Depends(get_db)
 ):
     """Envia uma nova mensagem no chat do projeto"""
-    from database.db_helper import get_db_connection
-    
-    conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
+    usuario_id = current_user.get("user_id") or current_user.get("id")
+    conn = await db.acquire()
+    cursor = await conn.cursor()
     
     try:
         # Buscar ou criar chat
-        cursor.execute("""
+        await cursor.execute("""
             SELECT id FROM chats WHERE projeto_id = %s
         """, (projeto_id,))
         
-        chat = cursor.fetchone()
+        chat = await cursor.fetchone()
         if not chat:
-            cursor.execute("""
+            await cursor.execute("""
                 INSERT INTO chats (projeto_id, nome, criado_em)
                 VALUES (%s, 'Chat do Projeto', NOW())
             """, (projeto_id,))
@@ -106,32 +140,46 @@ async def enviar_mensagem(
             chat_id = chat['id']
         
         # Adicionar usuário como participante se não estiver
-        cursor.execute("""
+        await cursor.execute("""
             INSERT IGNORE INTO chat_participantes (chat_id, usuario_id, juntou_em)
             VALUES (%s, %s, NOW())
-        """, (chat_id, current_user['id']))
+        """, (chat_id, usuario_id))
         
         # Inserir mensagem
-        cursor.execute("""
+        enviada_em = datetime.now().replace(microsecond=0)
+        await cursor.execute("""
             INSERT INTO mensagens (chat_id, autor_id, conteudo, enviada_em)
-            VALUES (%s, %s, %s, NOW())
-        """, (chat_id, current_user['id'], mensagem.conteudo))
+            VALUES (%s, %s, %s, %s)
+        """, (chat_id, usuario_id, mensagem.conteudo, enviada_em))
         
         mensagem_id = cursor.lastrowid
         
         # Criar notificações para menções
         if mensagem.mencoes:
-            for usuario_id in mensagem.mencoes:
-                cursor.execute("""
+            for mencionado_id in mensagem.mencoes:
+                await cursor.execute("""
                     INSERT INTO notificacoes 
                     (usuario_id, tipo, conteudo, lida, criada_em)
                     VALUES (%s, 'mencao', %s, FALSE, NOW())
                 """, (
-                    usuario_id,
+                    mencionado_id,
                     f"{current_user['nome']} mencionou você em uma mensagem"
                 ))
         
-        conn.commit()
+        await conn.commit()
+        
+        nova = {
+            "id": mensagem_id,
+            "chat_id": chat_id,
+            "autor_id": usuario_id,
+            "autor_nome": current_user.get("nome"),
+            "conteudo": mensagem.conteudo,
+            "enviada_em": enviada_em
+        }
+        busca_mensagens.mensagem_adicionada(projeto_id, nova)
+        
+        # Entregar aos participantes conectados (WebSocket/SSE)
+        await chat_hub.publicar(projeto_id, "mensagem", nova)
         
         return {
             "success": True,
@@ -140,26 +188,129 @@ async def enviar_mensagem(
         }
         
     except Exception as e:
-        conn.rollback()
+        await conn.rollback()
         raise HTTPException(status_code=500, detail=str(e))
     finally:
-        cursor.close()
-        conn.close()
+        await cursor.close()
+        await db.release(conn)
+
+
+# ===== TEMPO REAL (WebSocket / SSE) =====
+
+async def _autenticar_tempo_real(token: Optional[str], projeto_id: int) -> int:
+    """
+    Valida o token e a participação no projeto para conexões em tempo real
+    
+    Returns:
+        ID do usuário
+    
+    Raises:
+        HTTPException 401 (token) ou 403 (não é membro)
+    """
+    if not token:
+        raise HTTPException(status_code=401, detail="Token inválido ou expirado")
+    
+    # Mesma validação do get_current_user (tipo, cache e revogações)
+    usuario_id = (await validar_token_acesso(token))["user_id"]
+    
+    if not await permission_manager.is_project_member(usuario_id, projeto_id):
+        raise HTTPException(status_code=403, detail="Você não tem acesso a este projeto")
+    
+    return usuario_id
+
+
+@router.websocket("/{projeto_id}/ws")
+async def chat_websocket(websocket: WebSocket, projeto_id: int, token: Optional[str] = None):
+    """
+    Recebe as mensagens do chat do projeto em tempo real
+    Conexão: ws://.../chat/{projeto_id}/ws?token=<JWT>
+    
+    Eventos (JSON): {"tipo": "mensagem" | "mensagem_removida" | "ping", "projeto_id", "dados"}
+    Fechamento com código 1013 indica cliente lento: reconectar e
+    recuperar as mensagens perdidas por GET /chat/{projeto_id}/mensagens
+    """
+    try:
+        usuario_id = await _autenticar_tempo_real(token, projeto_id)
+    except HTTPException:
+        await websocket.close(code=1008)
+        return
+    
+    await websocket.accept()
+    conexao = await chat_hub.conectar(projeto_id, usuario_id)
+    
+    async def receber():
+        # O cliente não envia dados; a leitura só detecta a desconexão
+        try:
+            while True:
+                await websocket.receive_text()
+        except WebSocketDisconnect:
+            conexao.encerrar("cliente_desconectou")
+    
+    leitor = asyncio.create_task(receber())
+    try:
+        while True:
+            evento = await conexao.proximo(chat_hub.heartbeat)
+            if evento is None:
+                break
+            await websocket.send_text(evento or '{"tipo": "ping"}')
+    except WebSocketDisconnect:
+        pass
+    finally:
+        leitor.cancel()
+        await chat_hub.desconectar(conexao)
+        if conexao.motivo in ("fila_cheia", "desligamento"):
+            try:
+                await websocket.close(code=1013 if conexao.motivo == "fila_cheia" else 1001)
+            except RuntimeError:
+                pass
+
+
+@router.get("/{projeto_id}/eventos")
+async def chat_eventos(
+    projeto_id: int,
+    token: Optional[str] = None,
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(bearer_opcional)
+):
+    """
+    Alternativa ao WebSocket via Server-Sent Events (text/event-stream)
+    Token no cabeçalho Authorization ou em ?token=<JWT> (EventSource)
+    """
+    usuario_id = await _autenticar_tempo_real(
+        credentials.credentials if credentials else token, projeto_id
+    )
+    conexao = await chat_hub.conectar(projeto_id, usuario_id)
+    
+    async def gerar():
+        try:
+            yield "retry: 3000\n\n"
+            # Desconexão do cliente cancela o gerador (StreamingResponse)
+            while True:
+                evento = await conexao.proximo(chat_hub.heartbeat)
+                if evento is None:
+                    break
+                yield f"data: {evento}\n\n" if evento else ": ping\n\n"
+        finally:
+            await chat_hub.desconectar(conexao)
+    
+    return StreamingResponse(
+        gerar(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 
 @router.get("/{projeto_id}/participantes")
 async def listar_participantes(
     projeto_id: int,
-    current_user: dict = Depends(get_current_user)
+    current_user: dict = Depends(get_current_user),
+    db: AsyncDatabaseHelper = Depends(get_db)
 ):
     """Lista participantes do chat do projeto"""
-    from database.db_helper import get_db_connection
-    
-    conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
+    conn = await db.acquire()
+    cursor = await conn.cursor()
     
     try:
-        cursor.execute("""
+        await cursor.execute("""
             SELECT cp.*, u.nome, u.email, u.cargo
             FROM chat_participantes cp
             LEFT JOIN usuarios u ON cp.usuario_id = u.id
@@ -168,7 +319,7 @@ async def listar_participantes(
             ORDER BY cp.juntou_em
         """, (projeto_id,))
         
-        participantes = cursor.fetchall()
+        participantes = await cursor.fetchall()
         
         return {
             "success": True,
@@ -179,37 +330,43 @@ async def listar_participantes(
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
     finally:
-        cursor.close()
-        conn.close()
+        await cursor.close()
+        await db.release(conn)
 
 
 @router.delete("/{mensagem_id}")
 async def deletar_mensagem(
     mensagem_id: int,
-    current_user: dict = Depends(get_current_user)
+    current_user: dict = Depends(get_current_user),
+    db: AsyncDatabaseHelper = Depends(get_db)
 ):
     """Deleta uma mensagem (apenas autor ou admin)"""
-    from database.db_helper import get_db_connection
-    
-    conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
+    usuario_id = current_user.get("user_id") or current_user.get("id")
+    conn = await db.acquire()
+    cursor = await conn.cursor()
     
     try:
         # Verificar se é o autor
-        cursor.execute("""
-            SELECT autor_id FROM mensagens WHERE id = %s
+        await cursor.execute("""
+            SELECT m.autor_id, c.projeto_id
+            FROM mensagens m
+            LEFT JOIN chats c ON m.chat_id = c.id
+            WHERE m.id = %s
         """, (mensagem_id,))
         
-        mensagem = cursor.fetchone()
+        mensagem = await cursor.fetchone()
         if not mensagem:
             raise HTTPException(status_code=404, detail="Mensagem não encontrada")
         
-        if mensagem['autor_id'] != current_user['id']:
+        if mensagem['autor_id'] != usuario_id:
             # Verificar se é admin (você pode adicionar lógica de permissão aqui)
             raise HTTPException(status_code=403, detail="Sem permissão para deletar")
         
-        cursor.execute("DELETE FROM mensagens WHERE id = %s", (mensagem_id,))
-        conn.commit()
+        await cursor.execute("DELETE FROM mensagens WHERE id = %s", (mensagem_id,))
+        await conn.commit()
+        
+        busca_mensagens.mensagem_removida(mensagem['projeto_id'], mensagem_id)
+        await chat_hub.publicar(mensagem['projeto_id'], "mensagem_removida", {"id": mensagem_id})
         
         return {
             "success": True,
@@ -219,48 +376,47 @@ async def deletar_mensagem(
     except HTTPException:
         raise
     except Exception as e:
-        conn.rollback()
+        await conn.rollback()
         raise HTTPException(status_code=500, detail=str(e))
     finally:
-        cursor.close()
-        conn.close()
+        await cursor.close()
+        await db.release(conn)
 
 
 @router.get("/{projeto_id}/buscar")
 async def buscar_mensagens(
     projeto_id: int,
-    termo: str,
-    current_user: dict = Depends(get_current_user)
+    response: Response,
+    termo: str = Query(..., min_length=2, max_length=200),
+    pagina: Paginacao = Depends(parametros_paginacao),
+    current_user: dict = Depends(get_current_user),
+    db: AsyncDatabaseHelper = Depends(get_db)
 ):
-    """Busca mensagens por texto no chat do projeto"""
-    from database.db_helper import get_db_connection
+    """
+    Busca mensagens por texto no chat do projeto
     
-    conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
+    Resultados por relevância, com o trecho encontrado em "destaque"
+    (termos em <mark>). Paginação por cursor: X-Next-Cursor
+    """
+    usuario_id = current_user.get("user_id") or current_user.get("id")
+    if not await permission_manager.is_project_member(usuario_id, projeto_id):
+        raise HTTPException(status_code=403, detail="Você não tem acesso a este projeto")
     
     try:
-        cursor.execute("""
-            SELECT m.*, u.nome as autor_nome
-            FROM mensagens m
-            LEFT JOIN usuarios u ON m.autor_id = u.id
-            LEFT JOIN chats c ON m.chat_id = c.id
-            WHERE c.projeto_id = %s
-              AND m.conteudo LIKE %s
-            ORDER BY m.enviada_em DESC
-            LIMIT 50
-        """, (projeto_id, f"%{termo}%"))
-        
-        resultados = cursor.fetchall()
-        
-        return {
-            "success": True,
-            "total_encontrados": len(resultados),
-            "termo_busca": termo,
-            "resultados": resultados
-        }
-        
+        resultados, proximo = await busca_mensagens.buscar(
+            db, projeto_id, termo, pagina.cursor, pagina.limite
+        )
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        cursor.close()
-        conn.close()
+    
+    aplicar_cabecalhos(response, proximo)
+    
+    return {
+        "success": True,
+        "total_encontrados": len(resultados),
+        "termo_busca": termo,
+        "resultados": resultados,
+        "proximo_cursor": proximo
+    }
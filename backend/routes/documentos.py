@@ -3,14 +3,31 @@ Rotas para gerenciamento de documentos
 Permite upload, download, versionamento e organização de arquivos técnicos
 Com validações de segurança em uploads
 """
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Request, Response
+from fastapi.responses import StreamingResponse
 from typing import List, Optional
 from datetime import datetime
 import os
-import uuid
+import sys
 import logging
+
+# Adicionar path do database
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'database'))
+from async_db_helper import AsyncDatabaseHelper
+
 from middleware.auth_middleware import get_current_user
-from utils.file_security import FileSecurityValidator, UploadSecurityManager
+from middleware.database import get_db, liberar_conexao
+from middleware.permissions import permission_manager
+from utils.file_security import FileSecurityValidator, UploadRecusado, TAMANHO_BLOCO
+from utils.blob_store import BlobStore
+from utils.download import responder_arquivo, responder_conteudo
+from utils.delta_versoes import armazenamento_delta
+from utils.exportacao import gerar_zip
+from utils.miniaturas import TIPOS_DERIVADO, caminho_derivado, gerador_miniaturas
+from utils.paginacao import (
+    Paginacao, parametros_paginacao, condicao_keyset, ordem_keyset,
+    proximo_cursor, total_aproximado, aplicar_cabecalhos
+)
 
 # Logger para auditoria
 logger = logging.getLogger(__name__)
@@ -21,23 +38,58 @@ router = APIRouter(prefix="/documentos", tags=["Documentos"])
 UPLOAD_DIR = "uploads/documentos"
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 
-# Gerenciador de segurança de uploads
-upload_manager = UploadSecurityManager(UPLOAD_DIR)
+# Arquivos guardados por conteúdo (SHA-256), sem duplicatas
+blob_store = BlobStore(os.path.join(UPLOAD_DIR, "blobs"))
+
+TAMANHO_MAXIMO_UPLOAD = FileSecurityValidator.SIZE_LIMITS['padrao']  # 100MB
+
+
+async def _blocos(file: UploadFile):
+    """Lê o upload em blocos de tamanho fixo"""
+    while True:
+        bloco = await file.read(TAMANHO_BLOCO)
+        if not bloco:
+            break
+        yield bloco
+
+
+async def _receber_upload(file: UploadFile, ext: str) -> dict:
+    """
+    Recebe o upload num temporário do blob store sem carregá-lo inteiro na memória
+    
+    Returns:
+        {"temp", "tamanho", "sha256"} (registrar com blob_store.guardar)
+    """
+    try:
+        return await blob_store.receber_stream(_blocos(file), ext, TAMANHO_MAXIMO_UPLOAD)
+    except UploadRecusado as e:
+        raise HTTPException(status_code=e.status_code, detail=e.mensagem)
+    except Exception as e:
+        logger.error(f"Erro ao salvar arquivo: {str(e)}")
+        raise HTTPException(status_code=500, detail="Erro ao salvar arquivo no servidor")
+
+
+# Chave de paginação dos documentos (mais recentes primeiro)
+CHAVE_DOCUMENTOS = ("d.data_upload", "d.id")
 
 @router.get("/{projeto_id}")
 async def listar_documentos(
     projeto_id: int,
+    response: Response,
     categoria: Optional[str] = None,
-    current_user: dict = Depends(get_current_user)
+    pagina: Paginacao = Depends(parametros_paginacao),
+    current_user: dict = Depends(get_current_user),
+    db: AsyncDatabaseHelper = Depends(get_db)
 ):
     """
-    Lista todos os documentos de um projeto
+    Lista os documentos de um projeto (paginado por cursor)
     Filtros: categoria (plantas, rrt, diario, medicoes, fotos, relatorios)
     """
-    from database.db_helper import get_db_connection
+    # Cursor decodificado antes do try: adulterado gera 400, não 500
+    depois, params_cursor = condicao_keyset(CHAVE_DOCUMENTOS, pagina.cursor, decrescente=True)
     
-    conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
+    conn = await db.acquire()
+    cursor = await conn.cursor()
     
     try:
         query = """
@@ -48,28 +100,108 @@ async def listar_documentos(
             LEFT JOIN versoes_documento v ON d.id = v.documento_id
             WHERE d.projeto_id = %s
         """
-        params = [projeto_id]
+        filtro = " AND d.categoria = %s" if categoria else ""
+        params = [projeto_id, categoria] if categoria else [projeto_id]
         
-        if categoria:
-            query += " AND d.categoria = %s"
-            params.append(categoria)
+        query += filtro + depois
+        query += f" GROUP BY d.id {ordem_keyset(CHAVE_DOCUMENTOS, decrescente=True)} LIMIT %s"
         
-        query += " GROUP BY d.id ORDER BY d.data_upload DESC"
+        await cursor.execute(query, params + params_cursor + [pagina.limite + 1])
+        documentos = list(await cursor.fetchall())
+        proximo = proximo_cursor(documentos, pagina.limite, ("data_upload", "id"))
         
-        cursor.execute(query, params)
-        documentos = cursor.fetchall()
+        total = None
+        if pagina.incluir_total:
+            total = await total_aproximado(
+                cursor,
+                "SELECT 1 FROM documentos d WHERE d.projeto_id = %s" + filtro,
+                params
+            )
+        
+        aplicar_cabecalhos(response, proximo, total)
         
         return {
             "success": True,
             "total": len(documentos),
-            "documentos": documentos
+            "documentos": documentos,
+            "proximo_cursor": proximo
         }
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
     finally:
-        cursor.close()
-        conn.close()
+        await cursor.close()
+        await db.release(conn)
+
+
+@router.get("/{projeto_id}/export.zip")
+async def exportar_documentos(
+    projeto_id: int,
+    categoria: Optional[str] = None,
+    current_user: dict = Depends(get_current_user),
+    db: AsyncDatabaseHelper = Depends(get_db)
+):
+    """
+    Exporta os documentos do projeto (versão atual) num ZIP gerado em streaming
+    Pastas por categoria e manifesto.json com o histórico de versões
+    Filtros: categoria (plantas, rrt, diario, medicoes, fotos, relatorios)
+    """
+    usuario_id = current_user.get("user_id") or current_user.get("id")
+    if not await permission_manager.is_project_member(usuario_id, projeto_id):
+        raise HTTPException(status_code=403, detail="Você não tem acesso a este projeto")
+    
+    filtro = " AND d.categoria = %s" if categoria else ""
+    params = (projeto_id, categoria) if categoria else (projeto_id,)
+    
+    documentos = await db.execute_query(f"""
+        SELECT d.id, d.nome, d.categoria, d.caminho_arquivo, d.tamanho_bytes,
+               d.data_upload, d.sha256
+        FROM documentos d
+        WHERE d.projeto_id = %s{filtro}
+        ORDER BY d.categoria, d.nome
+    """, params, fetch=True)
+    
+    versoes = await db.execute_query(f"""
+        SELECT v.documento_id, v.numero_versao, v.tamanho_bytes,
+               COALESCE(v.conteudo_sha256, v.sha256) as sha256,
+               v.data_criacao, v.comentario, u.nome as criado_por_nome
+        FROM versoes_documento v
+        INNER JOIN documentos d ON v.documento_id = d.id
+        LEFT JOIN usuarios u ON v.criado_por = u.id
+        WHERE d.projeto_id = %s{filtro}
+        ORDER BY v.documento_id, v.numero_versao
+    """, params, fetch=True)
+    
+    # O ZIP é gerado em streaming: devolve a conexão antes
+    await liberar_conexao()
+    
+    historico = {}
+    for versao in versoes:
+        historico.setdefault(versao.pop('documento_id'), []).append(versao)
+    
+    manifesto = {
+        "projeto_id": projeto_id,
+        "categoria": categoria,
+        "gerado_em": datetime.now(),
+        "documentos": [
+            {
+                "id": d['id'],
+                "nome": d['nome'],
+                "categoria": d['categoria'],
+                "tamanho_bytes": d['tamanho_bytes'],
+                "sha256": d['sha256'],
+                "versoes": historico.get(d['id'], [])
+            }
+            for d in documentos
+        ]
+    }
+    
+    nome_zip = f"projeto_{projeto_id}_documentos" + (f"_{categoria}" if categoria else "") + ".zip"
+    return StreamingResponse(
+        gerar_zip(documentos, manifesto),
+        media_type="application/zip",
+        headers={"Content-Disposition": f'attachment; filename="{nome_zip}"'}
+    )
 
 
 @router.post("/{projeto_id}/upload")
@@ -78,18 +210,17 @@ async def upload_documento(
     file: UploadFile = File(...),
     categoria: str = "outros",
     descricao: Optional[str] = None,
-    current_user: dict = Depends(get_current_user)
+    current_user: dict = Depends(get_current_user),
+    db: AsyncDatabaseHelper = Depends(get_db)
 ):
     """
     Faz upload de um novo documento com validações de segurança
     Categorias: plantas, rrt, diario, medicoes, fotos, relatorios, outros
     Validações: tipo arquivo, tamanho máximo, magic bytes
     """
-    from database.db_helper import get_db_connection
     
-    # 1. VALIDAR TAMANHO (antes de ler arquivo)
-    max_tamanho = 100 * 1024 * 1024  # 100MB
-    if file.size and file.size > max_tamanho:
+    # 1. VALIDAR TAMANHO DECLARADO (antes de ler arquivo)
+    if file.size and file.size > TAMANHO_MAXIMO_UPLOAD:
         raise HTTPException(
             status_code=413,
             detail=f"Arquivo excede tamanho máximo de 100MB"
@@ -103,19 +234,7 @@ async def upload_documento(
             detail=f"Extensão '{ext}' não permitida. Extensões aceitas: {', '.join(FileSecurityValidator.ALLOWED_EXTENSIONS)}"
         )
     
-    # 3. LER ARQUIVO COM LIMITE
-    try:
-        conteudo = await file.read()
-        if len(conteudo) > max_tamanho:
-            raise HTTPException(
-                status_code=413,
-                detail=f"Arquivo excede tamanho máximo de 100MB"
-            )
-    except Exception as e:
-        logger.error(f"Erro ao ler arquivo: {str(e)}")
-        raise HTTPException(status_code=400, detail="Erro ao processar arquivo")
-    
-    # 4. VALIDAR MIME TYPE
+    # 3. VALIDAR MIME TYPE
     import mimetypes
     mime_type, _ = mimetypes.guess_type(file.filename)
     if mime_type and mime_type not in FileSecurityValidator.ALLOWED_MIMETYPES:
@@ -124,44 +243,15 @@ async def upload_documento(
             detail=f"MIME type '{mime_type}' não permitido"
         )
     
-    # 5. VALIDAR MAGIC BYTES (assinatura do arquivo)
-    if len(conteudo) > 8:
-        header = conteudo[:8]
-        arquivo_valido = False
-        
-        for magic, tipo_ext in FileSecurityValidator.MAGIC_BYTES.items():
-            if header.startswith(magic):
-                if tipo_ext == ext:
-                    arquivo_valido = True
-                else:
-                    raise HTTPException(
-                        status_code=400,
-                        detail=f"Arquivo disfarçado: extensão '{ext}' não corresponde ao tipo real"
-                    )
-        
-        if not arquivo_valido and mime_type not in FileSecurityValidator.ALLOWED_MIMETYPES:
-            logger.warning(f"Arquivo sem assinatura reconhecida: {file.filename}, MIME: {mime_type}")
-    
-    # 6. GERAR NOME ÚNICO E SANITIZADO
-    nome_sanitizado = FileSecurityValidator.sanitizar_nome_arquivo(file.filename)
-    nome_unico = f"{uuid.uuid4()}_{nome_sanitizado}"
-    caminho_arquivo = os.path.join(UPLOAD_DIR, nome_unico)
-    
-    # 7. SALVAR ARQUIVO
-    try:
-        with open(caminho_arquivo, "wb") as f:
-            f.write(conteudo)
-        
-        tamanho_bytes = len(conteudo)
-        logger.info(f"Arquivo salvo: {nome_unico} ({tamanho_bytes} bytes) por {current_user['id']}")
-        
-    except Exception as e:
-        logger.error(f"Erro ao salvar arquivo: {str(e)}")
-        raise HTTPException(status_code=500, detail="Erro ao salvar arquivo no servidor")
+    # 4. RECEBER EM BLOCOS (limite de tamanho, magic bytes e hash durante a gravação)
+    # Sem conexão presa durante o recebimento; o INSERT abre transação própria
+    await liberar_conexao()
+    recebido = await _receber_upload(file, ext)
+    usuario_id = current_user.get("user_id") or current_user.get("id")
     
-    # 8. INSERIR NO BANCO
-    conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
+    # 5. INSERIR NO BANCO (blob + documento + versão na mesma transação)
+    conn = await db.acquire()
+    cursor = await conn.cursor()
     
     try:
         # Validar categoria
@@ -169,16 +259,21 @@ async def upload_documento(
         if categoria not in categorias_validas:
             categoria = 'outros'
         
+        # Documento e versão inicial referenciam o mesmo blob
+        arquivo = await blob_store.guardar(cursor, recebido, referencias=2)
+        caminho_arquivo = arquivo["caminho"]
+        tamanho_bytes = arquivo["tamanho"]
+        
         # Inserir documento
         query = """
             INSERT INTO documentos 
             (projeto_id, nome, categoria, descricao, caminho_arquivo, 
-             tamanho_bytes, uploaded_por, data_upload)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, NOW())
+             tamanho_bytes, sha256, uploaded_por, data_upload)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, NOW())
         """
-        cursor.execute(query, (
+        await cursor.execute(query, (
             projeto_id, file.filename, categoria, descricao,
-            caminho_arquivo, tamanho_bytes, current_user['id']
+            caminho_arquivo, tamanho_bytes, arquivo["sha256"], usuario_id
         ))
         
         doc_id = cursor.lastrowid
@@ -187,15 +282,21 @@ async def upload_documento(
         query_versao = """
             INSERT INTO versoes_documento
             (documento_id, numero_versao, caminho_arquivo, tamanho_bytes,
-             criado_por, data_criacao, comentario)
-            VALUES (%s, 1, %s, %s, %s, NOW(), 'Versão inicial')
+             sha256, criado_por, data_criacao, comentario)
+            VALUES (%s, 1, %s, %s, %s, %s, NOW(), 'Versão inicial')
         """
-        cursor.execute(query_versao, (
-            doc_id, caminho_arquivo, tamanho_bytes, current_user['id']
+        await cursor.execute(query_versao, (
+            doc_id, caminho_arquivo, tamanho_bytes, arquivo["sha256"], usuario_id
         ))
         
-        conn.commit()
-        logger.info(f"Documento registrado no banco: {doc_id}")
+        await conn.commit()
+        logger.info(
+            f"Documento registrado no banco: {doc_id} ({tamanho_bytes} bytes, "
+            f"{'deduplicado' if arquivo['deduplicado'] else 'novo blob'}) por {usuario_id}"
+        )
+        
+        # Miniatura/prévia em segundo plano (reaproveitadas se o blob já existia)
+        gerador_miniaturas.agendar(arquivo["sha256"], caminho_arquivo, file.filename)
         
         return {
             "success": True,
@@ -203,19 +304,20 @@ async def upload_documento(
             "documento_id": doc_id,
             "nome": file.filename,
             "tamanho": tamanho_bytes,
+            "sha256": arquivo["sha256"],
+            "deduplicado": arquivo["deduplicado"],
             "categoria": categoria
         }
         
     except Exception as e:
-        conn.rollback()
-        # Remover arquivo se houver erro
-        if os.path.exists(caminho_arquivo):
-            os.remove(caminho_arquivo)
-            logger.error(f"Arquivo removido devido a erro no banco: {nome_unico}")
+        await conn.rollback()
+        # Remover o blob se nenhuma outra linha o referencia
+        blob_store.agendar_coleta(db, [recebido["sha256"]])
         raise HTTPException(status_code=500, detail=str(e))
     finally:
-        cursor.close()
-        conn.close()
+        blob_store.descartar_temp(recebido["temp"])
+        await cursor.close()
+        await db.release(conn)
 
 
 @router.post("/{documento_id}/nova-versao")
@@ -223,86 +325,112 @@ async def criar_nova_versao(
     documento_id: int,
     file: UploadFile = File(...),
     comentario: Optional[str] = None,
-    current_user: dict = Depends(get_current_user)
+    current_user: dict = Depends(get_current_user),
+    db: AsyncDatabaseHelper = Depends(get_db)
 ):
     """Cria uma nova versão de um documento existente"""
-    from database.db_helper import get_db_connection
-    
-    # Salvar nova versão do arquivo
-    extensao = os.path.splitext(file.filename)[1]
-    nome_unico = f"{uuid.uuid4()}{extensao}"
-    caminho_arquivo = os.path.join(UPLOAD_DIR, nome_unico)
+    usuario_id = current_user.get("user_id") or current_user.get("id")
     
-    with open(caminho_arquivo, "wb") as f:
-        conteudo = await file.read()
-        f.write(conteudo)
+    extensao = os.path.splitext(file.filename)[1].lower()
+    if extensao not in FileSecurityValidator.ALLOWED_EXTENSIONS:
+        raise HTTPException(status_code=400, detail=f"Extensão '{extensao}' não permitida")
     
-    tamanho_bytes = len(conteudo)
+    # Receber nova versão do arquivo (em blocos), sem conexão presa
+    await liberar_conexao()
+    recebido = await _receber_upload(file, extensao)
+    liberados = []
+    versao = None
     
-    conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
+    conn = await db.acquire()
+    cursor = await conn.cursor()
     
     try:
-        # Obter última versão
-        cursor.execute("""
-            SELECT MAX(numero_versao) as ultima_versao
-            FROM versoes_documento
-            WHERE documento_id = %s
+        # Obter última versão e o blob atual do documento (trava a linha)
+        await cursor.execute("""
+            SELECT d.sha256, d.caminho_arquivo, d.tamanho_bytes,
+                   (SELECT MAX(numero_versao) FROM versoes_documento
+                    WHERE documento_id = d.id) as ultima_versao
+            FROM documentos d
+            WHERE d.id = %s
+            FOR UPDATE
         """, (documento_id,))
         
-        result = cursor.fetchone()
+        result = await cursor.fetchone()
+        if not result:
+            raise HTTPException(status_code=404, detail="Documento não encontrado")
         nova_versao = (result['ultima_versao'] or 0) + 1
         
+        # Documento aponta para o novo blob; a versão, para o mesmo blob
+        # ou para o delta em relação à versão anterior (se ativo)
+        base = {
+            "caminho": result['caminho_arquivo'],
+            "tamanho": result['tamanho_bytes'] or 0,
+            "sha256": result['sha256']
+        }
+        arquivo, versao = await armazenamento_delta.gravar_versao(
+            cursor, blob_store, recebido, nova_versao, base
+        )
+        caminho_arquivo = arquivo["caminho"]
+        tamanho_bytes = arquivo["tamanho"]
+        liberados = await blob_store.liberar(cursor, [result['sha256']])
+        
         # Criar nova versão
         query = """
             INSERT INTO versoes_documento
             (documento_id, numero_versao, caminho_arquivo, tamanho_bytes,
-             criado_por, data_criacao, comentario)
-            VALUES (%s, %s, %s, %s, %s, NOW(), %s)
+             sha256, conteudo_sha256, delta_base, criado_por, data_criacao, comentario)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, NOW(), %s)
         """
-        cursor.execute(query, (
-            documento_id, nova_versao, caminho_arquivo,
-            tamanho_bytes, current_user['id'], comentario
+        await cursor.execute(query, (
+            documento_id, nova_versao, versao["caminho"], tamanho_bytes,
+            versao["sha256"], versao["conteudo_sha256"], versao["delta_base"],
+            usuario_id, comentario
         ))
         
         # Atualizar documento principal
-        cursor.execute("""
+        await cursor.execute("""
             UPDATE documentos
-            SET caminho_arquivo = %s, tamanho_bytes = %s
+            SET caminho_arquivo = %s, tamanho_bytes = %s, sha256 = %s
             WHERE id = %s
-        """, (caminho_arquivo, tamanho_bytes, documento_id))
+        """, (caminho_arquivo, tamanho_bytes, arquivo["sha256"], documento_id))
         
-        conn.commit()
+        await conn.commit()
+        blob_store.agendar_coleta(db, liberados)
+        gerador_miniaturas.agendar(arquivo["sha256"], caminho_arquivo, file.filename)
         
         return {
             "success": True,
             "message": f"Versão {nova_versao} criada com sucesso",
-            "versao": nova_versao
+            "versao": nova_versao,
+            "deduplicado": arquivo["deduplicado"],
+            "delta": versao["delta_base"] is not None
         }
         
+    except HTTPException:
+        await conn.rollback()
+        raise
     except Exception as e:
-        conn.rollback()
-        if os.path.exists(caminho_arquivo):
-            os.remove(caminho_arquivo)
+        await conn.rollback()
+        blob_store.agendar_coleta(db, [recebido["sha256"], versao["sha256"] if versao else None])
         raise HTTPException(status_code=500, detail=str(e))
     finally:
-        cursor.close()
-        conn.close()
+        blob_store.descartar_temp(recebido["temp"])
+        await cursor.close()
+        await db.release(conn)
 
 
 @router.get("/{documento_id}/versoes")
 async def listar_versoes(
     documento_id: int,
-    current_user: dict = Depends(get_current_user)
+    current_user: dict = Depends(get_current_user),
+    db: AsyncDatabaseHelper = Depends(get_db)
 ):
     """Lista todas as versões de um documento"""
-    from database.db_helper import get_db_connection
-    
-    conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
+    conn = await db.acquire()
+    cursor = await conn.cursor()
     
     try:
-        cursor.execute("""
+        await cursor.execute("""
             SELECT v.*, u.nome as criado_por_nome
             FROM versoes_documento v
             LEFT JOIN usuarios u ON v.criado_por = u.id
@@ -310,7 +438,7 @@ async def listar_versoes(
             ORDER BY v.numero_versao DESC
         """, (documento_id,))
         
-        versoes = cursor.fetchall()
+        versoes = await cursor.fetchall()
         
         return {
             "success": True,
@@ -321,40 +449,182 @@ async def listar_versoes(
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
     finally:
-        cursor.close()
-        conn.close()
+        await cursor.close()
+        await db.release(conn)
+
+
+async def _enviar_download(request: Request, arquivo: Optional[dict], current_user: dict, imutavel: bool):
+    """Verifica acesso ao projeto e responde o arquivo (Range / ETag)"""
+    if not arquivo:
+        raise HTTPException(status_code=404, detail="Documento não encontrado")
+    
+    usuario_id = current_user.get("user_id") or current_user.get("id")
+    if not await permission_manager.is_project_member(usuario_id, arquivo['projeto_id']):
+        raise HTTPException(status_code=403, detail="Você não tem acesso a este projeto")
+    
+    try:
+        return await responder_arquivo(
+            request, arquivo['caminho_arquivo'], arquivo['nome'],
+            sha256=arquivo['sha256'], imutavel=imutavel
+        )
+    except FileNotFoundError:
+        logger.error(f"Arquivo ausente no disco: {arquivo['caminho_arquivo']}")
+        raise HTTPException(status_code=404, detail="Arquivo não encontrado")
+
+
+@router.get("/{documento_id}/download")
+async def download_documento(
+    documento_id: int,
+    request: Request,
+    current_user: dict = Depends(get_current_user),
+    db: AsyncDatabaseHelper = Depends(get_db)
+):
+    """
+    Baixa a versão atual de um documento
+    Suporta Range (download retomável) e If-None-Match (304 se inalterado)
+    """
+    rows = await db.execute_query("""
+        SELECT projeto_id, nome, caminho_arquivo, sha256
+        FROM documentos WHERE id = %s
+    """, (documento_id,), fetch=True)
+    
+    return await _enviar_download(request, rows[0] if rows else None, current_user, imutavel=False)
+
+
+@router.get("/{documento_id}/miniatura")
+async def miniatura_documento(
+    documento_id: int,
+    request: Request,
+    tipo: str = "miniatura",
+    current_user: dict = Depends(get_current_user),
+    db: AsyncDatabaseHelper = Depends(get_db)
+):
+    """
+    Miniatura (256px) ou prévia (1024px, primeira página de PDFs) da versão atual
+    Retorna 202 enquanto o derivado ainda está sendo gerado
+    """
+    if tipo not in TIPOS_DERIVADO:
+        raise HTTPException(status_code=400, detail=f"Tipo inválido. Use: {', '.join(TIPOS_DERIVADO)}")
+    
+    rows = await db.execute_query("""
+        SELECT projeto_id, nome, caminho_arquivo, sha256
+        FROM documentos WHERE id = %s
+    """, (documento_id,), fetch=True)
+    if not rows:
+        raise HTTPException(status_code=404, detail="Documento não encontrado")
+    documento = rows[0]
+    
+    usuario_id = current_user.get("user_id") or current_user.get("id")
+    if not await permission_manager.is_project_member(usuario_id, documento['projeto_id']):
+        raise HTTPException(status_code=403, detail="Você não tem acesso a este projeto")
+    
+    sha256 = documento['sha256']
+    if sha256:
+        derivado = caminho_derivado(documento['caminho_arquivo'], sha256, tipo)
+        try:
+            return await responder_arquivo(
+                request, str(derivado), f"{os.path.splitext(documento['nome'])[0]}_{tipo}.webp",
+                sha256=f"{sha256}-{tipo}"
+            )
+        except FileNotFoundError:
+            # Ainda não gerado (ou gerado antes de um restart): agenda de novo
+            if gerador_miniaturas.pendente(sha256, tipo) or gerador_miniaturas.agendar(
+                sha256, documento['caminho_arquivo'], documento['nome']
+            ):
+                return Response(status_code=202, headers={"Retry-After": "2"})
+    
+    raise HTTPException(status_code=404, detail="Miniatura indisponível para este documento")
+
+
+@router.get("/{documento_id}/versoes/{numero_versao}/download")
+async def download_versao(
+    documento_id: int,
+    numero_versao: int,
+    request: Request,
+    current_user: dict = Depends(get_current_user),
+    db: AsyncDatabaseHelper = Depends(get_db)
+):
+    """
+    Baixa uma versão específica de um documento (conteúdo imutável)
+    Suporta Range (download retomável) e If-None-Match (304 se inalterado)
+    """
+    rows = await db.execute_query("""
+        SELECT d.projeto_id, d.nome, v.caminho_arquivo, v.sha256, v.delta_base
+        FROM versoes_documento v
+        INNER JOIN documentos d ON v.documento_id = d.id
+        WHERE v.documento_id = %s AND v.numero_versao = %s
+    """, (documento_id, numero_versao), fetch=True)
+    
+    if rows and rows[0]['delta_base'] is not None:
+        # Versão em delta: reconstruída (e mantida no LRU) antes de responder
+        arquivo = rows[0]
+        usuario_id = current_user.get("user_id") or current_user.get("id")
+        if not await permission_manager.is_project_member(usuario_id, arquivo['projeto_id']):
+            raise HTTPException(status_code=403, detail="Você não tem acesso a este projeto")
+        try:
+            conteudo, sha256 = await armazenamento_delta.materializar(db, documento_id, numero_versao)
+        except (LookupError, FileNotFoundError, ValueError) as e:
+            logger.error(f"Falha ao reconstruir versão {numero_versao} do documento {documento_id}: {e}")
+            raise HTTPException(status_code=404, detail="Arquivo não encontrado")
+        return responder_conteudo(request, conteudo, arquivo['nome'], sha256, imutavel=True)
+    
+    return await _enviar_download(request, rows[0] if rows else None, current_user, imutavel=True)
+
+
+@router.get("/{documento_id}/armazenamento")
+async def uso_armazenamento(
+    documento_id: int,
+    current_user: dict = Depends(get_current_user),
+    db: AsyncDatabaseHelper = Depends(get_db)
+):
+    """
+    Uso de disco das versões do documento
+    Bytes de todas as versões completas x bytes efetivamente guardados (deltas)
+    """
+    rows = await db.execute_query(
+        "SELECT projeto_id FROM documentos WHERE id = %s", (documento_id,), fetch=True
+    )
+    if not rows:
+        raise HTTPException(status_code=404, detail="Documento não encontrado")
+    
+    usuario_id = current_user.get("user_id") or current_user.get("id")
+    if not await permission_manager.is_project_member(usuario_id, rows[0]['projeto_id']):
+        raise HTTPException(status_code=403, detail="Você não tem acesso a este projeto")
+    
+    uso = await armazenamento_delta.uso_disco(db, documento_id)
+    return {"success": True, **uso}
 
 
 @router.delete("/{documento_id}")
 async def deletar_documento(
     documento_id: int,
-    current_user: dict = Depends(get_current_user)
+    current_user: dict = Depends(get_current_user),
+    db: AsyncDatabaseHelper = Depends(get_db)
 ):
     """Deleta um documento e todas suas versões"""
-    from database.db_helper import get_db_connection
-    
-    conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
+    conn = await db.acquire()
+    cursor = await conn.cursor()
     
     try:
-        # Buscar arquivos para deletar
-        cursor.execute("""
-            SELECT caminho_arquivo FROM documentos WHERE id = %s
-            UNION
-            SELECT caminho_arquivo FROM versoes_documento WHERE documento_id = %s
+        # Buscar arquivos para deletar (uma linha por referência)
+        await cursor.execute("""
+            SELECT caminho_arquivo, sha256 FROM documentos WHERE id = %s
+            UNION ALL
+            SELECT caminho_arquivo, sha256 FROM versoes_documento WHERE documento_id = %s
         """, (documento_id, documento_id))
         
-        arquivos = cursor.fetchall()
+        arquivos = await cursor.fetchall()
         
-        # Deletar do banco
-        cursor.execute("DELETE FROM documentos WHERE id = %s", (documento_id,))
-        conn.commit()
+        # Liberar referências aos blobs e deletar do banco
+        liberados = await blob_store.liberar(cursor, [a['sha256'] for a in arquivos])
+        await cursor.execute("DELETE FROM documentos WHERE id = %s", (documento_id,))
+        await conn.commit()
         
-        # Deletar arquivos físicos
-        for arquivo in arquivos:
-            caminho = arquivo['caminho_arquivo']
-            if os.path.exists(caminho):
-                os.remove(caminho)
+        # Blobs sem referência e arquivos anteriores aos blobs (sem hash) saem
+        # em segundo plano; a resposta não espera pelo disco
+        blob_store.agendar_coleta(
+            db, liberados, {a['caminho_arquivo'] for a in arquivos if not a['sha256']}
+        )
         
         return {
             "success": True,
@@ -362,8 +632,8 @@ async def deletar_documento(
         }
         
     except Exception as e:
-        conn.rollback()
+        await conn.rollback()
         raise HTTPException(status_code=500, detail=str(e))
     finally:
-        cursor.close()
-        conn.close()
+        await cursor.close()
+        await db.release(conn)
@@ -15,8 +15,10 @@ from pydantic import BaseModel
 database_dir = Path(__file__).parent.parent.parent / "database"
 sys.path.insert(0, str(database_dir))
 
-from db_helper import DatabaseHelper
+from async_db_helper import AsyncDatabaseHelper
 from middleware.auth_middleware import get_current_active_user
+from middleware.database import get_db, apos_confirmar
+from middleware.permissions import permission_manager
 
 router = APIRouter(prefix="/equipes", tags=["Equipes"])
 
@@ -57,7 +59,8 @@ class PermissaoCreate(BaseModel):
 async def listar_membros_projeto(
     projeto_id: int,
     ativo: Optional[bool] = None,
-    current_user: dict = Depends(get_current_active_user)
+    current_user: dict = Depends(get_current_active_user),
+    db: AsyncDatabaseHelper = Depends(get_db)
 ):
     """
     Lista todos os membros de um projeto
@@ -69,19 +72,15 @@ async def listar_membros_projeto(
     Returns:
         Lista de membros com informações do usuário
     """
-    db = DatabaseHelper()
+    conn = None
     
     try:
-        if not db.connect():
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail="Erro ao conectar no banco de dados"
-            )
+        conn = await db.acquire()
         
         # Verificar se projeto existe
-        cursor = db.connection.cursor(dictionary=True)
-        cursor.execute("SELECT id, nome FROM projetos WHERE id = %s", (projeto_id,))
-        projeto = cursor.fetchone()
+        cursor = await conn.cursor()
+        await cursor.execute("SELECT id, nome FROM projetos WHERE id = %s", (projeto_id,))
+        projeto = await cursor.fetchone()
         
         if not projeto:
             raise HTTPException(
@@ -116,10 +115,10 @@ async def listar_membros_projeto(
         
         query += " ORDER BY e.data_entrada DESC"
         
-        cursor.execute(query, params)
-        membros = cursor.fetchall()
+        await cursor.execute(query, params)
+        membros = await cursor.fetchall()
         
-        cursor.close()
+        await cursor.close()
         
         return [
             MembroEquipe(
@@ -146,13 +145,14 @@ async def listar_membros_projeto(
             detail=f"Erro ao listar membros: {str(e)}"
         )
     finally:
-        db.disconnect()
+        await db.release(conn)
 
 
 @router.post("/", status_code=status.HTTP_201_CREATED)
 async def adicionar_membro(
     membro: EquipeCreate,
-    current_user: dict = Depends(get_current_active_user)
+    current_user: dict = Depends(get_current_active_user),
+    db: AsyncDatabaseHelper = Depends(get_db)
 ):
     """
     Adiciona um novo membro à equipe do projeto
@@ -163,42 +163,38 @@ async def adicionar_membro(
     Returns:
         ID do membro criado
     """
-    db = DatabaseHelper()
+    conn = None
     
     try:
-        if not db.connect():
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail="Erro ao conectar no banco de dados"
-            )
+        conn = await db.acquire()
         
-        cursor = db.connection.cursor(dictionary=True)
+        cursor = await conn.cursor()
         
         # Verificar se projeto existe
-        cursor.execute("SELECT id FROM projetos WHERE id = %s", (membro.projeto_id,))
-        if not cursor.fetchone():
+        await cursor.execute("SELECT id FROM projetos WHERE id = %s", (membro.projeto_id,))
+        if not await cursor.fetchone():
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail=f"Projeto {membro.projeto_id} não encontrado"
             )
         
         # Verificar se usuário existe
-        cursor.execute("SELECT id FROM usuarios WHERE id = %s", (membro.usuario_id,))
-        if not cursor.fetchone():
+        await cursor.execute("SELECT id FROM usuarios WHERE id = %s", (membro.usuario_id,))
+        if not await cursor.fetchone():
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail=f"Usuário {membro.usuario_id} não encontrado"
             )
         
         # Verificar se já existe membro ativo
-        cursor.execute(
+        await cursor.execute(
             """
             SELECT id FROM equipes 
             WHERE projeto_id = %s AND usuario_id = %s AND ativo = TRUE
             """,
             (membro.projeto_id, membro.usuario_id)
         )
-        if cursor.fetchone():
+        if await cursor.fetchone():
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Usuário já é membro ativo deste projeto"
@@ -217,7 +213,7 @@ async def adicionar_membro(
             INSERT INTO equipes (projeto_id, usuario_id, papel, data_entrada, ativo)
             VALUES (%s, %s, %s, %s, TRUE)
         """
-        cursor.execute(query, (
+        await cursor.execute(query, (
             membro.projeto_id,
             membro.usuario_id,
             membro.papel,
@@ -225,8 +221,10 @@ async def adicionar_membro(
         ))
         
         membro_id = cursor.lastrowid
-        db.connection.commit()
-        cursor.close()
+        await conn.commit()
+        await cursor.close()
+        
+        apos_confirmar(lambda: permission_manager.invalidate(membro.usuario_id, membro.projeto_id))
         
         return {
             "message": "Membro adicionado à equipe com sucesso",
@@ -236,20 +234,22 @@ async def adicionar_membro(
     except HTTPException:
         raise
     except Exception as e:
-        db.connection.rollback()
+        if conn:
+            await conn.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Erro ao adicionar membro: {str(e)}"
         )
     finally:
-        db.disconnect()
+        await db.release(conn)
 
 
 @router.put("/{membro_id}")
 async def atualizar_membro(
     membro_id: int,
     dados: EquipeUpdate,
-    current_user: dict = Depends(get_current_active_user)
+    current_user: dict = Depends(get_current_active_user),
+    db: AsyncDatabaseHelper = Depends(get_db)
 ):
     """
     Atualiza dados de um membro da equipe (papel, status, data_saida)
@@ -261,20 +261,20 @@ async def atualizar_membro(
     Returns:
         Mensagem de sucesso
     """
-    db = DatabaseHelper()
+    conn = None
     
     try:
-        if not db.connect():
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail="Erro ao conectar no banco de dados"
-            )
+        conn = await db.acquire()
         
-        cursor = db.connection.cursor(dictionary=True)
+        cursor = await conn.cursor()
         
         # Verificar se membro existe
-        cursor.execute("SELECT id FROM equipes WHERE id = %s", (membro_id,))
-        if not cursor.fetchone():
+        await cursor.execute(
+            "SELECT id, projeto_id, usuario_id FROM equipes WHERE id = %s",
+            (membro_id,)
+        )
+        existente = await cursor.fetchone()
+        if not existente:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail=f"Membro {membro_id} não encontrado"
@@ -308,28 +308,32 @@ async def atualizar_membro(
         params.append(membro_id)
         query = f"UPDATE equipes SET {', '.join(updates)} WHERE id = %s"
         
-        cursor.execute(query, params)
-        db.connection.commit()
-        cursor.close()
+        await cursor.execute(query, params)
+        await conn.commit()
+        await cursor.close()
+        
+        apos_confirmar(lambda: permission_manager.invalidate(existente['usuario_id'], existente['projeto_id']))
         
         return {"message": "Membro atualizado com sucesso"}
         
     except HTTPException:
         raise
     except Exception as e:
-        db.connection.rollback()
+        if conn:
+            await conn.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Erro ao atualizar membro: {str(e)}"
         )
     finally:
-        db.disconnect()
+        await db.release(conn)
 
 
 @router.delete("/{membro_id}")
 async def remover_membro(
     membro_id: int,
-    current_user: dict = Depends(get_current_active_user)
+    current_user: dict = Depends(get_current_active_user),
+    db: AsyncDatabaseHelper = Depends(get_db)
 ):
     """
     Remove um membro da equipe (soft delete - marca como inativo)
@@ -340,20 +344,20 @@ async def remover_membro(
     Returns:
         Mensagem de sucesso
     """
-    db = DatabaseHelper()
+    conn = None
     
     try:
-        if not db.connect():
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail="Erro ao conectar no banco de dados"
-            )
+        conn = await db.acquire()
         
-        cursor = db.connection.cursor(dictionary=True)
+        cursor = await conn.cursor()
         
         # Verificar se membro existe
-        cursor.execute("SELECT id FROM equipes WHERE id = %s", (membro_id,))
-        if not cursor.fetchone():
+        await cursor.execute(
+            "SELECT id, projeto_id, usuario_id FROM equipes WHERE id = %s",
+            (membro_id,)
+        )
+        existente = await cursor.fetchone()
+        if not existente:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail=f"Membro {membro_id} não encontrado"
@@ -361,7 +365,7 @@ async def remover_membro(
         
         # Soft delete: marca como inativo e define data_saida
         from datetime import date
-        cursor.execute(
+        await cursor.execute(
             """
             UPDATE equipes 
             SET ativo = FALSE, data_saida = %s 
@@ -370,28 +374,32 @@ async def remover_membro(
             (date.today(), membro_id)
         )
         
-        db.connection.commit()
-        cursor.close()
+        await conn.commit()
+        await cursor.close()
+        
+        apos_confirmar(lambda: permission_manager.invalidate(existente['usuario_id'], existente['projeto_id']))
         
         return {"message": "Membro removido da equipe com sucesso"}
         
     except HTTPException:
         raise
     except Exception as e:
-        db.connection.rollback()
+        if conn:
+            await conn.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Erro ao remover membro: {str(e)}"
         )
     finally:
-        db.disconnect()
+        await db.release(conn)
 
 
 @router.get("/usuario/{usuario_id}/permissoes")
 async def listar_permissoes_usuario(
     usuario_id: int,
     projeto_id: Optional[int] = None,
-    current_user: dict = Depends(get_current_active_user)
+    current_user: dict = Depends(get_current_active_user),
+    db: AsyncDatabaseHelper = Depends(get_db)
 ):
     """
     Lista todas as permissões de um usuário (global ou por projeto)
@@ -403,20 +411,16 @@ async def listar_permissoes_usuario(
     Returns:
         Lista de permissões do usuário
     """
-    db = DatabaseHelper()
+    conn = None
     
     try:
-        if not db.connect():
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail="Erro ao conectar no banco de dados"
-            )
+        conn = await db.acquire()
         
-        cursor = db.connection.cursor(dictionary=True)
+        cursor = await conn.cursor()
         
         # Verificar se usuário existe
-        cursor.execute("SELECT id, nome FROM usuarios WHERE id = %s", (usuario_id,))
-        usuario = cursor.fetchone()
+        await cursor.execute("SELECT id, nome FROM usuarios WHERE id = %s", (usuario_id,))
+        usuario = await cursor.fetchone()
         if not usuario:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -444,9 +448,9 @@ async def listar_permissoes_usuario(
             query += " AND up.projeto_id = %s"
             params.append(projeto_id)
         
-        cursor.execute(query, params)
-        permissoes = cursor.fetchall()
-        cursor.close()
+        await cursor.execute(query, params)
+        permissoes = await cursor.fetchall()
+        await cursor.close()
         
         return {
             "usuario_id": usuario_id,
@@ -463,4 +467,4 @@ async def listar_permissoes_usuario(
             detail=f"Erro ao listar permissões: {str(e)}"
         )
     finally:
-        db.disconnect()
+        await db.release(conn)
@@ -2,10 +2,23 @@
 Rotas para gerenciamento de materiais
 Controle de estoque, fornecedores e consumo por projeto
 """
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Response
 from typing import Optional
 from pydantic import BaseModel
+import sys
+import os
+
+# Adicionar path do database
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'database'))
+from async_db_helper import AsyncDatabaseHelper
+
 from middleware.auth_middleware import get_current_user
+from middleware.database import get_db
+from utils.metricas_snapshot import snapshot_engine
+from utils.paginacao import (
+    Paginacao, parametros_paginacao, condicao_keyset, ordem_keyset,
+    proximo_cursor, aplicar_cabecalhos
+)
 
 router = APIRouter(prefix="/materiais", tags=["Materiais"])
 
@@ -25,20 +38,28 @@ class MaterialUpdate(BaseModel):
     fornecedor: Optional[str] = None
     descricao: Optional[str] = None
 
+# Chave de paginação dos materiais (ordem alfabética)
+CHAVE_MATERIAIS = ("m.nome", "m.id")
+
 @router.get("/{projeto_id}")
 async def listar_materiais(
     projeto_id: int,
+    response: Response,
     categoria: Optional[str] = None,
-    current_user: dict = Depends(get_current_user)
+    pagina: Paginacao = Depends(parametros_paginacao),
+    current_user: dict = Depends(get_current_user),
+    db: AsyncDatabaseHelper = Depends(get_db)
 ):
     """
-    Lista todos os materiais de um projeto
+    Lista os materiais de um projeto (paginado por cursor)
     Categorias: cimento, areia, brita, aco, madeira, eletrico, hidraulico, acabamento, outros
+    Totais do projeto (todas as páginas) apenas com incluir_total=true
     """
-    from database.db_helper import get_db_connection
+    # Cursor decodificado antes do try: adulterado gera 400, não 500
+    depois, params_cursor = condicao_keyset(CHAVE_MATERIAIS, pagina.cursor)
     
-    conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
+    conn = await db.acquire()
+    cursor = await conn.cursor()
     
     try:
         query = """
@@ -56,41 +77,52 @@ async def listar_materiais(
             query += " AND m.categoria = %s"
             params.append(categoria)
         
-        query += " ORDER BY m.nome"
+        await cursor.execute(
+            query + depois + f" {ordem_keyset(CHAVE_MATERIAIS)} LIMIT %s",
+            params + params_cursor + [pagina.limite + 1]
+        )
+        materiais = list(await cursor.fetchall())
+        proximo = proximo_cursor(materiais, pagina.limite, ("nome", "id"))
         
-        cursor.execute(query, params)
-        materiais = cursor.fetchall()
+        # Totais do filtro completo, calculados no banco
+        totais = {"total": None, "total_estoque": None, "total_usado": None}
+        if pagina.incluir_total:
+            await cursor.execute(f"""
+                SELECT COUNT(*) as total,
+                       COALESCE(SUM(valor_estoque), 0) as total_estoque,
+                       COALESCE(SUM(valor_usado), 0) as total_usado
+                FROM ({query}) filtrados
+            """, params)
+            totais = await cursor.fetchone()
         
-        # Calcular totais
-        total_estoque = sum(m['valor_estoque'] for m in materiais)
-        total_usado = sum(m['valor_usado'] for m in materiais)
+        aplicar_cabecalhos(response, proximo, totais['total'])
         
         return {
             "success": True,
-            "total_materiais": len(materiais),
-            "total_estoque": total_estoque,
-            "total_usado": total_usado,
-            "materiais": materiais
+            "total_materiais": totais['total'],
+            "total_estoque": totais['total_estoque'],
+            "total_usado": totais['total_usado'],
+            "materiais": materiais,
+            "proximo_cursor": proximo
         }
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
     finally:
-        cursor.close()
-        conn.close()
+        await cursor.close()
+        await db.release(conn)
 
 
 @router.post("/{projeto_id}")
 async def criar_material(
     projeto_id: int,
     material: MaterialCreate,
-    current_user: dict = Depends(get_current_user)
+    current_user: dict = Depends(get_current_user),
+    db: AsyncDatabaseHelper = Depends(get_db)
 ):
     """Adiciona um novo material ao projeto"""
-    from database.db_helper import get_db_connection
-    
-    conn = get_db_connection()
-    cursor = conn.cursor()
+    conn = await db.acquire()
+    cursor = await conn.cursor()
     
     try:
         query = """
@@ -99,14 +131,16 @@ async def criar_material(
              fornecedor, descricao, quantidade_estoque, quantidade_usada)
             VALUES (%s, %s, %s, %s, %s, %s, %s, 0, 0)
         """
-        cursor.execute(query, (
+        await cursor.execute(query, (
             projeto_id, material.nome, material.categoria,
             material.unidade, material.preco_unitario,
             material.fornecedor, material.descricao
         ))
         
         material_id = cursor.lastrowid
-        conn.commit()
+        await conn.commit()
+        
+        snapshot_engine.marcar_alterado(projeto_id)
         
         return {
             "success": True,
@@ -115,24 +149,23 @@ async def criar_material(
         }
         
     except Exception as e:
-        conn.rollback()
+        await conn.rollback()
         raise HTTPException(status_code=500, detail=str(e))
     finally:
-        cursor.close()
-        conn.close()
+        await cursor.close()
+        await db.release(conn)
 
 
 @router.put("/{material_id}")
 async def atualizar_material(
     material_id: int,
     material: MaterialUpdate,
-    current_user: dict = Depends(get_current_user)
+    current_user: dict = Depends(get_current_user),
+    db: AsyncDatabaseHelper = Depends(get_db)
 ):
     """Atualiza informações de um material"""
-    from database.db_helper import get_db_connection
-    
-    conn = get_db_connection()
-    cursor = conn.cursor()
+    conn = await db.acquire()
+    cursor = await conn.cursor()
     
     try:
         updates = []
@@ -163,8 +196,8 @@ async def atualizar_material(
         params.append(material_id)
         query = f"UPDATE materiais SET {', '.join(updates)} WHERE id = %s"
         
-        cursor.execute(query, params)
-        conn.commit()
+        await cursor.execute(query, params)
+        await conn.commit()
         
         return {
             "success": True,
@@ -172,33 +205,32 @@ async def atualizar_material(
         }
         
     except Exception as e:
-        conn.rollback()
+        await conn.rollback()
         raise HTTPException(status_code=500, detail=str(e))
     finally:
-        cursor.close()
-        conn.close()
+        await cursor.close()
+        await db.release(conn)
 
 
 @router.post("/{material_id}/adicionar-estoque")
 async def adicionar_estoque(
     material_id: int,
     quantidade: float,
-    current_user: dict = Depends(get_current_user)
+    current_user: dict = Depends(get_current_user),
+    db: AsyncDatabaseHelper = Depends(get_db)
 ):
     """Adiciona quantidade ao estoque de um material"""
-    from database.db_helper import get_db_connection
-    
-    conn = get_db_connection()
-    cursor = conn.cursor()
+    conn = await db.acquire()
+    cursor = await conn.cursor()
     
     try:
-        cursor.execute("""
+        await cursor.execute("""
             UPDATE materiais
             SET quantidade_estoque = quantidade_estoque + %s
             WHERE id = %s
         """, (quantidade, material_id))
         
-        conn.commit()
+        await conn.commit()
         
         return {
             "success": True,
@@ -206,32 +238,31 @@ async def adicionar_estoque(
         }
         
     except Exception as e:
-        conn.rollback()
+        await conn.rollback()
         raise HTTPException(status_code=500, detail=str(e))
     finally:
-        cursor.close()
-        conn.close()
+        await cursor.close()
+        await db.release(conn)
 
 
 @router.post("/{material_id}/usar")
 async def usar_material(
     material_id: int,
     quantidade: float,
-    current_user: dict = Depends(get_current_user)
+    current_user: dict = Depends(get_current_user),
+    db: AsyncDatabaseHelper = Depends(get_db)
 ):
     """Registra uso de material (consome do estoque)"""
-    from database.db_helper import get_db_connection
-    
-    conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
+    conn = await db.acquire()
+    cursor = await conn.cursor()
     
     try:
         # Verificar estoque disponível
-        cursor.execute("""
+        await cursor.execute("""
             SELECT quantidade_estoque FROM materiais WHERE id = %s
         """, (material_id,))
         
-        result = cursor.fetchone()
+        result = await cursor.fetchone()
         if not result:
             raise HTTPException(status_code=404, detail="Material não encontrado")
         
@@ -242,14 +273,14 @@ async def usar_material(
             )
         
         # Atualizar estoque e uso
-        cursor.execute("""
+        await cursor.execute("""
             UPDATE materiais
             SET quantidade_estoque = quantidade_estoque - %s,
                 quantidade_usada = quantidade_usada + %s
             WHERE id = %s
         """, (quantidade, quantidade, material_id))
         
-        conn.commit()
+        await conn.commit()
         
         return {
             "success": True,
@@ -259,39 +290,43 @@ async def usar_material(
     except HTTPException:
         raise
     except Exception as e:
-        conn.rollback()
+        await conn.rollback()
         raise HTTPException(status_code=500, detail=str(e))
     finally:
-        cursor.close()
-        conn.close()
+        await cursor.close()
+        await db.release(conn)
 
 
 @router.delete("/{material_id}")
 async def deletar_material(
     material_id: int,
-    current_user: dict = Depends(get_current_user)
+    current_user: dict = Depends(get_current_user),
+    db: AsyncDatabaseHelper = Depends(get_db)
 ):
     """Deleta um material do projeto"""
-    from database.db_helper import get_db_connection
-    
-    conn = get_db_connection()
-    cursor = conn.cursor()
+    conn = await db.acquire()
+    cursor = await conn.cursor()
     
     try:
-        cursor.execute("DELETE FROM materiais WHERE id = %s", (material_id,))
-        conn.commit()
+        await cursor.execute("SELECT projeto_id FROM materiais WHERE id = %s", (material_id,))
+        existente = await cursor.fetchone()
+        
+        await cursor.execute("DELETE FROM materiais WHERE id = %s", (material_id,))
+        await conn.commit()
         
         if cursor.rowcount == 0:
             raise HTTPException(status_code=404, detail="Material não encontrado")
         
+        snapshot_engine.marcar_alterado(existente['projeto_id'])
+        
         return {
             "success": True,
             "message": "Material deletado com sucesso"
         }
         
     except Exception as e:
-        conn.rollback()
+        await conn.rollback()
         raise HTTPException(status_code=500, detail=str(e))
     finally:
-        cursor.close()
-        conn.close()
+        await cursor.close()
+        await db.release(conn)
@@ -4,201 +4,571 @@ Análise de progresso, produtividade e indicadores de desempenho
 """
 from fastapi import APIRouter, Depends, HTTPException
 from typing import Optional
+from datetime import date
+import json
+import sys
+import os
+
+# Adicionar path do database
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'database'))
+from async_db_helper import AsyncDatabaseHelper
+
 from middleware.auth_middleware import get_current_user
+from middleware.database import get_db
+from utils.metricas_snapshot import snapshot_engine, ALTERADO_EM_SQL
 
 router = APIRouter(prefix="/metricas", tags=["Métricas"])
 
+# ===== CONSULTAS COMPARTILHADAS =====
+
+# Todos os indicadores do dashboard em uma única ida ao banco:
+# cada tabela é agregada em uma tabela derivada de uma linha;
+# {colunas}/{juncoes} acrescentam as seções do relatório completo
+_DASHBOARD_BASE = """
+    SELECT 
+        p.id, p.nome, p.status, p.data_inicio, p.data_fim_prevista,
+        t.total, t.a_fazer, t.em_execucao, t.concluidas, t.atrasadas,
+        e.total_membros,
+        o.orcamento_total, o.gasto_total,
+        m.total_materiais, m.valor_estoque,
+        d.total_documentos{colunas}
+    FROM projetos p
+    CROSS JOIN (
+        SELECT 
+            COUNT(*) as total,
+            SUM(CASE WHEN status = 'a_fazer' THEN 1 ELSE 0 END) as a_fazer,
+            SUM(CASE WHEN status = 'em_andamento' THEN 1 ELSE 0 END) as em_execucao,
+            SUM(CASE WHEN status = 'concluida' THEN 1 ELSE 0 END) as concluidas,
+            SUM(CASE WHEN data_fim_prevista < CURDATE() AND status != 'concluida' THEN 1 ELSE 0 END) as atrasadas
+        FROM tarefas
+        WHERE projeto_id = %s
+    ) t
+    CROSS JOIN (
+        SELECT COUNT(*) as total_membros
+        FROM equipes
+        WHERE projeto_id = %s
+    ) e
+    CROSS JOIN (
+        SELECT 
+            SUM(valor_previsto) as orcamento_total,
+            SUM(valor_real) as gasto_total
+        FROM orcamentos
+        WHERE projeto_id = %s
+    ) o
+    CROSS JOIN (
+        SELECT 
+            COUNT(*) as total_materiais,
+            SUM(preco_unitario * (quantidade_prevista - quantidade_utilizada)) as valor_estoque
+        FROM materiais
+        WHERE projeto_id = %s
+    ) m
+    CROSS JOIN (
+        SELECT COUNT(*) as total_documentos
+        FROM documentos
+        WHERE projeto_id = %s
+    ) d{juncoes}
+    WHERE p.id = %s
+"""
+
+DASHBOARD_QUERY = _DASHBOARD_BASE.format(colunas="", juncoes="")
+
+# Relatório completo: dashboard + produtividade (janela de %s dias) +
+# financeiro por categoria na mesma linha; listas vêm em JSON_ARRAYAGG
+RELATORIO_QUERY = _DASHBOARD_BASE.format(
+    colunas=""",
+        c.total_concluidas, c.no_prazo, c.concluidas_atrasadas,
+        pm.por_membro, ev.evolucao, fc.financeiro""",
+    juncoes="""
+    CROSS JOIN (
+        SELECT JSON_ARRAYAGG(JSON_OBJECT(
+            'usuario_id', x.usuario_id, 'nome', x.nome, 'cargo', x.cargo,
+            'tarefas_concluidas', x.tarefas_concluidas, 'tempo_medio_dias', x.tempo_medio_dias
+        )) as por_membro
+        FROM (
+            SELECT 
+                e.usuario_id,
+                u.nome,
+                u.cargo,
+                COUNT(t.id) as tarefas_concluidas,
+                AVG(DATEDIFF(t.data_fim_real, t.data_inicio)) as tempo_medio_dias
+            FROM equipes e
+            LEFT JOIN usuarios u ON e.usuario_id = u.id
+            LEFT JOIN tarefas t ON t.responsavel_id = e.usuario_id 
+                AND t.projeto_id = %s
+                AND t.status = 'concluida'
+                AND t.data_fim_real >= DATE_SUB(CURDATE(), INTERVAL %s DAY)
+            WHERE e.projeto_id = %s
+            GROUP BY e.usuario_id, u.nome, u.cargo
+        ) x
+    ) pm
+    CROSS JOIN (
+        SELECT 
+            COUNT(*) as total_concluidas,
+            SUM(CASE WHEN data_fim_real <= data_fim_prevista THEN 1 ELSE 0 END) as no_prazo,
+            SUM(CASE WHEN data_fim_real > data_fim_prevista THEN 1 ELSE 0 END) as concluidas_atrasadas
+        FROM tarefas
+        WHERE projeto_id = %s
+          AND status = 'concluida'
+          AND data_fim_real >= DATE_SUB(CURDATE(), INTERVAL %s DAY)
+    ) c
+    CROSS JOIN (
+        SELECT JSON_ARRAYAGG(JSON_OBJECT(
+            'data_registro', data_registro, 'tarefas_concluidas', tarefas_concluidas,
+            'tarefas_atrasadas', tarefas_atrasadas, 'progresso_fisico', progresso_fisico
+        )) as evolucao
+        FROM metricas_projeto
+        WHERE projeto_id = %s
+          AND data_registro >= DATE_SUB(CURDATE(), INTERVAL %s DAY)
+    ) ev
+    CROSS JOIN (
+        SELECT JSON_ARRAYAGG(JSON_OBJECT(
+            'categoria', x.categoria, 'previsto', x.previsto, 'gasto', x.gasto
+        )) as financeiro
+        FROM (
+            SELECT 
+                categoria,
+                SUM(valor_previsto) as previsto,
+                SUM(valor_real) as gasto
+            FROM orcamentos
+            WHERE projeto_id = %s
+            GROUP BY categoria
+        ) x
+    ) fc"""
+)
+
+
+def _parametros_relatorio(projeto_id: int, periodo_dias: int) -> tuple:
+    """Parâmetros de RELATORIO_QUERY, na ordem das tabelas derivadas"""
+    return (
+        (projeto_id,) * 5
+        + (projeto_id, periodo_dias, projeto_id)  # pm
+        + (projeto_id, periodo_dias)  # c
+        + (projeto_id, periodo_dias)  # ev
+        + (projeto_id,)  # fc
+        + (projeto_id,)  # WHERE p.id
+    )
+
+
+def _lista_json(valor) -> list:
+    """JSON_ARRAYAGG chega como texto (ou NULL, sem linhas)"""
+    if valor is None:
+        return []
+    return json.loads(valor) if isinstance(valor, (str, bytes)) else list(valor)
+
+
+# Snapshot mais recente do projeto, com os mesmos aliases de DASHBOARD_QUERY
+SNAPSHOT_DASHBOARD_QUERY = """
+    SELECT 
+        p.id, p.nome, p.status, p.data_inicio, p.data_fim_prevista,
+        m.data_registro, m.atualizado_em as snapshot_em,
+        m.tarefas_total as total,
+        m.tarefas_a_fazer as a_fazer,
+        m.tarefas_em_execucao as em_execucao,
+        m.tarefas_concluidas as concluidas,
+        m.tarefas_atrasadas as atrasadas,
+        m.total_membros,
+        m.orcamento_total,
+        m.valor_gasto as gasto_total,
+        m.total_materiais,
+        m.valor_estoque,
+        m.total_documentos,
+        """ + ALTERADO_EM_SQL + """ as alterado_em
+    FROM projetos p
+    LEFT JOIN metricas_projeto m ON m.projeto_id = p.id
+    WHERE p.id = %s
+    ORDER BY m.data_registro DESC
+    LIMIT 1
+"""
+
+
+def _variacao(anterior: dict, atual: dict) -> dict:
+    """Diferença numérica (atual - anterior) entre duas respostas do dashboard"""
+    variacao = {}
+    for secao in ('tarefas', 'equipe', 'orcamento', 'materiais', 'documentos'):
+        variacao[secao] = {
+            chave: (valor or 0) - (anterior[secao].get(chave) or 0)
+            for chave, valor in atual[secao].items()
+        }
+    return variacao
+
+
+def _montar_dashboard(row: dict) -> dict:
+    """
+    Monta a resposta do dashboard a partir de uma linha agregada
+
+    Args:
+        row: Linha com os aliases de DASHBOARD_QUERY
+
+    Returns:
+        Dicionário no formato de GET /metricas/{projeto_id}/dashboard
+    """
+    tarefas = {
+        chave: row[chave]
+        for chave in ('total', 'a_fazer', 'em_execucao', 'concluidas', 'atrasadas')
+    }
+
+    # Calcular progresso geral
+    progresso = 0
+    if tarefas['total'] > 0:
+        progresso = (tarefas['concluidas'] / tarefas['total']) * 100
+
+    orcamento_total = row['orcamento_total'] or 0
+    gasto_total = row['gasto_total'] or 0
+
+    return {
+        "success": True,
+        "projeto": {
+            "id": row['id'],
+            "nome": row['nome'],
+            "status": row['status'],
+            "progresso": round(progresso, 1),
+            "data_inicio": row['data_inicio'],
+            "data_fim_prevista": row['data_fim_prevista']
+        },
+        "tarefas": tarefas,
+        "equipe": {"total_membros": row['total_membros']},
+        "orcamento": {
+            "total": orcamento_total,
+            "gasto": gasto_total,
+            "saldo": orcamento_total - gasto_total,
+            "percentual_gasto": round(gasto_total / (orcamento_total or 1) * 100, 1)
+        },
+        "materiais": {
+            "total_materiais": row['total_materiais'],
+            "valor_estoque": row['valor_estoque']
+        },
+        "documentos": {"total_documentos": row['total_documentos']}
+    }
+
+
+async def _carregar_dashboard(cursor, projeto_id: int) -> dict:
+    """
+    Executa a consulta do dashboard (ao vivo) e monta a resposta
+
+    Args:
+        cursor: Cursor aberto (DictCursor)
+        projeto_id: ID do projeto
+
+    Returns:
+        Dicionário no formato de GET /metricas/{projeto_id}/dashboard
+
+    Raises:
+        HTTPException 404 se o projeto não existir
+    """
+    await cursor.execute(DASHBOARD_QUERY, (projeto_id,) * 6)
+    row = await cursor.fetchone()
+
+    if not row:
+        raise HTTPException(status_code=404, detail="Projeto não encontrado")
+
+    dashboard = _montar_dashboard(row)
+    dashboard["fonte"] = {"tipo": "tempo_real"}
+    return dashboard
+
+
+async def _carregar_dashboard_snapshot(cursor, projeto_id: int) -> Optional[dict]:
+    """
+    Monta o dashboard a partir do snapshot mais recente (metricas_projeto)
+
+    Args:
+        cursor: Cursor aberto (DictCursor)
+        projeto_id: ID do projeto
+
+    Returns:
+        Dicionário no formato do dashboard ou None se ainda não houver snapshot
+
+    Raises:
+        HTTPException 404 se o projeto não existir
+    """
+    await cursor.execute(SNAPSHOT_DASHBOARD_QUERY, (projeto_id,) * 4)
+    row = await cursor.fetchone()
+
+    if not row:
+        raise HTTPException(status_code=404, detail="Projeto não encontrado")
+
+    if row['data_registro'] is None:
+        return None
+
+    dashboard = _montar_dashboard(row)
+    dashboard["fonte"] = {
+        "tipo": "snapshot",
+        "data_registro": row['data_registro'],
+        "atualizado_em": row['snapshot_em'],
+        "desatualizado": snapshot_engine.desatualizado(projeto_id, row['snapshot_em'], row['alterado_em'])
+    }
+    return dashboard
+
+
+async def _carregar_produtividade(cursor, projeto_id: int, periodo_dias: int) -> dict:
+    """
+    Executa as consultas de produtividade e monta a resposta
+
+    Args:
+        cursor: Cursor aberto (DictCursor)
+        projeto_id: ID do projeto
+        periodo_dias: Janela de análise em dias
+
+    Returns:
+        Dicionário no formato de GET /metricas/{projeto_id}/produtividade
+    """
+    # Tarefas concluídas por membro nos últimos X dias
+    await cursor.execute("""
+        SELECT 
+            e.usuario_id,
+            u.nome,
+            u.cargo,
+            COUNT(t.id) as tarefas_concluidas,
+            AVG(DATEDIFF(t.data_fim_real, t.data_inicio)) as tempo_medio_dias
+        FROM equipes e
+        LEFT JOIN usuarios u ON e.usuario_id = u.id
+        LEFT JOIN tarefas t ON t.responsavel_id = e.usuario_id 
+            AND t.projeto_id = %s
+            AND t.status = 'concluida'
+            AND t.data_fim_real >= DATE_SUB(CURDATE(), INTERVAL %s DAY)
+        WHERE e.projeto_id = %s
+        GROUP BY e.usuario_id, u.nome, u.cargo
+        ORDER BY tarefas_concluidas DESC
+    """, (projeto_id, periodo_dias, projeto_id))
+    
+    por_membro = await cursor.fetchall()
+    
+    # Taxa de conclusão no prazo
+    await cursor.execute("""
+        SELECT 
+            COUNT(*) as total_concluidas,
+            SUM(CASE WHEN data_fim_real <= data_fim_prevista THEN 1 ELSE 0 END) as no_prazo,
+            SUM(CASE WHEN data_fim_real > data_fim_prevista THEN 1 ELSE 0 END) as atrasadas
+        FROM tarefas
+        WHERE projeto_id = %s
+          AND status = 'concluida'
+          AND data_fim_real >= DATE_SUB(CURDATE(), INTERVAL %s DAY)
+    """, (projeto_id, periodo_dias))
+    
+    conclusao = await cursor.fetchone()
+    
+    # Evolução diária do período (snapshots)
+    await cursor.execute("""
+        SELECT data_registro, tarefas_concluidas, tarefas_atrasadas, progresso_fisico
+        FROM metricas_projeto
+        WHERE projeto_id = %s
+          AND data_registro >= DATE_SUB(CURDATE(), INTERVAL %s DAY)
+        ORDER BY data_registro
+    """, (projeto_id, periodo_dias))
+    
+    evolucao = await cursor.fetchall()
+    
+    return _montar_produtividade(
+        periodo_dias, por_membro,
+        conclusao['total_concluidas'], conclusao['no_prazo'], conclusao['atrasadas'],
+        evolucao
+    )
+
+
+def _montar_produtividade(
+    periodo_dias: int,
+    por_membro: list,
+    total_concluidas: int,
+    no_prazo: int,
+    atrasadas: int,
+    evolucao: list
+) -> dict:
+    """
+    Monta a resposta de produtividade
+
+    Returns:
+        Dicionário no formato de GET /metricas/{projeto_id}/produtividade
+    """
+    taxa_no_prazo = 0
+    if total_concluidas:
+        taxa_no_prazo = ((no_prazo or 0) / total_concluidas) * 100
+    
+    concluidas_periodo = 0
+    if len(evolucao) > 1:
+        concluidas_periodo = evolucao[-1]['tarefas_concluidas'] - evolucao[0]['tarefas_concluidas']
+    
+    return {
+        "success": True,
+        "periodo_dias": periodo_dias,
+        "por_membro": por_membro,
+        "conclusao_prazo": {
+            "total": total_concluidas,
+            "no_prazo": no_prazo,
+            "atrasadas": atrasadas,
+            "taxa_sucesso": round(taxa_no_prazo, 1)
+        },
+        "evolucao": {
+            "concluidas_no_periodo": concluidas_periodo,
+            "diario": evolucao
+        }
+    }
+
+
+# ===== ENDPOINTS =====
+
 @router.get("/{projeto_id}/dashboard")
 async def dashboard_projeto(
     projeto_id: int,
-    current_user: dict = Depends(get_current_user)
+    tempo_real: bool = False,
+    current_user: dict = Depends(get_current_user),
+    db: AsyncDatabaseHelper = Depends(get_db)
 ):
-    """Retorna métricas gerais do projeto para dashboard"""
-    from database.db_helper import get_db_connection
+    """
+    Retorna métricas gerais do projeto para dashboard
     
-    conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
+    Lê o snapshot mais recente de metricas_projeto. Com tempo_real=true
+    (ou se o projeto mudou desde o último snapshot) recalcula ao vivo e
+    informa a variação em relação ao snapshot.
+    """
+    conn = await db.acquire()
+    cursor = await conn.cursor()
     
     try:
-        # Informações básicas do projeto
-        cursor.execute("""
-            SELECT * FROM projetos WHERE id = %s
-        """, (projeto_id,))
-        projeto = cursor.fetchone()
-        
-        if not projeto:
-            raise HTTPException(status_code=404, detail="Projeto não encontrado")
-        
-        # Tarefas
-        cursor.execute("""
-            SELECT 
-                COUNT(*) as total,
-                SUM(CASE WHEN status = 'a_fazer' THEN 1 ELSE 0 END) as a_fazer,
-                SUM(CASE WHEN status = 'em_execucao' THEN 1 ELSE 0 END) as em_execucao,
-                SUM(CASE WHEN status = 'concluida' THEN 1 ELSE 0 END) as concluidas,
-                SUM(CASE WHEN data_limite < CURDATE() AND status != 'concluida' THEN 1 ELSE 0 END) as atrasadas
-            FROM tarefas
-            WHERE projeto_id = %s
-        """, (projeto_id,))
-        tarefas = cursor.fetchone()
-        
-        # Membros da equipe
-        cursor.execute("""
-            SELECT COUNT(*) as total_membros
-            FROM equipes
-            WHERE projeto_id = %s
-        """, (projeto_id,))
-        equipe = cursor.fetchone()
-        
-        # Orçamento
-        cursor.execute("""
-            SELECT 
-                SUM(valor_previsto) as orcamento_total,
-                SUM(valor_gasto) as gasto_total
-            FROM orcamentos
-            WHERE projeto_id = %s
-        """, (projeto_id,))
-        orcamento = cursor.fetchone()
+        snapshot = await _carregar_dashboard_snapshot(cursor, projeto_id)
         
-        # Materiais
-        cursor.execute("""
-            SELECT 
-                COUNT(*) as total_materiais,
-                SUM(preco_unitario * quantidade_estoque) as valor_estoque
-            FROM materiais
-            WHERE projeto_id = %s
-        """, (projeto_id,))
-        materiais = cursor.fetchone()
-        
-        # Documentos
-        cursor.execute("""
-            SELECT COUNT(*) as total_documentos
-            FROM documentos
-            WHERE projeto_id = %s
-        """, (projeto_id,))
-        docs = cursor.fetchone()
+        if snapshot and not tempo_real and not snapshot["fonte"]["desatualizado"]:
+            return snapshot
         
-        # Calcular progresso geral
-        progresso = 0
-        if tarefas['total'] > 0:
-            progresso = (tarefas['concluidas'] / tarefas['total']) * 100
-        
-        return {
-            "success": True,
-            "projeto": {
-                "id": projeto['id'],
-                "nome": projeto['nome'],
-                "status": projeto['status'],
-                "progresso": round(progresso, 1),
-                "data_inicio": projeto['data_inicio'],
-                "data_fim_prevista": projeto['data_fim_prevista']
-            },
-            "tarefas": tarefas,
-            "equipe": equipe,
-            "orcamento": {
-                "total": orcamento['orcamento_total'] or 0,
-                "gasto": orcamento['gasto_total'] or 0,
-                "saldo": (orcamento['orcamento_total'] or 0) - (orcamento['gasto_total'] or 0),
-                "percentual_gasto": round((orcamento['gasto_total'] or 0) / (orcamento['orcamento_total'] or 1) * 100, 1)
-            },
-            "materiais": materiais,
-            "documentos": docs
-        }
+        dashboard = await _carregar_dashboard(cursor, projeto_id)
+        if snapshot:
+            dashboard["fonte"]["variacao_desde_snapshot"] = _variacao(snapshot, dashboard)
+            dashboard["fonte"]["data_registro"] = snapshot["fonte"]["data_registro"]
+        return dashboard
         
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
     finally:
-        cursor.close()
-        conn.close()
+        await cursor.close()
+        await db.release(conn)
 
 
 @router.get("/{projeto_id}/produtividade")
 async def analise_produtividade(
     projeto_id: int,
     periodo_dias: int = 30,
-    current_user: dict = Depends(get_current_user)
+    current_user: dict = Depends(get_current_user),
+    db: AsyncDatabaseHelper = Depends(get_db)
 ):
     """Análise de produtividade da equipe"""
-    from database.db_helper import get_db_connection
+    conn = await db.acquire()
+    cursor = await conn.cursor()
+    
+    try:
+        return await _carregar_produtividade(cursor, projeto_id, periodo_dias)
+        
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        await cursor.close()
+        await db.release(conn)
+
+
+@router.get("/{projeto_id}/curva-s")
+async def curva_s_projeto(
+    projeto_id: int,
+    tempo_real: bool = False,
+    current_user: dict = Depends(get_current_user),
+    db: AsyncDatabaseHelper = Depends(get_db)
+):
+    """
+    Curva S do projeto: progresso físico e financeiro acumulados por dia
     
-    conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
+    Série lida dos snapshots diários; o planejado é linear entre
+    data_inicio e data_fim_prevista. Com tempo_real=true o ponto de hoje
+    é recalculado ao vivo.
+    """
+    conn = await db.acquire()
+    cursor = await conn.cursor()
     
     try:
-        # Tarefas concluídas por membro nos últimos X dias
-        cursor.execute("""
+        await cursor.execute("""
             SELECT 
-                e.usuario_id,
-                u.nome,
-                u.cargo,
-                COUNT(t.id) as tarefas_concluidas,
-                AVG(DATEDIFF(t.data_conclusao, t.data_inicio)) as tempo_medio_dias
-            FROM equipes e
-            LEFT JOIN usuarios u ON e.usuario_id = u.id
-            LEFT JOIN tarefas t ON t.responsavel_id = e.usuario_id 
-                AND t.projeto_id = %s
-                AND t.status = 'concluida'
-                AND t.data_conclusao >= DATE_SUB(CURDATE(), INTERVAL %s DAY)
-            WHERE e.projeto_id = %s
-            GROUP BY e.usuario_id, u.nome, u.cargo
-            ORDER BY tarefas_concluidas DESC
-        """, (projeto_id, periodo_dias, projeto_id))
+                p.data_inicio,
+                p.data_fim_prevista,
+                m.data_registro,
+                m.progresso_fisico,
+                m.progresso_financeiro,
+                m.valor_gasto,
+                m.orcamento_total,
+                m.atualizado_em as snapshot_em,
+                """ + ALTERADO_EM_SQL + """ as alterado_em
+            FROM projetos p
+            LEFT JOIN metricas_projeto m ON m.projeto_id = p.id
+            WHERE p.id = %s
+            ORDER BY m.data_registro
+        """, (projeto_id,) * 4)
         
-        por_membro = cursor.fetchall()
+        rows = await cursor.fetchall()
         
-        # Taxa de conclusão no prazo
-        cursor.execute("""
-            SELECT 
-                COUNT(*) as total_concluidas,
-                SUM(CASE WHEN data_conclusao <= data_limite THEN 1 ELSE 0 END) as no_prazo,
-                SUM(CASE WHEN data_conclusao > data_limite THEN 1 ELSE 0 END) as atrasadas
-            FROM tarefas
-            WHERE projeto_id = %s
-              AND status = 'concluida'
-              AND data_conclusao >= DATE_SUB(CURDATE(), INTERVAL %s DAY)
-        """, (projeto_id, periodo_dias))
+        if not rows:
+            raise HTTPException(status_code=404, detail="Projeto não encontrado")
+        
+        pontos = [
+            {
+                "data": r['data_registro'],
+                "progresso_fisico": r['progresso_fisico'],
+                "progresso_financeiro": r['progresso_financeiro'],
+                "valor_gasto": r['valor_gasto'],
+                "orcamento_total": r['orcamento_total']
+            }
+            for r in rows if r['data_registro'] is not None
+        ]
         
-        conclusao = cursor.fetchone()
+        ultimo = rows[-1]
+        if tempo_real or snapshot_engine.desatualizado(projeto_id, ultimo['snapshot_em'], ultimo['alterado_em']):
+            atual = await _carregar_dashboard(cursor, projeto_id)
+            hoje = {
+                "data": date.today(),
+                "progresso_fisico": atual['projeto']['progresso'],
+                "progresso_financeiro": atual['orcamento']['percentual_gasto'],
+                "valor_gasto": atual['orcamento']['gasto'],
+                "orcamento_total": atual['orcamento']['total']
+            }
+            if pontos and pontos[-1]['data'] == hoje['data']:
+                pontos[-1] = hoje
+            else:
+                pontos.append(hoje)
         
-        taxa_no_prazo = 0
-        if conclusao['total_concluidas'] > 0:
-            taxa_no_prazo = (conclusao['no_prazo'] / conclusao['total_concluidas']) * 100
+        # Linha de base planejada (linear)
+        inicio = rows[0]['data_inicio']
+        fim = rows[0]['data_fim_prevista']
+        for ponto in pontos:
+            ponto['planejado'] = None
+            if inicio and fim and fim > inicio:
+                fracao = (ponto['data'] - inicio).days / (fim - inicio).days
+                ponto['planejado'] = round(min(max(fracao, 0), 1) * 100, 1)
         
         return {
             "success": True,
-            "periodo_dias": periodo_dias,
-            "por_membro": por_membro,
-            "conclusao_prazo": {
-                "total": conclusao['total_concluidas'],
-                "no_prazo": conclusao['no_prazo'],
-                "atrasadas": conclusao['atrasadas'],
-                "taxa_sucesso": round(taxa_no_prazo, 1)
-            }
+            "projeto_id": projeto_id,
+            "data_inicio": inicio,
+            "data_fim_prevista": fim,
+            "pontos": pontos
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
     finally:
-        cursor.close()
-        conn.close()
+        await cursor.close()
+        await db.release(conn)
 
 
 @router.get("/{projeto_id}/timeline")
 async def timeline_projeto(
     projeto_id: int,
-    current_user: dict = Depends(get_current_user)
+    current_user: dict = Depends(get_current_user),
+    db: AsyncDatabaseHelper = Depends(get_db)
 ):
     """Timeline de atividades do projeto"""
-    from database.db_helper import get_db_connection
-    
-    conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
+    conn = await db.acquire()
+    cursor = await conn.cursor()
     
     try:
         # Histórico de ações (simplificado - você pode adicionar tabela de logs)
-        cursor.execute("""
+        await cursor.execute("""
             SELECT 
                 'tarefa_criada' as tipo,
                 t.titulo as descricao,
@@ -234,7 +604,7 @@ async def timeline_projeto(
             LIMIT 50
         """, (projeto_id, projeto_id, projeto_id))
         
-        eventos = cursor.fetchall()
+        eventos = await cursor.fetchall()
         
         return {
             "success": True,
@@ -245,38 +615,44 @@ async def timeline_projeto(
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
     finally:
-        cursor.close()
-        conn.close()
+        await cursor.close()
+        await db.release(conn)
 
 
 @router.get("/{projeto_id}/relatorio-completo")
 async def relatorio_completo(
     projeto_id: int,
-    current_user: dict = Depends(get_current_user)
+    current_user: dict = Depends(get_current_user),
+    db: AsyncDatabaseHelper = Depends(get_db)
 ):
-    """Relatório completo do projeto para exportação"""
-    from database.db_helper import get_db_connection
+    """
+    Relatório completo do projeto para exportação
     
-    conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
+    Dashboard, produtividade dos últimos 30 dias e financeiro por
+    categoria vêm de uma única consulta (RELATORIO_QUERY)
+    """
+    conn = await db.acquire()
+    cursor = await conn.cursor()
     
     try:
-        # Chamar todas as métricas
-        dashboard = await dashboard_projeto(projeto_id, current_user)
-        produtividade = await analise_produtividade(projeto_id, 30, current_user)
+        await cursor.execute(RELATORIO_QUERY, _parametros_relatorio(projeto_id, 30))
+        row = await cursor.fetchone()
         
-        # Adicionar análise financeira detalhada
-        cursor.execute("""
-            SELECT 
-                categoria,
-                SUM(valor_previsto) as previsto,
-                SUM(valor_gasto) as gasto
-            FROM orcamentos
-            WHERE projeto_id = %s
-            GROUP BY categoria
-        """, (projeto_id,))
+        if not row:
+            raise HTTPException(status_code=404, detail="Projeto não encontrado")
+        
+        dashboard = _montar_dashboard(row)
+        dashboard["fonte"] = {"tipo": "tempo_real"}
         
-        financeiro_detalhado = cursor.fetchall()
+        por_membro = sorted(
+            _lista_json(row['por_membro']), key=lambda m: m['tarefas_concluidas'], reverse=True
+        )
+        evolucao = sorted(_lista_json(row['evolucao']), key=lambda d: d['data_registro'])
+        produtividade = _montar_produtividade(
+            30, por_membro,
+            row['total_concluidas'], row['no_prazo'], row['concluidas_atrasadas'],
+            evolucao
+        )
         
         return {
             "success": True,
@@ -284,11 +660,13 @@ async def relatorio_completo(
             "projeto_id": projeto_id,
             "dashboard": dashboard,
             "produtividade": produtividade,
-            "financeiro_detalhado": financeiro_detalhado
+            "financeiro_detalhado": _lista_json(row['financeiro'])
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
     finally:
-        cursor.close()
-        conn.close()
+        await cursor.close()
+        await db.release(conn)
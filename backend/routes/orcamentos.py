@@ -2,10 +2,23 @@
 Rotas para gerenciamento de orçamentos
 Controle financeiro de custos por categoria e análise de gastos
 """
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Response
 from typing import Optional
 from pydantic import BaseModel
+import sys
+import os
+
+# Adicionar path do database
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'database'))
+from async_db_helper import AsyncDatabaseHelper
+
 from middleware.auth_middleware import get_current_user
+from middleware.database import get_db
+from utils.metricas_snapshot import snapshot_engine
+from utils.paginacao import (
+    Paginacao, parametros_paginacao, condicao_keyset, ordem_keyset,
+    proximo_cursor, aplicar_cabecalhos
+)
 
 router = APIRouter(prefix="/orcamentos", tags=["Orçamentos"])
 
@@ -24,22 +37,31 @@ class OrcamentoUpdate(BaseModel):
     data_pagamento: Optional[str] = None
     status: Optional[str] = None
 
+# Chave de paginação dos orçamentos (data_prevista aceita NULL e não
+# serve como chave; a ordem é a de cadastro)
+CHAVE_ORCAMENTOS = ("o.criado_em", "o.id")
+
 @router.get("/{projeto_id}")
 async def listar_orcamentos(
     projeto_id: int,
+    response: Response,
     categoria: Optional[str] = None,
     status: Optional[str] = None,
-    current_user: dict = Depends(get_current_user)
+    pagina: Paginacao = Depends(parametros_paginacao),
+    current_user: dict = Depends(get_current_user),
+    db: AsyncDatabaseHelper = Depends(get_db)
 ):
     """
-    Lista todos os itens do orçamento de um projeto
+    Lista os itens do orçamento de um projeto (paginado por cursor)
     Categorias: mao_de_obra, materiais, equipamentos, servicos, impostos, outros
     Status: previsto, pago, atrasado
+    Resumo e totais por categoria (todas as páginas) apenas com incluir_total=true
     """
-    from database.db_helper import get_db_connection
+    # Cursor decodificado antes do try: adulterado gera 400, não 500
+    depois, params_cursor = condicao_keyset(CHAVE_ORCAMENTOS, pagina.cursor)
     
-    conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
+    conn = await db.acquire()
+    cursor = await conn.cursor()
     
     try:
         query = """
@@ -59,69 +81,82 @@ async def listar_orcamentos(
             query += " AND o.categoria = %s"
             params.append(categoria)
         
+        having = ""
         if status:
             having_clause = {
                 'previsto': 'HAVING status_calculado = "previsto"',
                 'pago': 'HAVING status_calculado = "pago"',
                 'atrasado': 'HAVING status_calculado = "atrasado"'
             }
-            query += f" {having_clause.get(status, '')}"
-        
-        query += " ORDER BY o.data_prevista, o.categoria"
-        
-        cursor.execute(query, params)
-        orcamentos = cursor.fetchall()
-        
-        # Calcular totais
-        total_previsto = sum(o['valor_previsto'] for o in orcamentos)
-        total_gasto = sum(o['valor_gasto'] for o in orcamentos)
-        diferenca_total = total_previsto - total_gasto
-        
-        # Estatísticas por categoria
-        categorias = {}
-        for o in orcamentos:
-            cat = o['categoria']
-            if cat not in categorias:
-                categorias[cat] = {
-                    'previsto': 0,
-                    'gasto': 0,
-                    'quantidade': 0
+            having = f" {having_clause.get(status, '')}"
+        
+        await cursor.execute(
+            query + depois + having + f" {ordem_keyset(CHAVE_ORCAMENTOS)} LIMIT %s",
+            params + params_cursor + [pagina.limite + 1]
+        )
+        orcamentos = list(await cursor.fetchall())
+        proximo = proximo_cursor(orcamentos, pagina.limite, ("criado_em", "id"))
+        
+        total_itens = None
+        resumo = None
+        categorias = None
+        if pagina.incluir_total:
+            # Totais por categoria do filtro completo, calculados no banco
+            await cursor.execute(f"""
+                SELECT categoria,
+                       COUNT(*) as quantidade,
+                       COALESCE(SUM(valor_previsto), 0) as previsto,
+                       COALESCE(SUM(valor_gasto), 0) as gasto
+                FROM ({query}{having}) filtrados
+                GROUP BY categoria
+            """, params)
+            categorias = {
+                row['categoria']: {
+                    'previsto': row['previsto'],
+                    'gasto': row['gasto'],
+                    'quantidade': row['quantidade']
                 }
-            categorias[cat]['previsto'] += o['valor_previsto']
-            categorias[cat]['gasto'] += o['valor_gasto']
-            categorias[cat]['quantidade'] += 1
-        
-        return {
-            "success": True,
-            "total_itens": len(orcamentos),
-            "resumo": {
+                for row in await cursor.fetchall()
+            }
+            
+            total_itens = sum(c['quantidade'] for c in categorias.values())
+            total_previsto = sum(c['previsto'] for c in categorias.values())
+            total_gasto = sum(c['gasto'] for c in categorias.values())
+            resumo = {
                 "total_previsto": total_previsto,
                 "total_gasto": total_gasto,
-                "diferenca": diferenca_total,
+                "diferenca": total_previsto - total_gasto,
                 "percentual_gasto": (total_gasto / total_previsto * 100) if total_previsto > 0 else 0
-            },
+            }
+        
+        aplicar_cabecalhos(response, proximo, total_itens)
+        
+        return {
+            "success": True,
+            "total_itens": total_itens,
+            "resumo": resumo,
             "por_categoria": categorias,
-            "orcamentos": orcamentos
+            "orcamentos": orcamentos,
+            "proximo_cursor": proximo
         }
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
     finally:
-        cursor.close()
-        conn.close()
+        await cursor.close()
+        await db.release(conn)
 
 
 @router.post("/{projeto_id}")
 async def criar_orcamento(
     projeto_id: int,
     orcamento: OrcamentoCreate,
-    current_user: dict = Depends(get_current_user)
+    current_user: dict = Depends(get_current_user),
+    db: AsyncDatabaseHelper = Depends(get_db)
 ):
     """Adiciona um novo item ao orçamento do projeto"""
-    from database.db_helper import get_db_connection
-    
-    conn = get_db_connection()
-    cursor = conn.cursor()
+    conn = await db.acquire()
+    cursor = await conn.cursor()
     
     try:
         query = """
@@ -130,13 +165,15 @@ async def criar_orcamento(
              valor_gasto, data_prevista, status)
             VALUES (%s, %s, %s, %s, 0, %s, 'previsto')
         """
-        cursor.execute(query, (
+        await cursor.execute(query, (
             projeto_id, orcamento.categoria, orcamento.descricao,
             orcamento.valor_previsto, orcamento.data_prevista
         ))
         
         orcamento_id = cursor.lastrowid
-        conn.commit()
+        await conn.commit()
+        
+        snapshot_engine.marcar_alterado(projeto_id)
         
         return {
             "success": True,
@@ -145,24 +182,23 @@ async def criar_orcamento(
         }
         
     except Exception as e:
-        conn.rollback()
+        await conn.rollback()
         raise HTTPException(status_code=500, detail=str(e))
     finally:
-        cursor.close()
-        conn.close()
+        await cursor.close()
+        await db.release(conn)
 
 
 @router.put("/{orcamento_id}")
 async def atualizar_orcamento(
     orcamento_id: int,
     orcamento: OrcamentoUpdate,
-    current_user: dict = Depends(get_current_user)
+    current_user: dict = Depends(get_current_user),
+    db: AsyncDatabaseHelper = Depends(get_db)
 ):
     """Atualiza um item do orçamento"""
-    from database.db_helper import get_db_connection
-    
-    conn = get_db_connection()
-    cursor = conn.cursor()
+    conn = await db.acquire()
+    cursor = await conn.cursor()
     
     try:
         updates = []
@@ -196,8 +232,8 @@ async def atualizar_orcamento(
         params.append(orcamento_id)
         query = f"UPDATE orcamentos SET {', '.join(updates)} WHERE id = %s"
         
-        cursor.execute(query, params)
-        conn.commit()
+        await cursor.execute(query, params)
+        await conn.commit()
         
         return {
             "success": True,
@@ -205,11 +241,11 @@ async def atualizar_orcamento(
         }
         
     except Exception as e:
-        conn.rollback()
+        await conn.rollback()
         raise HTTPException(status_code=500, detail=str(e))
     finally:
-        cursor.close()
-        conn.close()
+        await cursor.close()
+        await db.release(conn)
 
 
 @router.post("/{orcamento_id}/registrar-pagamento")
@@ -217,19 +253,19 @@ async def registrar_pagamento(
     orcamento_id: int,
     valor_pago: float,
     data_pagamento: Optional[str] = None,
-    current_user: dict = Depends(get_current_user)
+    current_user: dict = Depends(get_current_user),
+    db: AsyncDatabaseHelper = Depends(get_db)
 ):
     """Registra pagamento de um item do orçamento"""
-    from database.db_helper import get_db_connection
     from datetime import date
     
-    conn = get_db_connection()
-    cursor = conn.cursor()
+    conn = await db.acquire()
+    cursor = await conn.cursor()
     
     try:
         data = data_pagamento or date.today().isoformat()
         
-        cursor.execute("""
+        await cursor.execute("""
             UPDATE orcamentos
             SET valor_gasto = valor_gasto + %s,
                 data_pagamento = %s,
@@ -237,7 +273,7 @@ async def registrar_pagamento(
             WHERE id = %s
         """, (valor_pago, data, orcamento_id))
         
-        conn.commit()
+        await conn.commit()
         
         return {
             "success": True,
@@ -245,27 +281,26 @@ async def registrar_pagamento(
         }
         
     except Exception as e:
-        conn.rollback()
+        await conn.rollback()
         raise HTTPException(status_code=500, detail=str(e))
     finally:
-        cursor.close()
-        conn.close()
+        await cursor.close()
+        await db.release(conn)
 
 
 @router.get("/{projeto_id}/resumo")
 async def resumo_orcamento(
     projeto_id: int,
-    current_user: dict = Depends(get_current_user)
+    current_user: dict = Depends(get_current_user),
+    db: AsyncDatabaseHelper = Depends(get_db)
 ):
     """Retorna resumo financeiro do projeto"""
-    from database.db_helper import get_db_connection
-    
-    conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
+    conn = await db.acquire()
+    cursor = await conn.cursor()
     
     try:
         # Totais gerais
-        cursor.execute("""
+        await cursor.execute("""
             SELECT 
                 SUM(valor_previsto) as total_previsto,
                 SUM(valor_gasto) as total_gasto,
@@ -274,10 +309,10 @@ async def resumo_orcamento(
             WHERE projeto_id = %s
         """, (projeto_id,))
         
-        totais = cursor.fetchone()
+        totais = await cursor.fetchone()
         
         # Por categoria
-        cursor.execute("""
+        await cursor.execute("""
             SELECT 
                 categoria,
                 SUM(valor_previsto) as previsto,
@@ -288,10 +323,10 @@ async def resumo_orcamento(
             GROUP BY categoria
         """, (projeto_id,))
         
-        por_categoria = cursor.fetchall()
+        por_categoria = await cursor.fetchall()
         
         # Itens atrasados
-        cursor.execute("""
+        await cursor.execute("""
             SELECT COUNT(*) as atrasados
             FROM orcamentos
             WHERE projeto_id = %s
@@ -299,7 +334,7 @@ async def resumo_orcamento(
               AND data_prevista < CURDATE()
         """, (projeto_id,))
         
-        atrasados = cursor.fetchone()['atrasados']
+        atrasados = (await cursor.fetchone())['atrasados']
         
         total_prev = totais['total_previsto'] or 0
         total_gast = totais['total_gasto'] or 0
@@ -320,36 +355,40 @@ async def resumo_orcamento(
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
     finally:
-        cursor.close()
-        conn.close()
+        await cursor.close()
+        await db.release(conn)
 
 
 @router.delete("/{orcamento_id}")
 async def deletar_orcamento(
     orcamento_id: int,
-    current_user: dict = Depends(get_current_user)
+    current_user: dict = Depends(get_current_user),
+    db: AsyncDatabaseHelper = Depends(get_db)
 ):
     """Deleta um item do orçamento"""
-    from database.db_helper import get_db_connection
-    
-    conn = get_db_connection()
-    cursor = conn.cursor()
+    conn = await db.acquire()
+    cursor = await conn.cursor()
     
     try:
-        cursor.execute("DELETE FROM orcamentos WHERE id = %s", (orcamento_id,))
-        conn.commit()
+        await cursor.execute("SELECT projeto_id FROM orcamentos WHERE id = %s", (orcamento_id,))
+        existente = await cursor.fetchone()
+        
+        await cursor.execute("DELETE FROM orcamentos WHERE id = %s", (orcamento_id,))
+        await conn.commit()
         
         if cursor.rowcount == 0:
             raise HTTPException(status_code=404, detail="Item não encontrado")
         
+        snapshot_engine.marcar_alterado(existente['projeto_id'])
+        
         return {
             "success": True,
             "message": "Item deletado do orçamento"
         }
         
     except Exception as e:
-        conn.rollback()
+        await conn.rollback()
         raise HTTPException(status_code=500, detail=str(e))
     finally:
-        cursor.close()
-        conn.close()
+        await cursor.close()
+        await db.release(conn)
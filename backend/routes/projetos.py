@@ -2,7 +2,7 @@
 Rotas de Projetos - CRUD
 """
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Response, status
 from pydantic import BaseModel
 from typing import Optional, List
 from datetime import date
@@ -11,11 +11,16 @@ import os
 
 # Adicionar path do database
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'database'))
-from db_helper import DatabaseHelper
+from async_db_helper import AsyncDatabaseHelper
 
 from middleware.auth_middleware import get_current_active_user
+from middleware.database import get_db, apos_confirmar
 from middleware.permissions import permission_manager
 from utils.permissions_decorators import verify_project_access, verify_project_modify, verify_project_delete
+from utils.paginacao import (
+    Paginacao, parametros_paginacao, condicao_keyset, ordem_keyset,
+    proximo_cursor, total_aproximado, aplicar_cabecalhos
+)
 
 router = APIRouter(prefix="/projetos", tags=["Projetos"])
 
@@ -62,66 +67,71 @@ class ProjetoResponse(BaseModel):
     atualizado_em: str
 
 
+# Chave de paginação dos projetos (mais recentes primeiro)
+CHAVE_PROJETOS = ("p.criado_em", "p.id")
+
+
 @router.get("/", response_model=List[ProjetoResponse])
 async def listar_projetos(
+    response: Response,
     status: Optional[str] = None,
-    current_user: dict = Depends(get_current_active_user)
+    pagina: Paginacao = Depends(parametros_paginacao),
+    current_user: dict = Depends(get_current_active_user),
+    db: AsyncDatabaseHelper = Depends(get_db)
 ):
     """
     Lista projetos do usuário (onde é membro da equipe)
     
     Query params:
         status: Filtrar por status (opcional)
+        cursor, limit, incluir_total: paginação (próxima página em X-Next-Cursor)
     """
-    db = DatabaseHelper()
     user_id = current_user.get("user_id") or current_user.get("id")
     
     # Listar apenas projetos onde usuário é membro da equipe
-    if status:
-        projetos = db.execute_query(
-            """
-            SELECT DISTINCT p.id, p.nome, p.descricao, p.endereco, p.cliente, p.valor_total,
-                   p.data_inicio, p.data_fim_prevista, p.data_fim_real, p.status,
-                   p.progresso_percentual, p.criador_id, p.criado_em, p.atualizado_em
-            FROM projetos p
-            INNER JOIN equipes e ON p.id = e.projeto_id
-            WHERE e.usuario_id = %s AND e.ativo = TRUE AND p.status = %s
-            ORDER BY p.criado_em DESC
-            """,
-            (user_id, status),
-            fetch=True
-        )
-    else:
-        projetos = db.execute_query(
-            """
-            SELECT DISTINCT p.id, p.nome, p.descricao, p.endereco, p.cliente, p.valor_total,
-                   p.data_inicio, p.data_fim_prevista, p.data_fim_real, p.status,
-                   p.progresso_percentual, p.criador_id, p.criado_em, p.atualizado_em
-            FROM projetos p
-            INNER JOIN equipes e ON p.id = e.projeto_id
-            WHERE e.usuario_id = %s AND e.ativo = TRUE
-            ORDER BY p.criado_em DESC
-            """,
-            (user_id,),
-            fetch=True
+    filtro = " AND p.status = %s" if status else ""
+    params = [user_id, status] if status else [user_id]
+    
+    depois, params_cursor = condicao_keyset(CHAVE_PROJETOS, pagina.cursor, decrescente=True)
+    projetos = await db.execute_query(
+        f"""
+        SELECT DISTINCT p.id, p.nome, p.descricao, p.endereco, p.cliente, p.valor_total,
+               p.data_inicio, p.data_fim_prevista, p.data_fim_real, p.status,
+               p.progresso_percentual, p.criador_id, p.criado_em, p.atualizado_em
+        FROM projetos p
+        INNER JOIN equipes e ON p.id = e.projeto_id
+        WHERE e.usuario_id = %s AND e.ativo = TRUE{filtro}{depois}
+        {ordem_keyset(CHAVE_PROJETOS, decrescente=True)}
+        LIMIT %s
+        """,
+        tuple(params + params_cursor + [pagina.limite + 1]),
+        fetch=True
+    )
+    proximo = proximo_cursor(projetos, pagina.limite, ("criado_em", "id"))
+    
+    total = None
+    if pagina.incluir_total:
+        total = await total_aproximado(
+            db, "SELECT 1 FROM equipes e WHERE e.usuario_id = %s AND e.ativo = TRUE", (user_id,)
         )
+    aplicar_cabecalhos(response, proximo, total)
     
     return [
         {
-            "id": p[0],
-            "nome": p[1],
-            "descricao": p[2],
-            "endereco": p[3],
-            "cliente": p[4],
-            "valor_total": float(p[5]) if p[5] else None,
-            "data_inicio": p[6],
-            "data_fim_prevista": p[7],
-            "data_fim_real": p[8],
-            "status": p[9],
-            "progresso_percentual": float(p[10]),
-            "criador_id": p[11],
-            "criado_em": str(p[12]),
-            "atualizado_em": str(p[13])
+            "id": p['id'],
+            "nome": p['nome'],
+            "descricao": p['descricao'],
+            "endereco": p['endereco'],
+            "cliente": p['cliente'],
+            "valor_total": float(p['valor_total']) if p['valor_total'] else None,
+            "data_inicio": p['data_inicio'],
+            "data_fim_prevista": p['data_fim_prevista'],
+            "data_fim_real": p['data_fim_real'],
+            "status": p['status'],
+            "progresso_percentual": float(p['progresso_percentual']),
+            "criador_id": p['criador_id'],
+            "criado_em": str(p['criado_em']),
+            "atualizado_em": str(p['atualizado_em'])
         }
         for p in projetos
     ]
@@ -130,7 +140,8 @@ async def listar_projetos(
 @router.get("/{projeto_id}", response_model=ProjetoResponse)
 async def buscar_projeto(
     projeto_id: int,
-    current_user: dict = Depends(get_current_active_user)
+    current_user: dict = Depends(get_current_active_user),
+    db: AsyncDatabaseHelper = Depends(get_db)
 ):
     """
     Busca projeto por ID (apenas membros da equipe)
@@ -138,15 +149,13 @@ async def buscar_projeto(
     user_id = current_user.get("user_id") or current_user.get("id")
     
     # Verificar se usuário tem acesso ao projeto
-    if not permission_manager.is_project_member(user_id, projeto_id):
+    if not await permission_manager.is_project_member(user_id, projeto_id):
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Você não tem acesso a este projeto"
         )
     
-    db = DatabaseHelper()
-    
-    projeto = db.execute_query(
+    projeto = await db.execute_query(
         """
         SELECT id, nome, descricao, endereco, cliente, valor_total,
                data_inicio, data_fim_prevista, data_fim_real, status,
@@ -186,15 +195,15 @@ async def buscar_projeto(
 @router.post("/", response_model=dict, status_code=status.HTTP_201_CREATED)
 async def criar_projeto(
     projeto: ProjetoCreate,
-    current_user: dict = Depends(get_current_active_user)
+    current_user: dict = Depends(get_current_active_user),
+    db: AsyncDatabaseHelper = Depends(get_db)
 ):
     """
     Cria novo projeto
     """
-    db = DatabaseHelper()
     
     try:
-        result = db.execute_query(
+        result = await db.execute_query(
             """
             INSERT INTO projetos (
                 nome, descricao, endereco, cliente, valor_total,
@@ -218,7 +227,7 @@ async def criar_projeto(
         
         # Adicionar criador à equipe como gerente
         from datetime import date as dt_date
-        db.execute_query(
+        await db.execute_query(
             """
             INSERT INTO equipes (projeto_id, usuario_id, papel, data_entrada, ativo)
             VALUES (%s, %s, 'gerente', %s, TRUE)
@@ -227,6 +236,8 @@ async def criar_projeto(
             fetch=False
         )
         
+        apos_confirmar(lambda: permission_manager.invalidate(project_id=result))
+        
         return {"message": "Projeto criado com sucesso", "id": result}
     
     except Exception as e:
@@ -240,7 +251,8 @@ async def criar_projeto(
 async def atualizar_projeto(
     projeto_id: int,
     projeto: ProjetoUpdate,
-    current_user: dict = Depends(get_current_active_user)
+    current_user: dict = Depends(get_current_active_user),
+    db: AsyncDatabaseHelper = Depends(get_db)
 ):
     """
     Atualiza projeto existente (apenas gerente ou criador)
@@ -248,16 +260,14 @@ async def atualizar_projeto(
     user_id = current_user.get("user_id") or current_user.get("id")
     
     # Verificar permissão (apenas gerente ou dono)
-    if not permission_manager.can_modify_project(user_id, projeto_id):
+    if not await permission_manager.can_modify_project(user_id, projeto_id):
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Apenas gerentes do projeto podem modificá-lo"
         )
     
-    db = DatabaseHelper()
-    
     # Verificar se projeto existe
-    existing = db.execute_query(
+    existing = await db.execute_query(
         "SELECT id FROM projetos WHERE id = %s",
         (projeto_id,),
         fetch=True
@@ -288,7 +298,7 @@ async def atualizar_projeto(
     query = f"UPDATE projetos SET {', '.join(updates)} WHERE id = %s"
     
     try:
-        db.execute_query(query, tuple(params))
+        await db.execute_query(query, tuple(params))
         return {"message": "Projeto atualizado com sucesso"}
     
     except Exception as e:
@@ -301,7 +311,8 @@ async def atualizar_projeto(
 @router.delete("/{projeto_id}")
 async def deletar_projeto(
     projeto_id: int,
-    current_user: dict = Depends(get_current_active_user)
+    current_user: dict = Depends(get_current_active_user),
+    db: AsyncDatabaseHelper = Depends(get_db)
 ):
     """
     Deleta projeto (apenas criador)
@@ -309,16 +320,14 @@ async def deletar_projeto(
     user_id = current_user.get("user_id") or current_user.get("id")
     
     # Verificar permissão (apenas criador pode deletar)
-    if not permission_manager.can_delete_project(user_id, projeto_id):
+    if not await permission_manager.can_delete_project(user_id, projeto_id):
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Apenas o criador do projeto pode deletá-lo"
         )
     
-    db = DatabaseHelper()
-    
     # Verificar se projeto existe
-    existing = db.execute_query(
+    existing = await db.execute_query(
         "SELECT id FROM projetos WHERE id = %s",
         (projeto_id,),
         fetch=True
@@ -331,7 +340,8 @@ async def deletar_projeto(
         )
     
     try:
-        db.execute_query("DELETE FROM projetos WHERE id = %s", (projeto_id,))
+        await db.execute_query("DELETE FROM projetos WHERE id = %s", (projeto_id,))
+        apos_confirmar(lambda: permission_manager.invalidate(project_id=projeto_id))
         return {"message": "Projeto deletado com sucesso"}
     
     except Exception as e:
@@ -2,7 +2,7 @@
 Rotas de Tarefas - CRUD
 """
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Response, status
 from pydantic import BaseModel
 from typing import Optional, List
 from datetime import date
@@ -11,10 +11,17 @@ import os
 
 # Adicionar path do database
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'database'))
-from db_helper import DatabaseHelper
+from async_db_helper import AsyncDatabaseHelper
 
 from middleware.auth_middleware import get_current_active_user
+from middleware.database import get_db, apos_confirmar
 from middleware.permissions import permission_manager
+from utils.metricas_snapshot import snapshot_engine
+from utils.cronograma import cronograma_cache, CicloDependenciaError
+from utils.paginacao import (
+    Paginacao, parametros_paginacao, condicao_keyset, ordem_keyset,
+    proximo_cursor, total_aproximado, aplicar_cabecalhos
+)
 
 router = APIRouter(prefix="/tarefas", tags=["Tarefas"])
 
@@ -43,80 +50,119 @@ class TarefaUpdate(BaseModel):
     progresso_percentual: Optional[float] = None
 
 
+# Chave de paginação das tarefas (ordem manual, depois cadastro)
+CHAVE_TAREFAS = ("COALESCE(t.ordem, 0)", "t.criado_em", "t.id")
+
+
 @router.get("/projeto/{projeto_id}")
 async def listar_tarefas_projeto(
     projeto_id: int,
+    response: Response,
     status: Optional[str] = None,
-    current_user: dict = Depends(get_current_active_user)
+    pagina: Paginacao = Depends(parametros_paginacao),
+    current_user: dict = Depends(get_current_active_user),
+    db: AsyncDatabaseHelper = Depends(get_db)
 ):
     """
     Lista tarefas de um projeto (apenas membros)
+    
+    Paginada por cursor: próxima página em X-Next-Cursor
     """
     user_id = current_user.get("user_id") or current_user.get("id")
     
     # Verificar se usuário é membro do projeto
-    if not permission_manager.is_project_member(user_id, projeto_id):
+    if not await permission_manager.is_project_member(user_id, projeto_id):
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Você não tem acesso a este projeto"
         )
     
-    db = DatabaseHelper()
+    filtro = " AND t.status = %s" if status else ""
+    params = [projeto_id, status] if status else [projeto_id]
     
-    if status:
-        tarefas = db.execute_query(
-            """
-            SELECT t.id, t.titulo, t.descricao, t.status, t.prioridade,
-                   t.data_inicio, t.data_fim_prevista, t.data_fim_real,
-                   t.responsavel_id, t.progresso_percentual, t.ordem,
-                   u.nome as responsavel_nome
-            FROM tarefas t
-            LEFT JOIN usuarios u ON t.responsavel_id = u.id
-            WHERE t.projeto_id = %s AND t.status = %s
-            ORDER BY t.ordem, t.criado_em
-            """,
-            (projeto_id, status),
-            fetch=True
-        )
-    else:
-        tarefas = db.execute_query(
-            """
-            SELECT t.id, t.titulo, t.descricao, t.status, t.prioridade,
-                   t.data_inicio, t.data_fim_prevista, t.data_fim_real,
-                   t.responsavel_id, t.progresso_percentual, t.ordem,
-                   u.nome as responsavel_nome
-            FROM tarefas t
-            LEFT JOIN usuarios u ON t.responsavel_id = u.id
-            WHERE t.projeto_id = %s
-            ORDER BY t.ordem, t.criado_em
-            """,
-            (projeto_id,),
-            fetch=True
+    depois, params_cursor = condicao_keyset(CHAVE_TAREFAS, pagina.cursor)
+    tarefas = await db.execute_query(
+        f"""
+        SELECT t.id, t.titulo, t.descricao, t.status, t.prioridade,
+               t.data_inicio, t.data_fim_prevista, t.data_fim_real,
+               t.responsavel_id, t.progresso_percentual,
+               COALESCE(t.ordem, 0) as ordem, t.criado_em,
+               u.nome as responsavel_nome
+        FROM tarefas t
+        LEFT JOIN usuarios u ON t.responsavel_id = u.id
+        WHERE t.projeto_id = %s{filtro}{depois}
+        {ordem_keyset(CHAVE_TAREFAS)}
+        LIMIT %s
+        """,
+        tuple(params + params_cursor + [pagina.limite + 1]),
+        fetch=True
+    )
+    proximo = proximo_cursor(tarefas, pagina.limite, ("ordem", "criado_em", "id"))
+    
+    total = None
+    if pagina.incluir_total:
+        total = await total_aproximado(
+            db, "SELECT 1 FROM tarefas t WHERE t.projeto_id = %s" + filtro, params
         )
+    aplicar_cabecalhos(response, proximo, total)
     
     return [
         {
-            "id": t[0],
-            "titulo": t[1],
-            "descricao": t[2],
-            "status": t[3],
-            "prioridade": t[4],
-            "data_inicio": t[5],
-            "data_fim_prevista": t[6],
-            "data_fim_real": t[7],
-            "responsavel_id": t[8],
-            "progresso_percentual": float(t[9]) if t[9] else 0,
-            "ordem": t[10],
-            "responsavel_nome": t[11]
+            "id": t['id'],
+            "titulo": t['titulo'],
+            "descricao": t['descricao'],
+            "status": t['status'],
+            "prioridade": t['prioridade'],
+            "data_inicio": t['data_inicio'],
+            "data_fim_prevista": t['data_fim_prevista'],
+            "data_fim_real": t['data_fim_real'],
+            "responsavel_id": t['responsavel_id'],
+            "progresso_percentual": float(t['progresso_percentual']) if t['progresso_percentual'] else 0,
+            "ordem": t['ordem'],
+            "responsavel_nome": t['responsavel_nome']
         }
         for t in tarefas
     ]
 
 
+@router.get("/projeto/{projeto_id}/caminho-critico")
+async def caminho_critico_projeto(
+    projeto_id: int,
+    apenas_criticas: bool = False,
+    current_user: dict = Depends(get_current_active_user),
+    db: AsyncDatabaseHelper = Depends(get_db)
+):
+    """
+    Calcula o caminho crítico (CPM) do projeto a partir de tarefa_dependencias
+    
+    Retorna início/fim cedo e tarde, folga de cada tarefa e a sequência
+    de tarefas críticas (folga zero).
+    """
+    user_id = current_user.get("user_id") or current_user.get("id")
+    
+    # Verificar se usuário é membro do projeto
+    if not await permission_manager.is_project_member(user_id, projeto_id):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Você não tem acesso a este projeto"
+        )
+    
+    try:
+        cronograma = await cronograma_cache.obter(db, projeto_id)
+    except CicloDependenciaError as e:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=str(e)
+        )
+    
+    return {"projeto_id": projeto_id, **cronograma.resultado(apenas_criticas)}
+
+
 @router.post("/", status_code=status.HTTP_201_CREATED)
 async def criar_tarefa(
     tarefa: TarefaCreate,
-    current_user: dict = Depends(get_current_active_user)
+    current_user: dict = Depends(get_current_active_user),
+    db: AsyncDatabaseHelper = Depends(get_db)
 ):
     """
     Cria nova tarefa (apenas membros do projeto)
@@ -124,16 +170,14 @@ async def criar_tarefa(
     user_id = current_user.get("user_id") or current_user.get("id")
     
     # Verificar se usuário é membro do projeto
-    if not permission_manager.is_project_member(user_id, tarefa.projeto_id):
+    if not await permission_manager.is_project_member(user_id, tarefa.projeto_id):
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Você não tem acesso a este projeto"
         )
     
-    db = DatabaseHelper()
-    
     try:
-        result = db.execute_query(
+        result = await db.execute_query(
             """
             INSERT INTO tarefas (
                 projeto_id, titulo, descricao, status, prioridade,
@@ -154,6 +198,8 @@ async def criar_tarefa(
             )
         )
         
+        apos_confirmar(lambda: snapshot_engine.marcar_alterado(tarefa.projeto_id))
+        apos_confirmar(lambda: cronograma_cache.invalidar(tarefa.projeto_id))
         return {"message": "Tarefa criada com sucesso", "id": result}
     
     except Exception as e:
@@ -167,17 +213,17 @@ async def criar_tarefa(
 async def atualizar_tarefa(
     tarefa_id: int,
     tarefa: TarefaUpdate,
-    current_user: dict = Depends(get_current_active_user)
+    current_user: dict = Depends(get_current_active_user),
+    db: AsyncDatabaseHelper = Depends(get_db)
 ):
     """
     Atualiza tarefa existente (apenas membros do projeto)
     """
     user_id = current_user.get("user_id") or current_user.get("id")
-    db = DatabaseHelper()
     
     # Verificar se tarefa existe e obter projeto_id
-    existing = db.execute_query(
-        "SELECT projeto_id FROM tarefas WHERE id = %s",
+    existing = await db.execute_query(
+        "SELECT projeto_id, data_inicio, data_fim_prevista FROM tarefas WHERE id = %s",
         (tarefa_id,),
         fetch=True
     )
@@ -188,10 +234,10 @@ async def atualizar_tarefa(
             detail="Tarefa não encontrada"
         )
     
-    projeto_id = existing[0][0]
+    projeto_id = existing[0]['projeto_id']
     
     # Verificar se usuário é membro do projeto
-    if not permission_manager.is_project_member(user_id, projeto_id):
+    if not await permission_manager.is_project_member(user_id, projeto_id):
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Você não tem acesso a este projeto"
@@ -201,7 +247,9 @@ async def atualizar_tarefa(
     updates = []
     params = []
     
-    for field, value in tarefa.dict(exclude_unset=True).items():
+    campos = tarefa.dict(exclude_unset=True)
+    
+    for field, value in campos.items():
         updates.append(f"{field} = %s")
         params.append(value)
     
@@ -215,7 +263,15 @@ async def atualizar_tarefa(
     query = f"UPDATE tarefas SET {', '.join(updates)} WHERE id = %s"
     
     try:
-        db.execute_query(query, tuple(params))
+        await db.execute_query(query, tuple(params))
+        apos_confirmar(lambda: snapshot_engine.marcar_alterado(projeto_id))
+        
+        # Recalcular o cronograma em cache só a partir desta tarefa (após o commit)
+        if 'data_inicio' in campos or 'data_fim_prevista' in campos:
+            inicio = campos.get('data_inicio', existing[0]['data_inicio'])
+            fim = campos.get('data_fim_prevista', existing[0]['data_fim_prevista'])
+            apos_confirmar(lambda: cronograma_cache.atualizar_tarefa(projeto_id, tarefa_id, inicio, fim))
+        
         return {"message": "Tarefa atualizada com sucesso"}
     
     except Exception as e:
@@ -228,16 +284,16 @@ async def atualizar_tarefa(
 @router.delete("/{tarefa_id}")
 async def deletar_tarefa(
     tarefa_id: int,
-    current_user: dict = Depends(get_current_active_user)
+    current_user: dict = Depends(get_current_active_user),
+    db: AsyncDatabaseHelper = Depends(get_db)
 ):
     """
     Deleta tarefa (apenas membros do projeto)
     """
     user_id = current_user.get("user_id") or current_user.get("id")
-    db = DatabaseHelper()
     
     # Verificar se tarefa existe e obter projeto_id
-    existing = db.execute_query(
+    existing = await db.execute_query(
         "SELECT projeto_id FROM tarefas WHERE id = %s",
         (tarefa_id,),
         fetch=True
@@ -249,27 +305,19 @@ async def deletar_tarefa(
             detail="Tarefa não encontrada"
         )
     
-    projeto_id = existing[0][0]
+    projeto_id = existing[0]['projeto_id']
     
     # Verificar se usuário é membro do projeto
-    if not permission_manager.is_project_member(user_id, projeto_id):
+    if not await permission_manager.is_project_member(user_id, projeto_id):
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Você não tem acesso a este projeto"
         )
     
     try:
-        db.execute_query("DELETE FROM tarefas WHERE id = %s", (tarefa_id,))
-        return {"message": "Tarefa deletada com sucesso"}
-    
-    except Exception as e:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Erro ao deletar tarefa: {str(e)}"
-        )
-    
-    try:
-        db.execute_query("DELETE FROM tarefas WHERE id = %s", (tarefa_id,))
+        await db.execute_query("DELETE FROM tarefas WHERE id = %s", (tarefa_id,))
+        apos_confirmar(lambda: snapshot_engine.marcar_alterado(projeto_id))
+        apos_confirmar(lambda: cronograma_cache.invalidar(projeto_id))
         return {"message": "Tarefa deletada com sucesso"}
     
     except Exception as e:
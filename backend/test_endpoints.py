@@ -81,6 +81,62 @@ def tarefa_teste():
     }
 
 
+class BancoRoteiro:
+    """
+    Banco falso para chamar as rotas diretamente
+
+    Faz papel de helper, conexão e cursor: registra os comandos e
+    responde fetchone/fetchall com as linhas do primeiro trecho de SQL
+    (em respostas) encontrado no comando.
+    """
+
+    def __init__(self, respostas=None):
+        self.respostas = respostas or {}
+        self.comandos = []
+        self.commits = 0
+        self.rollbacks = 0
+        self.lastrowid = 0
+        self.rowcount = 0
+        self._linhas = []
+
+    async def acquire(self):
+        return self
+
+    async def release(self, conn):
+        pass
+
+    async def cursor(self, *args):
+        return self
+
+    async def execute(self, query, params=None):
+        self.comandos.append((query, params))
+        self._linhas = next(
+            (list(linhas) for trecho, linhas in self.respostas.items() if trecho in query), []
+        )
+        self.lastrowid = len(self.comandos)
+        self.rowcount = len(self._linhas) or 1
+        return self.rowcount
+
+    async def execute_query(self, query, params=None, fetch=False):
+        await self.execute(query, params)
+        return self._linhas if fetch else None
+
+    async def fetchone(self):
+        return self._linhas[0] if self._linhas else None
+
+    async def fetchall(self):
+        return self._linhas
+
+    async def commit(self):
+        self.commits += 1
+
+    async def rollback(self):
+        self.rollbacks += 1
+
+    async def close(self):
+        pass
+
+
 # ============================================================================
 # TESTES HEALTH CHECK
 # ============================================================================
@@ -109,6 +165,14 @@ class TestHealthCheck:
         """GET /redoc deve retornar 200"""
         response = client.get("/redoc")
         assert response.status_code == 200
+    
+    def test_health_db_pool_stats(self):
+        """GET /health/db deve retornar estatísticas do pool compartilhado"""
+        response = client.get("/health/db")
+        assert response.status_code == 200
+        data = response.json()
+        for campo in ["em_uso", "ociosas", "espera_media_ms", "falhas_checkout"]:
+            assert campo in data
 
 
 # ============================================================================
@@ -349,6 +413,22 @@ class TestDocumentos:
         """DELETE /documentos/1 deve retornar 200 ou 404"""
         response = client.delete("/documentos/1")
         assert response.status_code in [200, 204, 404]
+    
+    @pytest.mark.parametrize("arquivo", [
+        "006_busca_mensagens.sql", "007_blobs_documentos.sql", "008_versoes_delta.sql",
+        "009_indice_mensagens_keyset.sql"
+    ])
+    def test_migration_executavel_pelo_migrate(self, arquivo):
+        """Cada trecho do split por ';' do migrate.py começa com um comando SQL"""
+        import re
+        
+        caminho = os.path.join(os.path.dirname(__file__), '..', 'database', 'migrations', arquivo)
+        with open(caminho, encoding='utf-8') as f:
+            trechos = [t.strip() for t in f.read().split(';') if t.strip()]
+        
+        for trecho in trechos:
+            codigo = "\n".join(l for l in trecho.splitlines() if not l.strip().startswith("--")).strip()
+            assert re.match(r"(CREATE|ALTER|DROP|INSERT|UPDATE|DELETE|SET)\b", codigo), trecho[:80]
 
 
 # ============================================================================
@@ -510,6 +590,1151 @@ class TestTwoFactorAuth:
         assert "2fa" in response.json() or "verify" in response.json()
 
 
+# ============================================================================
+# TESTES SNAPSHOTS DE MÉTRICAS
+# ============================================================================
+
+class TestMetricasSnapshot:
+    """Testes do motor de snapshots diários"""
+    
+    def test_marcar_projeto_alterado(self):
+        """Projeto marcado fica pendente até a próxima atualização"""
+        from utils.metricas_snapshot import MetricasSnapshotEngine
+        
+        engine = MetricasSnapshotEngine(intervalo=60)
+        engine.marcar_alterado(7)
+        
+        assert engine.pendente(7)
+        assert not engine.pendente(8)
+        assert engine.stats()["projetos_pendentes"] == 1
+    
+    @staticmethod
+    def _schema():
+        """Colunas e valores de ENUM status por tabela de database/schema_completo.sql"""
+        import re
+        
+        caminho = os.path.join(os.path.dirname(__file__), '..', 'database', 'schema_completo.sql')
+        with open(caminho, encoding='utf-8') as arquivo:
+            sql = arquivo.read()
+        
+        colunas, status = {}, {}
+        for tabela, corpo in re.findall(r"CREATE TABLE (\w+) \((.*?)\n\) ENGINE", sql, re.S):
+            nomes = set()
+            for linha in corpo.splitlines():
+                partes = linha.strip().split()
+                if partes and partes[0] not in ("INDEX", "UNIQUE", "FOREIGN", "PRIMARY", "KEY", "FULLTEXT"):
+                    nomes.add(partes[0])
+                    if partes[0] == "status":
+                        status[tabela] = set(re.findall(r"'(\w+)'", linha.split("DEFAULT")[0]))
+            colunas[tabela] = nomes
+        return colunas, status
+    
+    @staticmethod
+    def _blocos(sql):
+        """A consulta e cada subconsulta, com as subconsultas internas trocadas por (?)"""
+        import re
+        
+        inicios = [m.start() for m in re.finditer(r"\(\s*SELECT", sql)]
+        trechos = [sql]
+        for inicio in inicios:
+            profundidade = 0
+            for fim in range(inicio, len(sql)):
+                profundidade += {"(": 1, ")": -1}.get(sql[fim], 0)
+                if profundidade == 0:
+                    trechos.append(sql[inicio + 1:fim])
+                    break
+        
+        blocos = []
+        for trecho in trechos:
+            for interno in sorted((t for t in trechos if t is not trecho and t in trecho), key=len, reverse=True):
+                trecho = trecho.replace(interno, "?")
+            blocos.append(trecho)
+        return blocos
+    
+    def _verificar_schema(self, sql):
+        """Toda coluna e todo status citados existem no schema"""
+        import re
+        
+        colunas, status = self._schema()
+        erros = []
+        
+        for bloco in self._blocos(sql):
+            aliases = {tabela: tabela for tabela in re.findall(r"(?:FROM|JOIN) (\w+)", bloco) if tabela in colunas}
+            aliases.update({
+                alias: tabela for tabela, alias in re.findall(r"(?:FROM|JOIN) (\w+) ([a-z]\w*)\b", bloco)
+                if tabela in colunas
+            })
+            
+            for alias, coluna in re.findall(r"\b([a-z]\w*)\.([a-z]\w*)", bloco):
+                if alias in aliases and coluna not in colunas[aliases[alias]]:
+                    erros.append(f"{aliases[alias]}.{coluna}")
+            
+            for alias, valor in re.findall(r"(?:\b([a-z]\w*)\.)?status\s*!?=\s*'(\w+)'", bloco):
+                tabela = aliases.get(alias) if alias else (list(aliases.values()) or [None])[0]
+                if tabela in status and valor not in status[tabela]:
+                    erros.append(f"{tabela}.status = '{valor}'")
+            
+            tabelas = set(aliases.values())
+            if len(tabelas) == 1 and "JOIN" not in bloco and "INSERT" not in bloco:
+                tabela = tabelas.pop()
+                limpo = re.sub(r"'[^']*'|%s|\b[a-z]\w*\.[a-z]\w*|\bas \w+", " ", bloco)
+                for nome in set(re.findall(r"\b[a-z_][a-z0-9_]*\b", limpo)) - {tabela} - set(aliases):
+                    if nome not in colunas[tabela]:
+                        erros.append(f"{tabela}.{nome}")
+        
+        for tabela, lista in re.findall(r"INSERT INTO (\w+) \((.*?)\)", sql, re.S):
+            erros += [f"{tabela}.{c.strip()}" for c in lista.split(",") if c.strip() not in colunas[tabela]]
+        
+        assert not erros, f"Fora do schema: {sorted(set(erros))}"
+    
+    def test_consultas_conferem_com_schema(self):
+        """Snapshot, dashboard e relatório só usam colunas e status do schema"""
+        from utils.metricas_snapshot import UPSERT_SNAPSHOT_QUERY, PROJETOS_ALTERADOS_QUERY
+        from routes.metricas import DASHBOARD_QUERY, RELATORIO_QUERY, SNAPSHOT_DASHBOARD_QUERY
+        
+        self._verificar_schema(UPSERT_SNAPSHOT_QUERY.format(filtro="", filtro_projetos=""))
+        self._verificar_schema(UPSERT_SNAPSHOT_QUERY.format(
+            filtro="WHERE projeto_id IN (%s)", filtro_projetos="WHERE p.id IN (%s)"
+        ))
+        for consulta in (PROJETOS_ALTERADOS_QUERY, DASHBOARD_QUERY, RELATORIO_QUERY, SNAPSHOT_DASHBOARD_QUERY):
+            self._verificar_schema(consulta)
+    
+    def test_upsert_sem_mudanca_renova_atualizado_em(self):
+        """Upsert com os mesmos agregados ainda renova o atualizado_em do snapshot"""
+        import re
+        import sqlite3
+        from utils.metricas_snapshot import UPSERT_SNAPSHOT_QUERY
+        
+        # O ON UPDATE CURRENT_TIMESTAMP do MySQL não dispara se nenhum valor
+        # muda: só vale o que estiver na lista do ON DUPLICATE KEY UPDATE
+        atualizacoes = UPSERT_SNAPSHOT_QUERY.split("ON DUPLICATE KEY UPDATE")[1]
+        atualizacoes = re.sub(r"VALUES\((\w+)\)", r"excluded.\1", atualizacoes)
+        colunas = re.findall(r"(\w+) = excluded", atualizacoes)
+        
+        conn = sqlite3.connect(":memory:")
+        conn.execute(
+            f"CREATE TABLE metricas_projeto (projeto_id, data_registro, {', '.join(colunas)}, "
+            "atualizado_em, PRIMARY KEY (projeto_id, data_registro))"
+        )
+        valores = [1, "2026-01-01"] + [0] * len(colunas)
+        conn.execute(
+            f"INSERT INTO metricas_projeto VALUES ({', '.join('?' * len(valores))}, '2000-01-01 00:00:00')",
+            valores
+        )
+        conn.execute(
+            f"INSERT INTO metricas_projeto (projeto_id, data_registro, {', '.join(colunas)}) "
+            f"VALUES ({', '.join('?' * len(valores))}) "
+            f"ON CONFLICT (projeto_id, data_registro) DO UPDATE SET {atualizacoes}",
+            valores
+        )
+        
+        assert conn.execute("SELECT atualizado_em FROM metricas_projeto").fetchone()[0] > "2000-01-01 00:00:00"
+    
+    def test_verificacao_pega_coluna_inexistente(self):
+        """A verificação recusa a coluna e o status que o schema não tem"""
+        with pytest.raises(AssertionError):
+            self._verificar_schema("SELECT COUNT(*) FROM tarefas WHERE data_limite < CURDATE()")
+        with pytest.raises(AssertionError):
+            self._verificar_schema("SELECT t.id FROM tarefas t WHERE t.status = 'em_execucao'")
+    
+    def test_snapshot_desatualizado_pelo_banco(self):
+        """Alteração gravada depois do snapshot o torna desatualizado em qualquer worker"""
+        from datetime import datetime
+        from utils.metricas_snapshot import MetricasSnapshotEngine
+        
+        engine = MetricasSnapshotEngine(intervalo=60)
+        snapshot_em = datetime(2026, 1, 1, 12, 0)
+        
+        assert not engine.desatualizado(1, snapshot_em, datetime(2026, 1, 1, 11, 0))
+        assert engine.desatualizado(1, snapshot_em, datetime(2026, 1, 1, 12, 5))
+        assert engine.desatualizado(1, None, None)
+        engine.marcar_alterado(1)
+        assert engine.desatualizado(1, snapshot_em, None)
+
+
+# ============================================================================
+# TESTES CAMINHO CRÍTICO (CPM)
+# ============================================================================
+
+class TestCaminhoCritico:
+    """Testes do motor de cronograma"""
+    
+    def test_caminho_critico_e_folga(self):
+        """Cadeia mais longa é crítica; tarefa paralela tem folga"""
+        from datetime import date
+        from utils.cronograma import CronogramaCPM
+        
+        cronograma = CronogramaCPM(
+            [
+                (1, date(2026, 1, 1), date(2026, 1, 5)),   # 4 dias
+                (2, date(2026, 1, 1), date(2026, 1, 3)),   # 2 dias
+                (3, date(2026, 1, 1), date(2026, 1, 4)),   # 3 dias
+            ],
+            [(1, 3, 'termino_inicio'), (2, 3, 'termino_inicio')]
+        )
+        resultado = cronograma.resultado()
+        
+        assert resultado["caminho_critico"] == [1, 3]
+        assert resultado["data_fim"] == date(2026, 1, 8)
+        folgas = {t["id"]: t["folga_dias"] for t in resultado["tarefas"]}
+        assert folgas == {1: 0, 2: 2, 3: 0}
+    
+    def test_recalculo_incremental(self):
+        """Mudança de datas de uma tarefa desloca as sucessoras"""
+        from datetime import date
+        from utils.cronograma import CronogramaCPM
+        
+        cronograma = CronogramaCPM(
+            [(1, date(2026, 1, 1), date(2026, 1, 3)), (2, None, None)],
+            [(1, 2, 'termino_inicio')]
+        )
+        cronograma.atualizar_tarefa(1, date(2026, 1, 1), date(2026, 1, 10))
+        
+        assert cronograma.resultado()["tarefas"][1]["inicio_cedo"] == date(2026, 1, 10)
+    
+    def test_ciclo_detectado(self):
+        """Dependências circulares devem gerar erro"""
+        from utils.cronograma import CronogramaCPM, CicloDependenciaError
+        
+        with pytest.raises(CicloDependenciaError):
+            CronogramaCPM(
+                [(1, None, None), (2, None, None)],
+                [(1, 2, 'termino_inicio'), (2, 1, 'inicio_inicio')]
+            )
+
+
+# ============================================================================
+# TESTES PAGINAÇÃO POR CURSOR
+# ============================================================================
+
+class TestPaginacao:
+    """Testes da paginação keyset"""
+    
+    def test_cursor_ida_e_volta(self):
+        """Última linha da página gera cursor com os mesmos valores da chave"""
+        from datetime import datetime
+        from utils.paginacao import proximo_cursor, decodificar_cursor, condicao_keyset
+        
+        linhas = [{"enviada_em": datetime(2026, 1, 1, 12, 0, i), "id": i} for i in range(3, 0, -1)]
+        cursor = proximo_cursor(linhas, 2, ("enviada_em", "id"))
+        
+        assert len(linhas) == 2
+        assert decodificar_cursor(cursor, 2) == [datetime(2026, 1, 1, 12, 0, 2), 2]
+        
+        sql, params = condicao_keyset(("m.enviada_em", "m.id"), cursor, decrescente=True)
+        assert sql == " AND ((m.enviada_em < %s) OR (m.enviada_em = %s AND m.id < %s))"
+        assert params == [datetime(2026, 1, 1, 12, 0, 2)] * 2 + [2]
+    
+    def test_ultima_pagina_e_cursor_invalido(self):
+        """Sem linha extra não há próxima página; cursor adulterado gera 400"""
+        from fastapi import HTTPException
+        from utils.paginacao import proximo_cursor, decodificar_cursor
+        
+        assert proximo_cursor([{"id": 1}], 2, ("id",)) is None
+        with pytest.raises(HTTPException) as exc:
+            decodificar_cursor("nao-e-um-cursor", 2)
+        assert exc.value.status_code == 400
+    
+    @pytest.mark.parametrize("modulo, listar", [
+        ("chat", "listar_mensagens"),
+        ("documentos", "listar_documentos"),
+        ("materiais", "listar_materiais"),
+        ("orcamentos", "listar_orcamentos"),
+    ])
+    def test_cursor_adulterado_gera_400_nas_rotas(self, modulo, listar):
+        """Cursor inválido não vira erro 500 dentro do try das listagens"""
+        import asyncio
+        import importlib
+        from fastapi import HTTPException, Response
+        from utils.paginacao import Paginacao
+        
+        rota = getattr(importlib.import_module(f"routes.{modulo}"), listar)
+        banco = BancoRoteiro({"FROM chats": [{"id": 1}]})
+        
+        with pytest.raises(HTTPException) as exc:
+            asyncio.run(rota(
+                projeto_id=1, response=Response(), pagina=Paginacao("nao-e-um-cursor", 10, False),
+                current_user={"user_id": 1}, db=banco
+            ))
+        assert exc.value.status_code == 400
+        assert banco.comandos == []
+    
+    def test_indice_cobre_keyset_das_mensagens(self):
+        """idx_chat_data = filtro (chat_id) + chave do keyset, no schema e na 009"""
+        import re
+        from routes.chat import CHAVE_MENSAGENS
+        
+        esperado = "chat_id, " + ", ".join(coluna.split(".")[1] for coluna in CHAVE_MENSAGENS)
+        pasta = os.path.join(os.path.dirname(__file__), '..', 'database')
+        for arquivo in ("schema_completo.sql", os.path.join("migrations", "009_indice_mensagens_keyset.sql")):
+            with open(os.path.join(pasta, arquivo), encoding='utf-8') as f:
+                assert re.findall(r"INDEX idx_chat_data \(([^)]*)\)", f.read()) == [esperado]
+    
+    def test_listagem_rejeita_limite_alto(self):
+        """limit acima do máximo não deve listar"""
+        response = client.get("/chat/1/mensagens?limit=10000")
+        assert response.status_code in [401, 403, 422]
+
+
+# ============================================================================
+# TESTES CHAT EM TEMPO REAL
+# ============================================================================
+
+class TestChatTempoReal:
+    """Testes do hub de chat (WebSocket/SSE)"""
+    
+    def test_evento_entregue_a_todas_conexoes(self):
+        """Mensagem publicada chega a todas as conexões do projeto"""
+        import asyncio
+        from utils.chat_hub import ChatHub, BrokerMemoria
+        
+        async def cenario():
+            hub = ChatHub(BrokerMemoria(), tamanho_fila=10, heartbeat=1)
+            a = await hub.conectar(1, 10)
+            b = await hub.conectar(1, 20)
+            outro = await hub.conectar(2, 30)
+            
+            await hub.publicar(1, "mensagem", {"id": 5, "conteudo": "Olá"})
+            
+            eventos = [json.loads(await c.proximo(1)) for c in (a, b)]
+            assert all(e["dados"]["id"] == 5 for e in eventos)
+            assert outro.fila.empty()
+            
+            await hub.desconectar(a)
+            await hub.desconectar(b)
+            assert hub.stats()["canais"] == 1
+        
+        asyncio.run(cenario())
+    
+    def test_cliente_lento_e_desconectado(self):
+        """Fila cheia encerra a conexão sem bloquear quem publica"""
+        import asyncio
+        from utils.chat_hub import ChatHub, BrokerMemoria
+        
+        async def cenario():
+            hub = ChatHub(BrokerMemoria(), tamanho_fila=2, heartbeat=1)
+            lenta = await hub.conectar(1, 10)
+            
+            for i in range(3):
+                await hub.publicar(1, "mensagem", {"id": i})
+            
+            assert lenta.motivo == "fila_cheia"
+            assert await lenta.proximo(1) is None
+            assert hub.stats()["conexoes_lentas"] == 1
+        
+        asyncio.run(cenario())
+    
+    def test_mencoes_nao_trocam_o_autor(self):
+        """Com menções, o evento e o índice de busca levam o autor, não o mencionado"""
+        import asyncio
+        from routes import chat
+        
+        banco = BancoRoteiro({"SELECT id FROM chats": [{"id": 3}]})
+        publicados, indexados = [], []
+        
+        async def publicar(projeto_id, tipo, dados):
+            publicados.append(dados)
+        
+        original_publicar = chat.chat_hub.publicar
+        original_indexar = chat.busca_mensagens.mensagem_adicionada
+        chat.chat_hub.publicar = publicar
+        chat.busca_mensagens.mensagem_adicionada = lambda projeto_id, dados: indexados.append(dados)
+        try:
+            asyncio.run(chat.enviar_mensagem(
+                1, chat.MensagemCreate(conteudo="Olá @ana @bia", mencoes=[8, 9]),
+                current_user={"user_id": 5, "nome": "Carlos"}, db=banco
+            ))
+        finally:
+            chat.chat_hub.publicar = original_publicar
+            chat.busca_mensagens.mensagem_adicionada = original_indexar
+        
+        assert publicados[0]["autor_id"] == 5
+        assert indexados[0]["autor_id"] == 5
+        notificados = [params[0] for query, params in banco.comandos if "INSERT INTO notificacoes" in query]
+        assert notificados == [8, 9]
+    
+    def test_websocket_sem_token_recusado(self):
+        """WebSocket sem token deve ser fechado antes de aceitar"""
+        from starlette.websockets import WebSocketDisconnect
+        
+        with pytest.raises(WebSocketDisconnect):
+            with client.websocket_connect("/chat/1/ws"):
+                pass
+
+
+# ============================================================================
+# TESTES BUSCA DE MENSAGENS
+# ============================================================================
+
+class TestBuscaMensagens:
+    """Testes do índice invertido de mensagens"""
+    
+    class BancoFalso:
+        """Devolve mensagens fixas no lugar da consulta de carga"""
+        
+        def __init__(self, mensagens):
+            self.mensagens = mensagens
+        
+        async def execute_query(self, query, params=None, fetch=False):
+            return [dict(m) for m in self.mensagens]
+    
+    def test_busca_sem_acento_ranking_e_destaque(self):
+        """'concretagem' encontra 'Concretagem'; mais ocorrências rankeiam antes"""
+        import asyncio
+        from utils.busca_mensagens import BuscaIndiceMemoria
+        
+        banco = self.BancoFalso([
+            {"id": 1, "conteudo": "Concretagem da laje amanhã"},
+            {"id": 2, "conteudo": "Concretagem adiada; concretagem só na sexta"},
+            {"id": 3, "conteudo": "Chegou o aço da fundação"},
+        ])
+        motor = BuscaIndiceMemoria(max_projetos=2)
+        
+        resultados, proximo = asyncio.run(motor.buscar(banco, 1, "concretagem", None, 10))
+        
+        assert [r["id"] for r in resultados] == [2, 1]
+        assert proximo is None
+        assert "<mark>Concretagem</mark>" in resultados[1]["destaque"]
+        
+        resultados, _ = asyncio.run(motor.buscar(banco, 1, "aco fundacao", None, 10))
+        assert [r["id"] for r in resultados] == [3]
+    
+    def test_paginacao_e_atualizacao_incremental(self):
+        """Cursor continua a busca; mensagens novas/removidas refletem no índice"""
+        import asyncio
+        from utils.busca_mensagens import BuscaIndiceMemoria
+        
+        banco = self.BancoFalso([{"id": i, "conteudo": f"vistoria {i}"} for i in range(1, 6)])
+        motor = BuscaIndiceMemoria()
+        
+        pagina1, cursor = asyncio.run(motor.buscar(banco, 1, "vistoria", None, 3))
+        pagina2, fim = asyncio.run(motor.buscar(banco, 1, "vistoria", cursor, 3))
+        assert [r["id"] for r in pagina1 + pagina2] == [5, 4, 3, 2, 1]
+        assert fim is None
+        
+        motor.mensagem_adicionada(1, {"id": 9, "conteudo": "Vistória final"})
+        motor.mensagem_removida(1, 5)
+        resultados, _ = asyncio.run(motor.buscar(banco, 1, "vistoria", None, 10))
+        ids = [r["id"] for r in resultados]
+        assert 9 in ids and 5 not in ids
+    
+    def test_colunas_da_busca_existem_depois_da_006(self):
+        """Mensagens da 001 + renomeações da 006 = schema_completo, que a busca consulta"""
+        import re
+        from utils.busca_mensagens import BUSCA_FULLTEXT_QUERY, INDICE_MENSAGENS_QUERY
+        
+        pasta = os.path.join(os.path.dirname(__file__), '..', 'database', 'migrations')
+        with open(os.path.join(pasta, '001_initial_schema.sql'), encoding='utf-8') as arquivo:
+            corpo = re.search(r"CREATE TABLE mensagens \((.*?)\n\) ENGINE", arquivo.read(), re.S).group(1)
+        with open(os.path.join(pasta, '006_busca_mensagens.sql'), encoding='utf-8') as arquivo:
+            migration = arquivo.read()
+        
+        colunas = {linha.split()[0] for linha in corpo.strip().splitlines()} - {"INDEX", "FOREIGN"}
+        for antiga, nova in re.findall(r"RENAME COLUMN (\w+) TO (\w+)", migration):
+            colunas = (colunas - {antiga}) | {nova}
+        
+        completo, _ = TestMetricasSnapshot._schema()
+        assert colunas == completo["mensagens"]
+        assert "ON mensagens(conteudo)" in migration
+        
+        verificador = TestMetricasSnapshot()
+        verificador._verificar_schema(BUSCA_FULLTEXT_QUERY.format(depois=""))
+        verificador._verificar_schema(INDICE_MENSAGENS_QUERY)
+
+
+# ============================================================================
+# TESTES DOWNLOAD DE DOCUMENTOS (RANGE / ETAG)
+# ============================================================================
+
+class TestDownloadDocumentos:
+    """Testes das respostas de download"""
+    
+    @pytest.fixture
+    def cliente_arquivo(self, tmp_path):
+        """App mínima servindo um arquivo com responder_arquivo"""
+        from fastapi import FastAPI, Request
+        from utils.download import responder_arquivo
+        
+        caminho = tmp_path / "planta.pdf"
+        caminho.write_bytes(bytes(range(256)) * 4)
+        
+        app_teste = FastAPI()
+        
+        @app_teste.get("/arquivo")
+        async def arquivo(request: Request):
+            return await responder_arquivo(request, str(caminho), "planta.pdf", sha256="ab" * 32)
+        
+        return TestClient(app_teste)
+    
+    def test_range_parcial(self, cliente_arquivo):
+        """Range retorna 206 apenas com o trecho pedido"""
+        response = cliente_arquivo.get("/arquivo", headers={"Range": "bytes=10-19"})
+        assert response.status_code == 206
+        assert response.content == bytes(range(10, 20))
+        assert response.headers["content-range"] == "bytes 10-19/1024"
+        
+        response = cliente_arquivo.get("/arquivo", headers={"Range": "bytes=-4"})
+        assert response.content == bytes(range(252, 256))
+        
+        response = cliente_arquivo.get("/arquivo", headers={"Range": "bytes=5000-"})
+        assert response.status_code == 416
+    
+    def test_etag_e_304(self, cliente_arquivo):
+        """ETag forte pelo hash; If-None-Match igual retorna 304 sem corpo"""
+        response = cliente_arquivo.get("/arquivo")
+        assert response.status_code == 200
+        assert len(response.content) == 1024
+        etag = response.headers["etag"]
+        assert etag == '"' + "ab" * 32 + '"'
+        
+        response = cliente_arquivo.get("/arquivo", headers={"If-None-Match": etag})
+        assert response.status_code == 304
+        assert response.content == b""
+    
+    def test_download_exige_autenticacao(self):
+        """GET /documentos/1/download sem token não deve baixar"""
+        response = client.get("/documentos/1/download")
+        assert response.status_code in [401, 403]
+
+
+# ============================================================================
+# TESTES VERSÕES EM DELTA
+# ============================================================================
+
+class TestVersoesDelta:
+    """Testes do armazenamento de versões em delta"""
+    
+    def test_delta_ida_e_volta(self):
+        """Delta pequeno para edição local e reconstrução idêntica"""
+        from utils.delta_versoes import calcular_delta, aplicar_delta
+        
+        base = b"".join(f"  10\n{i * 1.5:.4f}\n".encode() for i in range(5000))
+        alvo = base[:30000] + b"  10\nNOVA LINHA\n" + base[30000:60000] + base[61000:]
+        
+        delta = calcular_delta(base, alvo)
+        assert aplicar_delta(base, delta) == alvo
+        assert len(delta) < len(alvo) // 20
+        assert aplicar_delta(b"", calcular_delta(b"", b"\x00\x01binario")) == b"\x00\x01binario"
+    
+    def test_materializar_cadeia_com_cache(self, tmp_path):
+        """Versão 3 sai do keyframe + 2 deltas; segunda leitura vem do LRU"""
+        import asyncio
+        import hashlib
+        from utils.delta_versoes import ArmazenamentoDelta, calcular_delta
+        
+        conteudos = [b"linha a\nlinha b\n" * 50, b"linha a\nlinha c\n" * 50, b"linha d\nlinha c\n" * 50]
+        cadeia = []
+        for numero, conteudo in enumerate(conteudos, start=1):
+            caminho = tmp_path / f"v{numero}"
+            dados = conteudo if numero == 1 else calcular_delta(conteudos[numero - 2], conteudo)
+            caminho.write_bytes(dados)
+            sha = hashlib.sha256(conteudo).hexdigest()
+            cadeia.insert(0, {
+                "numero_versao": numero,
+                "caminho_arquivo": str(caminho),
+                "sha256": sha if numero == 1 else hashlib.sha256(dados).hexdigest(),
+                "conteudo_sha256": None if numero == 1 else sha,
+                "delta_base": None if numero == 1 else numero - 1
+            })
+        
+        class BancoFalso:
+            async def execute_query(self, query, params=None, fetch=False):
+                return [dict(v) for v in cadeia if v["numero_versao"] <= params[1]]
+        
+        armazenamento = ArmazenamentoDelta(ativo=True, intervalo_keyframe=10)
+        conteudo, sha = asyncio.run(armazenamento.materializar(BancoFalso(), 1, 3))
+        assert conteudo == conteudos[2]
+        assert sha == hashlib.sha256(conteudos[2]).hexdigest()
+        
+        asyncio.run(armazenamento.materializar(BancoFalso(), 1, 3))
+        assert armazenamento.stats()["cache_hits"] == 1
+
+
+# ============================================================================
+# TESTES EXPORTAÇÃO ZIP
+# ============================================================================
+
+class TestExportacaoZip:
+    """Testes do ZIP de documentos gerado em streaming"""
+    
+    def test_zip_com_manifesto(self, tmp_path):
+        """PDF sem recompressão, DXF comprimido, ausente no manifesto"""
+        import asyncio
+        import io
+        import zipfile
+        from utils.exportacao import gerar_zip
+        
+        (tmp_path / "a.pdf").write_bytes(b"%PDF-1.4 " * 1000)
+        (tmp_path / "b.dxf").write_bytes(b"  0\nLINE\n" * 1000)
+        documentos = [
+            {"id": 1, "nome": "planta.pdf", "categoria": "plantas",
+             "caminho_arquivo": str(tmp_path / "a.pdf"), "tamanho_bytes": 9000},
+            {"id": 2, "nome": "corte.dxf", "categoria": "plantas",
+             "caminho_arquivo": str(tmp_path / "b.dxf"), "tamanho_bytes": 10000},
+            {"id": 3, "nome": "sumiu.txt", "categoria": "rrt",
+             "caminho_arquivo": str(tmp_path / "nao_existe"), "tamanho_bytes": 1},
+        ]
+        
+        async def montar():
+            return b"".join([parte async for parte in gerar_zip(documentos, {"projeto_id": 7})])
+        
+        with zipfile.ZipFile(io.BytesIO(asyncio.run(montar()))) as zf:
+            assert zf.testzip() is None
+            assert zf.getinfo("plantas/planta.pdf").compress_type == zipfile.ZIP_STORED
+            assert zf.getinfo("plantas/corte.dxf").compress_type == zipfile.ZIP_DEFLATED
+            assert zf.read("plantas/corte.dxf") == b"  0\nLINE\n" * 1000
+            manifesto = json.loads(zf.read("manifesto.json"))
+        
+        assert manifesto["ausentes"] == [3]
+        assert manifesto["arquivos"] == {"1": "plantas/planta.pdf", "2": "plantas/corte.dxf"}
+    
+    def test_exportacao_exige_autenticacao(self):
+        """GET /documentos/1/export.zip sem token não deve exportar"""
+        response = client.get("/documentos/1/export.zip")
+        assert response.status_code in [401, 403]
+
+
+# ============================================================================
+# TESTES MINIATURAS
+# ============================================================================
+
+class TestMiniaturas:
+    """Testes da fila de geração de miniaturas/prévias"""
+    
+    def test_agendamento_reaproveita_e_processa(self, tmp_path):
+        """Derivado existente é reaproveitado; os demais passam pelo pool"""
+        import asyncio
+        from utils.miniaturas import GeradorMiniaturas, caminho_derivado
+        
+        sha = "cd" * 32
+        blob = tmp_path / sha
+        blob.write_bytes(b"\x89PNG\r\n\x1a\n")
+        caminho_derivado(str(blob), sha, "miniatura").write_bytes(b"RIFF")
+        
+        async def cenario():
+            gerador = GeradorMiniaturas(processos=1, tamanho_fila=4)
+            assert not gerador.agendar(sha, str(blob), "foto.png")  # pool parado
+            gerador.iniciar()
+            try:
+                assert not gerador.agendar(sha, str(blob), "memorial.docx")
+                assert gerador.agendar(sha, str(blob), "foto.png")
+                assert gerador.reaproveitados == 1
+                assert gerador.pendente(sha, "previa")
+                await asyncio.wait_for(gerador._fila.join(), 60)
+                assert not gerador.pendente(sha, "previa")
+                assert gerador.gerados + gerador.falhas == 1
+            finally:
+                await gerador.parar()
+        
+        asyncio.run(cenario())
+
+
+# ============================================================================
+# TESTES ARMAZENAMENTO DE ARQUIVOS
+# ============================================================================
+
+class TestArmazenamentoArquivos:
+    """Testes do pool de I/O e da limpeza em segundo plano"""
+    
+    def test_limpeza_repete_ate_conseguir(self, tmp_path):
+        """Limpeza que falha é repetida; a que sempre falha é abandonada"""
+        import asyncio
+        from utils.armazenamento_arquivos import ArmazenamentoArquivos
+        
+        arquivo = tmp_path / "versao.pdf"
+        arquivo.write_bytes(b"%PDF")
+        tentativas = []
+        
+        async def instavel():
+            tentativas.append(1)
+            if len(tentativas) < 3:
+                raise OSError("disco ocupado")
+            await armazenamento.remover(arquivo)
+        
+        async def quebrada():
+            raise OSError("sem permissão")
+        
+        async def cenario():
+            armazenamento.agendar_limpeza("instavel", instavel)
+            armazenamento.agendar_limpeza("quebrada", quebrada)
+            for _ in range(200):
+                if armazenamento.stats()["limpezas_pendentes"] == 0 and len(tentativas) >= 3:
+                    break
+                await asyncio.sleep(0.01)
+            await armazenamento.parar()
+        
+        armazenamento = ArmazenamentoArquivos(threads=2, tentativas=3, espera_base=0.01)
+        asyncio.run(cenario())
+        
+        assert not arquivo.exists()
+        assert armazenamento.limpezas_concluidas == 1
+        assert armazenamento.limpezas_abandonadas == 1
+        assert armazenamento.limpezas_repetidas == 4
+
+    def test_aguardar_inclui_novas_tentativas(self, tmp_path):
+        """aguardar_limpezas() só retorna depois das tentativas reagendadas"""
+        import asyncio
+        from utils.armazenamento_arquivos import ArmazenamentoArquivos
+
+        arquivo = tmp_path / "versao.pdf"
+        arquivo.write_bytes(b"%PDF")
+        tentativas = []
+
+        async def instavel():
+            tentativas.append(1)
+            if len(tentativas) < 2:
+                raise OSError("disco ocupado")
+            await armazenamento.remover(arquivo)
+
+        async def cenario():
+            armazenamento.agendar_limpeza("instavel", instavel)
+            assert await armazenamento.aguardar_limpezas(timeout=2)
+            assert not arquivo.exists()
+            await armazenamento.parar()
+
+        armazenamento = ArmazenamentoArquivos(threads=1, tentativas=3, espera_base=0.05)
+        asyncio.run(cenario())
+
+        assert armazenamento.limpezas_concluidas == 1
+
+    def test_parar_cancela_novas_tentativas(self):
+        """Nova tentativa agendada não dispara depois do parar()"""
+        import asyncio
+        from utils.armazenamento_arquivos import ArmazenamentoArquivos
+
+        erros = []
+        tentativas = []
+
+        async def quebrada():
+            tentativas.append(1)
+            raise OSError("disco ocupado")
+
+        async def cenario():
+            asyncio.get_running_loop().set_exception_handler(lambda loop, contexto: erros.append(contexto))
+            armazenamento.agendar_limpeza("quebrada", quebrada)
+            await armazenamento.parar(timeout=0.05)
+            await asyncio.sleep(0.3)  # além da espera da nova tentativa
+
+        armazenamento = ArmazenamentoArquivos(threads=1, tentativas=3, espera_base=0.1)
+        asyncio.run(cenario())
+
+        assert erros == []
+        assert tentativas == [1]
+        assert armazenamento.stats()["limpezas_pendentes"] == 0
+
+
+# ============================================================================
+# TESTES UNIDADE DE TRABALHO
+# ============================================================================
+
+class TestUnidadeDeTrabalho:
+    """Testes da conexão única por requisição"""
+    
+    class _Cursor:
+        lastrowid = 7
+        rowcount = 1
+        
+        async def execute(self, query, params):
+            pass
+        
+        async def fetchall(self):
+            return [{"id": 1}]
+        
+        async def close(self):
+            pass
+    
+    class _Conexao:
+        def __init__(self):
+            self.commits = 0
+            self.rollbacks = 0
+        
+        async def cursor(self):
+            return TestUnidadeDeTrabalho._Cursor()
+        
+        async def commit(self):
+            self.commits += 1
+        
+        async def rollback(self):
+            self.rollbacks += 1
+    
+    class _Pool:
+        def __init__(self):
+            self.checkouts = []
+            self.devolvidas = 0
+        
+        async def acquire(self):
+            conn = TestUnidadeDeTrabalho._Conexao()
+            self.checkouts.append(conn)
+            return conn
+        
+        async def release(self, conn):
+            self.devolvidas += 1
+    
+    def test_uma_conexao_e_um_commit(self):
+        """Permissão, handler e helper usam a mesma conexão; commit só no fim"""
+        import asyncio
+        from middleware.database import UnidadeDeTrabalho
+        
+        pool = self._Pool()
+        unidade = UnidadeDeTrabalho(pool)
+        
+        async def cenario():
+            assert await unidade.execute_query("SELECT 1", fetch=True) == [{"id": 1}]
+            conn = await unidade.acquire()
+            try:
+                # Helper chamado com a conexão do handler em uso (mesma task)
+                assert await unidade.execute_query("INSERT ...") == 7
+            finally:
+                await unidade.release(conn)
+            await unidade.finalizar(confirmar=True)
+            
+            # Depois da resposta, repassa ao pool
+            await unidade.release(await unidade.acquire())
+        
+        asyncio.run(cenario())
+        
+        primeira = pool.checkouts[0]
+        assert primeira.commits == 1 and primeira.rollbacks == 0
+        assert len(pool.checkouts) == 2  # 1 da requisição + 1 depois de finalizada
+        assert pool.devolvidas == 2
+    
+    def test_resposta_de_erro_faz_rollback(self):
+        """Resposta >= 400 desfaz o que a requisição escreveu"""
+        import asyncio
+        import middleware.database as database
+        from middleware.database import UnidadeDeTrabalhoMiddleware, db_atual
+        
+        pool = self._Pool()
+        
+        async def app_falha(scope, receive, send):
+            await db_atual().execute_query("UPDATE tarefas SET status = 'concluida'")
+            await send({"type": "http.response.start", "status": 403, "headers": []})
+            await send({"type": "http.response.body", "body": b""})
+        
+        enviados = []
+        
+        async def send(mensagem):
+            enviados.append(mensagem)
+        
+        original = database.get_db_pool
+        database.get_db_pool = lambda: pool
+        try:
+            asyncio.run(UnidadeDeTrabalhoMiddleware(app_falha)({"type": "http", "path": "/"}, None, send))
+        finally:
+            database.get_db_pool = original
+        
+        conn = pool.checkouts[0]
+        assert (conn.commits, conn.rollbacks) == (0, 1)
+        assert pool.devolvidas == 1
+        assert enviados[0]["status"] == 403
+    
+    def test_efeitos_so_depois_do_commit(self):
+        """Invalidações agendadas rodam após o commit e somem no rollback"""
+        import asyncio
+        from middleware.database import UnidadeDeTrabalho
+        
+        efeitos = []
+        
+        async def cenario(confirmar, falhar_commit=False):
+            pool = self._Pool()
+            unidade = UnidadeDeTrabalho(pool)
+            await unidade.execute_query("UPDATE equipes SET ativo = FALSE")
+            antes = len(efeitos)
+            unidade.apos_confirmar(lambda: efeitos.append(confirmar))
+            assert len(efeitos) == antes
+            
+            if falhar_commit:
+                async def commit():
+                    raise RuntimeError("commit falhou")
+                pool.checkouts[0].commit = commit
+            try:
+                await unidade.finalizar(confirmar)
+            except RuntimeError:
+                pass
+            
+            # Já finalizada: roda na hora
+            unidade.apos_confirmar(lambda: efeitos.append("depois"))
+        
+        asyncio.run(cenario(True))
+        assert efeitos == [True, "depois"]
+        
+        efeitos.clear()
+        asyncio.run(cenario(False))
+        asyncio.run(cenario(True, falhar_commit=True))
+        assert efeitos == ["depois", "depois"]
+    
+    def test_liberar_conexao_antes_do_streaming(self):
+        """Handler longo devolve a conexão cedo; o resto vai direto ao pool"""
+        import asyncio
+        import middleware.database as database
+        from middleware.database import UnidadeDeTrabalhoMiddleware, db_atual, liberar_conexao
+        
+        pool = self._Pool()
+        
+        async def app_longo(scope, receive, send):
+            await db_atual().execute_query("SELECT 1", fetch=True)
+            await liberar_conexao()
+            assert pool.devolvidas == 1  # antes de começar a resposta
+            await send({"type": "http.response.start", "status": 200, "headers": []})
+            await db_atual().execute_query("SELECT 2", fetch=True)
+            await send({"type": "http.response.body", "body": b""})
+        
+        async def send(mensagem):
+            pass
+        
+        pool.execute_query = lambda *args: asyncio.sleep(0, [])
+        original = database.get_db_pool
+        database.get_db_pool = lambda: pool
+        try:
+            asyncio.run(UnidadeDeTrabalhoMiddleware(app_longo)({"type": "http", "path": "/"}, None, send))
+        finally:
+            database.get_db_pool = original
+        
+        conn = pool.checkouts[0]
+        assert (conn.commits, conn.rollbacks) == (1, 0)
+        assert len(pool.checkouts) == 1 and pool.devolvidas == 1
+
+
+# ============================================================================
+# TESTES EXCLUSÃO DE TAREFA
+# ============================================================================
+
+class TestExclusaoTarefa:
+    """Testes da exclusão de tarefa (linhas do DictCursor)"""
+
+    def test_exclui_e_marca_projeto(self):
+        """Projeto lido pela chave; snapshot marcado e cronograma invalidado"""
+        import asyncio
+        from routes import tarefas
+        from middleware.permissions import permission_manager
+        from utils.metricas_snapshot import snapshot_engine
+
+        banco = BancoRoteiro({"SELECT projeto_id FROM tarefas": [{"projeto_id": 42}]})
+        invalidados = []
+
+        async def membro(usuario_id, projeto_id):
+            return projeto_id == 42
+
+        original_membro = permission_manager.is_project_member
+        original_invalidar = tarefas.cronograma_cache.invalidar
+        permission_manager.is_project_member = membro
+        tarefas.cronograma_cache.invalidar = invalidados.append
+        try:
+            resposta = asyncio.run(tarefas.deletar_tarefa(5, current_user={"user_id": 1}, db=banco))
+        finally:
+            permission_manager.is_project_member = original_membro
+            tarefas.cronograma_cache.invalidar = original_invalidar
+
+        assert resposta["message"] == "Tarefa deletada com sucesso"
+        assert banco.comandos[-1] == ("DELETE FROM tarefas WHERE id = %s", (5,))
+        assert invalidados == [42]
+        assert snapshot_engine.pendente(42)
+
+
+# ============================================================================
+# TESTES RECONCILIAÇÃO DO PROGRESSO
+# ============================================================================
+
+class TestReconciliacaoProgresso:
+    """Testes da auditoria dos contadores de progresso (migration 005)"""
+
+    def test_divergencias_detectadas(self):
+        """Consulta de auditoria aponta só os projetos com contadores errados"""
+        import sqlite3
+        from utils.reconciliacao_progresso import DIVERGENCIAS_QUERY
+
+        conn = sqlite3.connect(":memory:")
+        conn.row_factory = sqlite3.Row
+        conn.executescript("""
+            CREATE TABLE projetos (id INTEGER PRIMARY KEY, tarefas_quantidade INTEGER,
+                                   tarefas_soma_progresso REAL, progresso_percentual REAL);
+            CREATE TABLE tarefas (id INTEGER PRIMARY KEY, projeto_id INTEGER, progresso_percentual REAL);
+            INSERT INTO tarefas (projeto_id, progresso_percentual) VALUES (1, 50), (1, 100), (2, 30), (3, 10);
+            INSERT INTO projetos VALUES
+                (1, 2, 150, 75),   -- correto
+                (2, 2, 60, 30),    -- contagem e soma erradas
+                (3, 1, 10, 0),     -- percentual errado
+                (4, 0, 0, 0),      -- sem tarefas, correto
+                (5, 1, 20, 20);    -- tarefas apagadas sem trigger
+        """)
+
+        divergentes = [dict(r) for r in conn.execute(DIVERGENCIAS_QUERY)]
+
+        assert sorted(r["id"] for r in divergentes) == [2, 3, 5]
+        real = {r["id"]: (r["quantidade_real"], r["soma_real"]) for r in divergentes}
+        assert real[2] == (1, 30) and real[5] == (0, 0)
+
+    def test_corrige_apenas_divergentes(self):
+        """Reparo recalcula só os IDs divergentes; modo auditoria não altera nada"""
+        import asyncio
+        from utils import reconciliacao_progresso as modulo
+
+        job = modulo.ReconciliacaoProgresso(intervalo=0)
+
+        def rodar(divergentes, **kwargs):
+            banco = BancoRoteiro({"WHERE p.tarefas_quantidade": divergentes})
+            original = modulo.get_db_pool
+            modulo.get_db_pool = lambda: banco
+            try:
+                return asyncio.run(job.executar(**kwargs)), banco
+            finally:
+                modulo.get_db_pool = original
+
+        divergentes = [
+            {"id": i, "tarefas_quantidade": 2, "tarefas_soma_progresso": 60, "progresso_percentual": 30,
+             "quantidade_real": 1, "soma_real": 30}
+            for i in (2, 7)
+        ]
+
+        resultado, banco = rodar(divergentes, corrigir=False)
+        assert (resultado["divergentes"], resultado["corrigidos"]) == (2, 0)
+        assert len(banco.comandos) == 1
+
+        resultado, banco = rodar(divergentes)
+        assert resultado["corrigidos"] == 2
+        reparo, params = banco.comandos[-1]
+        assert reparo.lstrip().startswith("UPDATE projetos p")
+        assert "WHERE projeto_id IN (%s, %s)" in reparo and "WHERE p.id IN (%s, %s)" in reparo
+        assert params == (2, 7, 2, 7)
+        assert reparo.count("%s") == len(params)
+
+        resultado, banco = rodar([])
+        assert resultado["divergentes"] == 0 and len(banco.comandos) == 1
+        assert job.execucoes == 3 and job.divergencias_encontradas == 4
+
+    def test_schema_completo_tem_contadores_e_triggers(self):
+        """schema_completo.sql (CI/docker) traz as colunas e os triggers da migration 005"""
+        import re
+
+        base = os.path.join(os.path.dirname(__file__), '..', 'database')
+        with open(os.path.join(base, 'schema_completo.sql'), encoding='utf-8') as arquivo:
+            schema = arquivo.read()
+        with open(os.path.join(base, 'migrations', '005_progresso_incremental.sql'), encoding='utf-8') as arquivo:
+            migration = arquivo.read()
+
+        triggers = re.findall(r"CREATE TRIGGER .*?;", migration, re.S)
+        assert len(triggers) == 3
+        assert all(trigger in schema for trigger in triggers)
+        assert "tarefas_quantidade INT NOT NULL DEFAULT 0" in schema
+        assert "tarefas_soma_progresso DECIMAL(15,2) NOT NULL DEFAULT 0" in schema
+
+
+# ============================================================================
+# TESTES RELATÓRIO COMPLETO
+# ============================================================================
+
+class TestRelatorioCompleto:
+    """Testes do relatório montado a partir de uma única consulta"""
+
+    def test_uma_consulta_e_formato(self):
+        """Dashboard, produtividade e financeiro saem da mesma linha"""
+        import asyncio
+        from routes import metricas
+
+        linha = {
+            "id": 1, "nome": "Edifício", "status": "em_andamento",
+            "data_inicio": None, "data_fim_prevista": None,
+            "total": 4, "a_fazer": 1, "em_execucao": 1, "concluidas": 2, "atrasadas": 0,
+            "total_membros": 2, "orcamento_total": 1000, "gasto_total": 250,
+            "total_materiais": 3, "valor_estoque": 90, "total_documentos": 5,
+            "total_concluidas": 2, "no_prazo": 1, "concluidas_atrasadas": 1,
+            "por_membro": json.dumps([
+                {"usuario_id": 2, "nome": "B", "cargo": None, "tarefas_concluidas": 0, "tempo_medio_dias": None},
+                {"usuario_id": 1, "nome": "A", "cargo": None, "tarefas_concluidas": 2, "tempo_medio_dias": 3.5},
+            ]),
+            "evolucao": json.dumps([
+                {"data_registro": "2026-01-02", "tarefas_concluidas": 2, "tarefas_atrasadas": 0, "progresso_fisico": 50},
+                {"data_registro": "2026-01-01", "tarefas_concluidas": 1, "tarefas_atrasadas": 0, "progresso_fisico": 25},
+            ]),
+            "financeiro": json.dumps([{"categoria": "material", "previsto": 1000, "gasto": 250}]),
+        }
+        banco = BancoRoteiro({"FROM projetos p": [linha]})
+
+        relatorio = asyncio.run(metricas.relatorio_completo(1, current_user={"user_id": 1}, db=banco))
+
+        assert len(banco.comandos) == 1
+        assert banco.comandos[0][0].count("%s") == len(banco.comandos[0][1])
+        assert relatorio["dashboard"]["projeto"]["progresso"] == 50.0
+        assert relatorio["dashboard"]["orcamento"]["saldo"] == 750
+        produtividade = relatorio["produtividade"]
+        assert [m["usuario_id"] for m in produtividade["por_membro"]] == [1, 2]
+        assert produtividade["conclusao_prazo"]["taxa_sucesso"] == 50.0
+        assert produtividade["evolucao"]["concluidas_no_periodo"] == 1
+        assert relatorio["financeiro_detalhado"][0]["categoria"] == "material"
+
+    def test_projeto_inexistente(self):
+        """Sem linha, 404"""
+        import asyncio
+        from fastapi import HTTPException
+        from routes import metricas
+
+        with pytest.raises(HTTPException) as exc:
+            asyncio.run(metricas.relatorio_completo(9, current_user={"user_id": 1}, db=BancoRoteiro()))
+        assert exc.value.status_code == 404
+
+
+# ============================================================================
+# TESTES INSTRUMENTAÇÃO DE SQL
+# ============================================================================
+
+class TestInstrumentacaoSQL:
+    """Testes das métricas por consulta normalizada e do /metrics"""
+
+    def test_fingerprint_normaliza_literais_e_listas(self):
+        """Literais, parâmetros e listas IN viram a mesma consulta"""
+        from instrumentacao_sql import fingerprint
+
+        a = fingerprint("SELECT * FROM tarefas WHERE id IN (%s, %s) AND status = 'a_fazer' LIMIT 10")
+        b = fingerprint("select *  from tarefas\n WHERE id IN (1,2,3) AND status = %s LIMIT %s -- lista")
+        assert a == b == "select * from tarefas where id in (?+) and status = ? limit ?"
+
+    def test_histograma_percentis(self):
+        """Percentis com erro relativo abaixo de 1%"""
+        from instrumentacao_sql import HistogramaHDR
+
+        histograma = HistogramaHDR()
+        for valor in range(1, 100001):
+            histograma.registrar(valor)
+
+        for quantil, esperado in ((0.5, 50000), (0.95, 95000), (0.99, 99000)):
+            assert abs(histograma.percentil(quantil) - esperado) / esperado < 0.01
+
+    def test_consulta_lenta_pede_explain_uma_vez(self):
+        """Acima do limite só o primeiro SELECT pede EXPLAIN no intervalo"""
+        from instrumentacao_sql import InstrumentacaoSQL
+
+        medidor = InstrumentacaoSQL(limite_lenta_ms=100)
+        assert medidor.registrar("SELECT * FROM projetos WHERE id = 1", 0.5, 1)
+        assert not medidor.registrar("SELECT * FROM projetos WHERE id = 2", 0.5, 1)
+        assert not medidor.registrar("INSERT INTO logs VALUES (1)", 0.5, 1)
+        assert not medidor.registrar("SELECT 1", 0.001, 1)
+
+        consultas = {c["consulta"]: c for c in medidor.resumo()["consultas"]}
+        projetos = consultas["select * from projetos where id = ?"]
+        assert (projetos["chamadas"], projetos["lentas"], projetos["linhas"]) == (2, 2, 2)
+
+    def test_metrics_prometheus(self):
+        """/metrics exporta as consultas registradas em texto do Prometheus"""
+        from instrumentacao_sql import instrumentacao
+
+        instrumentacao.registrar("SELECT nome FROM usuarios WHERE email = %s", 0.002, 1)
+        response = client.get("/metrics")
+
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/plain")
+        assert 'sql_consultas_total{consulta="select nome from usuarios where email = ?"}' in response.text
+        assert "db_pool_espera_segundos_count" in response.text
+
+    def test_parametros_vem_do_config(self):
+        """A instância global usa SQL_* de config.Settings"""
+        from instrumentacao_sql import instrumentacao
+        from config import settings
+
+        assert instrumentacao.ativa == settings.SQL_INSTRUMENTACAO_ATIVA
+        assert instrumentacao.limite_lenta == settings.SQL_LENTA_MS / 1000
+        assert instrumentacao.max_consultas == settings.SQL_MAX_CONSULTAS
+
+
 # ============================================================================
 # EXECUÇÃO DOS TESTES
 # ============================================================================
@@ -493,6 +493,554 @@ class TestBackup:
         assert removidos >= 0
 
 
+# ============================================
+# 9. TESTES DE CACHE DE PERMISSÕES
+# ============================================
+
+class TestPermissionCache:
+    """Verifica cache de papéis por (usuário, projeto)"""
+    
+    def test_get_access_usa_cache(self):
+        """Acesso em cache não deve consultar o banco"""
+        import asyncio
+        from middleware.permissions import PermissionManager
+        
+        manager = PermissionManager(cache_ttl=60)
+        manager._cache_set((1, 10), {'papel': 'gerente', 'is_owner': False})
+        
+        assert asyncio.run(manager.can_modify_project(1, 10)) is True
+        assert asyncio.run(manager.is_project_member(1, 10)) is True
+        assert manager.cache_hits == 2
+        assert manager.cache_misses == 0
+    
+    def test_invalidate_por_projeto(self):
+        """Invalidar um projeto deve remover apenas os acessos dele"""
+        from middleware.permissions import PermissionManager
+        
+        manager = PermissionManager(cache_ttl=60)
+        manager._cache_set((1, 10), {'papel': 'gerente', 'is_owner': True})
+        manager._cache_set((2, 10), {'papel': 'tecnico', 'is_owner': False})
+        manager._cache_set((1, 20), {'papel': 'colaborador', 'is_owner': False})
+        
+        manager.invalidate(project_id=10)
+        
+        assert manager._cache_get((1, 10)) is None
+        assert manager._cache_get((2, 10)) is None
+        assert manager._cache_get((1, 20)) is not None
+
+
+# ============================================
+# 10. TESTES DE UPLOAD EM STREAMING
+# ============================================
+
+class TestUploadStreaming:
+    """Verifica limite, assinatura e gravação atômica do upload em blocos"""
+    
+    @staticmethod
+    async def _blocos(*partes):
+        for parte in partes:
+            yield parte
+    
+    def test_salva_e_calcula_hash(self, tmp_path):
+        """Arquivo válido é gravado com o SHA-256 do conteúdo"""
+        import asyncio
+        import hashlib
+        from utils.file_security import UploadSecurityManager
+        
+        manager = UploadSecurityManager(str(tmp_path))
+        partes = (b'%PDF-1.7\n' + b'a' * 100, b'b' * 100)
+        
+        info = asyncio.run(manager.salvar_stream(self._blocos(*partes), "doc.pdf", ".pdf", 1024))
+        
+        assert info["tamanho"] == 209
+        assert info["sha256"] == hashlib.sha256(b''.join(partes)).hexdigest()
+        assert sorted(p.name for p in tmp_path.iterdir()) == ["doc.pdf"]
+    
+    def test_limite_e_disfarce_nao_deixam_arquivo(self, tmp_path):
+        """Excesso de tamanho (413) e assinatura falsa (400) removem o temporário"""
+        import asyncio
+        from utils.file_security import UploadSecurityManager, UploadRecusado
+        
+        manager = UploadSecurityManager(str(tmp_path))
+        
+        with pytest.raises(UploadRecusado) as exc:
+            asyncio.run(manager.salvar_stream(
+                self._blocos(b'%PDF-1.7' + b'x' * 600, b'x' * 600), "grande.pdf", ".pdf", 1000
+            ))
+        assert exc.value.status_code == 413
+        
+        asyncio.run(manager.salvar_stream(
+            self._blocos(b'\x89PNG\r\n\x1a\n' + b'\x00' * 60), "ok.png", ".png", 1000
+        ))
+        with pytest.raises(UploadRecusado) as exc:
+            asyncio.run(manager.salvar_stream(
+                self._blocos(b'%PDF-1.7' + b'\x00' * 60), "falso.png", ".png", 1000
+            ))
+        assert exc.value.status_code == 400
+        assert sorted(p.name for p in tmp_path.iterdir()) == ["ok.png"]
+
+
+# ============================================
+# 11. TESTES DE BLOBS DEDUPLICADOS
+# ============================================
+
+class TestBlobStore:
+    """Verifica armazenamento por conteúdo (SHA-256)"""
+    
+    class CursorFalso:
+        """Registra as consultas no lugar do banco"""
+        
+        def __init__(self):
+            self.consultas = []
+        
+        async def execute(self, query, params=None):
+            self.consultas.append((" ".join(query.split()), params))
+    
+    @staticmethod
+    async def _blocos(*partes):
+        for parte in partes:
+            yield parte
+    
+    def test_conteudo_repetido_grava_um_blob(self, tmp_path):
+        """Segundo upload igual reaproveita o blob e soma referências"""
+        import asyncio
+        from utils.blob_store import BlobStore
+        
+        store = BlobStore(str(tmp_path))
+        cursor = self.CursorFalso()
+        conteudo = b'%PDF-1.7\n' + b'planta' * 50
+        
+        async def enviar():
+            recebido = await store.receber_stream(self._blocos(conteudo), ".pdf", 10_000)
+            return await store.guardar(cursor, recebido, referencias=2)
+        
+        primeiro = asyncio.run(enviar())
+        segundo = asyncio.run(enviar())
+        
+        assert not primeiro["deduplicado"] and segundo["deduplicado"]
+        assert primeiro["caminho"] == segundo["caminho"]
+        sha = primeiro["sha256"]
+        assert primeiro["caminho"].endswith(f"{sha[:2]}/{sha[2:4]}/{sha}")
+        
+        arquivos = [p for p in tmp_path.rglob("*") if p.is_file()]
+        assert len(arquivos) == 1 and arquivos[0].read_bytes() == conteudo
+        assert all("referencias + VALUES(referencias)" in q for q, _ in cursor.consultas)
+    
+    def test_liberar_soma_repeticoes(self, tmp_path):
+        """Referências repetidas ao mesmo blob são liberadas numa atualização"""
+        import asyncio
+        from utils.blob_store import BlobStore
+        
+        cursor = self.CursorFalso()
+        store = BlobStore(str(tmp_path))
+        afetados = asyncio.run(store.liberar(cursor, ["a" * 64, "a" * 64, None]))
+        
+        assert afetados == ["a" * 64]
+        assert cursor.consultas[0][1] == (2, "a" * 64)
+        assert cursor.consultas[1][0].startswith("DELETE FROM blobs WHERE referencias = 0")
+
+
+# ============================================
+# 12. TESTES DE ASSINATURAS DE ARQUIVO
+# ============================================
+
+class TestAssinaturas:
+    """Verifica a detecção de tipo por magic bytes"""
+    
+    @staticmethod
+    def _zip(*nomes):
+        import io
+        import zipfile
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as zf:
+            for nome in nomes:
+                zf.writestr(nome, "<xml/>")
+        return buffer.getvalue()
+    
+    def test_formatos_novos(self):
+        """DWG, 7z, gzip, tar (deslocamento 257) e OOXML dentro do ZIP"""
+        from utils.assinaturas import detectar
+        
+        assert detectar(b"AC1027\x00\x00\x00\x00\x00\x00") == "dwg"
+        assert detectar(b"7z\xbc\xaf\x27\x1c\x00\x04") == "7z"
+        assert detectar(b"\x1f\x8b\x08\x00\x00\x00") == "gzip"
+        assert detectar(bytes(257) + b"ustar\x0000") == "tar"
+        assert detectar(self._zip("[Content_Types].xml", "word/document.xml")) == "docx"
+        assert detectar(self._zip("[Content_Types].xml", "xl/workbook.xml")) == "xlsx"
+        assert detectar(self._zip("planta.dxf")) == "zip"
+        assert detectar(b"  0\nSECTION\n") is None
+    
+    def test_ooxml_disfarcado(self):
+        """Planilha enviada como .docx é recusada; .docx legítimo passa"""
+        from utils.file_security import FileSecurityValidator
+        
+        planilha = self._zip("[Content_Types].xml", "xl/workbook.xml")
+        documento = self._zip("[Content_Types].xml", "word/document.xml")
+        
+        assert FileSecurityValidator.verificar_assinatura(documento, ".docx")[0]
+        assert not FileSecurityValidator.verificar_assinatura(planilha, ".docx")[0]
+        assert not FileSecurityValidator.verificar_assinatura(b"%PDF-1.7\n", ".dwg")[0]
+
+
+# ============================================
+# 13. TESTES DOS STORES DE OTP
+# ============================================
+
+class TestOTPStore:
+    """Verifica os stores plugáveis de códigos OTP"""
+    
+    def test_memoria_capacidade_e_vencimento(self):
+        """Cheio, descarta o que vence primeiro; vencidos saem sem varredura"""
+        import time
+        from utils.otp_store import OTPStoreMemoria
+        
+        store = OTPStoreMemoria(capacidade=2)
+        store.salvar("a@email.com", "111111", 60)
+        store.salvar("b@email.com", "222222", 600)
+        store.salvar("c@email.com", "333333", 600)
+        
+        assert "a@email.com" not in store
+        assert store["c@email.com"]["code"] == "333333"
+        assert store.descartados_capacidade == 1
+        
+        store.salvar("d@email.com", "444444", 0.01)
+        time.sleep(0.02)
+        assert "d@email.com" not in store
+        assert store.limpar_expirados() == 1
+        assert len(store) == 1
+    
+    def test_sqlite_compartilhado_entre_workers(self, tmp_path):
+        """Código gerado num worker vale no outro e só é consumido uma vez"""
+        from utils.otp_store import OTPStoreSQLite
+        
+        caminho = str(tmp_path / "otp.sqlite3")
+        worker_a = OTPStoreSQLite(caminho, capacidade=100)
+        worker_b = OTPStoreSQLite(caminho, capacidade=100)
+        
+        worker_a.salvar("obra@email.com", "654321", 60)
+        assert worker_b["obra@email.com"]["code"] == "654321"
+        assert worker_b.registrar_tentativa("obra@email.com") == 1
+        assert worker_a["obra@email.com"]["attempts"] == 1
+        
+        assert worker_b.remover("obra@email.com") is True
+        assert worker_a.remover("obra@email.com") is False
+    
+    def test_limite_de_tentativas_com_palpites_paralelos(self, tmp_path):
+        """Palpites simultâneos (vários workers) não passam de MAX_TENTATIVAS_OTP"""
+        import threading
+        import utils.two_factor_auth as tfa
+        from utils.otp_store import OTPStoreSQLite
+        
+        largada = threading.Barrier(8)
+        
+        class StoreLento(OTPStoreSQLite):
+            # Todos os workers leem o registro ao mesmo tempo
+            def obter(self, email):
+                registro = super().obter(email)
+                try:
+                    largada.wait(timeout=0.5)
+                except threading.BrokenBarrierError:
+                    pass
+                return registro
+        
+        store = StoreLento(str(tmp_path / "otp.sqlite3"), capacidade=100)
+        store.salvar("obra@email.com", "123456", 60)
+        respostas = []
+        
+        def palpite():
+            respostas.append(tfa.validar_otp("obra@email.com", "000000"))
+        
+        original = tfa.otp_store
+        tfa.otp_store = store
+        try:
+            threads = [threading.Thread(target=palpite) for _ in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            
+            assert sum("incorreto" in mensagem for _, mensagem in respostas) == tfa.MAX_TENTATIVAS_OTP
+            assert tfa.validar_otp("obra@email.com", "123456")[0] is False
+        finally:
+            tfa.otp_store = original
+
+
+# ============================================
+# 14. TESTES DO POOL DE SENHAS
+# ============================================
+
+class TestPoolSenhas:
+    """Verifica o pool limitado do bcrypt (fila e recusa por sobrecarga)"""
+
+    def test_recusa_quando_fila_cheia(self):
+        """Com as threads ocupadas e a fila no limite, novas chamadas são recusadas"""
+        import asyncio
+        import threading
+        from utils.auth import ExecutorSenhas, SobrecargaSenhas
+
+        pool = ExecutorSenhas(threads=1, fila_maxima=1)
+        liberar = threading.Event()
+
+        async def cenario():
+            primeira = asyncio.ensure_future(pool.executar(liberar.wait, 5))
+            segunda = asyncio.ensure_future(pool.executar(lambda: "ok"))
+            await asyncio.sleep(0.05)
+            assert pool.stats()["fila"] == 1
+
+            with pytest.raises(SobrecargaSenhas):
+                await pool.executar(lambda: "recusada")
+
+            liberar.set()
+            return await primeira, await segunda
+
+        try:
+            assert asyncio.run(cenario()) == (True, "ok")
+        finally:
+            pool.parar()
+
+        stats = pool.stats()
+        assert stats["recusados"] == 1
+        assert stats["concluidos"] == 2
+        assert stats["pico_fila"] == 1
+        assert stats["fila"] == 0
+
+
+# ============================================
+# 15. TESTES DO CACHE DE TOKENS
+# ============================================
+
+class TestCacheTokens:
+    """Verifica o cache de JWTs verificados e a revogação"""
+
+    def test_cache_e_revogacao_no_logout(self):
+        """Token repetido vem do cache; depois do logout é recusado"""
+        from utils.auth import create_access_token
+        from utils.cache_tokens import cache_tokens
+
+        token = create_access_token({"user_id": 1, "email": "teste01@gmail.com", "nome": "Teste"})
+        headers = {"Authorization": f"Bearer {token}"}
+        hits = cache_tokens.hits
+
+        response = client.post("/auth/logout", headers=headers)
+        assert response.status_code == 200
+        assert cache_tokens.hits == hits  # primeira vez: verificado e guardado
+
+        response = client.post("/auth/logout", headers=headers)
+        assert response.status_code == 401
+        assert response.json()["detail"] == "Token revogado"
+
+    def test_entrada_vale_ate_o_exp(self):
+        """Entradas expiradas e excedentes saem do cache"""
+        import time
+        from utils.cache_tokens import CacheTokens, digest_token
+
+        cache = CacheTokens(max_entradas=2)
+        cache.guardar(digest_token("a"), {"user_id": 1}, time.time() - 1)
+        assert cache.obter(digest_token("a")) is None
+
+        for token in ("b", "c", "d"):
+            cache.guardar(digest_token(token), {"user_id": token}, time.time() + 60)
+        assert cache.obter(digest_token("b")) is None  # menos usado, descartado
+        assert cache.obter(digest_token("d")) == {"user_id": "d"}
+        assert cache.stats()["entradas"] == 2
+
+
+# ============================================
+# 16. TESTES DE REFRESH TOKEN E REVOGAÇÃO
+# ============================================
+
+class TestRefreshTokens:
+    """Verifica rotação de refresh tokens e a lista de revogação por jti"""
+
+    def test_rotacao_e_reuso(self):
+        """Refresh token vale uma vez; reuso revoga a sessão inteira"""
+        from utils.auth import create_refresh_token
+
+        refresh = create_refresh_token({"user_id": 1, "email": "teste01@gmail.com", "nome": "Teste"})
+
+        response = client.post("/auth/refresh", json={"refresh_token": refresh})
+        assert response.status_code == 200
+        novo = response.json()
+        assert novo["refresh_token"] != refresh
+
+        # O token de acesso novo funciona até o reuso do refresh antigo
+        headers = {"Authorization": f"Bearer {novo['access_token']}"}
+        response = client.post("/auth/refresh", json={"refresh_token": refresh})
+        assert response.status_code == 401
+
+        assert client.post("/auth/refresh", json={"refresh_token": novo["refresh_token"]}).status_code == 401
+        assert client.post("/auth/logout", headers=headers).status_code == 401
+
+    def test_refresh_token_nao_autentica(self):
+        """Refresh token não é aceito como token de acesso"""
+        from utils.auth import create_refresh_token
+
+        refresh = create_refresh_token({"user_id": 1, "email": "teste01@gmail.com", "nome": "Teste"})
+        response = client.post("/auth/logout", headers={"Authorization": f"Bearer {refresh}"})
+        assert response.status_code == 401
+
+    def test_sessao_tem_limite_absoluto(self):
+        """Rotação carrega o auth_time; depois de SESSAO_MAX_DIAS o refresh é recusado"""
+        import time
+        from config import settings
+        from utils.auth import create_refresh_token, decode_access_token
+
+        dados = {"user_id": 1, "email": "teste01@gmail.com", "nome": "Teste"}
+        inicio = int(time.time()) - 3600
+        response = client.post("/auth/refresh", json={
+            "refresh_token": create_refresh_token({**dados, "auth_time": inicio})
+        })
+        assert response.status_code == 200
+        assert decode_access_token(response.json()["refresh_token"])["auth_time"] == inicio
+
+        antigo = int(time.time()) - (settings.SESSAO_MAX_DIAS + 1) * 86400
+        response = client.post("/auth/refresh", json={
+            "refresh_token": create_refresh_token({**dados, "auth_time": antigo})
+        })
+        assert response.status_code == 401
+
+    def test_usuario_inativo_nao_renova(self):
+        """Usuário do banco desativado ou removido não recebe tokens novos"""
+        import routes.auth as auth
+        from utils.auth import create_refresh_token
+
+        class Banco:
+            def __init__(self, linhas):
+                self.linhas = linhas
+
+            async def execute_query(self, query, params=None, fetch=False):
+                assert "FROM usuarios" in query and params == (77,)
+                return self.linhas
+
+        dados = {"user_id": 77, "email": "cadastrado@empresa.com", "nome": "Cadastrado"}
+        original = auth.db_atual
+        try:
+            for linhas, esperado in (([{"ativo": 0}], 401), ([], 401), ([{"ativo": 1}], 200)):
+                auth.db_atual = lambda: Banco(linhas)
+                response = client.post("/auth/refresh", json={"refresh_token": create_refresh_token(dados)})
+                assert response.status_code == esperado
+        finally:
+            auth.db_atual = original
+
+    def test_refresh_tem_rate_limit(self):
+        """/auth/refresh passa pelo limitador (30/min por IP)"""
+        from middleware.rate_limit import limiter, BackendMemoria
+
+        original = limiter._backend
+        limiter._backend = BackendMemoria()
+        try:
+            codigos = [
+                client.post("/auth/refresh", json={"refresh_token": "invalido"}).status_code
+                for _ in range(31)
+            ]
+        finally:
+            limiter._backend = original
+        assert codigos[:30] == [401] * 30
+        assert codigos[30] == 429
+
+    def test_poda_dos_vencidos(self):
+        """Revogações saem do store e do filtro quando o token expiraria"""
+        import time
+        from utils.lista_revogacao import ListaRevogacaoMemoria
+
+        lista = ListaRevogacaoMemoria(capacidade=1000, intervalo_poda=3600)
+        assert lista.revogar("jti-vencido", time.time() - 1)
+        assert lista.revogar("jti-vigente", time.time() + 60)
+        assert not lista.revogar("jti-vigente", time.time() + 60)
+
+        assert lista.podar() == 1
+        assert not lista.revogado("jti-vencido")
+        assert lista.revogado("jti-vigente")
+        assert len(lista) == 1
+
+    def test_sincronia_entre_workers_depois_da_poda(self, tmp_path):
+        """Revogação feita após a poda chega aos outros workers (id não é reaproveitado)"""
+        import time
+        from utils.lista_revogacao import ListaRevogacaoSQLite
+
+        caminho = str(tmp_path / "revogados.db")
+        a = ListaRevogacaoSQLite(caminho, 0, capacidade=1000, intervalo_poda=3600)
+        a.revogar("jti-curto", time.time() + 0.2)
+        b = ListaRevogacaoSQLite(caminho, 0, capacidade=1000, intervalo_poda=3600)
+
+        time.sleep(0.3)
+        assert a.podar() == 1
+        assert a.revogar("jti-logout", time.time() + 60)
+        assert b.revogado("jti-logout")
+
+
+# ============================================
+# 17. TESTES DO RATE LIMIT (JANELA DESLIZANTE)
+# ============================================
+
+class TestJanelaDeslizante:
+    """Verifica o contador de janela deslizante e a chave por usuário"""
+
+    def test_janela_anterior_pesa_proporcionalmente(self):
+        """A contagem da janela anterior decai ao longo da janela atual"""
+        import asyncio
+        from middleware.rate_limit import BackendMemoria
+
+        backend = BackendMemoria(shards=4)
+
+        async def cenario():
+            # 10 requisições no fim da janela [0, 60)
+            for _ in range(10):
+                assert (await backend.registrar("ip:1", 10, 60, 59.0))[0]
+            assert not (await backend.registrar("ip:1", 10, 60, 59.5))[0]
+
+            # Em 75s a anterior pesa 75%: 7,5 + 1 cabe, 7,5 + 3 não
+            assert (await backend.registrar("ip:1", 10, 60, 75.0))[0]
+            assert (await backend.registrar("ip:1", 10, 60, 75.0))[0]
+            assert not (await backend.registrar("ip:1", 10, 60, 75.0))[0]
+
+            # Duas janelas depois, tudo zerado
+            assert (await backend.registrar("ip:1", 10, 60, 185.0)) == (True, 1, 0)
+
+        asyncio.run(cenario())
+        assert len(backend) == 1
+
+    def test_chave_por_usuario_autenticado(self):
+        """Com usuário autenticado a cota é dele, não do IP"""
+        from middleware.rate_limit import identificar, tempo_de_espera
+        from starlette.requests import Request
+
+        request = Request({"type": "http", "client": ("10.0.0.7", 5000), "headers": []})
+        assert identificar(request) == "ip:10.0.0.7"
+        assert identificar(request, {"user_id": 42}) == "u:42"
+
+        # 5/min cheio aos 10s da janela: espera a virada e o peso cair a 4/5
+        assert tempo_de_espera(10.0, 0.0, 60, 5, 5, 0) == 62
+
+
+# ============================================
+# 18. TESTES DA AUTENTICAÇÃO EM TEMPO REAL
+# ============================================
+
+class TestAutenticacaoTempoReal:
+    """Verifica que o WS/SSE do chat valida o token como o get_current_user"""
+
+    def test_tokens_recusados_no_stream(self):
+        """Refresh token, jti revogado e família revogada não abrem o stream"""
+        import asyncio
+        import time
+        from fastapi import HTTPException
+        from routes.chat import _autenticar_tempo_real
+        from utils.auth import create_access_token, create_refresh_token
+        from utils.lista_revogacao import lista_revogacao
+
+        dados = {"user_id": 1, "email": "teste01@gmail.com", "nome": "Teste"}
+        revogado_jti = create_access_token({**dados, "jti": "jti-ws-revogado"})
+        revogada_fam = create_access_token({**dados, "fam": "fam-ws-revogada"})
+        lista_revogacao.revogar("jti-ws-revogado", time.time() + 60)
+        lista_revogacao.revogar("fam-ws-revogada", time.time() + 60)
+
+        for token in (None, create_refresh_token(dados), revogado_jti, revogada_fam):
+            with pytest.raises(HTTPException) as erro:
+                asyncio.run(_autenticar_tempo_real(token, 1))
+            assert erro.value.status_code == 401
+
+
 # ============================================
 # EXECUTAR TESTES
 # ============================================
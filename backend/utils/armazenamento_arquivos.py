@@ -0,0 +1,203 @@
+"""
+Armazenamento de Arquivos - Gerenciador de Projetos
+Interface assíncrona para o disco sobre um pool de threads dedicado e
+fila de limpeza em segundo plano (com novas tentativas)
+"""
+
+import asyncio
+import functools
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, Optional, Union
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+Caminho = Union[str, Path]
+
+
+class ArmazenamentoArquivos:
+    """
+    Operações de arquivo fora do event loop
+
+    Usa um ThreadPoolExecutor próprio, para que uploads e exclusões
+    grandes não disputem o executor padrão do asyncio (usado pelo
+    restante da aplicação).
+
+    Limpezas (remoção de arquivos depois do commit) entram numa fila
+    consumida por uma task; uma limpeza que falha é reagendada com espera
+    exponencial até o limite de tentativas, sem segurar a requisição.
+    """
+
+    def __init__(self, threads: int = None, tentativas: int = None, espera_base: float = 1.0):
+        """
+        Args:
+            threads: Threads do pool de I/O de arquivos
+            tentativas: Tentativas de cada limpeza antes de desistir
+            espera_base: Espera (segundos) antes da 2ª tentativa; dobra a cada falha
+        """
+        self.threads = threads or settings.ARQUIVOS_THREADS
+        self.tentativas = tentativas or settings.ARQUIVOS_LIMPEZA_TENTATIVAS
+        self.espera_base = espera_base
+
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._fila: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        # Limpezas esperando nova tentativa (timer do call_later por chave)
+        self._aguardando: Dict[int, asyncio.TimerHandle] = {}
+        self._proxima_chave = 0
+
+        # Estatísticas
+        self.limpezas_concluidas = 0
+        self.limpezas_repetidas = 0
+        self.limpezas_abandonadas = 0
+
+    # ===== I/O =====
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix="arquivos")
+        return self._executor
+
+    async def executar(self, funcao: Callable, *args, **kwargs):
+        """Executa uma função bloqueante no pool de arquivos"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, functools.partial(funcao, *args, **kwargs))
+
+    async def existe(self, caminho: Caminho) -> bool:
+        return await self.executar(os.path.exists, caminho)
+
+    async def ler(self, caminho: Caminho) -> bytes:
+        return await self.executar(Path(caminho).read_bytes)
+
+    async def mover(self, origem: Caminho, destino: Caminho):
+        """Move atomicamente (os.replace), criando o diretório de destino"""
+        def _mover():
+            Path(destino).parent.mkdir(parents=True, exist_ok=True)
+            os.replace(origem, destino)
+        await self.executar(_mover)
+
+    async def remover(self, caminho: Caminho) -> bool:
+        """Remove o arquivo; False se ele já não existia"""
+        def _remover():
+            try:
+                os.remove(caminho)
+                return True
+            except FileNotFoundError:
+                return False
+        return await self.executar(_remover)
+
+    # ===== LIMPEZA EM SEGUNDO PLANO =====
+
+    def agendar_limpeza(self, descricao: str, tarefa: Callable[[], Awaitable]):
+        """
+        Agenda uma limpeza para depois da resposta
+
+        Args:
+            descricao: Identificação nos logs (ex.: "documento 42")
+            tarefa: Função sem argumentos que retorna a corrotina da limpeza;
+                deve ser idempotente (pode rodar mais de uma vez)
+        """
+        self._garantir_worker()
+        self._fila.put_nowait((descricao, tarefa, 1))
+
+    def _garantir_worker(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._worker is None or self._worker.done():
+            self._cancelar_aguardando()
+            self._loop = loop
+            self._fila = asyncio.Queue()
+            self._worker = loop.create_task(self._consumir())
+
+    async def _consumir(self):
+        while True:
+            descricao, tarefa, tentativa = await self._fila.get()
+            reagendada = False
+            try:
+                await tarefa()
+                self.limpezas_concluidas += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                if tentativa >= self.tentativas:
+                    self.limpezas_abandonadas += 1
+                    logger.error(f"Limpeza abandonada ({descricao}) após {tentativa} tentativas: {e}")
+                else:
+                    self.limpezas_repetidas += 1
+                    espera = self.espera_base * 2 ** (tentativa - 1)
+                    logger.warning(f"Limpeza falhou ({descricao}), nova tentativa em {espera:.0f}s: {e}")
+                    chave = self._proxima_chave
+                    self._proxima_chave += 1
+                    self._aguardando[chave] = asyncio.get_running_loop().call_later(
+                        espera, self._reagendar, chave, (descricao, tarefa, tentativa + 1)
+                    )
+                    reagendada = True
+            finally:
+                # Limpeza reagendada continua pendente na fila (join() espera
+                # por ela) até voltar nela em _reagendar
+                if not reagendada:
+                    self._fila.task_done()
+
+    def _reagendar(self, chave: int, item):
+        del self._aguardando[chave]
+        self._fila.put_nowait(item)
+        self._fila.task_done()
+
+    def _cancelar_aguardando(self) -> int:
+        """Cancela as novas tentativas agendadas; retorna quantas eram"""
+        for timer in self._aguardando.values():
+            timer.cancel()
+        quantidade = len(self._aguardando)
+        self._aguardando.clear()
+        return quantidade
+
+    async def aguardar_limpezas(self, timeout: float = None) -> bool:
+        """
+        Espera a fila esvaziar, incluindo as limpezas aguardando nova
+        tentativa (testes e shutdown); False se o tempo esgotou
+        """
+        if self._fila is None:
+            return True
+        try:
+            await asyncio.wait_for(self._fila.join(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    async def parar(self, timeout: float = 10.0):
+        """Conclui as limpezas pendentes (até timeout) e encerra o pool (chamado no shutdown)"""
+        if self._worker is not None and self._loop is asyncio.get_running_loop():
+            if not await self.aguardar_limpezas(timeout):
+                pendentes = self._fila.qsize() + len(self._aguardando)
+                logger.warning(f"Shutdown com {pendentes} limpeza(s) de arquivos pendente(s)")
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+        self._cancelar_aguardando()
+        self._worker = None
+        self._fila = None
+
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    def stats(self) -> Dict:
+        """Retorna estatísticas do armazenamento"""
+        return {
+            "threads": self.threads,
+            "limpezas_pendentes": (self._fila.qsize() if self._fila else 0) + len(self._aguardando),
+            "limpezas_concluidas": self.limpezas_concluidas,
+            "limpezas_repetidas": self.limpezas_repetidas,
+            "limpezas_abandonadas": self.limpezas_abandonadas
+        }
+
+
+# Instância global
+armazenamento_arquivos = ArmazenamentoArquivos()
@@ -0,0 +1,264 @@
+"""
+Detecção de Tipo por Assinatura - Gerenciador de Projetos
+Magic bytes compilados uma vez em tabelas de despacho pelo primeiro
+byte, com deslocamentos, assinaturas compostas e inspeção de contêineres
+ZIP (OOXML / OpenDocument)
+"""
+
+from typing import Dict, FrozenSet, List, Optional, Tuple
+
+# Bytes do início do arquivo necessários para a detecção
+# (tar tem a assinatura em 257; OOXML precisa das primeiras entradas do ZIP)
+TAMANHO_DETECCAO = 4096
+
+
+class Assinatura:
+    """
+    Assinatura de um formato: uma ou mais partes (deslocamento, bytes)
+
+    A primeira parte é a usada no despacho; as demais são conferidas
+    depois (ex.: WEBP = "RIFF" em 0 e "WEBP" em 8).
+    """
+
+    __slots__ = ("tipo", "partes")
+
+    def __init__(self, tipo: str, *partes: Tuple[int, bytes]):
+        self.tipo = tipo
+        self.partes = partes
+
+
+ASSINATURAS = [
+    Assinatura("pdf", (0, b"%PDF-")),
+    Assinatura("jpeg", (0, b"\xff\xd8\xff")),
+    Assinatura("png", (0, b"\x89PNG\r\n\x1a\n")),
+    Assinatura("gif", (0, b"GIF87a")),
+    Assinatura("gif", (0, b"GIF89a")),
+    Assinatura("bmp", (0, b"BM")),
+    Assinatura("webp", (0, b"RIFF"), (8, b"WEBP")),
+    Assinatura("zip", (0, b"PK\x03\x04")),
+    Assinatura("zip", (0, b"PK\x05\x06")),  # ZIP vazio
+    Assinatura("rar", (0, b"Rar!\x1a\x07")),
+    Assinatura("7z", (0, b"7z\xbc\xaf\x27\x1c")),
+    Assinatura("gzip", (0, b"\x1f\x8b\x08")),
+    Assinatura("tar", (257, b"ustar")),
+    Assinatura("ole", (0, b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1")),  # .doc/.xls/.ppt
+    Assinatura("dwg", (0, b"AC10")),  # AC1012 ... AC1032
+    Assinatura("step", (0, b"ISO-10303-21;")),
+]
+
+# Extensões aceitas para cada tipo detectado
+EXTENSOES_POR_TIPO: Dict[str, FrozenSet[str]] = {
+    "pdf": frozenset({".pdf"}),
+    "jpeg": frozenset({".jpg", ".jpeg"}),
+    "png": frozenset({".png"}),
+    "gif": frozenset({".gif"}),
+    "bmp": frozenset({".bmp"}),
+    "webp": frozenset({".webp"}),
+    # ZIP sem as entradas identificáveis no início: pode ser qualquer contêiner
+    "zip": frozenset({".zip", ".docx", ".xlsx", ".pptx", ".odt"}),
+    "ooxml": frozenset({".docx", ".xlsx", ".pptx", ".zip"}),
+    "docx": frozenset({".docx", ".zip"}),
+    "xlsx": frozenset({".xlsx", ".zip"}),
+    "pptx": frozenset({".pptx", ".zip"}),
+    "odt": frozenset({".odt", ".zip"}),
+    "rar": frozenset({".rar"}),
+    "7z": frozenset({".7z"}),
+    "gzip": frozenset({".gz"}),
+    "tar": frozenset({".tar"}),
+    "ole": frozenset({".doc", ".xls", ".ppt"}),
+    "dwg": frozenset({".dwg"}),
+    "step": frozenset({".step", ".stp"}),
+}
+
+
+def _compilar(assinaturas: List[Assinatura]) -> Tuple[Tuple[int, Dict[int, tuple]], ...]:
+    """
+    Tabelas de despacho por deslocamento: {primeiro byte: candidatos}
+
+    Candidatos (magic, tipo, partes extras) do mesmo byte ficam da
+    assinatura mais longa para a mais curta (a mais específica vence).
+    """
+    tabelas: Dict[int, Dict[int, list]] = {}
+    for assinatura in assinaturas:
+        deslocamento, magic = assinatura.partes[0]
+        tabelas.setdefault(deslocamento, {}).setdefault(magic[0], []).append(
+            (magic, assinatura.tipo, assinatura.partes[1:])
+        )
+
+    return tuple(
+        (deslocamento, {
+            byte: tuple(sorted(candidatos, key=lambda c: len(c[0]), reverse=True))
+            for byte, candidatos in tabela.items()
+        })
+        for deslocamento, tabela in sorted(tabelas.items())
+    )
+
+
+_TABELAS = _compilar(ASSINATURAS)
+
+_ZIP_LOCAL = b"PK\x03\x04"
+_MIMETYPE_ODT = b"application/vnd.oasis.opendocument.text"
+_PREFIXOS_OOXML = ((b"word/", "docx"), (b"xl/", "xlsx"), (b"ppt/", "pptx"))
+
+
+def _u16(dados: bytes, posicao: int) -> int:
+    return dados[posicao] | dados[posicao + 1] << 8
+
+
+def _u32(dados: bytes, posicao: int) -> int:
+    return _u16(dados, posicao) | _u16(dados, posicao + 2) << 16
+
+
+def _tipo_zip(cabecalho: bytes) -> str:
+    """
+    Identifica o conteúdo de um ZIP pelas entradas locais do início
+
+    Percorre os cabeçalhos locais (sem descompactar) enquanto couberem
+    no trecho lido; entradas com data descriptor (tamanho desconhecido)
+    encerram a varredura.
+    """
+    ooxml = False
+    posicao = 0
+    limite = len(cabecalho)
+
+    while posicao + 30 <= limite and cabecalho.startswith(_ZIP_LOCAL, posicao):
+        tamanho_nome = _u16(cabecalho, posicao + 26)
+        inicio_nome = posicao + 30
+        inicio_dados = inicio_nome + tamanho_nome + _u16(cabecalho, posicao + 28)
+
+        if cabecalho.startswith(b"mimetype", inicio_nome) and tamanho_nome == 8:
+            if cabecalho.startswith(_MIMETYPE_ODT, inicio_dados):
+                return "odt"
+        elif cabecalho.startswith(b"[Content_Types].xml", inicio_nome):
+            ooxml = True
+        else:
+            for prefixo, tipo in _PREFIXOS_OOXML:
+                if cabecalho.startswith(prefixo, inicio_nome):
+                    return tipo
+
+        if _u16(cabecalho, posicao + 6) & 0x08:
+            break
+        posicao = inicio_dados + _u32(cabecalho, posicao + 18)
+
+    return "ooxml" if ooxml else "zip"
+
+
+def detectar(cabecalho: bytes) -> Optional[str]:
+    """
+    Tipo do arquivo pelos primeiros bytes
+
+    O caminho comum (uma consulta de dicionário por deslocamento e
+    startswith com posição) não cria objetos intermediários.
+
+    Args:
+        cabecalho: Início do arquivo (até TAMANHO_DETECCAO bytes)
+
+    Returns:
+        Tipo detectado (chave de EXTENSOES_POR_TIPO) ou None
+    """
+    tamanho = len(cabecalho)
+    for deslocamento, tabela in _TABELAS:
+        if deslocamento >= tamanho:
+            break
+        candidatos = tabela.get(cabecalho[deslocamento])
+        if candidatos is None:
+            continue
+        for magic, tipo, extras in candidatos:
+            if not cabecalho.startswith(magic, deslocamento):
+                continue
+            if extras and not all(cabecalho.startswith(m, d) for d, m in extras):
+                continue
+            if tipo == "zip" and cabecalho.startswith(_ZIP_LOCAL):
+                return _tipo_zip(cabecalho)
+            return tipo
+    return None
+
+
+def verificar(cabecalho: bytes, ext: str) -> Tuple[bool, str]:
+    """
+    Confere a extensão declarada com o tipo detectado
+
+    Returns:
+        (aceito, mensagem); assinatura desconhecida é aceita com aviso
+    """
+    tipo = detectar(cabecalho)
+    if tipo is None:
+        return True, "Assinatura não reconhecida"
+    if ext in EXTENSOES_POR_TIPO[tipo]:
+        return True, "OK"
+    return False, f"Arquivo disfarçado: extensão '{ext}' não corresponde ao tipo real ({tipo})"
+
+
+if __name__ == '__main__':
+    # Benchmark (a partir de backend/): python -m utils.assinaturas
+    import io
+    import random
+    import time
+    import zipfile
+
+    def _zip(*nomes: str) -> bytes:
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as zf:
+            for nome in nomes:
+                zf.writestr(nome, "<xml/>" * 20)
+        return buffer.getvalue()[:TAMANHO_DETECCAO]
+
+    aleatorio = random.Random(7)
+    corpus = [
+        b"%PDF-1.7\n%\xe2\xe3\xcf\xd3\n" + bytes(4000),
+        b"\xff\xd8\xff\xe0\x00\x10JFIF\x00" + bytes(4000),
+        b"\x89PNG\r\n\x1a\n\x00\x00\x00\rIHDR" + bytes(4000),
+        b"GIF89a" + bytes(4000),
+        b"RIFF\x24\x00\x00\x00WEBPVP8 " + bytes(4000),
+        b"AC1032\x00\x00\x00\x00\x00\x00" + bytes(4000),
+        b"7z\xbc\xaf\x27\x1c\x00\x04" + bytes(4000),
+        b"\x1f\x8b\x08\x00" + bytes(4000),
+        b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1" + bytes(4000),
+        bytes(257) + b"ustar\x0000" + bytes(3000),
+        b"  0\nSECTION\n  2\nHEADER\n" * 100,  # DXF (texto, sem assinatura)
+        bytes(aleatorio.getrandbits(8) for _ in range(4096)),
+        _zip("[Content_Types].xml", "_rels/.rels", "word/document.xml"),
+        _zip("[Content_Types].xml", "_rels/.rels", "xl/workbook.xml"),
+        _zip("planta.dxf", "memorial.txt"),
+    ]
+
+    # Referências: o dicionário anterior (MAGIC_BYTES, 8 bytes) e um laço
+    # linear sobre as mesmas assinaturas desta tabela
+    magic_anterior = {
+        b'%PDF': '.pdf', b'\xff\xd8\xff': '.jpg', b'\x89PNG\r\n': '.png', b'GIF8': '.gif',
+        b'BM': '.bmp', b'PK\x03\x04': '.zip', b'Rar!\x1a\x07': '.rar',
+    }
+
+    def _anterior(cabecalho: bytes):
+        for magic, tipo in magic_anterior.items():
+            if cabecalho.startswith(magic):
+                return tipo
+        return None
+
+    def _linear(cabecalho: bytes):
+        for assinatura in ASSINATURAS:
+            if all(cabecalho.startswith(m, d) for d, m in assinatura.partes):
+                if assinatura.tipo == "zip" and cabecalho.startswith(_ZIP_LOCAL):
+                    return _tipo_zip(cabecalho)
+                return assinatura.tipo
+        return None
+
+    repeticoes = 20000
+    medicoes = (
+        ("anterior (8 bytes, 7 assinaturas)", _anterior),
+        ("linear (mesmas assinaturas)", _linear),
+        ("despacho por byte", detectar),
+    )
+    for nome, funcao in medicoes:
+        inicio = time.perf_counter()
+        for _ in range(repeticoes):
+            for cabecalho in corpus:
+                funcao(cabecalho)
+        ns = (time.perf_counter() - inicio) / (repeticoes * len(corpus)) * 1e9
+        print(f"✓ {nome}: {ns:.0f}ns por cabeçalho")
+
+    reconhecidos = [detectar(c) for c in corpus]
+    assert reconhecidos == [_linear(c) for c in corpus]
+    print(f"  Tipos: {reconhecidos}")
+    print(f"  Reconhecidos: {sum(t is not None for t in reconhecidos)}/{len(corpus)} "
+          f"(antes: {sum(_anterior(c) is not None for c in corpus)}/{len(corpus)})")
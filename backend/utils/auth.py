@@ -2,14 +2,21 @@
 Utilitários de Autenticação - JWT e Hash de Senhas
 """
 
+import asyncio
+import logging
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Callable, Dict, Optional
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from config import settings
 
-# Contexto para hash de senhas
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+logger = logging.getLogger(__name__)
+
+# Contexto para hash de senhas (custo do bcrypt configurável por ambiente)
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=settings.BCRYPT_ROUNDS)
 
 
 def hash_password(password: str) -> str:
@@ -39,10 +46,125 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
 
+class SobrecargaSenhas(Exception):
+    """Fila do pool de senhas cheia: a requisição deve ser recusada (503)"""
+
+
+class ExecutorSenhas:
+    """
+    Pool de threads limitado para o bcrypt
+
+    Cada hash/verificação leva centenas de milissegundos de CPU; rodando
+    direto num handler async, trava o event loop da API inteira. Aqui o
+    bcrypt roda em threads próprias (a biblioteca libera o GIL durante o
+    cálculo) e, com todas ocupadas e a fila no limite, novas chamadas são
+    recusadas na hora em vez de acumular latência.
+    """
+
+    def __init__(self, threads: int = None, fila_maxima: int = None):
+        """
+        Args:
+            threads: Threads do pool (bcrypts simultâneos)
+            fila_maxima: Chamadas esperando thread antes de recusar novas
+        """
+        self.threads = threads or settings.SENHA_THREADS
+        self.fila_maxima = settings.SENHA_FILA_MAXIMA if fila_maxima is None else fila_maxima
+
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._trava = threading.Lock()
+        self._ocupados = 0  # em execução + na fila
+
+        # Estatísticas
+        self.concluidos = 0
+        self.recusados = 0
+        self.pico_fila = 0
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix="senhas")
+        return self._executor
+
+    @property
+    def fila(self) -> int:
+        """Chamadas aguardando uma thread livre"""
+        return max(self._ocupados - self.threads, 0)
+
+    async def executar(self, funcao: Callable, *args):
+        """
+        Executa a função no pool
+
+        Raises:
+            SobrecargaSenhas: pool ocupado e fila no limite
+        """
+        with self._trava:
+            if self._ocupados >= self.threads + self.fila_maxima:
+                self.recusados += 1
+                raise SobrecargaSenhas(f"Fila de senhas cheia ({self.fila_maxima})")
+            self._ocupados += 1
+            self.pico_fila = max(self.pico_fila, self.fila)
+
+        # O contador só cai quando a thread termina (mesmo se o cliente desistir)
+        futuro = self.executor.submit(funcao, *args)
+        futuro.add_done_callback(self._liberar)
+        return await asyncio.wrap_future(futuro)
+
+    def _liberar(self, _futuro):
+        with self._trava:
+            self._ocupados -= 1
+            self.concluidos += 1
+
+    def parar(self):
+        """Encerra o pool (chamado no shutdown)"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    def stats(self) -> Dict:
+        """Retorna estatísticas do pool de senhas"""
+        return {
+            "threads": self.threads,
+            "em_execucao": min(self._ocupados, self.threads),
+            "fila": self.fila,
+            "fila_maxima": self.fila_maxima,
+            "pico_fila": self.pico_fila,
+            "concluidos": self.concluidos,
+            "recusados": self.recusados,
+            "rounds": settings.BCRYPT_ROUNDS
+        }
+
+
+# Instância global
+executor_senhas = ExecutorSenhas()
+
+
+async def hash_password_async(password: str) -> str:
+    """
+    hash_password fora do event loop (pool de senhas)
+
+    Raises:
+        SobrecargaSenhas: pool sobrecarregado
+    """
+    return await executor_senhas.executar(hash_password, password)
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """
+    verify_password fora do event loop (pool de senhas)
+
+    Raises:
+        SobrecargaSenhas: pool sobrecarregado
+    """
+    return await executor_senhas.executar(verify_password, plain_password, hashed_password)
+
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     """
     Cria token JWT
     
+    Cada token recebe um jti (identificador único, usado na revogação)
+    e type "access", salvo se vierem em data.
+    
     Args:
         data: Dados a serem codificados no token
         expires_delta: Tempo de expiração customizado
@@ -50,7 +172,8 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     Returns:
         Token JWT assinado
     """
-    to_encode = data.copy()
+    to_encode = {"type": "access", **data}
+    to_encode.setdefault("jti", uuid.uuid4().hex)
     
     if expires_delta:
         expire = datetime.utcnow() + expires_delta
@@ -63,6 +186,26 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     return encoded_jwt
 
 
+def create_refresh_token(data: dict, familia: Optional[str] = None) -> str:
+    """
+    Cria refresh token (REFRESH_TOKEN_EXPIRE_DAYS)
+    
+    Tokens da mesma sessão compartilham a família ("fam"): cada rotação
+    emite um token novo na família, e revogar a família encerra a sessão.
+    
+    Args:
+        data: Dados do usuário (user_id, email, nome)
+        familia: Família da sessão (nova se omitida)
+        
+    Returns:
+        Refresh token assinado
+    """
+    return create_access_token(
+        {**data, "type": "refresh", "fam": familia or uuid.uuid4().hex},
+        expires_delta=timedelta(days=settings.REFRESH_TOKEN_EXPIRE_DAYS)
+    )
+
+
 def decode_access_token(token: str) -> Optional[dict]:
     """
     Decodifica e valida token JWT
@@ -78,3 +221,58 @@ def decode_access_token(token: str) -> Optional[dict]:
         return payload
     except JWTError:
         return None
+
+
+if __name__ == '__main__':
+    # Benchmark (a partir de backend/): python -m utils.auth [logins]
+    # Latência do event loop durante logins simultâneos, com o bcrypt
+    # direto no handler e no pool de senhas
+    import sys
+    import time
+
+    logins = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    senha_hash = hash_password("SenhaSegura123")
+
+    async def _medir(verificar) -> Dict:
+        atrasos = []
+        parar = asyncio.Event()
+
+        async def _batimento():
+            # Deveria acordar a cada 5ms; o atraso é o tempo em que o loop ficou preso
+            while not parar.is_set():
+                antes = time.perf_counter()
+                await asyncio.sleep(0.005)
+                atrasos.append((time.perf_counter() - antes - 0.005) * 1000)
+
+        batimento = asyncio.create_task(_batimento())
+        await asyncio.sleep(0.05)
+        inicio = time.perf_counter()
+        await asyncio.gather(*(verificar() for _ in range(logins)))
+        total = time.perf_counter() - inicio
+        parar.set()
+        await batimento
+
+        atrasos.sort()
+        return {
+            "total_s": total,
+            "p99_ms": atrasos[int(len(atrasos) * 0.99) - 1] if atrasos else 0.0,
+            "max_ms": atrasos[-1] if atrasos else 0.0,
+            "batimentos": len(atrasos)
+        }
+
+    async def _no_loop():
+        verify_password("SenhaSegura123", senha_hash)
+
+    async def _no_pool():
+        await verify_password_async("SenhaSegura123", senha_hash)
+
+    async def _principal():
+        print(f"✓ {logins} logins simultâneos, bcrypt rounds={settings.BCRYPT_ROUNDS}, "
+              f"pool de {executor_senhas.threads} threads")
+        for nome, verificar in (("no event loop", _no_loop), ("pool de senhas", _no_pool)):
+            r = await _medir(verificar)
+            print(f"  {nome}: total {r['total_s']:.2f}s, atraso do loop máx {r['max_ms']:.1f}ms, "
+                  f"p99 {r['p99_ms']:.1f}ms ({r['batimentos']} batimentos de 5ms)")
+        executor_senhas.parar()
+
+    asyncio.run(_principal())
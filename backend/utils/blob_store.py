@@ -0,0 +1,195 @@
+"""
+Armazenamento de Documentos por Conteúdo - Gerenciador de Projetos
+Arquivos guardados uma única vez, pelo SHA-256 do conteúdo, com contagem
+de referências de documentos e versoes_documento (tabela blobs, migration 007)
+"""
+
+import hashlib
+import logging
+import os
+import tempfile
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Iterable, List
+
+from utils.armazenamento_arquivos import armazenamento_arquivos
+from utils.file_security import UploadSecurityManager
+
+logger = logging.getLogger(__name__)
+
+
+class BlobStore(UploadSecurityManager):
+    """
+    Blob store deduplicado sobre o UploadSecurityManager
+
+    Layout: <diretorio>/ab/cd/abcd...(64 hex). Cada linha de documentos
+    e de versoes_documento que aponta para o blob conta uma referência.
+
+    Concorrência entre upload e exclusão do mesmo conteúdo é resolvida
+    pela trava da linha em blobs: o upload incrementa (e trava) a linha
+    antes de colocar o arquivo no lugar; a coleta só apaga o arquivo
+    com a linha ausente e travada (SELECT ... FOR UPDATE).
+    """
+
+    def caminho_blob(self, sha256: str) -> Path:
+        """Caminho do blob no diretório fragmentado (2 níveis)"""
+        return self.diretorio_uploads / sha256[:2] / sha256[2:4] / sha256
+
+    async def guardar(self, cursor, recebido: Dict, referencias: int) -> Dict:
+        """
+        Registra o upload recebido como blob e soma referências
+
+        Deve rodar na transação que grava as linhas que apontam para o
+        blob; se ela for desfeita, chamar coletar() com o sha256.
+
+        Args:
+            cursor: Cursor da transação da rota
+            recebido: Resultado de receber_stream (temp, tamanho, sha256)
+            referencias: Linhas que passarão a apontar para o blob
+
+        Returns:
+            {"caminho", "tamanho", "sha256", "deduplicado"}
+        """
+        sha256 = recebido["sha256"]
+        destino = self.caminho_blob(sha256)
+
+        try:
+            await cursor.execute("""
+                INSERT INTO blobs (sha256, caminho_arquivo, tamanho_bytes, referencias)
+                VALUES (%s, %s, %s, %s)
+                ON DUPLICATE KEY UPDATE referencias = referencias + VALUES(referencias)
+            """, (sha256, str(destino), recebido["tamanho"], referencias))
+
+            deduplicado = await armazenamento_arquivos.existe(destino)
+            if deduplicado:
+                self.descartar_temp(recebido["temp"])
+            else:
+                await armazenamento_arquivos.mover(recebido["temp"], destino)
+        except BaseException:
+            self.descartar_temp(recebido["temp"])
+            raise
+
+        return {
+            "caminho": str(destino),
+            "tamanho": recebido["tamanho"],
+            "sha256": sha256,
+            "deduplicado": deduplicado
+        }
+
+    async def guardar_bytes(self, cursor, dados: bytes, referencias: int) -> Dict:
+        """
+        Registra conteúdo gerado pelo servidor (ex.: delta de versão) como blob
+
+        Returns:
+            {"caminho", "tamanho", "sha256", "deduplicado"}
+        """
+        fd, caminho_temp = tempfile.mkstemp(dir=self.diretorio_uploads, suffix='.part')
+        try:
+            with os.fdopen(fd, 'wb') as temp:
+                await armazenamento_arquivos.executar(temp.write, dados)
+        except BaseException:
+            self.descartar_temp(caminho_temp)
+            raise
+
+        return await self.guardar(cursor, {
+            "temp": caminho_temp,
+            "tamanho": len(dados),
+            "sha256": hashlib.sha256(dados).hexdigest()
+        }, referencias)
+
+    async def liberar(self, cursor, hashes: Iterable[str]) -> List[str]:
+        """
+        Remove uma referência por item (repetições somam) na transação da rota
+
+        Linhas com zero referências são apagadas; os arquivos só saem em
+        coletar(), depois do commit.
+
+        Returns:
+            Hashes afetados (passar para coletar após o commit)
+        """
+        contagem = Counter(h for h in hashes if h)
+        for sha256, quantidade in contagem.items():
+            await cursor.execute("""
+                UPDATE blobs SET referencias = GREATEST(referencias - %s, 0)
+                WHERE sha256 = %s
+            """, (quantidade, sha256))
+
+        if contagem:
+            marcadores = ", ".join(["%s"] * len(contagem))
+            await cursor.execute(
+                f"DELETE FROM blobs WHERE referencias = 0 AND sha256 IN ({marcadores})",
+                tuple(contagem)
+            )
+
+        return list(contagem)
+
+    async def coletar(self, db, hashes: Iterable[str], propagar_erros: bool = False) -> int:
+        """
+        Apaga os arquivos dos blobs que não estão mais registrados
+
+        Cada hash é verificado com a linha travada, para não apagar um
+        blob que um upload concorrente acabou de voltar a referenciar.
+
+        Args:
+            db: Pool de conexões
+            hashes: Hashes liberados
+            propagar_erros: Relançar falhas (para a fila de limpeza repetir)
+
+        Returns:
+            Número de arquivos apagados
+        """
+        hashes = [h for h in hashes if h]
+        if not hashes:
+            return 0
+
+        apagados = 0
+        conn = await db.acquire()
+        cursor = await conn.cursor()
+        try:
+            for sha256 in hashes:
+                await cursor.execute(
+                    "SELECT referencias FROM blobs WHERE sha256 = %s FOR UPDATE", (sha256,)
+                )
+                if await cursor.fetchone() is None:
+                    caminho = self.caminho_blob(sha256)
+                    if await armazenamento_arquivos.remover(caminho):
+                        apagados += 1
+                    # Derivados (miniaturas) guardados ao lado do blob
+                    for derivado in await armazenamento_arquivos.executar(list, caminho.parent.glob(f"{sha256}.*")):
+                        await armazenamento_arquivos.remover(derivado)
+                await conn.commit()
+        except Exception as e:
+            await conn.rollback()
+            logger.error(f"Erro ao coletar blobs: {str(e)}")
+            if propagar_erros:
+                raise
+        finally:
+            await cursor.close()
+            await db.release(conn)
+
+        if apagados:
+            logger.info(f"Blobs sem referência removidos: {apagados}")
+        return apagados
+
+    def agendar_coleta(self, db, hashes: Iterable[str], avulsos: Iterable[str] = ()):
+        """
+        Coleta em segundo plano, depois da resposta (com novas tentativas)
+
+        Args:
+            db: Pool de conexões
+            hashes: Hashes liberados na transação já confirmada
+            avulsos: Arquivos sem blob (anteriores à migration 007) a remover
+        """
+        hashes = [h for h in hashes if h]
+        avulsos = list(avulsos)
+        if not hashes and not avulsos:
+            return
+
+        async def limpar():
+            await self.coletar(db, hashes, propagar_erros=True)
+            for caminho in avulsos:
+                await armazenamento_arquivos.remover(caminho)
+
+        armazenamento_arquivos.agendar_limpeza(
+            f"{len(hashes)} blob(s), {len(avulsos)} arquivo(s) avulso(s)", limpar
+        )
@@ -0,0 +1,348 @@
+"""
+Busca de Mensagens do Chat - Gerenciador de Projetos
+Motores de busca textual (FULLTEXT do MySQL ou índice invertido em memória)
+com ranking, destaque dos termos e paginação por cursor
+"""
+
+import asyncio
+import html
+import math
+import re
+import unicodedata
+from collections import Counter, OrderedDict
+from typing import Dict, List, Optional, Set, Tuple
+
+from config import settings
+from utils.paginacao import codificar_cursor, condicao_keyset, decodificar_cursor
+
+_TOKEN = re.compile(r"\w+", re.UNICODE)
+
+# Palavras muito frequentes em português (já sem acento)
+STOPWORDS = frozenset("""
+    a o e as os de da do das dos em na no nas nos um uma uns umas
+    para pra por com sem que se ao aos ou mas como mais ja nao sim
+    eu tu ele ela nos vos eles elas me te lhe isso isto esse essa este esta
+""".split())
+
+
+# ===== TEXTO =====
+
+def normalizar(palavra: str) -> str:
+    """Minúsculas e sem acentos ("Ação" -> "acao")"""
+    decomposta = unicodedata.normalize("NFKD", palavra.lower())
+    return "".join(c for c in decomposta if not unicodedata.combining(c))
+
+
+def tokenizar(texto: str) -> List[str]:
+    """Termos indexáveis do texto (normalizados, sem stopwords)"""
+    termos = []
+    for palavra in _TOKEN.findall(texto or ""):
+        termo = normalizar(palavra)
+        if len(termo) > 1 and termo not in STOPWORDS:
+            termos.append(termo)
+    return termos
+
+
+def destacar(texto: str, termos: Set[str], tamanho: int = 160) -> str:
+    """
+    Trecho do texto com os termos buscados em <mark>
+
+    O texto é escapado (HTML) antes de receber as marcações.
+
+    Args:
+        texto: Conteúdo da mensagem
+        termos: Termos da busca já normalizados
+        tamanho: Tamanho máximo do trecho
+
+    Returns:
+        Trecho em HTML com os termos destacados
+    """
+    texto = texto or ""
+    ocorrencias = [m for m in _TOKEN.finditer(texto) if normalizar(m.group()) in termos]
+
+    inicio = 0
+    if len(texto) > tamanho and ocorrencias:
+        inicio = max(0, min(ocorrencias[0].start() - tamanho // 4, len(texto) - tamanho))
+    fim = min(len(texto), inicio + tamanho)
+
+    partes = ["…"] if inicio > 0 else []
+    posicao = inicio
+    for m in ocorrencias:
+        if m.start() < inicio or m.end() > fim:
+            continue
+        partes.append(html.escape(texto[posicao:m.start()]))
+        partes.append(f"<mark>{html.escape(m.group())}</mark>")
+        posicao = m.end()
+    partes.append(html.escape(texto[posicao:fim]))
+    if fim < len(texto):
+        partes.append("…")
+
+    return "".join(partes)
+
+
+# ===== MOTORES =====
+
+class MotorBusca:
+    """
+    Interface dos motores de busca de mensagens
+
+    As rotas do chat avisam o motor de cada mensagem inserida ou
+    removida; motores apoiados no banco podem ignorar os avisos.
+    """
+
+    nome = "base"
+
+    async def buscar(self, db, projeto_id: int, termo: str,
+                     cursor: Optional[str], limite: int) -> Tuple[List[dict], Optional[str]]:
+        """
+        Busca mensagens do projeto por relevância
+
+        Returns:
+            (resultados da página, cursor da próxima página ou None)
+        """
+        raise NotImplementedError
+
+    def mensagem_adicionada(self, projeto_id: int, mensagem: dict):
+        """Aviso de mensagem nova (id, chat_id, autor_id, autor_nome, conteudo, enviada_em)"""
+
+    def mensagem_removida(self, projeto_id: int, mensagem_id: int):
+        """Aviso de mensagem removida"""
+
+    def stats(self) -> Dict:
+        return {"motor": self.nome}
+
+
+BUSCA_FULLTEXT_QUERY = """
+    SELECT m.*, u.nome as autor_nome,
+           MATCH(m.conteudo) AGAINST (%s IN NATURAL LANGUAGE MODE) as relevancia
+    FROM mensagens m
+    INNER JOIN chats c ON m.chat_id = c.id
+    LEFT JOIN usuarios u ON m.autor_id = u.id
+    WHERE c.projeto_id = %s
+      AND MATCH(m.conteudo) AGAINST (%s IN NATURAL LANGUAGE MODE)
+    HAVING TRUE{depois}
+    ORDER BY relevancia DESC, m.id DESC
+    LIMIT %s
+"""
+
+
+class BuscaFulltext(MotorBusca):
+    """Busca pelo índice FULLTEXT de mensagens.conteudo (migration 006)"""
+
+    nome = "fulltext"
+
+    async def buscar(self, db, projeto_id, termo, cursor, limite):
+        depois, params_cursor = condicao_keyset(("relevancia", "m.id"), cursor, decrescente=True)
+        resultados = await db.execute_query(
+            BUSCA_FULLTEXT_QUERY.format(depois=depois),
+            (termo, projeto_id, termo, *params_cursor, limite + 1),
+            fetch=True
+        )
+
+        proximo = None
+        if len(resultados) > limite:
+            del resultados[limite:]
+            ultima = resultados[-1]
+            proximo = codificar_cursor([ultima['relevancia'], ultima['id']])
+
+        termos = set(tokenizar(termo))
+        for row in resultados:
+            row['destaque'] = destacar(row.get('conteudo'), termos)
+        return resultados, proximo
+
+
+INDICE_MENSAGENS_QUERY = """
+    SELECT m.id, m.chat_id, m.autor_id, u.nome as autor_nome, m.conteudo, m.enviada_em
+    FROM mensagens m
+    INNER JOIN chats c ON m.chat_id = c.id
+    LEFT JOIN usuarios u ON m.autor_id = u.id
+    WHERE c.projeto_id = %s
+"""
+
+
+class IndiceProjeto:
+    """Índice invertido das mensagens de um projeto com ranking BM25"""
+
+    K1 = 1.2
+    B = 0.75
+
+    def __init__(self):
+        self.postings: Dict[str, Dict[int, int]] = {}  # termo -> {mensagem_id: frequência}
+        self.docs: Dict[int, Tuple[int, Tuple[str, ...], dict]] = {}  # id -> (tamanho, termos, mensagem)
+        self.total_termos = 0
+
+        # Carga inicial: remoções avisadas durante a consulta não podem
+        # ser reinseridas por ela
+        self.carregado = asyncio.Event()
+        self.removidas_na_carga: Set[int] = set()
+
+    def adicionar(self, mensagem: dict):
+        mensagem_id = mensagem['id']
+        if mensagem_id in self.docs or mensagem_id in self.removidas_na_carga:
+            return
+
+        frequencias = Counter(tokenizar(mensagem.get('conteudo')))
+        for termo, freq in frequencias.items():
+            self.postings.setdefault(termo, {})[mensagem_id] = freq
+
+        tamanho = sum(frequencias.values())
+        self.docs[mensagem_id] = (tamanho, tuple(frequencias), mensagem)
+        self.total_termos += tamanho
+
+    def remover(self, mensagem_id: int):
+        if not self.carregado.is_set():
+            self.removidas_na_carga.add(mensagem_id)
+        doc = self.docs.pop(mensagem_id, None)
+        if doc is None:
+            return
+
+        tamanho, termos, _ = doc
+        self.total_termos -= tamanho
+        for termo in termos:
+            lista = self.postings.get(termo)
+            if lista is not None:
+                lista.pop(mensagem_id, None)
+                if not lista:
+                    del self.postings[termo]
+
+    def pontuar(self, termos: List[str]) -> Dict[int, float]:
+        """Pontuação BM25 das mensagens que contêm algum dos termos"""
+        total_docs = len(self.docs)
+        if not total_docs:
+            return {}
+
+        media = self.total_termos / total_docs or 1.0
+        pontos: Dict[int, float] = {}
+        for termo in set(termos):
+            lista = self.postings.get(termo)
+            if not lista:
+                continue
+
+            idf = math.log(1 + (total_docs - len(lista) + 0.5) / (len(lista) + 0.5))
+            for mensagem_id, freq in lista.items():
+                tamanho = self.docs[mensagem_id][0]
+                peso = freq * (self.K1 + 1) / (freq + self.K1 * (1 - self.B + self.B * tamanho / media))
+                pontos[mensagem_id] = pontos.get(mensagem_id, 0.0) + idf * peso
+
+        return pontos
+
+
+class BuscaIndiceMemoria(MotorBusca):
+    """
+    Índice invertido em memória, por projeto
+
+    O índice de um projeto é montado na primeira busca (uma consulta) e
+    depois mantido pelos avisos de mensagem inserida/removida. Apenas os
+    max_projetos mais recentes ficam em memória (LRU). Indicado para um
+    único worker; com vários, cada um mantém o próprio índice.
+    """
+
+    nome = "indice"
+
+    def __init__(self, max_projetos: int = None):
+        self.max_projetos = max_projetos or settings.CHAT_BUSCA_MAX_PROJETOS
+        self._indices: "OrderedDict[int, IndiceProjeto]" = OrderedDict()
+
+        # Estatísticas
+        self.cargas = 0
+        self.buscas = 0
+
+    async def _obter_indice(self, db, projeto_id: int) -> IndiceProjeto:
+        indice = self._indices.get(projeto_id)
+        if indice is not None:
+            self._indices.move_to_end(projeto_id)
+            if not indice.carregado.is_set():
+                # Outra busca está carregando o mesmo projeto
+                await indice.carregado.wait()
+                if projeto_id not in self._indices:
+                    return await self._obter_indice(db, projeto_id)
+            return indice
+
+        # Registrado antes da consulta: avisos recebidos durante a carga
+        # já entram no índice e não são sobrescritos por ela
+        indice = IndiceProjeto()
+        self._indices[projeto_id] = indice
+        while len(self._indices) > self.max_projetos:
+            self._indices.popitem(last=False)
+
+        try:
+            mensagens = await db.execute_query(INDICE_MENSAGENS_QUERY, (projeto_id,), fetch=True)
+        except Exception:
+            self._indices.pop(projeto_id, None)
+            indice.carregado.set()
+            raise
+
+        for mensagem in mensagens:
+            indice.adicionar(mensagem)
+        indice.removidas_na_carga.clear()
+        indice.carregado.set()
+        self.cargas += 1
+        return indice
+
+    async def buscar(self, db, projeto_id, termo, cursor, limite):
+        indice = await self._obter_indice(db, projeto_id)
+        termos = tokenizar(termo)
+        self.buscas += 1
+
+        ranking = sorted(
+            ((round(pontos, 6), mensagem_id) for mensagem_id, pontos in indice.pontuar(termos).items()),
+            reverse=True
+        )
+        if cursor:
+            chave = tuple(decodificar_cursor(cursor, 2))
+            ranking = [item for item in ranking if item < chave]
+
+        pagina = ranking[:limite]
+        proximo = codificar_cursor(list(pagina[-1])) if len(ranking) > limite else None
+
+        busca = set(termos)
+        resultados = []
+        for pontos, mensagem_id in pagina:
+            mensagem = dict(indice.docs[mensagem_id][2])
+            mensagem['relevancia'] = pontos
+            mensagem['destaque'] = destacar(mensagem.get('conteudo'), busca)
+            resultados.append(mensagem)
+
+        return resultados, proximo
+
+    def mensagem_adicionada(self, projeto_id, mensagem):
+        indice = self._indices.get(projeto_id)
+        if indice is not None:
+            indice.adicionar(mensagem)
+
+    def mensagem_removida(self, projeto_id, mensagem_id):
+        indice = self._indices.get(projeto_id)
+        if indice is not None:
+            indice.remover(mensagem_id)
+
+    def stats(self) -> Dict:
+        return {
+            "motor": self.nome,
+            "projetos_indexados": len(self._indices),
+            "mensagens_indexadas": sum(len(i.docs) for i in self._indices.values()),
+            "cargas": self.cargas,
+            "buscas": self.buscas
+        }
+
+
+MOTORES = {
+    "fulltext": BuscaFulltext,
+    "indice": BuscaIndiceMemoria,
+}
+
+
+def criar_motor_busca(nome: str = None) -> MotorBusca:
+    """
+    Cria o motor configurado em CHAT_BUSCA_MOTOR
+
+    Raises:
+        ValueError se o motor não existir
+    """
+    nome = nome or settings.CHAT_BUSCA_MOTOR
+    if nome not in MOTORES:
+        raise ValueError(f"Motor de busca desconhecido: {nome}")
+    return MOTORES[nome]()
+
+
+# Instância global
+busca_mensagens = criar_motor_busca()
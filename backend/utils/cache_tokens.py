@@ -0,0 +1,132 @@
+"""
+Cache de Tokens Verificados - Gerenciador de Projetos
+Claims de JWTs já validados (LRU pelo digest do token, válidos até o
+exp) e conjunto de tokens revogados
+"""
+
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from jose import JWTError, jwt
+
+from config import settings
+
+
+def digest_token(token: str) -> bytes:
+    """Chave do token no cache (o token em si não fica guardado)"""
+    return hashlib.blake2b(token.encode(), digest_size=16).digest()
+
+
+class CacheTokens:
+    """
+    LRU de tokens já verificados
+
+    Um cliente repete o mesmo token em todas as requisições; depois da
+    primeira verificação (assinatura e claims), as seguintes viram uma
+    consulta de dicionário. Cada entrada vale até o exp do próprio token,
+    então o cache nunca aceita um token que o jwt.decode recusaria por
+    expiração.
+
+    Revogações (logout) ficam num dicionário digest -> exp, consultado
+    em O(1) antes do cache; entradas saem quando o token expiraria.
+    """
+
+    def __init__(self, max_entradas: int = None):
+        """
+        Args:
+            max_entradas: Tokens em cache (0 = sem cache)
+        """
+        self.max_entradas = settings.TOKEN_CACHE_MAX_ENTRIES if max_entradas is None else max_entradas
+        self._itens: "OrderedDict[bytes, Tuple[float, Dict]]" = OrderedDict()
+        self._revogados: Dict[bytes, float] = {}
+        self._limite_poda = 1024
+
+        # Estatísticas
+        self.hits = 0
+        self.misses = 0
+        self.recusados_revogacao = 0
+
+    def obter(self, chave: bytes) -> Optional[Dict]:
+        """Usuário do token em cache ou None (ausente ou expirado)"""
+        item = self._itens.get(chave)
+        if item is None:
+            self.misses += 1
+            return None
+        if item[0] <= time.time():
+            del self._itens[chave]
+            self.misses += 1
+            return None
+        self._itens.move_to_end(chave)
+        self.hits += 1
+        return item[1]
+
+    def guardar(self, chave: bytes, usuario: Dict, expira: Optional[float]):
+        """Guarda o usuário até o exp do token (tokens sem exp não entram)"""
+        if self.max_entradas <= 0 or expira is None:
+            return
+        self._itens[chave] = (float(expira), usuario)
+        self._itens.move_to_end(chave)
+        while len(self._itens) > self.max_entradas:
+            self._itens.popitem(last=False)
+
+    def revogado(self, chave: bytes) -> bool:
+        """True se o token (pelo digest) foi revogado e ainda não expirou"""
+        if not self._revogados:
+            return False
+        expira = self._revogados.get(chave)
+        if expira is None:
+            return False
+        if expira <= time.time():
+            del self._revogados[chave]
+            return False
+        self.recusados_revogacao += 1
+        return True
+
+    def revogar(self, token: str, expira: float = None):
+        """
+        Revoga o token até ele expirar
+
+        Args:
+            token: JWT a revogar
+            expira: exp do token (lido das claims se omitido)
+        """
+        if expira is None:
+            try:
+                expira = jwt.get_unverified_claims(token).get("exp")
+            except JWTError:
+                expira = None
+            if expira is None:
+                expira = time.time() + settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60
+
+        # Poda dos já expirados quando o conjunto dobra (custo amortizado O(1))
+        if len(self._revogados) >= self._limite_poda:
+            agora = time.time()
+            self._revogados = {k: v for k, v in self._revogados.items() if v > agora}
+            self._limite_poda = max(2 * len(self._revogados), 1024)
+
+        chave = digest_token(token)
+        self._revogados[chave] = float(expira)
+        self._itens.pop(chave, None)
+
+    def limpar(self):
+        """Esvazia o cache (revogações continuam valendo)"""
+        self._itens.clear()
+
+    def stats(self) -> Dict:
+        """Retorna estatísticas do cache de tokens"""
+        total = self.hits + self.misses
+        return {
+            "entradas": len(self._itens),
+            "max_entradas": self.max_entradas,
+            "hits": self.hits,
+            "misses": self.misses,
+            "taxa_acerto": round(self.hits / total, 4) if total else 0.0,
+            "revogados": len(self._revogados),
+            "recusados_revogacao": self.recusados_revogacao
+        }
+
+
+# Instância global
+cache_tokens = CacheTokens()
@@ -0,0 +1,262 @@
+"""
+Hub de Chat em Tempo Real - Gerenciador de Projetos
+Distribui os eventos do chat de cada projeto para as conexões
+WebSocket/SSE abertas, sem que os clientes precisem consultar a API
+"""
+
+import asyncio
+import json
+import logging
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Callable, Dict, Optional, Set
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+
+def _json_padrao(valor):
+    if isinstance(valor, (datetime, date)):
+        return valor.isoformat()
+    if isinstance(valor, Decimal):
+        return float(valor)
+    raise TypeError(f"Tipo não serializável: {type(valor).__name__}")
+
+
+# ===== BROKER =====
+
+class BrokerChat:
+    """
+    Interface do broker de eventos do chat
+
+    O hub publica cada evento no canal do projeto e recebe de volta, via
+    callback, os eventos dos canais que assinou. Com um único worker o
+    broker em memória basta; com vários workers, um broker compartilhado
+    (ex.: Redis pub/sub) implementa a mesma interface e cada worker
+    entrega os eventos às suas próprias conexões.
+    """
+
+    async def publicar(self, canal: str, evento: str):
+        """Publica um evento (já serializado) no canal"""
+        raise NotImplementedError
+
+    async def assinar(self, canal: str, entregar: Callable[[str, str], None]):
+        """Passa a receber os eventos do canal em entregar(canal, evento)"""
+        raise NotImplementedError
+
+    async def cancelar(self, canal: str):
+        """Deixa de receber os eventos do canal"""
+        raise NotImplementedError
+
+    async def fechar(self):
+        """Libera recursos do broker (chamado no shutdown)"""
+
+
+class BrokerMemoria(BrokerChat):
+    """Broker no próprio processo (um worker)"""
+
+    def __init__(self):
+        self._assinaturas: Dict[str, Callable[[str, str], None]] = {}
+
+    async def publicar(self, canal: str, evento: str):
+        entregar = self._assinaturas.get(canal)
+        if entregar is not None:
+            entregar(canal, evento)
+
+    async def assinar(self, canal: str, entregar: Callable[[str, str], None]):
+        self._assinaturas[canal] = entregar
+
+    async def cancelar(self, canal: str):
+        self._assinaturas.pop(canal, None)
+
+
+BROKERS = {
+    "memoria": BrokerMemoria,
+}
+
+
+def criar_broker(nome: str = None) -> BrokerChat:
+    """
+    Cria o broker configurado em CHAT_BROKER
+
+    Raises:
+        ValueError se o broker não existir
+    """
+    nome = nome or settings.CHAT_BROKER
+    if nome not in BROKERS:
+        raise ValueError(f"Broker de chat desconhecido: {nome}")
+    return BROKERS[nome]()
+
+
+# ===== CONEXÕES =====
+
+class ConexaoChat:
+    """
+    Conexão de um cliente com fila de envio limitada
+
+    O hub nunca espera o cliente: os eventos entram na fila sem bloquear.
+    Se a fila enche (cliente lento ou parado), a conexão é encerrada em vez
+    de descartar mensagens em silêncio; o cliente reconecta e recupera o
+    que perdeu pela listagem paginada de mensagens.
+    """
+
+    def __init__(self, projeto_id: int, usuario_id: int, tamanho_fila: int):
+        self.projeto_id = projeto_id
+        self.usuario_id = usuario_id
+        self.fila: asyncio.Queue = asyncio.Queue(maxsize=tamanho_fila)
+        self.encerrada = False
+        self.motivo: Optional[str] = None
+
+    def enfileirar(self, evento: str) -> bool:
+        """Coloca evento na fila; False se a conexão foi (ou acabou de ser) encerrada"""
+        if self.encerrada:
+            return False
+        try:
+            self.fila.put_nowait(evento)
+            return True
+        except asyncio.QueueFull:
+            self.encerrar("fila_cheia")
+            return False
+
+    def encerrar(self, motivo: str):
+        """Encerra a conexão e acorda quem estiver esperando em proximo()"""
+        if self.encerrada:
+            return
+        self.encerrada = True
+        self.motivo = motivo
+
+        # Esvazia a fila para caber o sinal de encerramento
+        while not self.fila.empty():
+            self.fila.get_nowait()
+        self.fila.put_nowait(None)
+
+    async def proximo(self, timeout: float) -> Optional[str]:
+        """
+        Aguarda o próximo evento
+
+        Returns:
+            Evento serializado, "" se o tempo esgotou (enviar heartbeat)
+            ou None se a conexão foi encerrada
+        """
+        if self.encerrada and self.fila.empty():
+            return None
+        try:
+            return await asyncio.wait_for(self.fila.get(), timeout)
+        except asyncio.TimeoutError:
+            return ""
+
+
+# ===== HUB =====
+
+class ChatHub:
+    """
+    Pub/sub dos chats de projeto
+
+    Cada projeto é um canal; o hub assina no broker apenas os canais com
+    conexões locais. O evento é serializado uma vez por publicação e a
+    mesma string é enfileirada para todas as conexões do canal.
+    """
+
+    def __init__(self, broker: BrokerChat = None, tamanho_fila: int = None, heartbeat: float = None):
+        """
+        Args:
+            broker: Broker de eventos (padrão: CHAT_BROKER)
+            tamanho_fila: Eventos pendentes por conexão antes de encerrá-la
+            heartbeat: Segundos sem eventos até enviar um ping
+        """
+        self.broker = broker or criar_broker()
+        self.tamanho_fila = tamanho_fila or settings.CHAT_FILA_MAXIMA
+        self.heartbeat = heartbeat or settings.CHAT_HEARTBEAT
+
+        self._conexoes: Dict[str, Set[ConexaoChat]] = {}
+
+        # Estatísticas
+        self.eventos_publicados = 0
+        self.eventos_entregues = 0
+        self.conexoes_lentas = 0
+        self.falhas_publicacao = 0
+
+    @staticmethod
+    def canal(projeto_id: int) -> str:
+        return f"chat:{projeto_id}"
+
+    async def conectar(self, projeto_id: int, usuario_id: int) -> ConexaoChat:
+        """Registra uma conexão no canal do projeto"""
+        conexao = ConexaoChat(projeto_id, usuario_id, self.tamanho_fila)
+        canal = self.canal(projeto_id)
+
+        conexoes = self._conexoes.setdefault(canal, set())
+        conexoes.add(conexao)
+        if len(conexoes) == 1:
+            await self.broker.assinar(canal, self._entregar)
+
+        return conexao
+
+    async def desconectar(self, conexao: ConexaoChat):
+        """Remove a conexão; cancela a assinatura do canal se for a última"""
+        conexao.encerrar(conexao.motivo or "desconectado")
+        canal = self.canal(conexao.projeto_id)
+
+        conexoes = self._conexoes.get(canal)
+        if conexoes is None:
+            return
+        conexoes.discard(conexao)
+        if not conexoes:
+            del self._conexoes[canal]
+            await self.broker.cancelar(canal)
+
+    async def publicar(self, projeto_id: int, tipo: str, dados: dict):
+        """
+        Publica um evento no chat do projeto
+
+        Falhas do broker são registradas e não interrompem a requisição
+        que originou o evento (a mensagem já foi gravada no banco).
+        """
+        evento = json.dumps(
+            {"tipo": tipo, "projeto_id": projeto_id, "dados": dados},
+            default=_json_padrao,
+            ensure_ascii=False
+        )
+        try:
+            await self.broker.publicar(self.canal(projeto_id), evento)
+            self.eventos_publicados += 1
+        except Exception as e:
+            self.falhas_publicacao += 1
+            logger.warning(f"Falha ao publicar evento do chat {projeto_id}: {e}")
+
+    def _entregar(self, canal: str, evento: str):
+        """Callback do broker: distribui o evento às conexões locais"""
+        for conexao in list(self._conexoes.get(canal, ())):
+            if conexao.enfileirar(evento):
+                self.eventos_entregues += 1
+            elif conexao.motivo == "fila_cheia":
+                self.conexoes_lentas += 1
+                logger.info(
+                    f"Conexão de chat encerrada por fila cheia "
+                    f"(projeto {conexao.projeto_id}, usuário {conexao.usuario_id})"
+                )
+
+    async def fechar(self):
+        """Encerra todas as conexões e o broker (chamado no shutdown)"""
+        for conexoes in list(self._conexoes.values()):
+            for conexao in list(conexoes):
+                conexao.encerrar("desligamento")
+        self._conexoes.clear()
+        await self.broker.fechar()
+
+    def stats(self) -> Dict:
+        """Retorna estatísticas do hub"""
+        return {
+            "broker": type(self.broker).__name__,
+            "canais": len(self._conexoes),
+            "conexoes": sum(len(c) for c in self._conexoes.values()),
+            "eventos_publicados": self.eventos_publicados,
+            "eventos_entregues": self.eventos_entregues,
+            "conexoes_lentas": self.conexoes_lentas,
+            "falhas_publicacao": self.falhas_publicacao
+        }
+
+
+# Instância global
+chat_hub = ChatHub()
@@ -0,0 +1,431 @@
+"""
+Cronograma - Método do Caminho Crítico (CPM)
+Calcula datas cedo/tarde, folgas e caminho crítico a partir de tarefa_dependencias
+"""
+
+import heapq
+import time
+from collections import OrderedDict
+from datetime import date, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Tipos de dependência (tarefa_dependencias.tipo)
+# tarefa_id é a predecessora, tarefa_dependente_id a sucessora
+TERMINO_INICIO = 0    # sucessora começa após o término da predecessora
+INICIO_INICIO = 1     # sucessora começa após o início da predecessora
+TERMINO_TERMINO = 2   # sucessora termina após o término da predecessora
+
+TIPOS_DEPENDENCIA = {
+    'termino_inicio': TERMINO_INICIO,
+    'inicio_inicio': INICIO_INICIO,
+    'termino_termino': TERMINO_TERMINO
+}
+
+# Tarefas e predecessoras do projeto em uma única consulta
+# (uma linha por dependência; tarefas sem predecessora vêm com pred NULL)
+CRONOGRAMA_QUERY = """
+    SELECT
+        t.id, t.data_inicio, t.data_fim_prevista,
+        d.tarefa_id as predecessora_id, d.tipo
+    FROM tarefas t
+    LEFT JOIN tarefa_dependencias d ON d.tarefa_dependente_id = t.id
+    WHERE t.projeto_id = %s
+"""
+
+
+class CicloDependenciaError(ValueError):
+    """Dependências formam um ciclo; o cronograma não pode ser calculado"""
+
+    def __init__(self, ciclo: List[int]):
+        self.ciclo = ciclo
+        super().__init__(
+            "Dependências circulares entre as tarefas: " + " -> ".join(str(t) for t in ciclo)
+        )
+
+
+class CronogramaCPM:
+    """
+    Grafo de tarefas de um projeto com passagens de ida e volta do CPM
+
+    Durações em dias (data_fim_prevista - data_inicio). data_inicio, quando
+    informada, funciona como "não iniciar antes de". Internamente as datas
+    são deslocamentos inteiros a partir de `base`, e o grafo usa índices
+    (listas), o que mantém as passagens lineares em tarefas + dependências.
+    """
+
+    def __init__(
+        self,
+        tarefas: Iterable[Tuple[int, Optional[date], Optional[date]]],
+        dependencias: Iterable[Tuple[int, int, str]] = ()
+    ):
+        """
+        Args:
+            tarefas: (id, data_inicio, data_fim_prevista)
+            dependencias: (predecessora_id, sucessora_id, tipo)
+
+        Raises:
+            CicloDependenciaError: se as dependências tiverem ciclo
+        """
+        tarefas = list(tarefas)
+        inicios = [t[1] for t in tarefas if t[1] is not None]
+        self.base: date = min(inicios) if inicios else date.today()
+
+        self.ids: List[int] = []
+        self.indice: Dict[int, int] = {}
+        self.duracao: List[int] = []
+        self.liberacao: List[int] = []
+
+        for tarefa_id, data_inicio, data_fim in tarefas:
+            self.indice[tarefa_id] = len(self.ids)
+            self.ids.append(tarefa_id)
+            self.duracao.append(self._duracao(data_inicio, data_fim))
+            self.liberacao.append(self._deslocamento(data_inicio))
+
+        n = len(self.ids)
+        self.predecessoras: List[List[Tuple[int, int]]] = [[] for _ in range(n)]
+        self.sucessoras: List[List[Tuple[int, int]]] = [[] for _ in range(n)]
+
+        for pred_id, suc_id, tipo in dependencias:
+            p = self.indice.get(pred_id)
+            s = self.indice.get(suc_id)
+            if p is None or s is None:
+                continue  # dependência com tarefa de outro projeto
+            t = TIPOS_DEPENDENCIA.get(tipo, TERMINO_INICIO)
+            self.predecessoras[s].append((p, t))
+            self.sucessoras[p].append((s, t))
+
+        self.ordem: List[int] = self._ordenar()
+        self.posicao: List[int] = [0] * n
+        for pos, v in enumerate(self.ordem):
+            self.posicao[v] = pos
+
+        self.inicio_cedo: List[int] = [0] * n
+        self.fim_cedo: List[int] = [0] * n
+        self.inicio_tarde: List[int] = [0] * n
+        self.fim_tarde: List[int] = [0] * n
+        self.fim_projeto = 0
+
+        self.calcular()
+
+    # ===== AUXILIARES =====
+
+    @staticmethod
+    def _duracao(data_inicio: Optional[date], data_fim: Optional[date]) -> int:
+        if data_inicio is None or data_fim is None:
+            return 0
+        return max((data_fim - data_inicio).days, 0)
+
+    def _deslocamento(self, data: Optional[date]) -> int:
+        return (data - self.base).days if data is not None else 0
+
+    def _ordenar(self) -> List[int]:
+        """Ordenação topológica (Kahn), O(tarefas + dependências)"""
+        n = len(self.ids)
+        grau = [len(p) for p in self.predecessoras]
+        fila = [v for v in range(n) if grau[v] == 0]
+        ordem = []
+
+        while fila:
+            v = fila.pop()
+            ordem.append(v)
+            for s, _ in self.sucessoras[v]:
+                grau[s] -= 1
+                if grau[s] == 0:
+                    fila.append(s)
+
+        if len(ordem) < n:
+            raise CicloDependenciaError(self._encontrar_ciclo(grau))
+
+        return ordem
+
+    def _encontrar_ciclo(self, grau: List[int]) -> List[int]:
+        """Extrai um ciclo entre as tarefas que sobraram na ordenação"""
+        # Toda tarefa restante tem predecessora restante: basta voltar
+        # pelas predecessoras até repetir um vértice
+        v = next(i for i, g in enumerate(grau) if g > 0)
+        visitados: Dict[int, int] = {}
+        caminho: List[int] = []
+
+        while v not in visitados:
+            visitados[v] = len(caminho)
+            caminho.append(v)
+            v = next(p for p, _ in self.predecessoras[v] if grau[p] > 0)
+
+        ciclo = caminho[visitados[v]:]
+        ciclo.reverse()
+        ciclo.append(ciclo[0])
+        return [self.ids[i] for i in ciclo]
+
+    def _calcular_cedo(self, v: int) -> int:
+        es = self.liberacao[v]
+        for p, tipo in self.predecessoras[v]:
+            if tipo == TERMINO_INICIO:
+                restricao = self.fim_cedo[p]
+            elif tipo == INICIO_INICIO:
+                restricao = self.inicio_cedo[p]
+            else:
+                restricao = self.fim_cedo[p] - self.duracao[v]
+            if restricao > es:
+                es = restricao
+        return es
+
+    def _calcular_tarde(self, v: int) -> int:
+        lf = self.fim_projeto
+        for s, tipo in self.sucessoras[v]:
+            if tipo == TERMINO_INICIO:
+                restricao = self.inicio_tarde[s]
+            elif tipo == INICIO_INICIO:
+                restricao = self.inicio_tarde[s] + self.duracao[v]
+            else:
+                restricao = self.fim_tarde[s]
+            if restricao < lf:
+                lf = restricao
+        return lf
+
+    # ===== CÁLCULO =====
+
+    def calcular(self):
+        """Passagem completa de ida (datas cedo) e volta (datas tarde)"""
+        for v in self.ordem:
+            es = self._calcular_cedo(v)
+            self.inicio_cedo[v] = es
+            self.fim_cedo[v] = es + self.duracao[v]
+
+        self.fim_projeto = max(self.fim_cedo) if self.fim_cedo else 0
+        self._calcular_volta()
+
+    def _calcular_volta(self):
+        for v in reversed(self.ordem):
+            lf = self._calcular_tarde(v)
+            self.fim_tarde[v] = lf
+            self.inicio_tarde[v] = lf - self.duracao[v]
+
+    def atualizar_tarefa(
+        self,
+        tarefa_id: int,
+        data_inicio: Optional[date] = None,
+        data_fim_prevista: Optional[date] = None
+    ) -> int:
+        """
+        Recalcula o cronograma após mudar as datas de uma tarefa
+
+        Só as tarefas alcançáveis a partir da alterada são revisitadas
+        (em ordem topológica, via heap de posições). A volta completa só é
+        refeita se a data de término do projeto mudar.
+
+        Args:
+            tarefa_id: ID da tarefa alterada
+            data_inicio: Nova data de início
+            data_fim_prevista: Nova data de término prevista
+
+        Returns:
+            Número de tarefas revisitadas
+        """
+        origem = self.indice[tarefa_id]
+        self.duracao[origem] = self._duracao(data_inicio, data_fim_prevista)
+        self.liberacao[origem] = self._deslocamento(data_inicio)
+
+        # Ida: propaga para as sucessoras cujas datas cedo mudarem
+        visitadas = 0
+        heap = [self.posicao[origem]]
+        na_fila = {origem}
+        while heap:
+            v = self.ordem[heapq.heappop(heap)]
+            na_fila.discard(v)
+            visitadas += 1
+
+            es = self._calcular_cedo(v)
+            ef = es + self.duracao[v]
+            if v != origem and es == self.inicio_cedo[v] and ef == self.fim_cedo[v]:
+                continue
+            self.inicio_cedo[v] = es
+            self.fim_cedo[v] = ef
+
+            for s, _ in self.sucessoras[v]:
+                if s not in na_fila:
+                    na_fila.add(s)
+                    heapq.heappush(heap, self.posicao[s])
+
+        fim_projeto = max(self.fim_cedo)
+        if fim_projeto != self.fim_projeto:
+            self.fim_projeto = fim_projeto
+            self._calcular_volta()
+            return visitadas + len(self.ordem)
+
+        # Volta: datas tarde dependem só de durações e do fim do projeto,
+        # então basta propagar a partir da tarefa alterada
+        heap = [-self.posicao[origem]]
+        na_fila = {origem}
+        while heap:
+            v = self.ordem[-heapq.heappop(heap)]
+            na_fila.discard(v)
+            visitadas += 1
+
+            lf = self._calcular_tarde(v)
+            ls = lf - self.duracao[v]
+            if v != origem and lf == self.fim_tarde[v] and ls == self.inicio_tarde[v]:
+                continue
+            self.fim_tarde[v] = lf
+            self.inicio_tarde[v] = ls
+
+            for p, _ in self.predecessoras[v]:
+                if p not in na_fila:
+                    na_fila.add(p)
+                    heapq.heappush(heap, -self.posicao[p])
+
+        return visitadas
+
+    # ===== RESULTADOS =====
+
+    def folga(self, v: int) -> int:
+        return self.inicio_tarde[v] - self.inicio_cedo[v]
+
+    def caminho_critico(self) -> List[int]:
+        """IDs das tarefas com folga zero, em ordem topológica"""
+        return [self.ids[v] for v in self.ordem if self.folga(v) == 0]
+
+    def _data(self, deslocamento: int) -> date:
+        return self.base + timedelta(days=deslocamento)
+
+    def resultado(self, apenas_criticas: bool = False) -> Dict:
+        """
+        Monta o resultado para a API
+
+        Args:
+            apenas_criticas: Retornar só as tarefas do caminho crítico
+
+        Returns:
+            Datas do projeto, caminho crítico e datas/folga por tarefa
+        """
+        tarefas = []
+        for v in self.ordem:
+            folga = self.folga(v)
+            if apenas_criticas and folga != 0:
+                continue
+            tarefas.append({
+                "id": self.ids[v],
+                "duracao_dias": self.duracao[v],
+                "inicio_cedo": self._data(self.inicio_cedo[v]),
+                "fim_cedo": self._data(self.fim_cedo[v]),
+                "inicio_tarde": self._data(self.inicio_tarde[v]),
+                "fim_tarde": self._data(self.fim_tarde[v]),
+                "folga_dias": folga,
+                "critica": folga == 0
+            })
+
+        inicio = min(self.inicio_cedo) if self.inicio_cedo else 0
+        return {
+            "data_inicio": self._data(inicio),
+            "data_fim": self._data(self.fim_projeto),
+            "duracao_dias": self.fim_projeto - inicio,
+            "total_tarefas": len(self.ids),
+            "caminho_critico": self.caminho_critico(),
+            "tarefas": tarefas
+        }
+
+
+# ===== CARREGAMENTO E CACHE =====
+
+class CronogramaCache:
+    """
+    Cronogramas calculados por projeto (LRU com TTL)
+
+    Alterações de datas feitas pela API atualizam o cronograma em cache
+    de forma incremental; criação/exclusão de tarefas invalida o projeto.
+    O TTL cobre alterações feitas por outros workers ou direto no banco.
+    """
+
+    def __init__(self, max_projetos: int = 32, ttl: float = 60):
+        self.max_projetos = max_projetos
+        self.ttl = ttl
+        self._itens: "OrderedDict[int, Tuple[float, CronogramaCPM]]" = OrderedDict()
+
+    async def obter(self, db, projeto_id: int) -> CronogramaCPM:
+        """
+        Retorna o cronograma do projeto (do cache ou carregado com 1 query)
+
+        Raises:
+            CicloDependenciaError: se as dependências tiverem ciclo
+        """
+        item = self._itens.get(projeto_id)
+        if item is not None and item[0] > time.monotonic():
+            self._itens.move_to_end(projeto_id)
+            return item[1]
+
+        rows = await db.execute_query(CRONOGRAMA_QUERY, (projeto_id,), fetch=True)
+
+        tarefas = {}
+        dependencias = []
+        for row in rows:
+            tarefas[row['id']] = (row['id'], row['data_inicio'], row['data_fim_prevista'])
+            if row['predecessora_id'] is not None:
+                dependencias.append((row['predecessora_id'], row['id'], row['tipo']))
+
+        cronograma = CronogramaCPM(tarefas.values(), dependencias)
+
+        self._itens[projeto_id] = (time.monotonic() + self.ttl, cronograma)
+        self._itens.move_to_end(projeto_id)
+        while len(self._itens) > self.max_projetos:
+            self._itens.popitem(last=False)
+
+        return cronograma
+
+    def atualizar_tarefa(
+        self,
+        projeto_id: int,
+        tarefa_id: int,
+        data_inicio: Optional[date],
+        data_fim_prevista: Optional[date]
+    ):
+        """Aplica a mudança de datas ao cronograma em cache, se houver"""
+        item = self._itens.get(projeto_id)
+        if item is None:
+            return
+        cronograma = item[1]
+        if tarefa_id not in cronograma.indice:
+            self.invalidar(projeto_id)
+            return
+        cronograma.atualizar_tarefa(tarefa_id, data_inicio, data_fim_prevista)
+
+    def invalidar(self, projeto_id: int):
+        """Descarta o cronograma do projeto"""
+        self._itens.pop(projeto_id, None)
+
+
+# Instância global
+cronograma_cache = CronogramaCache()
+
+
+if __name__ == '__main__':
+    # Benchmark: 50 mil tarefas em cadeias com dependências cruzadas
+    import random
+
+    print("\n" + "="*60)
+    print("BENCHMARK CRONOGRAMA CPM")
+    print("="*60 + "\n")
+
+    random.seed(42)
+    n = 50_000
+    inicio = date(2026, 1, 1)
+    tarefas = [
+        (i, inicio, inicio + timedelta(days=random.randint(1, 10)))
+        for i in range(1, n + 1)
+    ]
+    tipos = list(TIPOS_DEPENDENCIA)
+    dependencias = []
+    for i in range(2, n + 1):
+        for pred in {i - 1, random.randint(max(1, i - 500), i - 1)}:
+            dependencias.append((pred, i, random.choice(tipos)))
+
+    t0 = time.perf_counter()
+    cronograma = CronogramaCPM(tarefas, dependencias)
+    t1 = time.perf_counter()
+    print(f"✓ Cálculo completo: {n} tarefas, {len(dependencias)} dependências em {(t1 - t0) * 1000:.1f} ms")
+    print(f"  Duração do projeto: {cronograma.fim_projeto} dias, "
+          f"{len(cronograma.caminho_critico())} tarefas críticas")
+
+    alvo = n // 2
+    t0 = time.perf_counter()
+    visitadas = cronograma.atualizar_tarefa(alvo, inicio, inicio + timedelta(days=3))
+    t1 = time.perf_counter()
+    print(f"✓ Recálculo incremental (tarefa {alvo}): {visitadas} visitas em {(t1 - t0) * 1000:.1f} ms")
@@ -0,0 +1,495 @@
+"""
+Versões de Documentos em Delta - Gerenciador de Projetos
+Armazenamento opcional das versões como diferença binária da versão
+anterior, com versão completa (keyframe) a cada N versões
+"""
+
+import asyncio
+import hashlib
+import time
+import zlib
+from bisect import bisect_right
+from collections import OrderedDict
+from itertools import accumulate
+from typing import Dict, List, Optional, Tuple
+
+from config import settings
+from utils.armazenamento_arquivos import armazenamento_arquivos
+
+MAGICO = b"DLT1"
+
+# Segmentos menores que isso saem mais baratos como literal
+SEGMENTO_MINIMO = 8
+
+_COPIAR = 0
+_INSERIR = 1
+
+
+# ===== CODIFICAÇÃO =====
+
+def _varint(valor: int) -> bytes:
+    saida = bytearray()
+    while True:
+        byte = valor & 0x7F
+        valor >>= 7
+        if valor:
+            saida.append(byte | 0x80)
+        else:
+            saida.append(byte)
+            return bytes(saida)
+
+
+def _ler_varint(dados: bytes, posicao: int) -> Tuple[int, int]:
+    valor = 0
+    deslocamento = 0
+    while True:
+        byte = dados[posicao]
+        posicao += 1
+        valor |= (byte & 0x7F) << deslocamento
+        if not byte & 0x80:
+            return valor, posicao
+        deslocamento += 7
+
+
+def _segmentos(dados: bytes) -> List[bytes]:
+    """
+    Divide o conteúdo em segmentos terminados em quebra de linha
+
+    Limites definidos pelo conteúdo (e não por posição) continuam
+    alinhados depois de inserções/remoções; em arquivos texto (DXF, CSV)
+    são as linhas, em binários aparecem em média a cada 256 bytes.
+    """
+    partes = dados.split(b"\n")
+    segmentos = [parte + b"\n" for parte in partes[:-1]]
+    if partes[-1]:
+        segmentos.append(partes[-1])
+    return segmentos
+
+
+def _prefixo_comum(a: memoryview, inicio_a: int, b: memoryview, inicio_b: int) -> int:
+    """Bytes iguais a partir das duas posições (comparação em blocos crescentes)"""
+    total = 0
+    passo = 4096
+    crescendo = True
+    while passo:
+        fim_a, fim_b = inicio_a + total + passo, inicio_b + total + passo
+        if fim_a <= len(a) and fim_b <= len(b) and a[inicio_a + total:fim_a] == b[inicio_b + total:fim_b]:
+            total += passo
+            if crescendo:
+                passo *= 2
+        else:
+            crescendo = False
+            passo //= 2
+    return total
+
+
+def calcular_delta(base: bytes, alvo: bytes) -> bytes:
+    """
+    Diferença binária que transforma base em alvo
+
+    Operações de cópia (trecho da base) e inserção (bytes novos),
+    compactadas com zlib.
+
+    Args:
+        base: Conteúdo da versão anterior
+        alvo: Conteúdo da nova versão
+
+    Returns:
+        Delta codificado
+    """
+    indice: Dict[bytes, int] = {}
+    posicao = 0
+    for segmento in _segmentos(base):
+        if len(segmento) >= SEGMENTO_MINIMO:
+            indice.setdefault(segmento, posicao)
+        posicao += len(segmento)
+
+    segmentos = _segmentos(alvo)
+    fins = list(accumulate(map(len, segmentos)))
+    visao_base, visao_alvo = memoryview(base), memoryview(alvo)
+
+    operacoes: List[list] = []  # [_COPIAR, offset, tamanho] | [_INSERIR, [partes]]
+    continuacao: Optional[int] = None
+    i, posicao = 0, 0
+
+    while i < len(segmentos):
+        segmento = segmentos[i]
+        tamanho = len(segmento)
+
+        # Continua a cópia anterior enquanto a base segue igual, saltando
+        # de uma vez todos os segmentos cobertos pelo trecho comum
+        if continuacao is not None and base.startswith(segmento, continuacao):
+            comum = _prefixo_comum(visao_base, continuacao, visao_alvo, posicao)
+            j = bisect_right(fins, posicao + comum, lo=i) - 1
+            coberto = fins[j] - posicao
+            operacoes[-1][2] += coberto
+            continuacao += coberto
+            posicao = fins[j]
+            i = j + 1
+            continue
+
+        offset = indice.get(segmento) if tamanho >= SEGMENTO_MINIMO else None
+        if offset is not None:
+            operacoes.append([_COPIAR, offset, tamanho])
+            continuacao = offset + tamanho
+        else:
+            if operacoes and operacoes[-1][0] == _INSERIR:
+                operacoes[-1][1].append(segmento)
+            else:
+                operacoes.append([_INSERIR, [segmento]])
+            continuacao = None
+        posicao += tamanho
+        i += 1
+
+    saida = [MAGICO, _varint(len(alvo))]
+    for operacao in operacoes:
+        if operacao[0] == _COPIAR:
+            saida += [b"C", _varint(operacao[1]), _varint(operacao[2])]
+        else:
+            literal = b"".join(operacao[1])
+            saida += [b"I", _varint(len(literal)), literal]
+
+    return zlib.compress(b"".join(saida), 6)
+
+
+def aplicar_delta(base: bytes, delta: bytes) -> bytes:
+    """
+    Reconstrói a versão a partir da base e do delta
+
+    Raises:
+        ValueError se o delta for inválido ou não corresponder à base
+    """
+    dados = zlib.decompress(delta)
+    if not dados.startswith(MAGICO):
+        raise ValueError("Delta inválido")
+
+    tamanho_alvo, posicao = _ler_varint(dados, len(MAGICO))
+    visao_base = memoryview(base)
+    partes = []
+
+    while posicao < len(dados):
+        tipo = dados[posicao:posicao + 1]
+        posicao += 1
+        if tipo == b"C":
+            offset, posicao = _ler_varint(dados, posicao)
+            tamanho, posicao = _ler_varint(dados, posicao)
+            if offset + tamanho > len(base):
+                raise ValueError("Delta não corresponde à base")
+            partes.append(visao_base[offset:offset + tamanho])
+        elif tipo == b"I":
+            tamanho, posicao = _ler_varint(dados, posicao)
+            partes.append(dados[posicao:posicao + tamanho])
+            posicao += tamanho
+        else:
+            raise ValueError("Delta inválido")
+
+    resultado = b"".join(partes)
+    if len(resultado) != tamanho_alvo:
+        raise ValueError("Delta não corresponde à base")
+    return resultado
+
+
+def _ler_arquivo(caminho: str) -> bytes:
+    with open(caminho, "rb") as f:
+        return f.read()
+
+
+# ===== ARMAZENAMENTO =====
+
+CADEIA_VERSOES_QUERY = """
+    SELECT numero_versao, caminho_arquivo, sha256, conteudo_sha256, delta_base
+    FROM versoes_documento
+    WHERE documento_id = %s AND numero_versao <= %s
+    ORDER BY numero_versao DESC
+"""
+
+USO_DISCO_QUERY = """
+    SELECT v.numero_versao, v.tamanho_bytes, v.delta_base,
+           b.tamanho_bytes as armazenado_bytes
+    FROM versoes_documento v
+    LEFT JOIN blobs b ON b.sha256 = v.sha256
+    WHERE v.documento_id = %s
+    ORDER BY v.numero_versao
+"""
+
+
+class ArmazenamentoDelta:
+    """
+    Versões intermediárias guardadas como delta da versão anterior
+
+    - versões 1, N+1, 2N+1... (keyframes) são guardadas completas;
+    - as demais guardam só o delta em relação à anterior, quando ele fica
+      abaixo de razao_maxima do tamanho completo;
+    - o documento continua apontando para o blob completo da versão atual,
+      então o download da versão atual não reconstrói nada.
+
+    Para ler uma versão em delta, a cadeia é reconstruída a partir do
+    keyframe (ou da versão mais próxima já em cache); as versões
+    materializadas ficam num LRU limitado em bytes, chaveado pelo hash.
+    """
+
+    def __init__(
+        self,
+        ativo: bool = None,
+        intervalo_keyframe: int = None,
+        cache_bytes: int = None,
+        tamanho_maximo: int = None,
+        razao_maxima: float = 0.5
+    ):
+        """
+        Args:
+            ativo: Gravar novas versões em delta (leitura funciona sempre)
+            intervalo_keyframe: Versões entre duas versões completas
+            cache_bytes: Limite do LRU de versões materializadas
+            tamanho_maximo: Arquivos maiores são sempre guardados completos
+            razao_maxima: Delta maior que essa fração do arquivo é descartado
+        """
+        self.ativo = settings.DOCUMENTOS_DELTA_ATIVO if ativo is None else ativo
+        self.intervalo_keyframe = intervalo_keyframe or settings.DOCUMENTOS_DELTA_KEYFRAME
+        self.cache_bytes = cache_bytes or settings.DOCUMENTOS_DELTA_CACHE_MB * 1024 * 1024
+        self.tamanho_maximo = tamanho_maximo or settings.DOCUMENTOS_DELTA_TAMANHO_MAXIMO_MB * 1024 * 1024
+        self.razao_maxima = razao_maxima
+
+        self._cache: "OrderedDict[str, bytes]" = OrderedDict()
+        self._cache_total = 0
+
+        # Estatísticas
+        self.deltas_gravados = 0
+        self.bytes_economizados = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def eh_keyframe(self, numero_versao: int) -> bool:
+        return (numero_versao - 1) % self.intervalo_keyframe == 0
+
+    # ===== GRAVAÇÃO =====
+
+    async def gravar_versao(
+        self,
+        cursor,
+        blob_store,
+        recebido: Dict,
+        numero_versao: int,
+        base: Optional[Dict]
+    ) -> Tuple[Dict, Dict]:
+        """
+        Registra o conteúdo de uma nova versão no blob store
+
+        O blob completo recebe a referência do documento; a linha da versão
+        referencia o mesmo blob ou, em delta, o blob do delta.
+
+        Args:
+            cursor: Cursor da transação da rota
+            blob_store: BlobStore dos documentos
+            recebido: Resultado de receber_stream (temp, tamanho, sha256)
+            numero_versao: Número da nova versão
+            base: Blob completo da versão anterior ({"caminho", "tamanho", "sha256"}) ou None
+
+        Returns:
+            (blob completo, campos da versão: caminho, sha256, conteudo_sha256, delta_base)
+        """
+        delta = None
+        if (
+            self.ativo and base and base.get("sha256")
+            and not self.eh_keyframe(numero_versao)
+            and recebido["tamanho"] <= self.tamanho_maximo
+            and base["tamanho"] <= self.tamanho_maximo
+        ):
+            delta = await armazenamento_arquivos.executar(self._delta_de_arquivos, base["caminho"], recebido["temp"])
+            if len(delta) > recebido["tamanho"] * self.razao_maxima:
+                delta = None
+
+        if delta is None:
+            arquivo = await blob_store.guardar(cursor, recebido, referencias=2)
+            return arquivo, {
+                "caminho": arquivo["caminho"],
+                "sha256": arquivo["sha256"],
+                "conteudo_sha256": None,
+                "delta_base": None
+            }
+
+        arquivo = await blob_store.guardar(cursor, recebido, referencias=1)
+        blob_delta = await blob_store.guardar_bytes(cursor, delta, referencias=1)
+
+        self.deltas_gravados += 1
+        self.bytes_economizados += arquivo["tamanho"] - blob_delta["tamanho"]
+        return arquivo, {
+            "caminho": blob_delta["caminho"],
+            "sha256": blob_delta["sha256"],
+            "conteudo_sha256": arquivo["sha256"],
+            "delta_base": numero_versao - 1
+        }
+
+    @staticmethod
+    def _delta_de_arquivos(caminho_base: str, caminho_alvo: str) -> bytes:
+        return calcular_delta(_ler_arquivo(caminho_base), _ler_arquivo(caminho_alvo))
+
+    # ===== LEITURA =====
+
+    def _cache_get(self, chave: Optional[str]) -> Optional[bytes]:
+        conteudo = self._cache.get(chave) if chave else None
+        if conteudo is None:
+            self.cache_misses += 1
+            return None
+        self._cache.move_to_end(chave)
+        self.cache_hits += 1
+        return conteudo
+
+    def _cache_set(self, chave: Optional[str], conteudo: bytes):
+        if not chave or len(conteudo) > self.cache_bytes or chave in self._cache:
+            return
+        self._cache[chave] = conteudo
+        self._cache_total += len(conteudo)
+        while self._cache_total > self.cache_bytes:
+            _, removido = self._cache.popitem(last=False)
+            self._cache_total -= len(removido)
+
+    async def materializar(self, db, documento_id: int, numero_versao: int) -> Tuple[bytes, str]:
+        """
+        Conteúdo completo de uma versão em delta
+
+        Returns:
+            (conteúdo, sha256 do conteúdo)
+
+        Raises:
+            LookupError se a versão (ou a cadeia até o keyframe) não existir
+        """
+        cadeia = await db.execute_query(
+            CADEIA_VERSOES_QUERY, (documento_id, numero_versao), fetch=True
+        )
+        if not cadeia or cadeia[0]['numero_versao'] != numero_versao:
+            raise LookupError("Versão não encontrada")
+
+        # Desce até um keyframe ou uma versão já materializada
+        pendentes = []
+        conteudo = None
+        for versao in cadeia:
+            chave = versao['conteudo_sha256'] or versao['sha256']
+            conteudo = self._cache_get(chave)
+            if conteudo is not None:
+                break
+            if versao['delta_base'] is None:
+                conteudo = await armazenamento_arquivos.ler(versao['caminho_arquivo'])
+                self._cache_set(chave, conteudo)
+                break
+            pendentes.append(versao)
+        else:
+            raise LookupError("Cadeia de versões incompleta")
+
+        # Aplica os deltas em ordem crescente
+        for versao in reversed(pendentes):
+            if conteudo is None:
+                raise LookupError("Cadeia de versões incompleta")
+            delta = await armazenamento_arquivos.ler(versao['caminho_arquivo'])
+            conteudo = await asyncio.to_thread(aplicar_delta, conteudo, delta)
+            self._cache_set(versao['conteudo_sha256'], conteudo)
+
+        versao = cadeia[0]
+        return conteudo, versao['conteudo_sha256'] or versao['sha256']
+
+    async def uso_disco(self, db, documento_id: int) -> Dict:
+        """Bytes lógicos (todas as versões completas) x bytes armazenados"""
+        versoes = await db.execute_query(USO_DISCO_QUERY, (documento_id,), fetch=True)
+        logico = sum(int(v['tamanho_bytes'] or 0) for v in versoes)
+        armazenado = sum(int(v['armazenado_bytes'] or v['tamanho_bytes'] or 0) for v in versoes)
+        return {
+            "documento_id": documento_id,
+            "versoes": len(versoes),
+            "versoes_delta": sum(1 for v in versoes if v['delta_base'] is not None),
+            "bytes_logicos": logico,
+            "bytes_armazenados": armazenado,
+            "economia_percentual": round((1 - armazenado / logico) * 100, 2) if logico else 0,
+            "detalhes": versoes
+        }
+
+    def stats(self) -> Dict:
+        """Retorna estatísticas do armazenamento em delta"""
+        return {
+            "ativo": self.ativo,
+            "intervalo_keyframe": self.intervalo_keyframe,
+            "deltas_gravados": self.deltas_gravados,
+            "bytes_economizados": self.bytes_economizados,
+            "cache_versoes": len(self._cache),
+            "cache_bytes": self._cache_total,
+            "cache_hits": self.cache_hits,
+            "cache_misses": self.cache_misses
+        }
+
+
+# Instância global
+armazenamento_delta = ArmazenamentoDelta()
+
+
+if __name__ == '__main__':
+    # Benchmark (a partir de backend/):
+    #   python -m utils.delta_versoes                 -> revisões sintéticas de um DXF
+    #   python -m utils.delta_versoes --documento 42  -> uso de disco e leitura de um documento
+    import random
+    import sys
+
+    from middleware.database import get_db_pool
+
+    def _sintetico(versoes: int = 30, linhas: int = 200_000):
+        aleatorio = random.Random(42)
+        atual = [f"  10\n{aleatorio.uniform(0, 1e4):.4f}\n  20\n{aleatorio.uniform(0, 1e4):.4f}\n"
+                 for _ in range(linhas)]
+        conteudos = []
+        for _ in range(versoes):
+            for _ in range(linhas // 500):  # ~0,2% das entidades alteradas por revisão
+                atual[aleatorio.randrange(linhas)] = f"  10\n{aleatorio.uniform(0, 1e4):.4f}\n  20\n0.0\n"
+            conteudos.append("".join(atual).encode())
+        return conteudos
+
+    def _benchmark_sintetico():
+        armazenamento = ArmazenamentoDelta(ativo=True)
+        conteudos = _sintetico()
+        guardado = []
+        inicio = time.perf_counter()
+        for numero, conteudo in enumerate(conteudos, start=1):
+            if armazenamento.eh_keyframe(numero):
+                guardado.append(("completo", conteudo))
+            else:
+                guardado.append(("delta", calcular_delta(conteudos[numero - 2], conteudo)))
+        tempo_gravacao = time.perf_counter() - inicio
+
+        logico = sum(len(c) for c in conteudos)
+        fisico = sum(len(g[1]) for g in guardado)
+        print(f"✓ {len(conteudos)} versões de {len(conteudos[0]) / 1e6:.1f}MB "
+              f"(keyframe a cada {armazenamento.intervalo_keyframe})")
+        print(f"  Disco: {logico / 1e6:.1f}MB completos -> {fisico / 1e6:.1f}MB "
+              f"({(1 - fisico / logico) * 100:.1f}% menor), gravação {tempo_gravacao:.2f}s")
+
+        for numero in (1, armazenamento.intervalo_keyframe, len(conteudos)):
+            keyframe = (numero - 1) // armazenamento.intervalo_keyframe * armazenamento.intervalo_keyframe
+            inicio = time.perf_counter()
+            conteudo = guardado[keyframe][1]
+            for i in range(keyframe + 1, numero):
+                conteudo = aplicar_delta(conteudo, guardado[i][1])
+            ms = (time.perf_counter() - inicio) * 1000
+            assert hashlib.sha256(conteudo).digest() == hashlib.sha256(conteudos[numero - 1]).digest()
+            print(f"  Leitura v{numero}: {ms:.1f}ms ({numero - 1 - keyframe} delta(s) aplicados, sem cache)")
+
+    async def _benchmark_documento(documento_id: int):
+        db = get_db_pool()
+        try:
+            uso = await armazenamento_delta.uso_disco(db, documento_id)
+            print(f"✓ Documento {documento_id}: {uso['versoes']} versões "
+                  f"({uso['versoes_delta']} em delta), {uso['bytes_logicos'] / 1e6:.1f}MB -> "
+                  f"{uso['bytes_armazenados'] / 1e6:.1f}MB ({uso['economia_percentual']}% menor)")
+            for versao in uso['detalhes']:
+                armazenamento_delta._cache.clear()
+                armazenamento_delta._cache_total = 0
+                inicio = time.perf_counter()
+                await armazenamento_delta.materializar(db, documento_id, versao['numero_versao'])
+                frio = (time.perf_counter() - inicio) * 1000
+                inicio = time.perf_counter()
+                await armazenamento_delta.materializar(db, documento_id, versao['numero_versao'])
+                quente = (time.perf_counter() - inicio) * 1000
+                print(f"  v{versao['numero_versao']}: leitura {frio:.1f}ms (cache: {quente:.1f}ms)")
+        finally:
+            await db.close_pool()
+
+    if '--documento' in sys.argv:
+        asyncio.run(_benchmark_documento(int(sys.argv[sys.argv.index('--documento') + 1])))
+    else:
+        _benchmark_sintetico()
@@ -0,0 +1,240 @@
+"""
+Download de Arquivos - Gerenciador de Projetos
+Respostas de arquivo com Range (downloads retomáveis), ETag forte pelo
+SHA-256 do conteúdo e GET condicional (If-None-Match -> 304)
+"""
+
+import mimetypes
+import os
+import stat
+from typing import Optional, Tuple
+from urllib.parse import quote
+
+import anyio
+from fastapi import Request
+from fastapi.responses import FileResponse, Response
+
+TAMANHO_BLOCO_DOWNLOAD = 256 * 1024
+
+
+def interpretar_range(cabecalho: Optional[str], tamanho: int) -> Optional[Tuple[int, int]]:
+    """
+    Interpreta um cabeçalho Range de intervalo único
+
+    Args:
+        cabecalho: Valor do cabeçalho (ex.: "bytes=0-1023", "bytes=500-", "bytes=-500")
+        tamanho: Tamanho do arquivo
+
+    Returns:
+        (início, fim) inclusivos, ou None para responder o arquivo inteiro
+        (sem Range, formato desconhecido ou vários intervalos)
+
+    Raises:
+        ValueError se o intervalo não puder ser atendido (416)
+    """
+    if not cabecalho or not cabecalho.startswith("bytes=") or "," in cabecalho:
+        return None
+
+    inicio_txt, _, fim_txt = cabecalho[6:].strip().partition("-")
+    try:
+        if inicio_txt:
+            inicio = int(inicio_txt)
+            fim = int(fim_txt) if fim_txt else tamanho - 1
+        else:
+            sufixo = int(fim_txt)
+            if sufixo <= 0:
+                raise ValueError("Intervalo vazio")
+            inicio, fim = max(tamanho - sufixo, 0), tamanho - 1
+    except (TypeError, ValueError):
+        if inicio_txt.isdigit() or fim_txt.isdigit():
+            raise ValueError("Intervalo inválido")
+        return None
+
+    if inicio < 0 or inicio >= tamanho or fim < inicio:
+        raise ValueError("Intervalo fora do arquivo")
+    return inicio, min(fim, tamanho - 1)
+
+
+def etag_corresponde(cabecalho: Optional[str], etag: str) -> bool:
+    """Comparação fraca de If-None-Match (lista de ETags ou *)"""
+    if not cabecalho:
+        return False
+    if cabecalho.strip() == "*":
+        return True
+    alvo = etag[2:] if etag.startswith("W/") else etag
+    for item in cabecalho.split(","):
+        item = item.strip()
+        if (item[2:] if item.startswith("W/") else item) == alvo:
+            return True
+    return False
+
+
+class RespostaArquivo(FileResponse):
+    """
+    FileResponse com suporte a um intervalo de bytes (206 Partial Content)
+
+    Usa a extensão ASGI http.response.zerocopy (sendfile) quando o
+    servidor a oferece; senão, lê o arquivo em blocos numa thread.
+    """
+
+    chunk_size = TAMANHO_BLOCO_DOWNLOAD
+
+    def __init__(self, *args, intervalo: Optional[Tuple[int, int]] = None, **kwargs):
+        self.intervalo = intervalo
+        super().__init__(*args, **kwargs)
+
+    def set_stat_headers(self, stat_result: os.stat_result) -> None:
+        super().set_stat_headers(stat_result)
+        if self.intervalo is not None:
+            inicio, fim = self.intervalo
+            self.headers["content-length"] = str(fim - inicio + 1)
+            self.headers["content-range"] = f"bytes {inicio}-{fim}/{stat_result.st_size}"
+
+    async def __call__(self, scope, receive, send) -> None:
+        stat_result = self.stat_result or await anyio.to_thread.run_sync(os.stat, self.path)
+        if self.stat_result is None:
+            if not stat.S_ISREG(stat_result.st_mode):
+                raise RuntimeError(f"File at path {self.path} is not a file.")
+            self.set_stat_headers(stat_result)
+
+        inicio, fim = self.intervalo or (0, stat_result.st_size - 1)
+        restante = fim - inicio + 1
+
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+
+        if self.send_header_only or restante <= 0:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+        elif "http.response.zerocopy" in scope.get("extensions", {}):
+            with open(self.path, "rb") as arquivo:
+                await send({
+                    "type": "http.response.zerocopy",
+                    "file": arquivo,
+                    "offset": inicio,
+                    "count": restante,
+                    "more_body": False
+                })
+        else:
+            async with await anyio.open_file(self.path, mode="rb") as arquivo:
+                await arquivo.seek(inicio)
+                while restante > 0:
+                    bloco = await arquivo.read(min(self.chunk_size, restante))
+                    if not bloco:
+                        break
+                    restante -= len(bloco)
+                    await send({"type": "http.response.body", "body": bloco, "more_body": restante > 0})
+                if restante > 0:
+                    await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+        if self.background is not None:
+            await self.background()
+
+
+def _negociar(
+    request: Request,
+    etag: str,
+    tamanho: int,
+    imutavel: bool
+) -> Tuple[dict, Optional[Tuple[int, int]], Optional[Response]]:
+    """
+    Cabeçalhos comuns e intervalo pedido
+
+    Returns:
+        (cabeçalhos, intervalo ou None, resposta 304/416 pronta ou None)
+    """
+    cabecalhos = {
+        "etag": etag,
+        "accept-ranges": "bytes",
+        "cache-control": "private, max-age=31536000, immutable" if imutavel else "private, no-cache",
+    }
+
+    if etag_corresponde(request.headers.get("if-none-match"), etag):
+        return cabecalhos, None, Response(status_code=304, headers=cabecalhos)
+
+    # If-Range só vale com ETag forte igual; senão envia o arquivo inteiro
+    intervalo_pedido = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if if_range is not None and (if_range.strip() != etag or etag.startswith("W/")):
+        intervalo_pedido = None
+
+    try:
+        intervalo = interpretar_range(intervalo_pedido, tamanho)
+    except ValueError:
+        return cabecalhos, None, Response(
+            status_code=416,
+            headers={**cabecalhos, "content-range": f"bytes */{tamanho}"}
+        )
+    return cabecalhos, intervalo, None
+
+
+async def responder_arquivo(
+    request: Request,
+    caminho: str,
+    nome: str,
+    sha256: Optional[str] = None,
+    imutavel: bool = False
+) -> Response:
+    """
+    Resposta de download com Range e GET condicional
+
+    Args:
+        request: Requisição (cabeçalhos Range, If-Range, If-None-Match)
+        caminho: Arquivo no disco
+        nome: Nome apresentado no Content-Disposition
+        sha256: Hash do conteúdo (ETag forte); sem hash, ETag fraca por data/tamanho
+        imutavel: Conteúdo nunca muda nesta URL (ex.: versão específica)
+
+    Returns:
+        200, 206, 304 ou 416
+    """
+    stat_result = await anyio.to_thread.run_sync(os.stat, caminho)
+    if sha256:
+        etag = f'"{sha256}"'
+    else:
+        etag = f'W/"{int(stat_result.st_mtime)}-{stat_result.st_size}"'
+
+    cabecalhos, intervalo, resposta = _negociar(request, etag, stat_result.st_size, imutavel)
+    if resposta is not None:
+        return resposta
+
+    return RespostaArquivo(
+        caminho,
+        status_code=206 if intervalo else 200,
+        headers=cabecalhos,
+        filename=nome,
+        stat_result=stat_result,
+        method=request.method,
+        intervalo=intervalo
+    )
+
+
+def responder_conteudo(
+    request: Request,
+    conteudo: bytes,
+    nome: str,
+    sha256: str,
+    imutavel: bool = False
+) -> Response:
+    """
+    Mesma negociação de responder_arquivo para conteúdo já em memória
+    (ex.: versão reconstruída a partir de deltas)
+    """
+    cabecalhos, intervalo, resposta = _negociar(request, f'"{sha256}"', len(conteudo), imutavel)
+    if resposta is not None:
+        return resposta
+
+    nome_codificado = quote(nome)
+    if nome_codificado != nome:
+        cabecalhos["content-disposition"] = f"attachment; filename*=utf-8''{nome_codificado}"
+    else:
+        cabecalhos["content-disposition"] = f'attachment; filename="{nome}"'
+
+    inicio, fim = intervalo or (0, len(conteudo) - 1)
+    if intervalo:
+        cabecalhos["content-range"] = f"bytes {inicio}-{fim}/{len(conteudo)}"
+
+    return Response(
+        content=conteudo[inicio:fim + 1],
+        status_code=206 if intervalo else 200,
+        headers=cabecalhos,
+        media_type=mimetypes.guess_type(nome)[0] or "application/octet-stream"
+    )
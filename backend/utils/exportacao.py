@@ -0,0 +1,145 @@
+"""
+Exportação de Documentos - Gerenciador de Projetos
+ZIP gerado durante o envio (streaming), sem arquivo temporário e com
+memória constante, acompanhado de um manifesto das versões
+"""
+
+import asyncio
+import io
+import json
+import logging
+import os
+import zipfile
+from datetime import date, datetime
+from decimal import Decimal
+from typing import AsyncIterator, Dict, List
+
+import anyio
+
+from utils.file_security import TAMANHO_BLOCO
+
+logger = logging.getLogger(__name__)
+
+# Formatos já compactados: guardados sem recompressão (ZIP_STORED)
+EXTENSOES_COMPACTADAS = {
+    '.jpg', '.jpeg', '.png', '.gif', '.webp',
+    '.pdf', '.docx', '.xlsx', '.pptx', '.odt', '.dwg',
+    '.zip', '.rar', '.7z', '.gz'
+}
+
+NOME_MANIFESTO = "manifesto.json"
+
+
+class _SaidaZip(io.RawIOBase):
+    """
+    Destino não posicionável do ZipFile
+
+    Acumula o que o ZipFile escreve até o gerador repassar ao cliente;
+    sem seek, o zipfile usa data descriptors e nunca volta no arquivo.
+    """
+
+    def __init__(self):
+        self._dados = bytearray()
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, dados) -> int:
+        self._dados += dados
+        return len(dados)
+
+    def esvaziar(self) -> bytes:
+        dados = bytes(self._dados)
+        self._dados.clear()
+        return dados
+
+
+def _json_padrao(valor):
+    if isinstance(valor, (datetime, date)):
+        return valor.isoformat()
+    if isinstance(valor, Decimal):
+        return float(valor)
+    raise TypeError(f"Tipo não serializável: {type(valor).__name__}")
+
+
+def nome_no_zip(documento: Dict, usados: set) -> str:
+    """
+    Caminho do documento dentro do ZIP: <categoria>/<nome>
+
+    Barras do nome são trocadas e nomes repetidos recebem o id do documento.
+    """
+    pasta = (documento.get('categoria') or 'outros').replace('/', '_').replace('\\', '_')
+    nome = (documento.get('nome') or f"documento_{documento['id']}").replace('/', '_').replace('\\', '_')
+    caminho = f"{pasta}/{nome}"
+    if caminho.lower() in usados:
+        base, ext = os.path.splitext(nome)
+        caminho = f"{pasta}/{base} ({documento['id']}){ext}"
+    usados.add(caminho.lower())
+    return caminho
+
+
+def _data_zip(valor) -> tuple:
+    if isinstance(valor, datetime) and valor.year >= 1980:
+        return valor.timetuple()[:6]
+    return (1980, 1, 1, 0, 0, 0)
+
+
+async def gerar_zip(documentos: List[Dict], manifesto: Dict) -> AsyncIterator[bytes]:
+    """
+    Gera o ZIP em blocos para uma StreamingResponse
+
+    Cada arquivo é lido em blocos de TAMANHO_BLOCO; compressão e CRC rodam
+    numa thread. Arquivos ausentes no disco são pulados e listados em
+    manifesto["ausentes"], que vai por último no ZIP.
+
+    Args:
+        documentos: Linhas de documentos (id, nome, categoria, caminho_arquivo,
+            tamanho_bytes, data_upload)
+        manifesto: Conteúdo do manifesto (recebe "arquivos" e "ausentes")
+
+    Yields:
+        Trechos do arquivo ZIP
+    """
+    saida = _SaidaZip()
+    usados = set()
+    manifesto.setdefault("arquivos", {})
+    manifesto.setdefault("ausentes", [])
+
+    with zipfile.ZipFile(saida, mode="w", compression=zipfile.ZIP_DEFLATED, allowZip64=True) as zf:
+        for documento in documentos:
+            try:
+                origem = await anyio.open_file(documento['caminho_arquivo'], mode="rb")
+            except OSError:
+                logger.warning(f"Exportação: arquivo ausente do documento {documento['id']}")
+                manifesto["ausentes"].append(documento['id'])
+                continue
+
+            caminho = nome_no_zip(documento, usados)
+            info = zipfile.ZipInfo(caminho, date_time=_data_zip(documento.get('data_upload')))
+            ext = os.path.splitext(documento.get('nome') or '')[1].lower()
+            info.compress_type = zipfile.ZIP_STORED if ext in EXTENSOES_COMPACTADAS else zipfile.ZIP_DEFLATED
+            info.file_size = int(documento.get('tamanho_bytes') or 0)  # decide ZIP64 antes de escrever
+
+            async with origem:
+                destino = zf.open(info, mode="w", force_zip64=info.file_size > zipfile.ZIP64_LIMIT)
+                try:
+                    while True:
+                        bloco = await origem.read(TAMANHO_BLOCO)
+                        if not bloco:
+                            break
+                        await asyncio.to_thread(destino.write, bloco)
+                        dados = saida.esvaziar()
+                        if dados:
+                            yield dados
+                finally:
+                    await asyncio.to_thread(destino.close)
+
+            manifesto["arquivos"][str(documento['id'])] = caminho
+            yield saida.esvaziar()
+
+        zf.writestr(
+            NOME_MANIFESTO,
+            json.dumps(manifesto, default=_json_padrao, ensure_ascii=False, indent=2)
+        )
+
+    yield saida.esvaziar()
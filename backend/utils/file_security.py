@@ -4,13 +4,33 @@ Desenvolvido por: Vicente de Souza
 """
 
 import os
+import hashlib
 import mimetypes
+import tempfile
 from pathlib import Path
-from typing import Tuple
+from typing import AsyncIterator, Dict, Tuple
 import logging
 
+from utils import assinaturas
+from utils.armazenamento_arquivos import armazenamento_arquivos
+
 logger = logging.getLogger(__name__)
 
+# Tamanho dos blocos lidos/gravados no upload em streaming
+TAMANHO_BLOCO = 1024 * 1024  # 1MB
+
+# Bytes do início do arquivo usados na verificação de assinatura
+TAMANHO_CABECALHO = assinaturas.TAMANHO_DETECCAO
+
+
+class UploadRecusado(Exception):
+    """Upload rejeitado durante o recebimento (status HTTP sugerido + mensagem)"""
+    
+    def __init__(self, status_code: int, mensagem: str):
+        super().__init__(mensagem)
+        self.status_code = status_code
+        self.mensagem = mensagem
+
 
 class FileSecurityValidator:
     """Validador de segurança para uploads de arquivos"""
@@ -66,17 +86,20 @@ class FileSecurityValidator:
         'padrao': 100 * 1024 * 1024      # 100MB padrão
     }
     
-    # Assinaturas de arquivo (magic bytes) - proteção contra disfarce
-    MAGIC_BYTES = {
-        b'%PDF': '.pdf',
-        b'\xff\xd8\xff': '.jpg',
-        b'\x89PNG\r\n': '.png',
-        b'GIF8': '.gif',
-        b'BM': '.bmp',
-        b'PK\x03\x04': '.zip',
-        b'Rar!\x1a\x07': '.rar',
-        b'\x50\x4b\x03\x04': '.zip',
-    }
+    @staticmethod
+    def verificar_assinatura(cabecalho: bytes, ext: str) -> Tuple[bool, str]:
+        """
+        Compara os magic bytes do início do arquivo com a extensão
+        (tabelas de assinaturas em utils/assinaturas.py)
+        
+        Args:
+            cabecalho: Primeiros bytes do arquivo (até TAMANHO_CABECALHO)
+            ext: Extensão declarada (com ponto, minúscula)
+            
+        Returns:
+            (aceito, mensagem); assinatura desconhecida é aceita com aviso
+        """
+        return assinaturas.verificar(cabecalho, ext)
     
     @staticmethod
     def validar_arquivo(
@@ -121,18 +144,14 @@ class FileSecurityValidator:
             
             # 5. Verificar magic bytes (assinatura)
             with open(arquivo, 'rb') as f:
-                header = f.read(8)
-                
-            arquivo_valido = False
-            for magic, tipo_ext in FileSecurityValidator.MAGIC_BYTES.items():
-                if header.startswith(magic):
-                    if tipo_ext == ext:
-                        arquivo_valido = True
-                    else:
-                        return False, f"Arquivo disfarçado: extensão não corresponde"
+                header = f.read(TAMANHO_CABECALHO)
+            
+            aceito, mensagem = FileSecurityValidator.verificar_assinatura(header, ext)
+            if not aceito:
+                return False, "Arquivo disfarçado: extensão não corresponde"
             
             # Se não encontrou magic bytes mas MIME é válido, aceita
-            if not arquivo_valido and mime_type not in FileSecurityValidator.ALLOWED_MIMETYPES:
+            if mensagem != "OK" and mime_type not in FileSecurityValidator.ALLOWED_MIMETYPES:
                 logger.warning(f"Arquivo sem assinatura reconhecida: {arquivo.name}")
             
             # 6. Verificar path traversal
@@ -236,6 +255,123 @@ class UploadSecurityManager:
             logger.error(f"Erro ao salvar arquivo: {str(e)}")
             return False, "", f"Erro ao salvar: {str(e)}"
     
+    async def salvar_stream(
+        self,
+        blocos: AsyncIterator[bytes],
+        nome_destino: str,
+        ext: str,
+        limite_bytes: int
+    ) -> Dict:
+        """
+        Salva um upload recebido em blocos, com memória constante
+        
+        Args:
+            blocos: Iterador assíncrono com o conteúdo do arquivo
+            nome_destino: Nome do arquivo final dentro do diretório de uploads
+            ext: Extensão declarada (com ponto, minúscula)
+            limite_bytes: Tamanho máximo aceito
+            
+        Returns:
+            {"caminho", "tamanho", "sha256"}
+            
+        Raises:
+            UploadRecusado: 413 (tamanho) ou 400 (assinatura)
+        """
+        recebido = await self.receber_stream(blocos, ext, limite_bytes)
+        caminho_final = self.diretorio_uploads / nome_destino
+        try:
+            await armazenamento_arquivos.mover(recebido["temp"], caminho_final)
+        except BaseException:
+            self.descartar_temp(recebido["temp"])
+            raise
+        
+        return {
+            "caminho": str(caminho_final),
+            "tamanho": recebido["tamanho"],
+            "sha256": recebido["sha256"]
+        }
+    
+    async def receber_stream(
+        self,
+        blocos: AsyncIterator[bytes],
+        ext: str,
+        limite_bytes: int
+    ) -> Dict:
+        """
+        Recebe um upload em blocos num arquivo temporário do diretório
+        
+        - o limite de tamanho é verificado a cada bloco (interrompe cedo);
+        - a assinatura (magic bytes) é verificada no primeiro bloco;
+        - o SHA-256 é calculado durante a gravação;
+        - os blocos são gravados no pool de threads de arquivos, fora do event loop.
+        
+        O temporário fica no mesmo sistema de arquivos do destino, para
+        ser movido com os.replace (atômico) por quem chamou.
+        
+        Returns:
+            {"temp", "tamanho", "sha256"}
+            
+        Raises:
+            UploadRecusado: 413 (tamanho) ou 400 (assinatura)
+        """
+        fd, caminho_temp = tempfile.mkstemp(dir=self.diretorio_uploads, suffix='.part')
+        arquivo = os.fdopen(fd, 'wb')
+        sha256 = hashlib.sha256()
+        tamanho = 0
+        cabecalho = b''
+        
+        def gravar(bloco: bytes):
+            # hashlib libera o GIL em blocos grandes; ambos rodam fora do event loop
+            sha256.update(bloco)
+            arquivo.write(bloco)
+        
+        try:
+            async for bloco in blocos:
+                if not bloco:
+                    continue
+                
+                tamanho += len(bloco)
+                if tamanho > limite_bytes:
+                    raise UploadRecusado(
+                        413, f"Arquivo excede tamanho máximo de {limite_bytes // (1024 * 1024)}MB"
+                    )
+                
+                if len(cabecalho) < TAMANHO_CABECALHO:
+                    cabecalho += bloco[:TAMANHO_CABECALHO - len(cabecalho)]
+                    if len(cabecalho) == TAMANHO_CABECALHO:
+                        self._verificar_cabecalho(cabecalho, ext)
+                
+                await armazenamento_arquivos.executar(gravar, bloco)
+            
+            # Arquivo menor que o cabeçalho (arquivos mínimos não são verificados)
+            if 8 < len(cabecalho) < TAMANHO_CABECALHO:
+                self._verificar_cabecalho(cabecalho, ext)
+            
+            await armazenamento_arquivos.executar(arquivo.close)
+            
+        except BaseException:
+            arquivo.close()
+            self.descartar_temp(caminho_temp)
+            raise
+        
+        return {
+            "temp": caminho_temp,
+            "tamanho": tamanho,
+            "sha256": sha256.hexdigest()
+        }
+    
+    @staticmethod
+    def descartar_temp(caminho_temp: str):
+        """Remove um temporário de upload (se ainda existir)"""
+        if os.path.exists(caminho_temp):
+            os.remove(caminho_temp)
+    
+    @staticmethod
+    def _verificar_cabecalho(cabecalho: bytes, ext: str):
+        aceito, mensagem = FileSecurityValidator.verificar_assinatura(cabecalho, ext)
+        if not aceito:
+            raise UploadRecusado(400, mensagem)
+    
     def deletar_arquivo_seguro(self, caminho_relativo: str) -> Tuple[bool, str]:
         """
         Deleta arquivo com verificações de segurança
@@ -0,0 +1,371 @@
+"""
+Lista de Revogação de Tokens - Gerenciador de Projetos
+jti (e famílias de refresh tokens) revogados até a expiração: filtro de
+Bloom em memória na frente de um store exato (memória ou SQLite)
+"""
+
+import hashlib
+import heapq
+import logging
+import math
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class FiltroBloom:
+    """
+    Conjunto aproximado em um bytearray
+
+    Sem falsos negativos: "não está" é definitivo e custa k leituras de
+    bit; "está" pode ser falso positivo (taxa_falsos com até capacidade
+    itens) e precisa de confirmação no store exato.
+    """
+
+    def __init__(self, capacidade: int, taxa_falsos: float = 0.001):
+        capacidade = max(capacidade, 1)
+        self.bits = max(int(-capacidade * math.log(taxa_falsos) / math.log(2) ** 2), 64)
+        self.hashes = max(round(self.bits / capacidade * math.log(2)), 1)
+        self._dados = bytearray((self.bits + 7) // 8)
+        self.itens = 0
+
+    def _posicoes(self, item: str):
+        # Hash duplo (Kirsch-Mitzenmacher): k posições a partir de um digest,
+        # geradas sob demanda (a consulta para no primeiro bit zerado)
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        bits = self.bits
+        posicao = int.from_bytes(digest[:8], "little") % bits
+        passo = int.from_bytes(digest[8:], "little") % bits | 1
+        for _ in range(self.hashes):
+            yield posicao
+            posicao += passo
+            if posicao >= bits:
+                posicao -= bits
+
+    def adicionar(self, item: str):
+        dados = self._dados
+        for posicao in self._posicoes(item):
+            dados[posicao >> 3] |= 1 << (posicao & 7)
+        self.itens += 1
+
+    def __contains__(self, item: str) -> bool:
+        dados = self._dados
+        for posicao in self._posicoes(item):
+            if not dados[posicao >> 3] >> (posicao & 7) & 1:
+                return False
+        return True
+
+    @property
+    def tamanho_bytes(self) -> int:
+        return len(self._dados)
+
+
+class ListaRevogacao:
+    """
+    Interface da lista de revogação
+
+    A consulta por requisição (revogado) só passa pelo filtro de Bloom;
+    o store exato é lido apenas nos positivos. Entradas vencidas saem do
+    store na poda periódica e o filtro é reconstruído com as restantes
+    (um filtro de Bloom não remove itens).
+    """
+
+    def __init__(self, capacidade: int = None, taxa_falsos: float = 0.001, intervalo_poda: float = None):
+        """
+        Args:
+            capacidade: Revogações simultâneas previstas (dimensiona o filtro)
+            taxa_falsos: Taxa de falsos positivos do filtro na capacidade
+            intervalo_poda: Segundos entre podas dos vencidos
+        """
+        self.capacidade = capacidade or settings.REVOGACAO_CAPACIDADE
+        self.taxa_falsos = taxa_falsos
+        self.intervalo_poda = (
+            settings.REVOGACAO_PODA_SEGUNDOS if intervalo_poda is None else intervalo_poda
+        )
+        self._filtro = FiltroBloom(self.capacidade, taxa_falsos)
+        self._proxima_poda = time.time() + self.intervalo_poda
+
+        # Estatísticas
+        self.consultas = 0
+        self.positivos = 0
+        self.falsos_positivos = 0
+        self.podados = 0
+
+    # ===== Store exato (implementado pelas subclasses) =====
+
+    def _gravar(self, chave: str, expira: float) -> bool:
+        """Grava a chave; False se ela já estava revogada (e vigente)"""
+        raise NotImplementedError
+
+    def _expiracao(self, chave: str) -> Optional[float]:
+        raise NotImplementedError
+
+    def _remover_vencidos(self, agora: float) -> int:
+        raise NotImplementedError
+
+    def _vigentes(self) -> Iterable[str]:
+        raise NotImplementedError
+
+    def _sincronizar(self):
+        """Traz ao filtro revogações feitas por outros processos"""
+
+    def __len__(self) -> int:
+        raise NotImplementedError
+
+    # ===== API =====
+
+    def revogar(self, chave: str, expira: float) -> bool:
+        """
+        Revoga a chave (jti ou família) até expira (epoch)
+
+        Returns:
+            True para quem revogou primeiro; False se já estava revogada.
+            Consumir um refresh token é revogar seu jti: só um entre
+            pedidos simultâneos recebe True.
+        """
+        self._podar_se_preciso()
+        novo = self._gravar(chave, float(expira))
+        self._filtro.adicionar(chave)
+        return novo
+
+    def revogado(self, chave: Optional[str]) -> bool:
+        """True se a chave está revogada e ainda não expirou"""
+        if not chave:
+            return False
+        self.consultas += 1
+        self._podar_se_preciso()
+        self._sincronizar()
+        if chave not in self._filtro:
+            return False
+
+        self.positivos += 1
+        expira = self._expiracao(chave)
+        if expira is None or expira <= time.time():
+            self.falsos_positivos += 1
+            return False
+        return True
+
+    def podar(self) -> int:
+        """Remove os vencidos do store e reconstrói o filtro; retorna quantos saíram"""
+        removidos = self._remover_vencidos(time.time())
+        self.podados += removidos
+        vigentes = list(self._vigentes())
+        filtro = FiltroBloom(max(self.capacidade, 2 * len(vigentes)), self.taxa_falsos)
+        for chave in vigentes:
+            filtro.adicionar(chave)
+        self._filtro = filtro
+        self._proxima_poda = time.time() + self.intervalo_poda
+        return removidos
+
+    def _podar_se_preciso(self):
+        if time.time() >= self._proxima_poda:
+            try:
+                self.podar()
+            except Exception as e:
+                self._proxima_poda = time.time() + self.intervalo_poda
+                logger.error(f"Falha ao podar a lista de revogação: {e}")
+
+    def stats(self) -> Dict:
+        """Retorna estatísticas da lista de revogação"""
+        return {
+            "revogados": len(self),
+            "filtro_bytes": self._filtro.tamanho_bytes,
+            "filtro_hashes": self._filtro.hashes,
+            "consultas": self.consultas,
+            "positivos": self.positivos,
+            "falsos_positivos": self.falsos_positivos,
+            "podados": self.podados
+        }
+
+
+class ListaRevogacaoMemoria(ListaRevogacao):
+    """Store exato no próprio processo (um worker): dicionário + heap de vencimentos"""
+
+    def __init__(self, *args, **kwargs):
+        self._dados: Dict[str, float] = {}
+        self._vencimentos: List[Tuple[float, str]] = []
+        super().__init__(*args, **kwargs)
+
+    def _gravar(self, chave, expira):
+        atual = self._dados.get(chave)
+        if atual is not None and atual > time.time():
+            return False
+        self._dados[chave] = expira
+        heapq.heappush(self._vencimentos, (expira, chave))
+        return True
+
+    def _expiracao(self, chave):
+        return self._dados.get(chave)
+
+    def _remover_vencidos(self, agora):
+        removidos = 0
+        while self._vencimentos and self._vencimentos[0][0] <= agora:
+            expira, chave = heapq.heappop(self._vencimentos)
+            if self._dados.get(chave) == expira:
+                del self._dados[chave]
+                removidos += 1
+        return removidos
+
+    def _vigentes(self):
+        return self._dados.keys()
+
+    def __len__(self):
+        return len(self._dados)
+
+
+class ListaRevogacaoSQLite(ListaRevogacao):
+    """
+    Store exato num arquivo SQLite compartilhado (modo WAL)
+
+    Cada processo mantém o próprio filtro e, a cada intervalo_sincronia,
+    acrescenta a ele as linhas novas (id maior que o último visto):
+    uma revogação feita em outro worker passa a valer aqui em até esse
+    intervalo. O id é AUTOINCREMENT: o rowid comum seria reaproveitado
+    depois da poda e a revogação nova passaria despercebida.
+    """
+
+    def __init__(self, caminho: str = None, intervalo_sincronia: float = None, *args, **kwargs):
+        self.caminho = caminho or settings.REVOGACAO_SQLITE_CAMINHO
+        self.intervalo_sincronia = (
+            settings.REVOGACAO_SINCRONIA_SEGUNDOS if intervalo_sincronia is None else intervalo_sincronia
+        )
+        self._local = threading.local()
+        self._ultimo_id = 0
+        self._proxima_sincronia = 0.0
+
+        diretorio = os.path.dirname(os.path.abspath(self.caminho))
+        os.makedirs(diretorio, exist_ok=True)
+        self._criar_tabela()
+        super().__init__(*args, **kwargs)
+        self.podar()
+
+    def _criar_tabela(self):
+        conn = self._conexao()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            colunas = [linha[1] for linha in conn.execute("PRAGMA table_info(revogados)")]
+            if colunas and "id" not in colunas:
+                # Arquivo da versão anterior (sem id): copia para a tabela nova
+                conn.execute("ALTER TABLE revogados RENAME TO revogados_antigo")
+                conn.execute("DROP INDEX IF EXISTS idx_revogados_expira")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS revogados (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    chave TEXT NOT NULL UNIQUE,
+                    expira REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_revogados_expira ON revogados(expira)")
+            if colunas and "id" not in colunas:
+                conn.execute(
+                    "INSERT INTO revogados (chave, expira) SELECT chave, expira FROM revogados_antigo"
+                )
+                conn.execute("DROP TABLE revogados_antigo")
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _conexao(self) -> sqlite3.Connection:
+        # Uma conexão por thread (sqlite3 não compartilha conexões entre threads)
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.caminho, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _gravar(self, chave, expira):
+        # Chave vencida (ainda não podada) é substituída como se fosse nova
+        conn = self._conexao()
+        conn.execute("DELETE FROM revogados WHERE chave = ? AND expira <= ?", (chave, time.time()))
+        return conn.execute(
+            "INSERT INTO revogados (chave, expira) VALUES (?, ?) ON CONFLICT(chave) DO NOTHING",
+            (chave, expira)
+        ).rowcount > 0
+
+    def _expiracao(self, chave):
+        linha = self._conexao().execute(
+            "SELECT expira FROM revogados WHERE chave = ?", (chave,)
+        ).fetchone()
+        return linha[0] if linha else None
+
+    def _remover_vencidos(self, agora):
+        return self._conexao().execute("DELETE FROM revogados WHERE expira <= ?", (agora,)).rowcount
+
+    def _vigentes(self):
+        conn = self._conexao()
+        self._ultimo_id = conn.execute(
+            "SELECT COALESCE(MAX(seq), 0) FROM sqlite_sequence WHERE name = 'revogados'"
+        ).fetchone()[0]
+        self._proxima_sincronia = time.time() + self.intervalo_sincronia
+        return [linha[0] for linha in conn.execute(
+            "SELECT chave FROM revogados WHERE id <= ?", (self._ultimo_id,)
+        )]
+
+    def _sincronizar(self):
+        agora = time.time()
+        if agora < self._proxima_sincronia:
+            return
+        self._proxima_sincronia = agora + self.intervalo_sincronia
+        linhas = self._conexao().execute(
+            "SELECT id, chave FROM revogados WHERE id > ? ORDER BY id", (self._ultimo_id,)
+        ).fetchall()
+        for id_linha, chave in linhas:
+            self._filtro.adicionar(chave)
+            self._ultimo_id = id_linha
+
+    def __len__(self):
+        return self._conexao().execute("SELECT COUNT(*) FROM revogados").fetchone()[0]
+
+
+LISTAS = {
+    "memoria": ListaRevogacaoMemoria,
+    "sqlite": ListaRevogacaoSQLite,
+}
+
+
+def criar_lista_revogacao(nome: str = None) -> ListaRevogacao:
+    """
+    Cria a lista configurada em REVOGACAO_STORE
+
+    Raises:
+        ValueError se o store não existir
+    """
+    nome = nome or settings.REVOGACAO_STORE
+    if nome not in LISTAS:
+        raise ValueError(f"Store de revogação desconhecido: {nome}")
+    return LISTAS[nome]()
+
+
+# Instância global
+lista_revogacao = criar_lista_revogacao()
+
+
+if __name__ == '__main__':
+    # Benchmark (a partir de backend/): python -m utils.lista_revogacao
+    import uuid
+
+    lista = ListaRevogacaoMemoria(capacidade=100000)
+    expira = time.time() + 3600
+    for _ in range(100000):
+        lista.revogar(uuid.uuid4().hex, expira)
+
+    validos = [uuid.uuid4().hex for _ in range(100000)]
+    inicio = time.perf_counter()
+    for jti in validos:
+        lista.revogado(jti)
+    ns = (time.perf_counter() - inicio) / len(validos) * 1e9
+
+    stats = lista.stats()
+    print(f"✓ {len(lista)} jti revogados, filtro de {stats['filtro_bytes'] / 1024:.0f}KB "
+          f"({stats['filtro_hashes']} hashes)")
+    print(f"  Consulta de token válido: {ns:.0f}ns; "
+          f"falsos positivos {stats['falsos_positivos']}/{len(validos)}")
@@ -0,0 +1,304 @@
+"""
+Snapshots de Métricas - Gerenciador de Projetos
+Grava em metricas_projeto uma linha por projeto por dia (upsert),
+atualizando apenas os projetos que mudaram desde a última execução
+"""
+
+import asyncio
+import logging
+import time
+from datetime import date, datetime
+from typing import Dict, Iterable, Optional, Set
+
+from config import settings
+from middleware.database import get_db_pool
+
+logger = logging.getLogger(__name__)
+
+
+# Agregação de todos os indicadores por projeto; {filtro} restringe
+# as tabelas derivadas ao lote de projetos sendo atualizado
+UPSERT_SNAPSHOT_QUERY = """
+    INSERT INTO metricas_projeto (
+        projeto_id, data_registro,
+        tarefas_total, tarefas_a_fazer, tarefas_em_execucao,
+        tarefas_concluidas, tarefas_atrasadas,
+        progresso_fisico, progresso_financeiro,
+        total_membros, orcamento_total, valor_gasto,
+        total_materiais, valor_estoque, total_documentos
+    )
+    SELECT
+        p.id, CURDATE(),
+        COALESCE(t.total, 0), COALESCE(t.a_fazer, 0), COALESCE(t.em_execucao, 0),
+        COALESCE(t.concluidas, 0), COALESCE(t.atrasadas, 0),
+        CASE WHEN t.total > 0 THEN ROUND(t.concluidas / t.total * 100, 2) ELSE 0 END,
+        CASE WHEN o.orcamento_total > 0
+             THEN LEAST(ROUND(o.gasto_total / o.orcamento_total * 100, 2), 999.99)
+             ELSE 0 END,
+        COALESCE(e.total_membros, 0), COALESCE(o.orcamento_total, 0), COALESCE(o.gasto_total, 0),
+        COALESCE(m.total_materiais, 0), COALESCE(m.valor_estoque, 0), COALESCE(d.total_documentos, 0)
+    FROM projetos p
+    LEFT JOIN (
+        SELECT
+            projeto_id,
+            COUNT(*) as total,
+            SUM(CASE WHEN status = 'a_fazer' THEN 1 ELSE 0 END) as a_fazer,
+            SUM(CASE WHEN status = 'em_andamento' THEN 1 ELSE 0 END) as em_execucao,
+            SUM(CASE WHEN status = 'concluida' THEN 1 ELSE 0 END) as concluidas,
+            SUM(CASE WHEN data_fim_prevista < CURDATE() AND status != 'concluida' THEN 1 ELSE 0 END) as atrasadas
+        FROM tarefas {filtro}
+        GROUP BY projeto_id
+    ) t ON t.projeto_id = p.id
+    LEFT JOIN (
+        SELECT projeto_id, COUNT(*) as total_membros
+        FROM equipes {filtro}
+        GROUP BY projeto_id
+    ) e ON e.projeto_id = p.id
+    LEFT JOIN (
+        SELECT
+            projeto_id,
+            SUM(valor_previsto) as orcamento_total,
+            SUM(valor_real) as gasto_total
+        FROM orcamentos {filtro}
+        GROUP BY projeto_id
+    ) o ON o.projeto_id = p.id
+    LEFT JOIN (
+        SELECT
+            projeto_id,
+            COUNT(*) as total_materiais,
+            SUM(preco_unitario * (quantidade_prevista - quantidade_utilizada)) as valor_estoque
+        FROM materiais {filtro}
+        GROUP BY projeto_id
+    ) m ON m.projeto_id = p.id
+    LEFT JOIN (
+        SELECT projeto_id, COUNT(*) as total_documentos
+        FROM documentos {filtro}
+        GROUP BY projeto_id
+    ) d ON d.projeto_id = p.id
+    {filtro_projetos}
+    ON DUPLICATE KEY UPDATE
+        tarefas_total = VALUES(tarefas_total),
+        tarefas_a_fazer = VALUES(tarefas_a_fazer),
+        tarefas_em_execucao = VALUES(tarefas_em_execucao),
+        tarefas_concluidas = VALUES(tarefas_concluidas),
+        tarefas_atrasadas = VALUES(tarefas_atrasadas),
+        progresso_fisico = VALUES(progresso_fisico),
+        progresso_financeiro = VALUES(progresso_financeiro),
+        total_membros = VALUES(total_membros),
+        orcamento_total = VALUES(orcamento_total),
+        valor_gasto = VALUES(valor_gasto),
+        total_materiais = VALUES(total_materiais),
+        valor_estoque = VALUES(valor_estoque),
+        total_documentos = VALUES(total_documentos),
+        atualizado_em = CURRENT_TIMESTAMP
+"""
+
+# Projetos com linhas criadas/alteradas desde um instante (usa idx_*_atualizado)
+PROJETOS_ALTERADOS_QUERY = """
+    SELECT projeto_id FROM tarefas WHERE atualizado_em >= %s
+    UNION
+    SELECT projeto_id FROM orcamentos WHERE atualizado_em >= %s
+    UNION
+    SELECT projeto_id FROM materiais WHERE atualizado_em >= %s
+"""
+
+# Última alteração de tarefas, orçamentos ou materiais de um projeto
+# (parâmetros: projeto_id x3); comparada ao atualizado_em do snapshot
+ALTERADO_EM_SQL = """GREATEST(
+            COALESCE((SELECT MAX(atualizado_em) FROM tarefas WHERE projeto_id = %s), TIMESTAMP('1970-01-01')),
+            COALESCE((SELECT MAX(atualizado_em) FROM orcamentos WHERE projeto_id = %s), TIMESTAMP('1970-01-01')),
+            COALESCE((SELECT MAX(atualizado_em) FROM materiais WHERE projeto_id = %s), TIMESTAMP('1970-01-01'))
+        )"""
+
+
+class MetricasSnapshotEngine:
+    """
+    Motor de snapshots diários de métricas
+
+    A cada execução atualiza:
+    - todos os projetos, na primeira execução do dia (atrasos mudam com a data);
+    - nas demais, só os projetos marcados pela API (marcar_alterado) ou com
+      tarefas, orçamentos ou materiais alterados desde a execução anterior.
+
+    Para servir o snapshot, as rotas usam desatualizado(): compara o
+    atualizado_em do snapshot com o das linhas do projeto (ALTERADO_EM_SQL),
+    o que vale para qualquer worker. Exclusões não alteram atualizado_em,
+    por isso as rotas também marcam o projeto; essa marcação é do processo,
+    então em outros workers uma exclusão só aparece no snapshot na
+    próxima rodada.
+    """
+
+    def __init__(self, intervalo: float = None, tamanho_lote: int = 500):
+        """
+        Args:
+            intervalo: Segundos entre execuções em segundo plano
+            tamanho_lote: Máximo de projetos por upsert
+        """
+        self.intervalo = settings.METRICAS_SNAPSHOT_INTERVALO if intervalo is None else intervalo
+        self.tamanho_lote = tamanho_lote
+
+        self._pendentes: Set[int] = set()
+        self._ultima_execucao: Optional[datetime] = None  # relógio do banco
+        self._ultimo_dia: Optional[date] = None
+        self._task: Optional[asyncio.Task] = None
+        self._lock: Optional[asyncio.Lock] = None
+
+        # Estatísticas
+        self.execucoes = 0
+        self.falhas = 0
+        self.projetos_atualizados = 0
+        self.ultima_duracao_ms = 0.0
+
+    # ===== MARCAÇÃO =====
+
+    def marcar_alterado(self, projeto_id: int):
+        """Marca projeto para entrar na próxima atualização"""
+        if projeto_id is not None:
+            self._pendentes.add(projeto_id)
+
+    def pendente(self, projeto_id: int) -> bool:
+        """True se o projeto foi marcado neste processo desde a última rodada"""
+        return projeto_id in self._pendentes
+
+    def desatualizado(
+        self,
+        projeto_id: int,
+        snapshot_em: Optional[datetime],
+        alterado_em: Optional[datetime]
+    ) -> bool:
+        """
+        True se o snapshot não reflete o estado atual do projeto
+
+        Args:
+            projeto_id: ID do projeto
+            snapshot_em: metricas_projeto.atualizado_em do snapshot
+            alterado_em: Última alteração das linhas do projeto (ALTERADO_EM_SQL)
+        """
+        if snapshot_em is None or self.pendente(projeto_id):
+            return True
+        return alterado_em is not None and alterado_em >= snapshot_em
+
+    # ===== ATUALIZAÇÃO =====
+
+    async def atualizar(self, projeto_ids: Optional[Iterable[int]] = None) -> int:
+        """
+        Grava o snapshot de hoje dos projetos informados
+
+        Args:
+            projeto_ids: IDs dos projetos (None = todos)
+
+        Returns:
+            Número de projetos processados
+        """
+        db = get_db_pool()
+
+        if projeto_ids is None:
+            query = UPSERT_SNAPSHOT_QUERY.format(filtro="", filtro_projetos="")
+            await db.execute_query(query)
+            rows = await db.execute_query("SELECT COUNT(*) as total FROM projetos", fetch=True)
+            return rows[0]['total'] if rows else 0
+
+        ids = sorted(set(projeto_ids))
+        for i in range(0, len(ids), self.tamanho_lote):
+            lote = ids[i:i + self.tamanho_lote]
+            marcadores = ", ".join(["%s"] * len(lote))
+            query = UPSERT_SNAPSHOT_QUERY.format(
+                filtro=f"WHERE projeto_id IN ({marcadores})",
+                filtro_projetos=f"WHERE p.id IN ({marcadores})"
+            )
+            # Mesmo lote para as 5 tabelas derivadas e para projetos
+            await db.execute_query(query, tuple(lote) * 6)
+
+        return len(ids)
+
+    async def executar(self) -> int:
+        """
+        Executa uma rodada incremental
+
+        Returns:
+            Número de projetos atualizados
+        """
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+
+        async with self._lock:
+            inicio = time.perf_counter()
+            pendentes, self._pendentes = self._pendentes, set()
+
+            try:
+                db = get_db_pool()
+                rows = await db.execute_query("SELECT NOW() as agora", fetch=True)
+                agora = rows[0]['agora']
+
+                if self._ultima_execucao is None or self._ultimo_dia != agora.date():
+                    total = await self.atualizar()
+                else:
+                    alterados = await db.execute_query(
+                        PROJETOS_ALTERADOS_QUERY,
+                        (self._ultima_execucao,) * 3,
+                        fetch=True
+                    )
+                    ids = pendentes | {row['projeto_id'] for row in alterados}
+                    total = await self.atualizar(ids) if ids else 0
+
+            except Exception:
+                # Mantém as marcações para a próxima rodada
+                self._pendentes |= pendentes
+                self.falhas += 1
+                raise
+
+            self._ultima_execucao = agora
+            self._ultimo_dia = agora.date()
+            self.execucoes += 1
+            self.projetos_atualizados += total
+            self.ultima_duracao_ms = round((time.perf_counter() - inicio) * 1000, 3)
+            return total
+
+    # ===== EXECUÇÃO EM SEGUNDO PLANO =====
+
+    async def _loop(self):
+        while True:
+            try:
+                total = await self.executar()
+                if total:
+                    logger.info(f"Snapshots de métricas atualizados: {total} projeto(s)")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Falha ao atualizar snapshots de métricas: {e}")
+
+            await asyncio.sleep(self.intervalo)
+
+    def iniciar(self):
+        """Inicia a atualização periódica (chamado no startup)"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._loop())
+
+    async def parar(self):
+        """Interrompe a atualização periódica (chamado no shutdown)"""
+        if self._task is None:
+            return
+
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    def stats(self) -> Dict:
+        """Retorna estatísticas do motor de snapshots"""
+        return {
+            "ativo": self._task is not None and not self._task.done(),
+            "intervalo_segundos": self.intervalo,
+            "execucoes": self.execucoes,
+            "falhas": self.falhas,
+            "projetos_atualizados": self.projetos_atualizados,
+            "projetos_pendentes": len(self._pendentes),
+            "ultima_execucao": self._ultima_execucao.isoformat() if self._ultima_execucao else None,
+            "ultima_duracao_ms": self.ultima_duracao_ms
+        }
+
+
+# Instância global
+snapshot_engine = MetricasSnapshotEngine()
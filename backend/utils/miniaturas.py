@@ -0,0 +1,204 @@
+"""
+Miniaturas e Prévias - Gerenciador de Projetos
+Geração em segundo plano (pool de processos limitado) das miniaturas de
+imagens e da prévia da primeira página de PDFs, guardadas ao lado do blob
+"""
+
+import asyncio
+import logging
+import multiprocessing
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, Optional, Set, Tuple
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+# Derivados gerados e lado máximo em pixels
+TIPOS_DERIVADO = {
+    "miniatura": 256,
+    "previa": 1024,
+}
+
+EXTENSOES_IMAGEM = {'.jpg', '.jpeg', '.png', '.gif', '.bmp', '.webp'}
+EXTENSOES_SUPORTADAS = EXTENSOES_IMAGEM | {'.pdf'}
+
+
+def caminho_derivado(caminho_blob: str, sha256: str, tipo: str) -> Path:
+    """Derivado ao lado do blob: <dir do blob>/<sha256>.<tipo>.webp"""
+    return Path(caminho_blob).parent / f"{sha256}.{tipo}.webp"
+
+
+def _renderizar(origem: str, ext: str, destino: str, lado: int):
+    """
+    Renderiza o derivado (roda no processo do pool)
+
+    Pillow e pypdfium2 são opcionais e importados só aqui; sem eles o
+    job falha e a rota responde que não há derivado.
+    """
+    from PIL import Image, ImageOps
+
+    if ext == '.pdf':
+        import pypdfium2 as pdfium
+
+        pdf = pdfium.PdfDocument(origem)
+        try:
+            pagina = pdf[0]
+            largura, altura = pagina.get_size()
+            imagem = pagina.render(scale=lado / max(largura, altura, 1)).to_pil()
+        finally:
+            pdf.close()
+    else:
+        imagem = Image.open(origem)
+        imagem.draft('RGB', (lado, lado))  # JPEG: decodifica já reduzido
+        imagem = ImageOps.exif_transpose(imagem)
+
+    imagem.thumbnail((lado, lado))
+    if imagem.mode not in ('RGB', 'RGBA'):
+        imagem = imagem.convert('RGBA' if 'A' in imagem.getbands() else 'RGB')
+
+    # Escreve num temporário e troca: leitores nunca veem arquivo parcial
+    fd, temp = tempfile.mkstemp(dir=os.path.dirname(destino), suffix='.part')
+    try:
+        with os.fdopen(fd, 'wb') as saida:
+            imagem.save(saida, format='WEBP', quality=80)
+        os.replace(temp, destino)
+    except BaseException:
+        if os.path.exists(temp):
+            os.unlink(temp)
+        raise
+
+
+class GeradorMiniaturas:
+    """
+    Fila limitada de jobs de renderização sobre um ProcessPoolExecutor
+
+    O upload só agenda (sem esperar); workers asyncio consomem a fila e
+    despacham para o pool. Derivados são chaveados pelo hash do conteúdo,
+    então reenvios do mesmo arquivo reaproveitam o que já existe e jobs
+    repetidos em andamento são ignorados.
+    """
+
+    def __init__(self, processos: int = None, tamanho_fila: int = None):
+        """
+        Args:
+            processos: Processos do pool de renderização
+            tamanho_fila: Jobs pendentes antes de recusar novos
+        """
+        self.processos = processos or settings.MINIATURAS_PROCESSOS
+        self.tamanho_fila = tamanho_fila or settings.MINIATURAS_FILA
+
+        self._fila: Optional[asyncio.Queue] = None
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._workers = []
+        self._pendentes: Set[Tuple[str, str]] = set()
+        self._falhados: Set[Tuple[str, str]] = set()  # não reagendar até o restart
+
+        # Estatísticas
+        self.gerados = 0
+        self.reaproveitados = 0
+        self.falhas = 0
+        self.recusados = 0
+
+    @property
+    def ativo(self) -> bool:
+        return self._fila is not None
+
+    def agendar(self, sha256: str, caminho_blob: str, nome: str) -> bool:
+        """
+        Agenda os derivados de um blob (chamar depois do commit do upload)
+
+        Returns:
+            True se há derivados prontos ou agendados
+        """
+        ext = os.path.splitext(nome)[1].lower()
+        if not sha256 or ext not in EXTENSOES_SUPORTADAS or not self.ativo:
+            return False
+
+        agendou = False
+        for tipo, lado in TIPOS_DERIVADO.items():
+            destino = caminho_derivado(caminho_blob, sha256, tipo)
+            if destino.exists():
+                self.reaproveitados += 1
+                agendou = True
+                continue
+            if (sha256, tipo) in self._pendentes:
+                agendou = True
+                continue
+            if (sha256, tipo) in self._falhados:
+                continue
+            try:
+                self._fila.put_nowait((sha256, tipo, caminho_blob, ext, str(destino), lado))
+                self._pendentes.add((sha256, tipo))
+                agendou = True
+            except asyncio.QueueFull:
+                self.recusados += 1
+                logger.warning(f"Fila de miniaturas cheia, derivado {tipo} de {sha256[:12]} não agendado")
+
+        return agendou
+
+    def pendente(self, sha256: str, tipo: str) -> bool:
+        return (sha256, tipo) in self._pendentes
+
+    async def _worker(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            sha256, tipo, origem, ext, destino, lado = await self._fila.get()
+            try:
+                await loop.run_in_executor(self._pool, _renderizar, origem, ext, destino, lado)
+                self.gerados += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.falhas += 1
+                if len(self._falhados) >= 10000:
+                    self._falhados.clear()
+                self._falhados.add((sha256, tipo))
+                logger.warning(f"Falha ao gerar {tipo} de {sha256[:12]}: {e}")
+            finally:
+                self._pendentes.discard((sha256, tipo))
+                self._fila.task_done()
+
+    def iniciar(self):
+        """Cria o pool e os workers (chamado no startup)"""
+        if self.ativo:
+            return
+        self._fila = asyncio.Queue(maxsize=self.tamanho_fila)
+        # spawn: o processo pai tem threads (pool do banco, to_thread)
+        self._pool = ProcessPoolExecutor(
+            max_workers=self.processos,
+            mp_context=multiprocessing.get_context("spawn")
+        )
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.processos)]
+
+    async def parar(self):
+        """Descarta a fila e encerra o pool (chamado no shutdown)"""
+        if not self.ativo:
+            return
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._pool.shutdown(wait=False, cancel_futures=True)
+        self._workers = []
+        self._pool = None
+        self._fila = None
+        self._pendentes.clear()
+
+    def stats(self) -> Dict:
+        """Retorna estatísticas da geração de derivados"""
+        return {
+            "ativo": self.ativo,
+            "processos": self.processos,
+            "fila": self._fila.qsize() if self._fila else 0,
+            "gerados": self.gerados,
+            "reaproveitados": self.reaproveitados,
+            "falhas": self.falhas,
+            "recusados": self.recusados
+        }
+
+
+# Instância global
+gerador_miniaturas = GeradorMiniaturas()
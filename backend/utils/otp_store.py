@@ -0,0 +1,274 @@
+"""
+Armazenamento de Códigos OTP - Gerenciador de Projetos
+Interface plugável para os códigos do 2FA: em memória (um worker) ou
+SQLite compartilhado (vários workers na mesma máquina)
+"""
+
+import heapq
+import itertools
+import logging
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+
+def _registro(codigo: str, expira: float, tentativas: int) -> Dict:
+    """Formato devolvido pelos stores: {"code", "expires" (UTC), "attempts"}"""
+    return {
+        "code": codigo,
+        "expires": datetime.utcfromtimestamp(expira),
+        "attempts": tentativas
+    }
+
+
+class OTPStore:
+    """
+    Interface dos stores de OTP
+
+    Também se comporta como um mapeamento somente leitura por email
+    (email in store, store[email]["code"]) para quem só consulta.
+    """
+
+    def salvar(self, email: str, codigo: str, validade_segundos: float):
+        """Grava (ou substitui) o código do email com zero tentativas"""
+        raise NotImplementedError
+
+    def obter(self, email: str) -> Optional[Dict]:
+        """Registro vigente do email ou None (ausente ou expirado)"""
+        raise NotImplementedError
+
+    def registrar_tentativa(self, email: str) -> int:
+        """
+        Soma uma tentativa (atômico); retorna o total, já com ela
+
+        Returns:
+            0 se não houver código vigente para o email
+        """
+        raise NotImplementedError
+
+    def remover(self, email: str) -> bool:
+        """
+        Remove o código do email
+
+        Returns:
+            True apenas para quem efetivamente removeu; com vários workers,
+            só um deles consome o mesmo código
+        """
+        raise NotImplementedError
+
+    def limpar_expirados(self) -> int:
+        """Remove os códigos vencidos; retorna quantos saíram"""
+        raise NotImplementedError
+
+    def __len__(self) -> int:
+        raise NotImplementedError
+
+    def __contains__(self, email: str) -> bool:
+        return self.obter(email) is not None
+
+    def __getitem__(self, email: str) -> Dict:
+        registro = self.obter(email)
+        if registro is None:
+            raise KeyError(email)
+        return registro
+
+
+class OTPStoreMemoria(OTPStore):
+    """
+    Store no próprio processo com capacidade máxima
+
+    - leituras sem trava: os registros nunca são alterados no lugar, cada
+      escrita publica um dicionário novo (a troca da referência é atômica);
+    - escritas sob trava, com heap de vencimentos: cada escrita retira os
+      vencidos do topo em O(log n) por item, sem varrer o store;
+    - cheio, descarta o código mais próximo de vencer.
+    """
+
+    def __init__(self, capacidade: int = None):
+        self.capacidade = capacidade or settings.OTP_CAPACIDADE
+        self._dados: Dict[str, Tuple[int, Dict]] = {}  # email -> (seq, registro)
+        self._vencimentos: List[Tuple[float, int, str]] = []  # (expira, seq, email)
+        self._seq = itertools.count()
+        self._trava = threading.Lock()
+
+        # Estatísticas
+        self.descartados_capacidade = 0
+
+    def salvar(self, email, codigo, validade_segundos):
+        expira = time.time() + validade_segundos
+        seq = next(self._seq)
+        with self._trava:
+            self._remover_vencidos(time.time())
+            if email not in self._dados:
+                while len(self._dados) >= self.capacidade and self._vencimentos:
+                    self._descartar_topo()
+            self._dados[email] = (seq, _registro(codigo, expira, 0))
+            heapq.heappush(self._vencimentos, (expira, seq, email))
+            self._compactar()
+
+    def obter(self, email):
+        atual = self._dados.get(email)
+        if atual is None or atual[1]["expires"] < datetime.utcnow():
+            return None
+        return atual[1]
+
+    def registrar_tentativa(self, email):
+        with self._trava:
+            atual = self._dados.get(email)
+            if atual is None or atual[1]["expires"] < datetime.utcnow():
+                return 0
+            seq, registro = atual
+            self._dados[email] = (seq, {**registro, "attempts": registro["attempts"] + 1})
+            return registro["attempts"] + 1
+
+    def remover(self, email):
+        # A entrada do heap fica obsoleta e é descartada ao chegar ao topo
+        with self._trava:
+            return self._dados.pop(email, None) is not None
+
+    def limpar_expirados(self):
+        with self._trava:
+            return self._remover_vencidos(time.time())
+
+    def __len__(self):
+        return len(self._dados)
+
+    # ===== Internos (com a trava) =====
+
+    def _atual(self, seq: int, email: str) -> bool:
+        atual = self._dados.get(email)
+        return atual is not None and atual[0] == seq
+
+    def _remover_vencidos(self, agora: float) -> int:
+        removidos = 0
+        while self._vencimentos and self._vencimentos[0][0] <= agora:
+            _, seq, email = heapq.heappop(self._vencimentos)
+            if self._atual(seq, email):
+                del self._dados[email]
+                removidos += 1
+        return removidos
+
+    def _descartar_topo(self):
+        _, seq, email = heapq.heappop(self._vencimentos)
+        if self._atual(seq, email):
+            del self._dados[email]
+            self.descartados_capacidade += 1
+            logger.warning(f"Store de OTP cheio ({self.capacidade}): código de {email} descartado")
+
+    def _compactar(self):
+        # Reenvios deixam entradas obsoletas no heap; reconstrói se dominarem
+        if len(self._vencimentos) > 2 * len(self._dados) + 64:
+            self._vencimentos = [
+                (expira, seq, email) for expira, seq, email in self._vencimentos
+                if self._atual(seq, email)
+            ]
+            heapq.heapify(self._vencimentos)
+
+
+class OTPStoreSQLite(OTPStore):
+    """
+    Store compartilhado num arquivo SQLite (modo WAL)
+
+    Todos os workers da máquina abrem o mesmo arquivo, então o código
+    gerado num worker é validado em qualquer outro; as operações são
+    comandos únicos (atômicos) e a remoção informa quem consumiu o código.
+    """
+
+    def __init__(self, caminho: str = None, capacidade: int = None):
+        self.caminho = caminho or settings.OTP_SQLITE_CAMINHO
+        self.capacidade = capacidade or settings.OTP_CAPACIDADE
+        self._local = threading.local()
+
+        diretorio = os.path.dirname(os.path.abspath(self.caminho))
+        os.makedirs(diretorio, exist_ok=True)
+        with self._conexao() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS otp (
+                    email TEXT PRIMARY KEY,
+                    codigo TEXT NOT NULL,
+                    expira REAL NOT NULL,
+                    tentativas INTEGER NOT NULL DEFAULT 0
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_otp_expira ON otp(expira)")
+
+    def _conexao(self) -> sqlite3.Connection:
+        # Uma conexão por thread (sqlite3 não compartilha conexões entre threads)
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.caminho, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def salvar(self, email, codigo, validade_segundos):
+        agora = time.time()
+        conn = self._conexao()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("DELETE FROM otp WHERE expira <= ?", (agora,))
+            conn.execute("""
+                INSERT INTO otp (email, codigo, expira, tentativas) VALUES (?, ?, ?, 0)
+                ON CONFLICT(email) DO UPDATE SET
+                    codigo = excluded.codigo, expira = excluded.expira, tentativas = 0
+            """, (email, codigo, agora + validade_segundos))
+            conn.execute("""
+                DELETE FROM otp WHERE email IN (
+                    SELECT email FROM otp ORDER BY expira
+                    LIMIT MAX((SELECT COUNT(*) FROM otp) - ?, 0)
+                )
+            """, (self.capacidade,))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def obter(self, email):
+        linha = self._conexao().execute(
+            "SELECT codigo, expira, tentativas FROM otp WHERE email = ? AND expira > ?",
+            (email, time.time())
+        ).fetchone()
+        return _registro(*linha) if linha else None
+
+    def registrar_tentativa(self, email):
+        linha = self._conexao().execute(
+            "UPDATE otp SET tentativas = tentativas + 1 WHERE email = ? AND expira > ? RETURNING tentativas",
+            (email, time.time())
+        ).fetchone()
+        return linha[0] if linha else 0
+
+    def remover(self, email):
+        return self._conexao().execute("DELETE FROM otp WHERE email = ?", (email,)).rowcount > 0
+
+    def limpar_expirados(self):
+        return self._conexao().execute("DELETE FROM otp WHERE expira <= ?", (time.time(),)).rowcount
+
+    def __len__(self):
+        return self._conexao().execute("SELECT COUNT(*) FROM otp").fetchone()[0]
+
+
+STORES = {
+    "memoria": OTPStoreMemoria,
+    "sqlite": OTPStoreSQLite,
+}
+
+
+def criar_otp_store(nome: str = None) -> OTPStore:
+    """
+    Cria o store configurado em OTP_STORE
+
+    Raises:
+        ValueError se o store não existir
+    """
+    nome = nome or settings.OTP_STORE
+    if nome not in STORES:
+        raise ValueError(f"Store de OTP desconhecido: {nome}")
+    return STORES[nome]()
@@ -0,0 +1,187 @@
+"""
+Paginação por cursor (keyset) - Gerenciador de Projetos
+Contrato comum das rotas de listagem: ?cursor=...&limit=...&incluir_total=true
+
+- As linhas são ordenadas por uma chave única (ex.: data, id) e a próxima
+  página começa depois da última chave vista, usando o índice em vez de
+  OFFSET (custo constante por página, sem pular/duplicar linhas novas).
+- O cursor é opaco para o cliente (base64 dos valores da chave).
+- A próxima página vem no cabeçalho X-Next-Cursor (e em "proximo_cursor"
+  nas respostas em objeto); ausente/nulo na última página.
+- O total só é calculado com incluir_total=true e é aproximado
+  (estimativa do EXPLAIN), devolvido em X-Total-Count.
+"""
+
+import base64
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, List, Optional, Sequence, Tuple
+
+from fastapi import HTTPException, Query, Response
+
+LIMITE_PADRAO = 50
+LIMITE_MAXIMO = 200
+
+
+class Paginacao:
+    """Parâmetros de paginação recebidos pela rota"""
+
+    def __init__(self, cursor: Optional[str], limite: int, incluir_total: bool):
+        self.cursor = cursor
+        self.limite = limite
+        self.incluir_total = incluir_total
+
+
+def parametros_paginacao(
+    cursor: Optional[str] = Query(None, description="Cursor da próxima página (X-Next-Cursor)"),
+    limit: int = Query(LIMITE_PADRAO, ge=1, le=LIMITE_MAXIMO, description="Itens por página"),
+    incluir_total: bool = Query(False, description="Incluir total aproximado (X-Total-Count)")
+) -> Paginacao:
+    """
+    Dependency: parâmetros de paginação por cursor
+    Uso em rota: pagina: Paginacao = Depends(parametros_paginacao)
+    """
+    return Paginacao(cursor, limit, incluir_total)
+
+
+# ===== CURSOR =====
+
+def _serializar(valor: Any) -> list:
+    if isinstance(valor, datetime):
+        return ["dt", valor.isoformat()]
+    if isinstance(valor, date):
+        return ["d", valor.isoformat()]
+    if isinstance(valor, Decimal):
+        return ["dec", str(valor)]
+    return ["v", valor]
+
+
+def _desserializar(item: list) -> Any:
+    tipo, valor = item
+    if tipo == "dt":
+        return datetime.fromisoformat(valor)
+    if tipo == "d":
+        return date.fromisoformat(valor)
+    if tipo == "dec":
+        return Decimal(valor)
+    return valor
+
+
+def codificar_cursor(valores: Sequence[Any]) -> str:
+    """Gera o cursor opaco a partir dos valores da chave de ordenação"""
+    dados = json.dumps([_serializar(v) for v in valores], separators=(",", ":"))
+    return base64.urlsafe_b64encode(dados.encode()).decode().rstrip("=")
+
+
+def decodificar_cursor(cursor: str, campos: int) -> List[Any]:
+    """
+    Lê os valores da chave de ordenação de um cursor
+
+    Raises:
+        HTTPException 400 se o cursor for inválido
+    """
+    try:
+        dados = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        valores = [_desserializar(item) for item in json.loads(dados)]
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Cursor de paginação inválido")
+
+    if len(valores) != campos:
+        raise HTTPException(status_code=400, detail="Cursor de paginação inválido")
+    return valores
+
+
+# ===== SQL =====
+
+def condicao_keyset(
+    colunas: Sequence[str],
+    cursor: Optional[str],
+    decrescente: bool = False
+) -> Tuple[str, list]:
+    """
+    Condição "depois do cursor" para a chave (c1, c2, ...)
+
+    Gera (c1 > v1) OR (c1 = v1 AND c2 > v2) OR ..., forma que o MySQL
+    resolve como range no índice (inclusive com direção DESC).
+
+    Args:
+        colunas: Colunas da chave, da mais para a menos significativa
+        cursor: Cursor recebido (None = primeira página)
+        decrescente: Ordenação DESC
+
+    Returns:
+        (trecho SQL começando com " AND ", parâmetros) ou ("", [])
+    """
+    if not cursor:
+        return "", []
+
+    valores = decodificar_cursor(cursor, len(colunas))
+    operador = "<" if decrescente else ">"
+
+    termos = []
+    params: list = []
+    for i, coluna in enumerate(colunas):
+        iguais = [f"{c} = %s" for c in colunas[:i]]
+        termos.append("(" + " AND ".join(iguais + [f"{coluna} {operador} %s"]) + ")")
+        params.extend(valores[:i])
+        params.append(valores[i])
+
+    return " AND (" + " OR ".join(termos) + ")", params
+
+
+def ordem_keyset(colunas: Sequence[str], decrescente: bool = False) -> str:
+    """Cláusula ORDER BY da chave (todas as colunas na mesma direção)"""
+    direcao = "DESC" if decrescente else "ASC"
+    return "ORDER BY " + ", ".join(f"{c} {direcao}" for c in colunas)
+
+
+def proximo_cursor(linhas: list, limite: int, chaves: Sequence[str]) -> Optional[str]:
+    """
+    Recorta a página e gera o cursor da próxima
+
+    A consulta deve buscar limite + 1 linhas; a linha extra só indica
+    que existe próxima página e é removida da lista.
+
+    Args:
+        linhas: Resultado da consulta (lista, alterada no lugar)
+        limite: Tamanho da página
+        chaves: Nomes das colunas da chave nas linhas do resultado
+
+    Returns:
+        Cursor da próxima página ou None se esta for a última
+    """
+    if len(linhas) <= limite:
+        return None
+
+    del linhas[limite:]
+    ultima = linhas[-1]
+    return codificar_cursor([ultima[chave] for chave in chaves])
+
+
+async def total_aproximado(origem, consulta: str, params: Sequence = ()) -> int:
+    """
+    Estimativa de linhas pelo plano de execução (sem varrer a tabela)
+
+    Args:
+        origem: Cursor aberto (DictCursor) ou AsyncDatabaseHelper
+        consulta: SELECT simples sobre uma tabela com o filtro da listagem
+        params: Parâmetros do filtro
+
+    Returns:
+        Número estimado de linhas
+    """
+    if hasattr(origem, "execute_query"):
+        plano = await origem.execute_query("EXPLAIN " + consulta, tuple(params), fetch=True)
+    else:
+        await origem.execute("EXPLAIN " + consulta, tuple(params))
+        plano = await origem.fetchall()
+    return int(plano[0]['rows'] or 0) if plano else 0
+
+
+def aplicar_cabecalhos(response: Response, proximo: Optional[str], total: Optional[int] = None):
+    """Define X-Next-Cursor e X-Total-Count na resposta"""
+    if proximo:
+        response.headers["X-Next-Cursor"] = proximo
+    if total is not None:
+        response.headers["X-Total-Count"] = str(total)
@@ -35,7 +35,7 @@ def require_project_member(func: Callable) -> Callable:
             )
         
         # Verificar se é membro
-        if not permission_manager.is_project_member(current_user['id'], project_id):
+        if not await permission_manager.is_project_member(current_user['id'], project_id):
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail="Você não é membro deste projeto"
@@ -69,7 +69,7 @@ def require_project_manager(func: Callable) -> Callable:
             )
         
         # Verificar se é gerente ou dono
-        if not permission_manager.can_modify_project(current_user['id'], project_id):
+        if not await permission_manager.can_modify_project(current_user['id'], project_id):
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail="Apenas gerentes podem realizar esta ação"
@@ -103,7 +103,7 @@ def require_project_owner(func: Callable) -> Callable:
             )
         
         # Verificar se é dono
-        if not permission_manager.is_project_owner(current_user['id'], project_id):
+        if not await permission_manager.is_project_owner(current_user['id'], project_id):
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail="Apenas o criador do projeto pode realizar esta ação"
@@ -141,7 +141,7 @@ def require_role(min_role: str):
                 )
             
             # Verificar permissão
-            if not permission_manager.has_permission(
+            if not await permission_manager.has_permission(
                 current_user['id'], 
                 project_id, 
                 min_role
@@ -166,7 +166,7 @@ async def verify_project_access(
     Dependency: Verifica acesso ao projeto
     Uso em rota: projeto_access: None = Depends(verify_project_access)
     """
-    if not permission_manager.is_project_member(current_user['id'], projeto_id):
+    if not await permission_manager.is_project_member(current_user['id'], projeto_id):
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Você não tem acesso a este projeto"
@@ -181,7 +181,7 @@ async def verify_project_modify(
     """
     Dependency: Verifica permissão para modificar projeto
     """
-    if not permission_manager.can_modify_project(current_user['id'], projeto_id):
+    if not await permission_manager.can_modify_project(current_user['id'], projeto_id):
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Você não tem permissão para modificar este projeto"
@@ -196,7 +196,7 @@ async def verify_project_delete(
     """
     Dependency: Verifica permissão para deletar projeto
     """
-    if not permission_manager.can_delete_project(current_user['id'], projeto_id):
+    if not await permission_manager.can_delete_project(current_user['id'], projeto_id):
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Apenas o criador pode deletar o projeto"
@@ -0,0 +1,173 @@
+"""
+Reconciliação do Progresso - Gerenciador de Projetos
+Audita e corrige os contadores incrementais de progresso em projetos
+(tarefas_quantidade / tarefas_soma_progresso, migration 005)
+"""
+
+import asyncio
+import logging
+from typing import Dict, List, Optional
+
+from config import settings
+from middleware.database import get_db_pool
+
+logger = logging.getLogger(__name__)
+
+
+# Valores reais calculados a partir das tarefas
+_TOTAIS_TAREFAS = """
+    SELECT
+        projeto_id,
+        COUNT(*) as quantidade,
+        COALESCE(SUM(progresso_percentual), 0) as soma
+    FROM tarefas
+    {filtro}
+    GROUP BY projeto_id
+"""
+
+_PROGRESSO_ESPERADO = """
+    CASE WHEN COALESCE(t.quantidade, 0) > 0
+         THEN ROUND(t.soma / t.quantidade, 2)
+         ELSE 0 END
+"""
+
+DIVERGENCIAS_QUERY = f"""
+    SELECT
+        p.id,
+        p.tarefas_quantidade,
+        p.tarefas_soma_progresso,
+        p.progresso_percentual,
+        COALESCE(t.quantidade, 0) as quantidade_real,
+        COALESCE(t.soma, 0) as soma_real
+    FROM projetos p
+    LEFT JOIN ({_TOTAIS_TAREFAS.format(filtro="")}) t ON t.projeto_id = p.id
+    WHERE p.tarefas_quantidade != COALESCE(t.quantidade, 0)
+       OR p.tarefas_soma_progresso != COALESCE(t.soma, 0)
+       OR p.progresso_percentual != {_PROGRESSO_ESPERADO}
+"""
+
+CORRIGIR_QUERY = """
+    UPDATE projetos p
+    LEFT JOIN ({totais}) t ON t.projeto_id = p.id
+    SET p.tarefas_quantidade = COALESCE(t.quantidade, 0),
+        p.tarefas_soma_progresso = COALESCE(t.soma, 0),
+        p.progresso_percentual = {esperado}
+    WHERE p.id IN ({marcadores})
+"""
+
+
+class ReconciliacaoProgresso:
+    """
+    Job de auditoria dos contadores de progresso
+
+    Os triggers mantêm soma e contagem por diferença; alterações que não
+    disparam triggers (carga direta com triggers desativados, restauração
+    parcial de backup, edição manual) podem deixá-los divergentes. O job
+    compara com as tarefas e recalcula apenas os projetos divergentes.
+    """
+
+    def __init__(self, intervalo: float = None):
+        """
+        Args:
+            intervalo: Segundos entre execuções em segundo plano (0 = desativado)
+        """
+        self.intervalo = (
+            settings.RECONCILIACAO_PROGRESSO_INTERVALO if intervalo is None else intervalo
+        )
+        self._task: Optional[asyncio.Task] = None
+
+        # Estatísticas
+        self.execucoes = 0
+        self.divergencias_encontradas = 0
+        self.ultima_execucao: Optional[Dict] = None
+
+    async def executar(self, corrigir: bool = True) -> Dict:
+        """
+        Audita todos os projetos e corrige os divergentes
+
+        Args:
+            corrigir: Se False, apenas relata as divergências
+
+        Returns:
+            Projetos divergentes e quantos foram corrigidos
+        """
+        db = get_db_pool()
+        divergentes = await db.execute_query(DIVERGENCIAS_QUERY, fetch=True)
+        ids: List[int] = [row['id'] for row in divergentes]
+
+        if ids and corrigir:
+            marcadores = ", ".join(["%s"] * len(ids))
+            query = CORRIGIR_QUERY.format(
+                totais=_TOTAIS_TAREFAS.format(filtro=f"WHERE projeto_id IN ({marcadores})"),
+                esperado=_PROGRESSO_ESPERADO,
+                marcadores=marcadores
+            )
+            await db.execute_query(query, tuple(ids) * 2)
+
+        if ids:
+            logger.warning(
+                f"Progresso divergente em {len(ids)} projeto(s)"
+                f"{' (corrigido)' if corrigir else ''}: {ids[:20]}"
+            )
+
+        self.execucoes += 1
+        self.divergencias_encontradas += len(ids)
+        self.ultima_execucao = {
+            "divergentes": len(ids),
+            "corrigidos": len(ids) if corrigir else 0,
+            "projetos": divergentes
+        }
+        return self.ultima_execucao
+
+    # ===== EXECUÇÃO EM SEGUNDO PLANO =====
+
+    async def _loop(self):
+        while True:
+            await asyncio.sleep(self.intervalo)
+            try:
+                await self.executar()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Falha na reconciliação do progresso: {e}")
+
+    def iniciar(self):
+        """Inicia a auditoria periódica (chamado no startup)"""
+        if self.intervalo > 0 and (self._task is None or self._task.done()):
+            self._task = asyncio.create_task(self._loop())
+
+    async def parar(self):
+        """Interrompe a auditoria periódica (chamado no shutdown)"""
+        if self._task is None:
+            return
+
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+
+# Instância global
+reconciliacao_progresso = ReconciliacaoProgresso()
+
+
+if __name__ == '__main__':
+    # Uso (a partir de backend/): python -m utils.reconciliacao_progresso [--corrigir]
+    import sys
+
+    async def _main():
+        corrigir = '--corrigir' in sys.argv
+        try:
+            resultado = await reconciliacao_progresso.executar(corrigir=corrigir)
+            print(f"✓ {resultado['divergentes']} projeto(s) divergente(s), "
+                  f"{resultado['corrigidos']} corrigido(s)")
+            for row in resultado['projetos']:
+                print(f"  • Projeto {row['id']}: {row['tarefas_quantidade']} tarefas / "
+                      f"soma {row['tarefas_soma_progresso']} "
+                      f"(real: {row['quantidade_real']} / {row['soma_real']})")
+        finally:
+            await get_db_pool().close_pool()
+
+    asyncio.run(_main())
@@ -5,15 +5,19 @@ Desenvolvido por: Vicente de Souza
 
 import random
 import string
-from datetime import datetime, timedelta
-from typing import Optional
 import logging
 
+from utils.otp_store import criar_otp_store
+
 logger = logging.getLogger(__name__)
 
-# Simulação de banco de dados para OTP (em produção, usar Redis)
-# Formato: {email: {"code": "123456", "expires": datetime, "attempts": 0}}
-otp_store = {}
+# Validade e tentativas dos códigos
+VALIDADE_OTP_SEGUNDOS = 15 * 60
+MAX_TENTATIVAS_OTP = 3
+
+# Store de OTP (OTP_STORE: memoria ou sqlite, compartilhado entre workers)
+# Consulta: otp_store[email] -> {"code": "123456", "expires": datetime, "attempts": 0}
+otp_store = criar_otp_store()
 
 
 def gerar_otp(length: int = 6) -> str:
@@ -44,11 +48,7 @@ def enviar_otp_email(email: str) -> bool:
         codigo = gerar_otp()
         
         # Armazenar temporariamente (15 minutos de validade)
-        otp_store[email] = {
-            "code": codigo,
-            "expires": datetime.utcnow() + timedelta(minutes=15),
-            "attempts": 0
-        }
+        otp_store.salvar(email, codigo, VALIDADE_OTP_SEGUNDOS)
         
         # Em produção, seria aqui que envia email via SMTP
         # Para desenvolvimento, apenas logar
@@ -76,29 +76,27 @@ def validar_otp(email: str, codigo: str) -> tuple[bool, str]:
         (válido, mensagem)
     """
     try:
-        # Verificar se existe OTP para este email
-        if email not in otp_store:
-            return False, "Código OTP não encontrado. Solicite um novo."
-        
-        otp_data = otp_store[email]
-        
-        # Verificar expiração
-        if datetime.utcnow() > otp_data["expires"]:
-            del otp_store[email]
-            return False, "Código OTP expirou. Solicite um novo."
-        
-        # Verificar tentativas (máx 3)
-        if otp_data["attempts"] >= 3:
-            del otp_store[email]
+        # Contar a tentativa antes de comparar: o incremento é atômico no
+        # store, então palpites em paralelo (vários workers) não passam de 3
+        tentativas = otp_store.registrar_tentativa(email)
+        if not tentativas:
+            return False, "Código OTP não encontrado ou expirado. Solicite um novo."
+        
+        # Verificar tentativas (máx 3); o código esgotado fica bloqueado até
+        # vencer ou ser reenviado
+        if tentativas > MAX_TENTATIVAS_OTP:
             return False, "Muitas tentativas. Solicite um novo código."
         
         # Verificar código
+        otp_data = otp_store.obter(email)
+        if otp_data is None:
+            return False, "Código OTP não encontrado ou expirado. Solicite um novo."
         if otp_data["code"] != codigo:
-            otp_data["attempts"] += 1
-            return False, f"Código incorreto. {3 - otp_data['attempts']} tentativas restantes."
+            return False, f"Código incorreto. {MAX_TENTATIVAS_OTP - tentativas} tentativas restantes."
         
-        # Código válido - remover do armazenamento
-        del otp_store[email]
+        # Código válido - remover do armazenamento (só um worker consome o código)
+        if not otp_store.remover(email):
+            return False, "Código OTP já utilizado. Solicite um novo."
         logger.info(f"OTP validado com sucesso para {email}")
         
         return True, "Código validado com sucesso"
@@ -120,8 +118,7 @@ def resend_otp(email: str) -> tuple[bool, str]:
     """
     try:
         # Limpar OTP antigo se existir
-        if email in otp_store:
-            del otp_store[email]
+        otp_store.remover(email)
         
         # Enviar novo OTP
         if enviar_otp_email(email):
@@ -137,16 +134,9 @@ def resend_otp(email: str) -> tuple[bool, str]:
 def limpar_otp_expirados():
     """
     Limpa códigos OTP expirados do armazenamento
-    (Chamado periodicamente)
+    (os stores já descartam vencidos a cada novo código; chamada opcional)
     """
-    agora = datetime.utcnow()
-    emails_expirados = [
-        email for email, data in otp_store.items()
-        if agora > data["expires"]
-    ]
-    
-    for email in emails_expirados:
-        del otp_store[email]
-        logger.info(f"OTP expirado removido para {email}")
-    
-    return len(emails_expirados)
+    removidos = otp_store.limpar_expirados()
+    if removidos:
+        logger.info(f"OTPs expirados removidos: {removidos}")
+    return removidos
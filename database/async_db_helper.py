@@ -0,0 +1,357 @@
+"""
+Async Database Helper - Gerenciador de Projetos
+Versão assíncrona do DatabaseHelper (aiomysql) para uso nas rotas async do FastAPI
+"""
+
+import os
+import time
+import asyncio
+from typing import List, Dict, Any, Optional
+from contextlib import asynccontextmanager
+import logging
+
+import aiomysql
+from pymysql.err import Error
+
+from instrumentacao_sql import instrumentacao
+
+# Configurar logging
+logger = logging.getLogger(__name__)
+
+
+class CursorInstrumentado(aiomysql.DictCursor):
+    """
+    DictCursor que registra cada execução na instrumentação de SQL
+
+    É o cursorclass do pool, então cobre também as rotas que usam
+    conn.cursor() diretamente. Acima do limite de consulta lenta roda o
+    EXPLAIN na mesma conexão (com um DictCursor comum) e loga o plano.
+    O executemany do aiomysql passa por execute, então também é medido.
+    """
+
+    async def execute(self, query, args=None):
+        inicio = time.perf_counter()
+        try:
+            resultado = await super().execute(query, args)
+        except Exception:
+            instrumentacao.registrar(query, time.perf_counter() - inicio, erro=True)
+            raise
+
+        duracao = time.perf_counter() - inicio
+        if instrumentacao.registrar(query, duracao, self.rowcount):
+            await self._explicar(query, args, duracao)
+        return resultado
+
+    async def _explicar(self, query, args, duracao: float):
+        try:
+            sql = self.mogrify(query, args) if args is not None else query
+            cursor = await self.connection.cursor(aiomysql.DictCursor)
+            try:
+                await cursor.execute(f"EXPLAIN {sql}")
+                plano = await cursor.fetchall()
+            finally:
+                await cursor.close()
+            instrumentacao.registrar_plano(query, duracao, plano)
+        except Error as e:
+            logger.warning(f"EXPLAIN da consulta lenta falhou: {e}")
+
+
+class AsyncDatabaseHelper:
+    """
+    Helper assíncrono para operações no banco de dados
+
+    Mesma API do DatabaseHelper (execute_query, execute_many, get_connection),
+    mas todas as operações são awaitable e não bloqueiam o event loop.
+    """
+
+    def __init__(
+        self,
+        pool_name="gerenciador_async_pool",
+        pool_size=5,
+        max_overflow=0,
+        pool_recycle=-1
+    ):
+        """
+        Inicializa o helper (o pool é criado no primeiro uso ou no connect)
+
+        Args:
+            pool_name: Nome do pool de conexões (apenas para logs)
+            pool_size: Conexões mantidas abertas no pool (padrão: 5)
+            max_overflow: Conexões extras permitidas em picos (padrão: 0)
+            pool_recycle: Segundos até reciclar uma conexão (-1 = nunca)
+        """
+        self.pool_name = pool_name
+        self.pool_size = pool_size
+        self.max_overflow = max_overflow
+        self.pool_recycle = pool_recycle
+        self.config = {
+            'host': os.getenv('DB_HOST', 'localhost'),
+            'user': os.getenv('DB_USER', 'root'),
+            'password': os.getenv('DB_PASSWORD', ''),
+            'db': os.getenv('DB_NAME', 'gerenciador_projetos'),
+            'port': int(os.getenv('DB_PORT', 3306)),
+            'charset': 'utf8mb4',
+            'init_command': "SET NAMES utf8mb4 COLLATE utf8mb4_unicode_ci",
+            'cursorclass': CursorInstrumentado,
+            'autocommit': False
+        }
+        self.pool: Optional[aiomysql.Pool] = None
+        self._lock: Optional[asyncio.Lock] = None
+
+        # Estatísticas de checkout
+        self._checkouts = 0
+        self._checkout_failures = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    async def connect(self) -> aiomysql.Pool:
+        """
+        Cria o connection pool (idempotente)
+
+        Returns:
+            Pool aiomysql pronto para uso
+        """
+        if self.pool is not None:
+            return self.pool
+
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+
+        async with self._lock:
+            if self.pool is None:
+                try:
+                    self.pool = await aiomysql.create_pool(
+                        minsize=self.pool_size,
+                        maxsize=self.pool_size + self.max_overflow,
+                        pool_recycle=self.pool_recycle,
+                        **self.config
+                    )
+                    logger.info(
+                        f"✓ Connection pool async criado: {self.pool_name} "
+                        f"(size: {self.pool_size}, overflow: {self.max_overflow})"
+                    )
+                except Error as e:
+                    logger.error(f"✗ Erro ao criar connection pool async: {e}")
+                    raise
+
+        return self.pool
+
+    async def acquire(self) -> aiomysql.Connection:
+        """
+        Obtém uma conexão do pool (devolver com release)
+
+        Uso:
+            conn = await db.acquire()
+            try:
+                cursor = await conn.cursor()
+                await cursor.execute("SELECT * FROM usuarios")
+            finally:
+                await db.release(conn)
+        """
+        inicio = time.perf_counter()
+        try:
+            pool = await self.connect()
+            conn = await pool.acquire()
+        except Exception:
+            self._checkout_failures += 1
+            raise
+
+        espera = time.perf_counter() - inicio
+        self._checkouts += 1
+        self._wait_total += espera
+        self._wait_max = max(self._wait_max, espera)
+        instrumentacao.registrar_espera(espera)
+        return conn
+
+    async def release(self, conn: aiomysql.Connection):
+        """
+        Devolve conexão ao pool
+
+        Transações não finalizadas são desfeitas antes de devolver,
+        para que a próxima requisição não herde um snapshot antigo.
+        Conexões de overflow são fechadas quando já há conexões ociosas
+        suficientes no pool.
+        """
+        if self.pool is None or conn is None:
+            return
+
+        try:
+            if not conn.closed and conn.get_transaction_status():
+                await conn.rollback()
+            if self.pool.size > self.pool_size and self.pool.freesize >= self.pool_size:
+                conn.close()
+        except Error as e:
+            logger.error(f"Erro ao resetar conexão: {e}")
+            conn.close()
+        finally:
+            self.pool.release(conn)
+
+    @asynccontextmanager
+    async def get_connection(self):
+        """
+        Context manager assíncrono para obter conexão do pool
+
+        Uso:
+            async with db.get_connection() as conn:
+                cursor = await conn.cursor()
+                await cursor.execute("SELECT * FROM usuarios")
+        """
+        conn = None
+        try:
+            conn = await self.acquire()
+            yield conn
+        except Error as e:
+            logger.error(f"Erro na conexão: {e}")
+            raise
+        finally:
+            await self.release(conn)
+
+    async def execute_query(self, query: str, params: tuple = None, fetch: bool = False) -> Optional[Any]:
+        """
+        Executa query SQL (SELECT, INSERT, UPDATE, DELETE)
+
+        Args:
+            query: Query SQL a ser executada
+            params: Parâmetros da query (opcional)
+            fetch: Se True, retorna resultados (para SELECT)
+
+        Returns:
+            Lista de dicionários com resultados (se fetch=True)
+            ID gerado pelo INSERT, quando houver (se fetch=False)
+        """
+        async with self.get_connection() as conn:
+            cursor = await conn.cursor()
+            try:
+                await cursor.execute(query, params or ())
+
+                if fetch:
+                    result = await cursor.fetchall()
+                    return list(result)
+                else:
+                    await conn.commit()
+                    return cursor.lastrowid or None
+
+            except Error as e:
+                await conn.rollback()
+                logger.error(f"Erro ao executar query: {e}")
+                raise
+            finally:
+                await cursor.close()
+
+    async def execute_many(self, query: str, data: List[tuple]) -> int:
+        """
+        Executa múltiplos inserts/updates de uma vez
+
+        Args:
+            query: Query SQL com placeholders
+            data: Lista de tuplas com os dados
+
+        Returns:
+            Número de linhas afetadas
+        """
+        async with self.get_connection() as conn:
+            cursor = await conn.cursor()
+            try:
+                await cursor.executemany(query, data)
+                await conn.commit()
+                return cursor.rowcount
+            except Error as e:
+                await conn.rollback()
+                logger.error(f"Erro ao executar batch: {e}")
+                raise
+            finally:
+                await cursor.close()
+
+    # ===== MÉTODOS UTILITÁRIOS =====
+
+    async def test_connection(self) -> bool:
+        """Testa conexão com o banco"""
+        try:
+            async with self.get_connection() as conn:
+                cursor = await conn.cursor()
+                await cursor.execute("SELECT 1")
+                await cursor.fetchone()
+                await cursor.close()
+                logger.info("✓ Conexão async com banco OK")
+                return True
+        except Error as e:
+            logger.error(f"✗ Erro na conexão: {e}")
+            return False
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Retorna estatísticas do pool
+
+        Returns:
+            Conexões em uso/ociosas, checkouts, falhas e tempo de espera
+        """
+        tamanho = self.pool.size if self.pool else 0
+        ociosas = self.pool.freesize if self.pool else 0
+        return {
+            "pool": self.pool_name,
+            "ativo": self.pool is not None,
+            "tamanho": tamanho,
+            "tamanho_minimo": self.pool_size,
+            "tamanho_maximo": self.pool_size + self.max_overflow,
+            "em_uso": tamanho - ociosas,
+            "ociosas": ociosas,
+            "checkouts": self._checkouts,
+            "falhas_checkout": self._checkout_failures,
+            "espera_media_ms": round(self._wait_total / self._checkouts * 1000, 3) if self._checkouts else 0,
+            "espera_max_ms": round(self._wait_max * 1000, 3)
+        }
+
+    async def close_pool(self):
+        """Fecha o connection pool (chamar ao encerrar aplicação)"""
+        if self.pool is None:
+            return
+
+        try:
+            self.pool.close()
+            await self.pool.wait_closed()
+            self.pool = None
+            logger.info(f"✓ Connection pool async fechado: {self.pool_name}")
+        except Exception as e:
+            logger.error(f"Erro ao fechar pool: {e}")
+
+
+# ===== FUNÇÕES DE CONVENIÊNCIA =====
+
+def get_async_db() -> AsyncDatabaseHelper:
+    """
+    Retorna instância do AsyncDatabaseHelper (singleton)
+
+    Uso em FastAPI:
+        from async_db_helper import get_async_db
+
+        @router.get("/projetos")
+        async def listar_projetos():
+            db = get_async_db()
+            return await db.execute_query("SELECT * FROM projetos", fetch=True)
+    """
+    if not hasattr(get_async_db, '_instance'):
+        get_async_db._instance = AsyncDatabaseHelper()
+    return get_async_db._instance
+
+
+if __name__ == '__main__':
+    # Teste básico
+    print("\n" + "="*60)
+    print("TESTANDO ASYNC DATABASE HELPER")
+    print("="*60 + "\n")
+
+    async def _main():
+        db = AsyncDatabaseHelper()
+        try:
+            if await db.test_connection():
+                print("✓ Helper async funcionando corretamente!")
+
+                usuarios = await db.execute_query("SELECT COUNT(*) as total FROM usuarios", fetch=True)
+                if usuarios:
+                    print(f"✓ Total de usuários no banco: {usuarios[0]['total']}")
+        except Exception as e:
+            print(f"✗ Erro: {e}")
+        finally:
+            await db.close_pool()
+
+    asyncio.run(_main())
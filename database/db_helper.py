@@ -4,12 +4,15 @@ Classe auxiliar para conexão e operações com o banco de dados
 """
 
 import os
+import time
 from typing import List, Dict, Any, Optional
 import mysql.connector
 from mysql.connector import Error, pooling
 from contextlib import contextmanager
 import logging
 
+from instrumentacao_sql import instrumentacao
+
 # Configurar logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -59,7 +62,9 @@ class DatabaseHelper:
         """
         conn = None
         try:
+            inicio = time.perf_counter()
             conn = self.pool.get_connection()
+            instrumentacao.registrar_espera(time.perf_counter() - inicio)
             yield conn
         except Error as e:
             logger.error(f"Erro na conexão: {e}")
@@ -82,9 +87,10 @@ class DatabaseHelper:
             None (se fetch=False)
         """
         with self.get_connection() as conn:
-            cursor = conn.cursor(dictionary=True)
+            # buffered: o resultado já está lido se for preciso rodar o EXPLAIN
+            cursor = conn.cursor(dictionary=True, buffered=True)
             try:
-                cursor.execute(query, params or ())
+                self._executar(conn, cursor, query, params or ())
                 
                 if fetch:
                     result = cursor.fetchall()
@@ -114,7 +120,7 @@ class DatabaseHelper:
         with self.get_connection() as conn:
             cursor = conn.cursor()
             try:
-                cursor.executemany(query, data)
+                self._executar(conn, cursor, query, data, muitos=True)
                 conn.commit()
                 return cursor.rowcount
             except Error as e:
@@ -124,6 +130,39 @@ class DatabaseHelper:
             finally:
                 cursor.close()
     
+    def _executar(self, conn, cursor, query: str, params, muitos: bool = False):
+        """
+        Executa no cursor registrando na instrumentação de SQL
+
+        Consultas lentas têm o plano (EXPLAIN) logado, na mesma conexão
+        """
+        inicio = time.perf_counter()
+        try:
+            if muitos:
+                cursor.executemany(query, params)
+            else:
+                cursor.execute(query, params)
+        except Error:
+            instrumentacao.registrar(query, time.perf_counter() - inicio, erro=True)
+            raise
+
+        duracao = time.perf_counter() - inicio
+        if not instrumentacao.registrar(query, duracao, cursor.rowcount):
+            return
+        if muitos:
+            # Lote: o plano é o de uma execução; loga sem ele
+            instrumentacao.registrar_plano(query, duracao, [])
+        else:
+            try:
+                explain = conn.cursor(dictionary=True)
+                try:
+                    explain.execute(f"EXPLAIN {cursor.statement}")
+                    instrumentacao.registrar_plano(query, duracao, explain.fetchall())
+                finally:
+                    explain.close()
+            except Error as e:
+                logger.warning(f"EXPLAIN da consulta lenta falhou: {e}")
+    
     # ===== MÉTODOS DE USUÁRIOS =====
     
     def get_usuario_by_email(self, email: str) -> Optional[Dict]:
@@ -236,9 +275,9 @@ class DatabaseHelper:
         query = """
             SELECT m.*, u.nome as usuario_nome, u.foto_perfil
             FROM mensagens m
-            JOIN usuarios u ON m.usuario_id = u.id
+            JOIN usuarios u ON m.autor_id = u.id
             WHERE m.chat_id = %s
-            ORDER BY m.criado_em DESC
+            ORDER BY m.enviada_em DESC
             LIMIT %s
         """
         mensagens = self.execute_query(query, (chat_id, limit), fetch=True)
@@ -248,7 +287,7 @@ class DatabaseHelper:
                        arquivo_url: Optional[str] = None) -> int:
         """Cria nova mensagem no chat"""
         query = """
-            INSERT INTO mensagens (chat_id, usuario_id, mensagem, arquivo_url)
+            INSERT INTO mensagens (chat_id, autor_id, conteudo, arquivo_url)
             VALUES (%s, %s, %s, %s)
         """
         with self.get_connection() as conn:
@@ -0,0 +1,317 @@
+"""
+Instrumentação de SQL - Gerenciador de Projetos
+Estatísticas por consulta normalizada (fingerprint): chamadas, linhas,
+latência em histograma HDR (p50/p95/p99), espera por conexão do pool e
+log de consultas lentas com o plano (EXPLAIN)
+"""
+
+import re
+import threading
+import time
+from functools import lru_cache
+from typing import Dict, Iterable, List
+import logging
+
+logger = logging.getLogger(__name__)
+
+QUANTIS = (0.5, 0.95, 0.99)
+
+
+class HistogramaHDR:
+    """
+    Histograma log-linear (estilo HdrHistogram) de valores inteiros
+
+    Cada potência de dois é dividida em 2^bits_sub faixas lineares: com
+    bits_sub=7 o erro relativo de qualquer percentil fica abaixo de 1%,
+    com memória proporcional ao número de faixas usadas, não de amostras.
+    """
+
+    __slots__ = ("bits_sub", "contagens", "total", "soma", "maximo")
+
+    def __init__(self, bits_sub: int = 7):
+        self.bits_sub = bits_sub
+        self.contagens: Dict[int, int] = {}
+        self.total = 0
+        self.soma = 0
+        self.maximo = 0
+
+    def _indice(self, valor: int) -> int:
+        magnitude = max(valor.bit_length() - self.bits_sub, 0)
+        return (magnitude << self.bits_sub) + (valor >> magnitude)
+
+    def _valor(self, indice: int) -> float:
+        # Ponto médio da faixa
+        magnitude = indice >> self.bits_sub
+        base = (indice & ((1 << self.bits_sub) - 1)) << magnitude
+        return base + ((1 << magnitude) - 1) / 2
+
+    def registrar(self, valor: int):
+        valor = max(int(valor), 0)
+        indice = self._indice(valor)
+        self.contagens[indice] = self.contagens.get(indice, 0) + 1
+        self.total += 1
+        self.soma += valor
+        if valor > self.maximo:
+            self.maximo = valor
+
+    def percentil(self, quantil: float) -> float:
+        """Valor abaixo do qual está a fração quantil das amostras"""
+        if not self.total:
+            return 0.0
+        alvo = max(quantil * self.total, 1)
+        acumulado = 0
+        for indice in sorted(self.contagens):
+            acumulado += self.contagens[indice]
+            if acumulado >= alvo:
+                return min(self._valor(indice), self.maximo)
+        return float(self.maximo)
+
+
+# ===== FINGERPRINT =====
+
+_COMENTARIOS = re.compile(r"--[^\n]*|/\*.*?\*/|#[^\n]*", re.S)
+_TEXTOS = re.compile(r"'(?:[^'\\]|\\.|'')*'|\"(?:[^\"\\]|\\.)*\"")
+_NUMEROS = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PARAMETROS = re.compile(r"%\(\w+\)s|%s|\?")
+_LISTAS = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+_VALUES = re.compile(r"(values\s*\(\?\+\))(?:\s*,\s*\(\?\+\))+")
+_ESPACOS = re.compile(r"\s+")
+
+
+@lru_cache(maxsize=4096)
+def fingerprint(sql: str) -> str:
+    """
+    SQL normalizado: literais e parâmetros viram ?, listas viram (?+)
+
+    "SELECT * FROM t WHERE id IN (%s, %s) AND nome = 'x'" ->
+    "select * from t where id in (?+) and nome = ?"
+    """
+    sql = _COMENTARIOS.sub(" ", sql)
+    sql = _TEXTOS.sub("?", sql)
+    sql = _PARAMETROS.sub("?", sql)
+    sql = _NUMEROS.sub("?", sql)
+    sql = _ESPACOS.sub(" ", sql).strip().lower()
+    sql = _LISTAS.sub("(?+)", sql)
+    return _VALUES.sub(r"\1", sql)
+
+
+def explicavel(sql: str) -> bool:
+    """Comandos com plano no EXPLAIN do MySQL"""
+    inicio = sql.lstrip(" \t\r\n(").split(None, 1)[0].lower() if sql.strip() else ""
+    return inicio in ("select", "update", "delete", "with")
+
+
+class EstatisticaConsulta:
+    """Acumulado de uma consulta normalizada"""
+
+    __slots__ = ("chamadas", "erros", "linhas", "lentas", "latencia")
+
+    def __init__(self):
+        self.chamadas = 0
+        self.erros = 0
+        self.linhas = 0
+        self.lentas = 0
+        self.latencia = HistogramaHDR()  # microssegundos
+
+
+class InstrumentacaoSQL:
+    """
+    Registro das execuções de SQL do processo
+
+    Os helpers (DatabaseHelper, AsyncDatabaseHelper e o cursor dos
+    routers) chamam registrar() em cada execução; acima de
+    limite_lenta_ms a execução é logada e, para SELECT/UPDATE/DELETE, o
+    helper roda o EXPLAIN (no máximo uma vez por consulta a cada
+    intervalo_explain segundos) e entrega o plano em registrar_plano().
+    """
+
+    def __init__(
+        self,
+        ativa: bool = True,
+        limite_lenta_ms: float = 200,
+        max_consultas: int = 500,
+        intervalo_explain: float = 60
+    ):
+        """
+        Args:
+            ativa: Se False, registrar() não guarda nada
+            limite_lenta_ms: Duração a partir da qual a consulta é lenta
+            max_consultas: Fingerprints distintos guardados (o excesso vai para "outras")
+            intervalo_explain: Segundos entre EXPLAINs da mesma consulta
+        """
+        self.configurar(ativa, limite_lenta_ms, max_consultas)
+        self.intervalo_explain = intervalo_explain
+
+        self._consultas: Dict[str, EstatisticaConsulta] = {}
+        self._ultimo_explain: Dict[str, float] = {}
+        self._espera_pool = HistogramaHDR()  # microssegundos
+        self._trava = threading.Lock()  # o DatabaseHelper síncrono roda em threads
+
+    def configurar(self, ativa: bool, limite_lenta_ms: float, max_consultas: int):
+        """Aplica os parâmetros (a API chama com os de config.Settings no import)"""
+        self.ativa = ativa
+        self.limite_lenta = limite_lenta_ms / 1000
+        self.max_consultas = max_consultas
+
+    def _estatistica(self, chave: str) -> EstatisticaConsulta:
+        estatistica = self._consultas.get(chave)
+        if estatistica is None:
+            if len(self._consultas) >= self.max_consultas:
+                chave = "outras"
+            estatistica = self._consultas.setdefault(chave, EstatisticaConsulta())
+        return estatistica
+
+    def registrar(self, sql: str, segundos: float, linhas: int = 0, erro: bool = False) -> bool:
+        """
+        Registra uma execução
+
+        Returns:
+            True se o chamador deve rodar o EXPLAIN desta consulta
+        """
+        if not self.ativa:
+            return False
+
+        chave = fingerprint(sql)
+        lenta = segundos >= self.limite_lenta
+        with self._trava:
+            estatistica = self._estatistica(chave)
+            estatistica.chamadas += 1
+            estatistica.linhas += max(linhas, 0)
+            estatistica.latencia.registrar(segundos * 1e6)
+            if erro:
+                estatistica.erros += 1
+            if not lenta:
+                return False
+            estatistica.lentas += 1
+
+            agora = time.monotonic()
+            explicar = not erro and explicavel(sql) and \
+                agora - self._ultimo_explain.get(chave, float("-inf")) >= self.intervalo_explain
+            if explicar:
+                self._ultimo_explain[chave] = agora
+
+        if not explicar:
+            logger.warning(f"Consulta lenta ({segundos * 1000:.0f}ms, {linhas} linhas): {chave}")
+        return explicar
+
+    def registrar_plano(self, sql: str, segundos: float, plano: Iterable[Dict]):
+        """Loga a consulta lenta com o plano do EXPLAIN"""
+        linhas_plano = [
+            f"    {linha.get('table')}: type={linha.get('type')} key={linha.get('key')} "
+            f"rows={linha.get('rows')} extra={linha.get('Extra')}"
+            for linha in plano
+        ]
+        logger.warning(
+            f"Consulta lenta ({segundos * 1000:.0f}ms): {fingerprint(sql)}\n" + "\n".join(linhas_plano)
+        )
+
+    def registrar_espera(self, segundos: float):
+        """Tempo de espera por uma conexão do pool"""
+        if self.ativa:
+            with self._trava:
+                self._espera_pool.registrar(segundos * 1e6)
+
+    # ===== EXPORTAÇÃO =====
+
+    def resumo(self, limite: int = 20) -> Dict:
+        """Consultas com maior tempo total (JSON)"""
+        with self._trava:
+            itens = sorted(self._consultas.items(), key=lambda item: item[1].latencia.soma, reverse=True)
+            consultas = [
+                {
+                    "consulta": chave,
+                    "chamadas": e.chamadas,
+                    "erros": e.erros,
+                    "lentas": e.lentas,
+                    "linhas": e.linhas,
+                    "total_ms": round(e.latencia.soma / 1000, 3),
+                    **{f"p{int(q * 100)}_ms": round(e.latencia.percentil(q) / 1000, 3) for q in QUANTIS},
+                    "max_ms": round(e.latencia.maximo / 1000, 3)
+                }
+                for chave, e in itens[:limite]
+            ]
+            espera = {
+                "aquisicoes": self._espera_pool.total,
+                **{f"p{int(q * 100)}_ms": round(self._espera_pool.percentil(q) / 1000, 3) for q in QUANTIS},
+                "max_ms": round(self._espera_pool.maximo / 1000, 3)
+            }
+        return {"consultas_distintas": len(self._consultas), "consultas": consultas, "espera_pool": espera}
+
+    def exportar_prometheus(self) -> str:
+        """Métricas no formato de texto do Prometheus"""
+        saida: List[str] = []
+
+        def _metrica(nome: str, tipo: str, ajuda: str):
+            saida.append(f"# HELP {nome} {ajuda}")
+            saida.append(f"# TYPE {nome} {tipo}")
+
+        with self._trava:
+            consultas = [(_rotulo(chave), e) for chave, e in self._consultas.items()]
+
+            for nome, ajuda, campo in (
+                ("sql_consultas_total", "Execucoes por consulta normalizada", "chamadas"),
+                ("sql_erros_total", "Execucoes com erro", "erros"),
+                ("sql_lentas_total", "Execucoes acima do limite de consulta lenta", "lentas"),
+                ("sql_linhas_total", "Linhas retornadas ou afetadas", "linhas"),
+            ):
+                _metrica(nome, "counter", ajuda)
+                saida.extend(f'{nome}{{consulta="{rotulo}"}} {getattr(e, campo)}' for rotulo, e in consultas)
+
+            _metrica("sql_latencia_segundos", "summary", "Latencia por consulta normalizada")
+            for rotulo, e in consultas:
+                saida.extend(_sumario("sql_latencia_segundos", f'consulta="{rotulo}",', e.latencia))
+
+            _metrica("db_pool_espera_segundos", "summary", "Espera por conexao do pool")
+            saida.extend(_sumario("db_pool_espera_segundos", "", self._espera_pool))
+
+        return "\n".join(saida) + "\n"
+
+    def limpar(self):
+        """Zera as estatísticas"""
+        with self._trava:
+            self._consultas.clear()
+            self._ultimo_explain.clear()
+            self._espera_pool = HistogramaHDR()
+
+
+def _rotulo(valor: str) -> str:
+    return valor.replace("\\", "\\\\").replace('"', '\\"').replace("\n", " ")
+
+
+def _sumario(nome: str, rotulos: str, histograma: HistogramaHDR) -> List[str]:
+    linhas = [
+        f'{nome}{{{rotulos}quantile="{q}"}} {histograma.percentil(q) / 1e6:.6f}' for q in QUANTIS
+    ]
+    chaves = f"{{{rotulos.rstrip(',')}}}" if rotulos else ""
+    linhas.append(f"{nome}_sum{chaves} {histograma.soma / 1e6:.6f}")
+    linhas.append(f"{nome}_count{chaves} {histograma.total}")
+    return linhas
+
+
+# Instância global
+instrumentacao = InstrumentacaoSQL()
+
+
+if __name__ == '__main__':
+    # Benchmark: custo do registro por execução
+    import random
+
+    sorteio = random.Random(7)
+    consultas = [
+        "SELECT * FROM tarefas WHERE projeto_id = %s AND status = %s ORDER BY id LIMIT %s",
+        "SELECT d.*, u.nome FROM documentos d LEFT JOIN usuarios u ON d.uploaded_por = u.id WHERE d.id IN (%s, %s, %s)",
+        "UPDATE tarefas SET status = %s WHERE id = %s",
+        "INSERT INTO mensagens_chat (chat_id, usuario_id, mensagem) VALUES (%s, %s, %s)",
+    ]
+    medidor = InstrumentacaoSQL(limite_lenta_ms=10 ** 9)
+    repeticoes = 200000
+
+    inicio = time.perf_counter()
+    for _ in range(repeticoes):
+        medidor.registrar(sorteio.choice(consultas), sorteio.expovariate(1 / 0.002), 10)
+    us = (time.perf_counter() - inicio) / repeticoes * 1e6
+
+    print(f"✓ {repeticoes} execuções registradas: {us:.2f}µs por execução")
+    for consulta in medidor.resumo()["consultas"]:
+        print(f"  {consulta['chamadas']:>6}x p50 {consulta['p50_ms']:.2f}ms p99 {consulta['p99_ms']:.2f}ms  "
+              f"{consulta['consulta'][:70]}")
@@ -0,0 +1,30 @@
+-- Migration 004: Snapshots diários de métricas
+-- metricas_projeto passa a guardar todos os indicadores do dashboard,
+-- gravados pelo motor de snapshots da API (utils/metricas_snapshot.py)
+-- Data: 2026-10-17
+
+-- ===== COLUNAS DO SNAPSHOT =====
+
+ALTER TABLE metricas_projeto
+    ADD COLUMN tarefas_total INT DEFAULT 0 AFTER data_registro,
+    ADD COLUMN tarefas_a_fazer INT DEFAULT 0 AFTER tarefas_total,
+    ADD COLUMN tarefas_em_execucao INT DEFAULT 0 AFTER tarefas_a_fazer,
+    ADD COLUMN total_membros INT DEFAULT 0 AFTER horas_trabalhadas,
+    ADD COLUMN orcamento_total DECIMAL(15,2) DEFAULT 0 AFTER total_membros,
+    ADD COLUMN total_materiais INT DEFAULT 0 AFTER valor_gasto,
+    ADD COLUMN valor_estoque DECIMAL(15,2) DEFAULT 0 AFTER total_materiais,
+    ADD COLUMN total_documentos INT DEFAULT 0 AFTER valor_estoque,
+    ADD COLUMN atualizado_em TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP;
+
+-- O trigger antigo sobrescrevia o snapshot do dia a cada UPDATE em projetos
+DROP TRIGGER IF EXISTS trg_registrar_metricas_projeto;
+
+-- ===== ÍNDICES PARA DETECÇÃO DE MUDANÇAS =====
+
+-- Projetos alterados desde a última execução do motor de snapshots
+CREATE INDEX idx_tarefas_atualizado ON tarefas(atualizado_em);
+CREATE INDEX idx_orcamentos_atualizado ON orcamentos(atualizado_em);
+CREATE INDEX idx_materiais_atualizado ON materiais(atualizado_em);
+
+-- Registrar execução da migration
+INSERT INTO _migrations (versao, nome) VALUES ('004', 'Snapshots de Métricas');
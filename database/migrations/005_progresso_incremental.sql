@@ -0,0 +1,87 @@
+-- Migration 005: Progresso do projeto incremental
+-- Substitui os triggers que recalculavam AVG(progresso_percentual) sobre
+-- todas as tarefas do projeto a cada INSERT/UPDATE/DELETE (O(n) por linha,
+-- O(n²) em importações) por soma e contagem mantidas por diferença (O(1))
+-- Data: 2026-10-17
+--
+-- Os triggers têm corpo de um único statement (sem BEGIN/END nem DELIMITER)
+-- para que o migrate.py possa executá-los. A divergência entre os contadores
+-- e as tarefas é auditada e corrigida por backend/utils/reconciliacao_progresso.py
+
+-- ===== CONTADORES EM PROJETOS =====
+
+ALTER TABLE projetos
+    ADD COLUMN tarefas_quantidade INT NOT NULL DEFAULT 0 AFTER progresso_percentual,
+    ADD COLUMN tarefas_soma_progresso DECIMAL(15,2) NOT NULL DEFAULT 0 AFTER tarefas_quantidade;
+
+-- Carga inicial dos contadores
+UPDATE projetos p
+LEFT JOIN (
+    SELECT
+        projeto_id,
+        COUNT(*) as quantidade,
+        COALESCE(SUM(progresso_percentual), 0) as soma
+    FROM tarefas
+    GROUP BY projeto_id
+) t ON t.projeto_id = p.id
+SET p.tarefas_quantidade = COALESCE(t.quantidade, 0),
+    p.tarefas_soma_progresso = COALESCE(t.soma, 0),
+    p.progresso_percentual = CASE
+        WHEN COALESCE(t.quantidade, 0) > 0 THEN ROUND(t.soma / t.quantidade, 2)
+        ELSE 0
+    END;
+
+-- ===== TRIGGERS =====
+
+DROP TRIGGER IF EXISTS trg_atualizar_progresso_projeto_insert;
+DROP TRIGGER IF EXISTS trg_atualizar_progresso_projeto_update;
+DROP TRIGGER IF EXISTS trg_atualizar_progresso_projeto_delete;
+
+-- As atribuições do UPDATE são avaliadas da esquerda para a direita,
+-- então progresso_percentual já usa a soma e a contagem novas
+
+CREATE TRIGGER trg_atualizar_progresso_projeto_insert
+AFTER INSERT ON tarefas
+FOR EACH ROW
+    UPDATE projetos
+    SET tarefas_quantidade = tarefas_quantidade + 1,
+        tarefas_soma_progresso = tarefas_soma_progresso + COALESCE(NEW.progresso_percentual, 0),
+        progresso_percentual = ROUND(tarefas_soma_progresso / tarefas_quantidade, 2)
+    WHERE id = NEW.projeto_id;
+
+-- Cobre também a troca de projeto (subtrai do antigo, soma no novo)
+CREATE TRIGGER trg_atualizar_progresso_projeto_update
+AFTER UPDATE ON tarefas
+FOR EACH ROW
+    UPDATE projetos
+    SET tarefas_quantidade = tarefas_quantidade
+            + (id = NEW.projeto_id) - (id = OLD.projeto_id),
+        tarefas_soma_progresso = tarefas_soma_progresso
+            + IF(id = NEW.projeto_id, COALESCE(NEW.progresso_percentual, 0), 0)
+            - IF(id = OLD.projeto_id, COALESCE(OLD.progresso_percentual, 0), 0),
+        progresso_percentual = IF(
+            tarefas_quantidade > 0,
+            ROUND(tarefas_soma_progresso / tarefas_quantidade, 2),
+            0
+        )
+    WHERE id IN (OLD.projeto_id, NEW.projeto_id)
+      AND (
+          NOT (OLD.progresso_percentual <=> NEW.progresso_percentual)
+          OR OLD.projeto_id != NEW.projeto_id
+      );
+
+CREATE TRIGGER trg_atualizar_progresso_projeto_delete
+AFTER DELETE ON tarefas
+FOR EACH ROW
+    UPDATE projetos
+    SET tarefas_quantidade = tarefas_quantidade - 1,
+        tarefas_soma_progresso = tarefas_soma_progresso - COALESCE(OLD.progresso_percentual, 0),
+        progresso_percentual = IF(
+            tarefas_quantidade > 0,
+            ROUND(tarefas_soma_progresso / tarefas_quantidade, 2),
+            0
+        )
+    WHERE id = OLD.projeto_id;
+
+-- Registrar execução da migration
+INSERT INTO _migrations (versao, nome) VALUES ('005', 'Progresso Incremental');
@@ -0,0 +1,36 @@
+-- Migration 006: Busca textual no chat
+-- Índice FULLTEXT para a busca de mensagens (MATCH ... AGAINST) usada por
+-- GET /chat/{projeto_id}/buscar, no lugar de LIKE '%termo%' (varredura
+-- de todas as mensagens do projeto)
+-- Data: 2026-10-17
+--
+-- Antes do índice, as colunas de mensagens passam a ter os nomes gravados
+-- e lidos por backend/routes/chat.py e utils/busca_mensagens.py:
+-- usuario_id -> autor_id, mensagem -> conteudo, criado_em -> enviada_em
+-- (índices e chaves estrangeiras acompanham a renomeação)
+--
+-- O trigger de notificação da migration 002 citava as colunas antigas e é
+-- recriado com corpo de um único statement (sem BEGIN/END nem DELIMITER),
+-- para que o migrate.py possa executá-lo
+
+ALTER TABLE mensagens
+    RENAME COLUMN usuario_id TO autor_id,
+    RENAME COLUMN mensagem TO conteudo,
+    RENAME COLUMN criado_em TO enviada_em;
+
+DROP TRIGGER IF EXISTS trg_notificar_nova_mensagem;
+
+CREATE TRIGGER trg_notificar_nova_mensagem
+AFTER INSERT ON mensagens
+FOR EACH ROW
+    INSERT INTO notificacoes (usuario_id, tipo, titulo, mensagem, link)
+    SELECT cp.usuario_id, 'mensagem', CONCAT('Nova mensagem em ', c.nome),
+           LEFT(NEW.conteudo, 100), CONCAT('/chats/', NEW.chat_id)
+    FROM chat_participantes cp
+    INNER JOIN chats c ON c.id = cp.chat_id
+    WHERE cp.chat_id = NEW.chat_id AND cp.usuario_id != NEW.autor_id;
+
+CREATE FULLTEXT INDEX idx_ft_mensagens_conteudo ON mensagens(conteudo);
+
+-- Registrar execução da migration
+INSERT INTO _migrations (versao, nome) VALUES ('006', 'Busca de Mensagens');
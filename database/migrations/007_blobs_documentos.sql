@@ -0,0 +1,27 @@
+-- Migration 007: Armazenamento de documentos por conteúdo
+-- Arquivos enviados são guardados uma única vez, pelo SHA-256 do conteúdo
+-- (backend/utils/blob_store.py), e cada linha de documentos e de
+-- versoes_documento que aponta para o arquivo conta uma referência
+-- Data: 2026-10-17
+--
+-- Linhas anteriores à migration ficam com sha256 NULL e continuam
+-- apontando para o arquivo próprio (removido junto com o documento)
+
+CREATE TABLE blobs (
+    sha256 CHAR(64) PRIMARY KEY,
+    caminho_arquivo VARCHAR(500) NOT NULL,
+    tamanho_bytes BIGINT NOT NULL,
+    referencias INT NOT NULL DEFAULT 0,
+    criado_em TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+ALTER TABLE documentos
+    ADD COLUMN sha256 CHAR(64) NULL,
+    ADD INDEX idx_documentos_sha256 (sha256);
+
+ALTER TABLE versoes_documento
+    ADD COLUMN sha256 CHAR(64) NULL,
+    ADD INDEX idx_versoes_documento_sha256 (sha256);
+
+-- Registrar execução da migration
+INSERT INTO _migrations (versao, nome) VALUES ('007', 'Blobs de Documentos');
@@ -0,0 +1,16 @@
+-- Migration 008: Versões de documentos em delta
+-- Com DOCUMENTOS_DELTA_ATIVO, versões intermediárias guardam apenas a
+-- diferença binária em relação à versão anterior (backend/utils/delta_versoes.py)
+-- Data: 2026-10-17
+--
+-- Em versões em delta, sha256/caminho_arquivo apontam para o blob do delta
+-- (é ele que conta referência) e conteudo_sha256 é o hash do conteúdo
+-- reconstruído, e delta_base é o número da versão usada como base.
+-- Versões completas ficam com as duas colunas NULL
+
+ALTER TABLE versoes_documento
+    ADD COLUMN conteudo_sha256 CHAR(64) NULL,
+    ADD COLUMN delta_base INT NULL;
+
+-- Registrar execução da migration
+INSERT INTO _migrations (versao, nome) VALUES ('008', 'Versões em Delta');
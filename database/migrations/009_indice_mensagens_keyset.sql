@@ -0,0 +1,12 @@
+-- Migration 009: Índice da paginação de mensagens
+-- GET /chat/{projeto_id}/mensagens pagina por keyset em (enviada_em, id)
+-- dentro de um chat. Com idx_chat_data em (chat_id, enviada_em, id) cada
+-- página é lida direto do índice, sem ordenar as mensagens do chat
+-- Data: 2026-10-17
+
+ALTER TABLE mensagens
+    DROP INDEX idx_chat_data,
+    ADD INDEX idx_chat_data (chat_id, enviada_em, id);
+
+-- Registrar execução da migration
+INSERT INTO _migrations (versao, nome) VALUES ('009', 'Índice de Mensagens por Keyset');
@@ -64,9 +64,9 @@ SELECT
     p.nome AS projeto_nome,
     COUNT(DISTINCT cp.usuario_id) AS total_participantes,
     COUNT(m.id) AS total_mensagens,
-    MAX(m.criado_em) AS ultima_mensagem_data,
-    (SELECT mensagem FROM mensagens WHERE chat_id = c.id ORDER BY criado_em DESC LIMIT 1) AS ultima_mensagem,
-    (SELECT u.nome FROM mensagens mm JOIN usuarios u ON mm.usuario_id = u.id WHERE mm.chat_id = c.id ORDER BY mm.criado_em DESC LIMIT 1) AS ultimo_usuario
+    MAX(m.enviada_em) AS ultima_mensagem_data,
+    (SELECT conteudo FROM mensagens WHERE chat_id = c.id ORDER BY enviada_em DESC LIMIT 1) AS ultima_mensagem,
+    (SELECT u.nome FROM mensagens mm JOIN usuarios u ON mm.autor_id = u.id WHERE mm.chat_id = c.id ORDER BY mm.enviada_em DESC LIMIT 1) AS ultimo_usuario
 FROM chats c
 JOIN projetos p ON c.projeto_id = p.id
 LEFT JOIN chat_participantes cp ON c.id = cp.chat_id
@@ -219,13 +219,13 @@ LIMIT 20;
 SELECT 
     p.nome AS projeto,
     c.nome AS chat,
-    COUNT(DISTINCT m.usuario_id) AS usuarios_ativos,
+    COUNT(DISTINCT m.autor_id) AS usuarios_ativos,
     COUNT(m.id) AS total_mensagens,
-    DATE(MAX(m.criado_em)) AS ultima_atividade
+    DATE(MAX(m.enviada_em)) AS ultima_atividade
 FROM chats c
 JOIN projetos p ON c.projeto_id = p.id
 LEFT JOIN mensagens m ON c.id = m.chat_id
-WHERE m.criado_em >= DATE_SUB(CURRENT_DATE, INTERVAL 7 DAY)
+WHERE m.enviada_em >= DATE_SUB(CURRENT_DATE, INTERVAL 7 DAY)
 GROUP BY p.id, p.nome, c.id, c.nome
 ORDER BY total_mensagens DESC;
 
@@ -261,7 +261,7 @@ ORDER BY mes_ano DESC;
 
 -- Índices para queries de dashboard
 CREATE INDEX idx_tarefas_data_status ON tarefas(data_fim_prevista, status);
-CREATE INDEX idx_mensagens_chat_data ON mensagens(chat_id, criado_em DESC);
+CREATE INDEX idx_mensagens_chat_data ON mensagens(chat_id, enviada_em DESC);
 CREATE INDEX idx_documentos_projeto_data ON documentos(projeto_id, criado_em DESC);
 CREATE INDEX idx_orcamentos_status_categoria ON orcamentos(status, categoria);
 
@@ -70,6 +70,8 @@ CREATE TABLE projetos (
     data_fim_real DATE,
     status ENUM('planejamento', 'em_andamento', 'pausado', 'concluido', 'cancelado') DEFAULT 'planejamento',
     progresso_percentual DECIMAL(5,2) DEFAULT 0,
+    tarefas_quantidade INT NOT NULL DEFAULT 0,
+    tarefas_soma_progresso DECIMAL(15,2) NOT NULL DEFAULT 0,
     criador_id INT NOT NULL,
     criado_em TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     atualizado_em TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
@@ -203,15 +205,16 @@ CREATE TABLE chat_participantes (
 CREATE TABLE mensagens (
     id INT AUTO_INCREMENT PRIMARY KEY,
     chat_id INT NOT NULL,
-    usuario_id INT NOT NULL,
-    mensagem TEXT NOT NULL,
+    autor_id INT NOT NULL,
+    conteudo TEXT NOT NULL,
     arquivo_url VARCHAR(255),
     lida BOOLEAN DEFAULT FALSE,
-    criado_em TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    enviada_em TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     INDEX idx_chat (chat_id),
-    INDEX idx_chat_data (chat_id, criado_em),
+    INDEX idx_chat_data (chat_id, enviada_em, id),
+    FULLTEXT INDEX idx_ft_mensagens_conteudo (conteudo),
     FOREIGN KEY (chat_id) REFERENCES chats(id) ON DELETE CASCADE,
-    FOREIGN KEY (usuario_id) REFERENCES usuarios(id)
+    FOREIGN KEY (autor_id) REFERENCES usuarios(id)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
 
 -- ===== MATERIAIS E ORÇAMENTO =====
@@ -257,13 +260,22 @@ CREATE TABLE metricas_projeto (
     id INT AUTO_INCREMENT PRIMARY KEY,
     projeto_id INT NOT NULL,
     data_registro DATE NOT NULL,
+    tarefas_total INT DEFAULT 0,
+    tarefas_a_fazer INT DEFAULT 0,
+    tarefas_em_execucao INT DEFAULT 0,
     tarefas_concluidas INT DEFAULT 0,
     tarefas_atrasadas INT DEFAULT 0,
     progresso_fisico DECIMAL(5,2) DEFAULT 0,
     progresso_financeiro DECIMAL(5,2) DEFAULT 0,
     horas_trabalhadas DECIMAL(10,2) DEFAULT 0,
+    total_membros INT DEFAULT 0,
+    orcamento_total DECIMAL(15,2) DEFAULT 0,
     valor_gasto DECIMAL(15,2) DEFAULT 0,
+    total_materiais INT DEFAULT 0,
+    valor_estoque DECIMAL(15,2) DEFAULT 0,
+    total_documentos INT DEFAULT 0,
     criado_em TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    atualizado_em TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
     UNIQUE KEY uk_projeto_data (projeto_id, data_registro),
     FOREIGN KEY (projeto_id) REFERENCES projetos(id) ON DELETE CASCADE
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
@@ -281,6 +293,11 @@ CREATE TABLE notificacoes (
     FOREIGN KEY (usuario_id) REFERENCES usuarios(id) ON DELETE CASCADE
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
 
+-- Projetos alterados desde a última execução do motor de snapshots (migration 004)
+CREATE INDEX idx_tarefas_atualizado ON tarefas(atualizado_em);
+CREATE INDEX idx_orcamentos_atualizado ON orcamentos(atualizado_em);
+CREATE INDEX idx_materiais_atualizado ON materiais(atualizado_em);
+
 -- =====================================================
 -- DADOS DE EXEMPLO (INSERTS)
 -- =====================================================
@@ -354,8 +371,88 @@ INSERT INTO orcamentos (projeto_id, descricao, categoria, valor_previsto, valor_
 (2, 'Instalações Especiais', 'servico', 450000.00, 320000.00, 'aprovado'),
 (5, 'Terraplanagem e Contenção', 'servico', 680000.00, 410000.00, 'aprovado');
 
+-- =====================================================
+-- PROGRESSO INCREMENTAL (migration 005)
+-- Soma e contagem das tarefas mantidas por diferença nos triggers;
+-- auditadas por backend/utils/reconciliacao_progresso.py
+-- =====================================================
+
+-- Carga inicial dos contadores
+UPDATE projetos p
+LEFT JOIN (
+    SELECT
+        projeto_id,
+        COUNT(*) as quantidade,
+        COALESCE(SUM(progresso_percentual), 0) as soma
+    FROM tarefas
+    GROUP BY projeto_id
+) t ON t.projeto_id = p.id
+SET p.tarefas_quantidade = COALESCE(t.quantidade, 0),
+    p.tarefas_soma_progresso = COALESCE(t.soma, 0),
+    p.progresso_percentual = CASE
+        WHEN COALESCE(t.quantidade, 0) > 0 THEN ROUND(t.soma / t.quantidade, 2)
+        ELSE 0
+    END;
+
+-- ===== TRIGGERS =====
+
+DROP TRIGGER IF EXISTS trg_atualizar_progresso_projeto_insert;
+DROP TRIGGER IF EXISTS trg_atualizar_progresso_projeto_update;
+DROP TRIGGER IF EXISTS trg_atualizar_progresso_projeto_delete;
+
+-- As atribuições do UPDATE são avaliadas da esquerda para a direita,
+-- então progresso_percentual já usa a soma e a contagem novas
+
+CREATE TRIGGER trg_atualizar_progresso_projeto_insert
+AFTER INSERT ON tarefas
+FOR EACH ROW
+    UPDATE projetos
+    SET tarefas_quantidade = tarefas_quantidade + 1,
+        tarefas_soma_progresso = tarefas_soma_progresso + COALESCE(NEW.progresso_percentual, 0),
+        progresso_percentual = ROUND(tarefas_soma_progresso / tarefas_quantidade, 2)
+    WHERE id = NEW.projeto_id;
+
+-- Cobre também a troca de projeto (subtrai do antigo, soma no novo)
+CREATE TRIGGER trg_atualizar_progresso_projeto_update
+AFTER UPDATE ON tarefas
+FOR EACH ROW
+    UPDATE projetos
+    SET tarefas_quantidade = tarefas_quantidade
+            + (id = NEW.projeto_id) - (id = OLD.projeto_id),
+        tarefas_soma_progresso = tarefas_soma_progresso
+            + IF(id = NEW.projeto_id, COALESCE(NEW.progresso_percentual, 0), 0)
+            - IF(id = OLD.projeto_id, COALESCE(OLD.progresso_percentual, 0), 0),
+        progresso_percentual = IF(
+            tarefas_quantidade > 0,
+            ROUND(tarefas_soma_progresso / tarefas_quantidade, 2),
+            0
+        )
+    WHERE id IN (OLD.projeto_id, NEW.projeto_id)
+      AND (
+          NOT (OLD.progresso_percentual <=> NEW.progresso_percentual)
+          OR OLD.projeto_id != NEW.projeto_id
+      );
+
+CREATE TRIGGER trg_atualizar_progresso_projeto_delete
+AFTER DELETE ON tarefas
+FOR EACH ROW
+    UPDATE projetos
+    SET tarefas_quantidade = tarefas_quantidade - 1,
+        tarefas_soma_progresso = tarefas_soma_progresso - COALESCE(OLD.progresso_percentual, 0),
+        progresso_percentual = IF(
+            tarefas_quantidade > 0,
+            ROUND(tarefas_soma_progresso / tarefas_quantidade, 2),
+            0
+        )
+    WHERE id = OLD.projeto_id;
+
 -- Registrar migration
 INSERT INTO _migrations (versao, nome) VALUES ('001', 'Initial Schema with Sample Data');
+-- Migrations já incorporadas neste script
+INSERT INTO _migrations (versao, nome) VALUES ('004', 'Snapshots de Métricas');
+INSERT INTO _migrations (versao, nome) VALUES ('005', 'Progresso Incremental');
+INSERT INTO _migrations (versao, nome) VALUES ('006', 'Busca de Mensagens');
+INSERT INTO _migrations (versao, nome) VALUES ('009', 'Índice de Mensagens por Keyset');
 
 -- =====================================================
 -- FIM DO SCRIPT
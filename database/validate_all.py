@@ -361,7 +361,7 @@ class DatabaseValidator:
             ("SELECT COUNT(*) FROM projetos", "Contar projetos"),
             ("SELECT * FROM vw_projetos_completo LIMIT 10", "View de projetos"),
             ("SELECT * FROM tarefas WHERE projeto_id = 1", "Tarefas por projeto"),
-            ("SELECT * FROM mensagens WHERE chat_id = 1 ORDER BY criado_em DESC LIMIT 20", "Mensagens do chat"),
+            ("SELECT * FROM mensagens WHERE chat_id = 1 ORDER BY enviada_em DESC LIMIT 20", "Mensagens do chat"),
         ]
         
         cursor = self.connection.cursor()
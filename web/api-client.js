@@ -312,13 +312,48 @@ class ApiClient {
     // ============ CHAT ============
 
     async sendMessage(projeto_id, conteudo) {
-        return this.post(`/chat/${projeto_id}/messages`, {
+        return this.post(`/chat/${projeto_id}/mensagens`, {
             conteudo,
         });
     }
 
-    async getMessages(projeto_id, skip = 0, limit = 50) {
-        return this.get(`/chat/${projeto_id}/messages?skip=${skip}&limit=${limit}`);
+    async getMessages(projeto_id, cursor = null, limit = 50) {
+        const pagina = cursor ? `&cursor=${encodeURIComponent(cursor)}` : '';
+        return this.get(`/chat/${projeto_id}/mensagens?limit=${limit}${pagina}`);
+    }
+
+    /**
+     * Recebe mensagens do chat em tempo real (WebSocket, com SSE como alternativa)
+     * Retorna função para encerrar a assinatura
+     */
+    subscribeChat(projeto_id, onEvento) {
+        const token = encodeURIComponent(this.token || '');
+        const base = `${API_URL}/chat/${projeto_id}`;
+        let fonte = null;
+        let encerrado = false;
+
+        const abrirSSE = () => {
+            fonte = new EventSource(`${base}/eventos?token=${token}`);
+            fonte.onmessage = (e) => onEvento(JSON.parse(e.data));
+        };
+
+        if ('WebSocket' in window) {
+            fonte = new WebSocket(`${base.replace(/^http/, 'ws')}/ws?token=${token}`);
+            fonte.onmessage = (e) => {
+                const evento = JSON.parse(e.data);
+                if (evento.tipo !== 'ping') onEvento(evento);
+            };
+            fonte.onerror = () => {
+                if (!encerrado && fonte.readyState !== WebSocket.OPEN) abrirSSE();
+            };
+        } else {
+            abrirSSE();
+        }
+
+        return () => {
+            encerrado = true;
+            if (fonte) fonte.close();
+        };
     }
 
     // ============ MÉTRICAS ============